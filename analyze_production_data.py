@@ -7,6 +7,10 @@ from modules.analytics.aggregator import MetricsAggregator, TimeRange
 from database.connection import get_db
 import json
 
+def format_rate(rate):
+    """Format a rate as a percentage; None means it is not observable yet"""
+    return 'n/a' if rate is None else f'{rate:.2%}'
+
 def analyze_production_data():
     """Analyze current production metrics to identify improvement areas"""
     
@@ -23,9 +27,9 @@ def analyze_production_data():
     print('\n--- ENGAGEMENT METRICS ---')
     print(f'Monthly Active Users (MAU): {engagement.mau}')
     print(f'Daily Active Users (DAU): {engagement.dau}')
-    print(f'Day 1 Retention: {engagement.retention_d1:.2%}')
-    print(f'Day 7 Retention: {engagement.retention_d7:.2%}')
-    print(f'Day 30 Retention: {engagement.retention_d30:.2%}')
+    print(f'Day 1 Retention: {format_rate(engagement.retention_d1)}')
+    print(f'Day 7 Retention: {format_rate(engagement.retention_d7)}')
+    print(f'Day 30 Retention: {format_rate(engagement.retention_d30)}')
     print(f'Avg Session Duration: {engagement.avg_session_duration:.0f} seconds')
     print(f'Engagement by Module: {json.dumps(engagement.engagement_by_module, indent=2)}')
     
@@ -62,8 +66,8 @@ def analyze_production_data():
     if engagement.mau < 10:
         print(f'❌ LOW USER BASE: Only {engagement.mau} monthly active users')
     
-    if engagement.retention_d1 < 0.3:
-        print(f'❌ LOW RETENTION: Day 1 retention is only {engagement.retention_d1:.2%}')
+    if engagement.retention_d1 is not None and engagement.retention_d1 < 0.3:
+        print(f'❌ LOW RETENTION: Day 1 retention is only {format_rate(engagement.retention_d1)}')
     
     # Monetization issues
     if monetization.total_revenue < 10:
@@ -11,6 +11,7 @@ from api.routers.users import router as users_router
 from api.routers.content import router as content_router
 from api.routers.analytics import router as analytics_router
 from api.routers.dashboard import router as dashboard_router
+from api.routers.leaderboards import router as leaderboards_router
 
 app = FastAPI(title="DianaBot API", version="1.0.0")
 
@@ -21,6 +22,7 @@ app.include_router(users_router, prefix="/api")
 app.include_router(content_router, prefix="/api")
 app.include_router(analytics_router, prefix="/api")
 app.include_router(dashboard_router, prefix="/api")
+app.include_router(leaderboards_router, prefix="/api")
 
 
 @app.get("/")
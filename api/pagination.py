@@ -0,0 +1,33 @@
+"""
+Keyset pagination for admin API listings
+"""
+
+from typing import Any, List, Optional
+
+from fastapi import Response
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def keyset_page(query: Query, model, response: Response, after_id: Optional[int] = None,
+                skip: int = 0, limit: int = 100) -> List[Any]:
+    """
+    Fetch one page of a listing ordered by primary key
+
+    With after_id the page is read with an index seek (id > after_id), so
+    deep pages cost the same as the first one. skip is only honoured when
+    no cursor is given, for older clients. When the page is full, the id
+    to pass as after_id for the next page is returned in X-Next-Cursor.
+    """
+    query = query.order_by(model.id)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit).all()
+
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(rows[-1].id)
+    return rows
@@ -1,4 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 from typing import Dict, Any, Optional
@@ -16,11 +21,16 @@ from database.models import (
     ChannelPost,
     AdminUser,
     ConversionFunnel,
+    AnalyticsEvent,
 )
 from api.middleware.auth import require_role, get_current_active_user
+from api.pagination import keyset_page
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from modules.analytics.dashboard import DashboardDataProvider
+from modules.analytics.active_users import active_user_counter, HLL_STANDARD_ERROR
+from modules.analytics.cohorts import COHORT_LOOKBACK_DAYS
+from modules.analytics.export import DataExporter, ParquetUnavailableError, STREAM_DATASETS, STREAM_FORMATS
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -40,6 +50,7 @@ class EngagementMetricsResponse(BaseModel):
     avg_session_length_minutes: float
     retention_rate_7d: float
     retention_rate_30d: float
+    active_users_error: float = 0.0
 
 
 class MonetizationMetricsResponse(BaseModel):
@@ -88,6 +99,7 @@ async def get_metrics_summary(
             "dau": overview.active_users_today,
             "wau": overview.active_users_week,
             "mau": overview.active_users_month,
+            "active_users_error": overview.active_users_error,
             "avg_session_length_minutes": 0.0,  # Placeholder
             "retention_rate_7d": 0.0,  # Placeholder
             "retention_rate_30d": 0.0,  # Placeholder
@@ -140,6 +152,7 @@ async def get_engagement_metrics(
         avg_session_length_minutes=0.0,  # Placeholder
         retention_rate_7d=0.0,  # Placeholder
         retention_rate_30d=0.0,  # Placeholder
+        active_users_error=overview.active_users_error,
     )
 
 
@@ -206,7 +219,12 @@ async def get_gamification_metrics(
 def count_active_users(
     db: Session, hours: Optional[int] = 24, days: Optional[int] = None
 ) -> int:
-    """Count active users in given time period"""
+    """
+    Count active users in given time period
+
+    Estimated from the per-day HyperLogLog sketches, so the window is
+    widened to whole days and the count carries a ~0.81% standard error.
+    """
     if hours:
         cutoff_time = datetime.now() - timedelta(hours=hours)
     elif days:
@@ -214,9 +232,9 @@ def count_active_users(
     else:
         cutoff_time = datetime.now() - timedelta(days=1)
 
-    # TODO: Implement actual active user counting based on last_active field
-    # For now, return total user count
-    return db.query(User).count()
+    return active_user_counter.count(cutoff_time.date(), datetime.now().date(), db=db)[
+        "count"
+    ]
 
 
 def count_active_subscriptions(db: Session) -> int:
@@ -385,6 +403,7 @@ async def get_dashboard_analytics(
     return {
         "metrics": {
             "activeUsers": active_users,
+            "activeUsersError": HLL_STANDARD_ERROR,
             "messagesToday": messages_today,
             "besitosEarned": besitos_earned,
             "storiesRead": stories_read,
@@ -607,6 +626,7 @@ async def get_dashboard_overview(
             "active_users_today": overview.active_users_today,
             "active_users_week": overview.active_users_week,
             "active_users_month": overview.active_users_month,
+            "active_users_error": overview.active_users_error,
             "total_revenue_today": overview.total_revenue_today,
             "total_revenue_month": overview.total_revenue_month,
             "conversion_rate": overview.conversion_rate,
@@ -669,6 +689,12 @@ async def get_dashboard_cohorts(
     current_user: AdminUser = Depends(require_role("admin")),
 ):
     """Get dashboard cohort analysis data"""
+    if cohort_definition not in COHORT_LOOKBACK_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"cohort_definition must be one of: {', '.join(COHORT_LOOKBACK_DAYS)}",
+        )
+
     dashboard_provider = DashboardDataProvider(db)
     cohort_analysis = dashboard_provider.get_cohort_analysis(cohort_definition)
 
@@ -722,3 +748,96 @@ async def get_dashboard_health(
     system_health = dashboard_provider.get_system_health()
 
     return system_health
+
+
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_role("admin")),
+):
+    """Stream a raw dataset (analytics events or transactions) as CSV, NDJSON or Parquet"""
+    if dataset not in STREAM_DATASETS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"dataset must be one of: {', '.join(STREAM_DATASETS)}",
+        )
+    if format not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(STREAM_FORMATS)}",
+        )
+
+    exporter = DataExporter(db)
+    filename = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+
+    if format == "ndjson":
+        return StreamingResponse(
+            exporter.stream_ndjson(dataset, start, end),
+            media_type="application/x-ndjson",
+        )
+
+    if format == "csv":
+        return StreamingResponse(
+            exporter.stream_csv(dataset, start, end),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    # Parquet needs a seekable file; it is written chunk by chunk and removed once sent
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await run_in_threadpool(exporter.write_parquet, dataset, path, start, end)
+    except ParquetUnavailableError as e:
+        os.remove(path)
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    except Exception:
+        os.remove(path)
+        raise
+
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=filename,
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+@router.get("/events")
+async def list_analytics_events(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    event_type: Optional[str] = None,
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_role("admin")),
+):
+    """
+    Page through raw analytics events, oldest first
+
+    Pass the X-Next-Cursor response header as after_id to get the next page.
+    """
+    query = db.query(AnalyticsEvent)
+    if event_type:
+        query = query.filter(AnalyticsEvent.event_type == event_type)
+    if user_id:
+        query = query.filter(AnalyticsEvent.user_id == user_id)
+
+    events = keyset_page(query, AnalyticsEvent, response, after_id, limit=limit)
+
+    return [
+        {
+            "id": event.id,
+            "event_type": event.event_type,
+            "user_id": event.user_id,
+            "session_id": event.session_id,
+            "timestamp": event.timestamp.isoformat() if event.timestamp else None,
+            "metadata": event.event_metadata,
+        }
+        for event in events
+    ]
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database.connection import get_db
@@ -7,6 +8,8 @@ from database.models import (
     Channel, ChannelPost, AdminUser
 )
 from api.middleware.auth import require_role, get_current_active_user
+from api.pagination import keyset_page
+from utils.streaming import iter_table_chunks, ndjson_stream, csv_stream
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/content", tags=["content"])
@@ -141,13 +144,15 @@ class ChannelPostResponse(BaseModel):
 # Narrative Endpoints
 @router.get("/narrative/fragments", response_model=List[NarrativeFragmentResponse])
 async def get_narrative_fragments(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(require_role("admin"))
 ):
     """Get paginated list of narrative fragments"""
-    fragments = db.query(NarrativeFragment).offset(skip).limit(limit).all()
+    fragments = keyset_page(db.query(NarrativeFragment), NarrativeFragment, response, after_id, skip, limit)
     
     return [
         NarrativeFragmentResponse(
@@ -278,13 +283,15 @@ async def delete_narrative_fragment(
 # Gamification Endpoints
 @router.get("/missions", response_model=List[MissionResponse])
 async def get_missions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(require_role("admin"))
 ):
     """Get paginated list of missions"""
-    missions = db.query(Mission).offset(skip).limit(limit).all()
+    missions = keyset_page(db.query(Mission), Mission, response, after_id, skip, limit)
     
     return [
         MissionResponse(
@@ -304,13 +311,15 @@ async def get_missions(
 
 @router.get("/achievements", response_model=List[AchievementResponse])
 async def get_achievements(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(require_role("admin"))
 ):
     """Get paginated list of achievements"""
-    achievements = db.query(Achievement).offset(skip).limit(limit).all()
+    achievements = keyset_page(db.query(Achievement), Achievement, response, after_id, skip, limit)
     
     return [
         AchievementResponse(
@@ -330,13 +339,15 @@ async def get_achievements(
 
 @router.get("/items", response_model=List[ItemResponse])
 async def get_items(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(require_role("admin"))
 ):
     """Get paginated list of items"""
-    items = db.query(Item).offset(skip).limit(limit).all()
+    items = keyset_page(db.query(Item), Item, response, after_id, skip, limit)
     
     return [
         ItemResponse(
@@ -358,13 +369,15 @@ async def get_items(
 # Channel Endpoints
 @router.get("/channels", response_model=List[ChannelResponse])
 async def get_channels(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(require_role("admin"))
 ):
     """Get paginated list of channels"""
-    channels = db.query(Channel).offset(skip).limit(limit).all()
+    channels = keyset_page(db.query(Channel), Channel, response, after_id, skip, limit)
     
     return [
         ChannelResponse(
@@ -383,15 +396,18 @@ async def get_channels(
 @router.get("/channels/{channel_id}/posts", response_model=List[ChannelPostResponse])
 async def get_channel_posts(
     channel_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(require_role("admin"))
 ):
     """Get paginated list of posts for a channel"""
-    posts = db.query(ChannelPost).filter(
-        ChannelPost.channel_id == channel_id
-    ).offset(skip).limit(limit).all()
+    posts = keyset_page(
+        db.query(ChannelPost).filter(ChannelPost.channel_id == channel_id),
+        ChannelPost, response, after_id, skip, limit
+    )
     
     return [
         ChannelPostResponse(
@@ -405,4 +421,47 @@ async def get_channel_posts(
             updated_at=post.updated_at.isoformat() if post.updated_at else None
         )
         for post in posts
-    ]
\ No newline at end of file
+    ]
+
+# Export Endpoints
+CONTENT_EXPORTS = {
+    "fragments": NarrativeFragment,
+    "missions": Mission,
+    "achievements": Achievement,
+    "items": Item,
+    "channels": Channel,
+    "posts": ChannelPost
+}
+
+
+@router.get("/export/{collection}")
+async def export_content(
+    collection: str,
+    format: str = "ndjson",
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(require_role("admin"))
+):
+    """Stream a whole content table as NDJSON or CSV without loading it into memory"""
+    model = CONTENT_EXPORTS.get(collection)
+    if model is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"collection must be one of: {', '.join(CONTENT_EXPORTS)}"
+        )
+    
+    chunks = iter_table_chunks(db, model)
+    
+    if format == "ndjson":
+        return StreamingResponse(ndjson_stream(chunks), media_type="application/x-ndjson")
+    if format == "csv":
+        fieldnames = [column.name for column in model.__table__.columns]
+        return StreamingResponse(
+            csv_stream(chunks, fieldnames),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{collection}.csv"'}
+        )
+    
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="format must be one of: ndjson, csv"
+    )
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from database.models import AdminUser
+from api.middleware.auth import get_current_active_user
+from modules.gamification.leaderboards import leaderboard_service, BOARDS, WINDOWS
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/leaderboards", tags=["leaderboards"])
+
+
+class LeaderboardEntryResponse(BaseModel):
+    rank: int
+    user_id: int
+    score: int
+
+
+class UserRankResponse(BaseModel):
+    user_id: int
+    rank: Optional[int]
+    score: int
+    total_users: int
+    around: List[LeaderboardEntryResponse]
+
+
+def _validate(board: str, window: str):
+    if board not in BOARDS:
+        raise HTTPException(status_code=404, detail=f"Unknown leaderboard: {board}")
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Window must be one of: {', '.join(WINDOWS)}")
+
+
+@router.get("/")
+async def list_leaderboards(current_user: AdminUser = Depends(get_current_active_user)):
+    """List available leaderboards and windows"""
+    return {"boards": BOARDS, "windows": list(WINDOWS)}
+
+
+@router.get("/{board}", response_model=List[LeaderboardEntryResponse])
+async def get_leaderboard(
+    board: str,
+    window: str = "global",
+    limit: int = Query(10, ge=1, le=100),
+    current_user: AdminUser = Depends(get_current_active_user)
+):
+    """Get the top N users of a leaderboard"""
+    _validate(board, window)
+    return leaderboard_service.get_top(board, window, limit)
+
+
+@router.get("/{board}/users/{user_id}", response_model=UserRankResponse)
+async def get_user_rank(
+    board: str,
+    user_id: int,
+    window: str = "global",
+    radius: int = Query(5, ge=0, le=50),
+    current_user: AdminUser = Depends(get_current_active_user)
+):
+    """Get a user's rank on a leaderboard and the users around them"""
+    _validate(board, window)
+    
+    rank = leaderboard_service.get_rank(board, user_id, window)
+    if rank is None:
+        return UserRankResponse(user_id=user_id, rank=None, score=0, total_users=0, around=[])
+    
+    return UserRankResponse(
+        user_id=user_id,
+        rank=rank["rank"],
+        score=rank["score"],
+        total_users=rank["total_users"],
+        around=leaderboard_service.get_around_me(board, user_id, window, radius)
+    )
@@ -7,6 +7,7 @@ from database.connection import get_db
 from database.models import User
 from modules.gamification.daily_rewards import daily_reward_service
 from modules.gamification.besitos import besitos_service
+from utils.rate_limiter import async_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,18 @@ async def daily_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     user = update.effective_user
     
+    # Eligibility is enforced by the claim itself; this only throttles spam
+    try:
+        allowed = await async_rate_limiter.check_limits(user.id, ["daily_command"])
+    except Exception as e:
+        # Fail open: a limiter outage must not block claiming
+        logger.warning(f"Daily rate limit check failed for user {user.id}: {e}")
+        allowed = True
+    
+    if not allowed:
+        await update.message.reply_text("⏳ Demasiados intentos. Espera un minuto y vuelve a probar.")
+        return
+    
     # Get database session
     db: Session = next(get_db())
     
@@ -39,7 +52,7 @@ async def daily_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"Daily reward claim result: {reward_result}")
         
         if reward_result is not None:
-            # Success message with streak info
+            # Success message with streak info (the grant is applied by the ledger job)
             current_balance = besitos_service.get_balance(user_id)
             logger.info(f"Current balance after reward: {current_balance}")
             
@@ -60,7 +73,7 @@ async def daily_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"🔥 *Racha actual:* {reward_result['new_streak']} días consecutivos"
                 f"{streak_message}"
                 f"{next_bonus_message}\n\n"
-                f"💰 *Nuevo balance:* **{current_balance}** 💋\n\n"
+                f"💰 *Balance:* **{current_balance}** 💋 _(los besitos se acreditan en unos segundos)_\n\n"
                 f"⏰ *Próxima recompensa:* Mañana a esta misma hora\n\n"
                 f"💡 *Consejo:* Vuelve cada día para mantener tu racha y ganar más!"
             )
@@ -0,0 +1,107 @@
+"""
+Leaderboard command for DianaBot
+Shows rankings and the user's position on them
+"""
+
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from database.models import User
+from modules.gamification.leaderboards import leaderboard_service, BOARDS, TRIVIA_MIN_ANSWERS
+
+logger = logging.getLogger(__name__)
+
+WINDOW_ALIASES = {
+    "global": "global",
+    "semana": "weekly",
+    "weekly": "weekly",
+    "hoy": "daily",
+    "daily": "daily"
+}
+
+WINDOW_TITLES = {
+    "global": "Histórico",
+    "weekly": "Esta semana",
+    "daily": "Hoy"
+}
+
+
+async def ranking_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handle /ranking [tabla] [global|semana|hoy] command
+    Shows the top 10 of a leaderboard and the users around the caller
+    """
+    db: Session = next(get_db())
+    
+    try:
+        args = context.args or []
+        board = args[0].lower() if args else "besitos"
+        window = WINDOW_ALIASES.get(args[1].lower(), None) if len(args) > 1 else "global"
+        
+        if board not in BOARDS or window is None:
+            await update.message.reply_text(
+                "Uso: /ranking [tabla] [global|semana|hoy]\n"
+                f"Tablas disponibles: {', '.join(BOARDS.keys())}"
+            )
+            return
+        
+        user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+        
+        if not user:
+            await update.message.reply_text(
+                "❌ No estás registrado. Usa /start para registrarte."
+            )
+            return
+        
+        top = leaderboard_service.get_top(board, window, limit=10)
+        my_rank = leaderboard_service.get_rank(board, user.id, window)
+        around_me = []
+        if my_rank and my_rank["rank"] > 10:
+            around_me = [
+                entry for entry in leaderboard_service.get_around_me(board, user.id, window, radius=2)
+                if entry["rank"] > 10
+            ]
+        
+        # Resolve names for every listed user in one query
+        user_ids = {entry["user_id"] for entry in top + around_me}
+        names = {
+            ranked.id: ranked.username or ranked.first_name or f"Usuario {ranked.id}"
+            for ranked in db.query(User).filter(User.id.in_(user_ids)).all()
+        } if user_ids else {}
+        
+        unit = "%" if board == "trivia" else ""
+        
+        def format_entry(entry):
+            marker = "👉 " if entry["user_id"] == user.id else ""
+            name = names.get(entry["user_id"], f"Usuario {entry['user_id']}").replace("_", "\\_")
+            return f"{marker}{entry['rank']}. {name} — {entry['score']}{unit}\n"
+        
+        message = f"🏆 *Ranking: {BOARDS[board]}* ({WINDOW_TITLES[window]})\n\n"
+        
+        if not top:
+            message += "Todavía no hay nadie en este ranking. ¡Sé el primero!"
+        else:
+            message += "".join(format_entry(entry) for entry in top)
+            
+            if around_me:
+                message += "\n...\n" + "".join(format_entry(entry) for entry in around_me)
+            
+            if my_rank:
+                message += f"\n📍 Tu posición: *{my_rank['rank']}* de {my_rank['total_users']}"
+            elif board == "trivia":
+                message += f"\n📍 Aparecerás al responder {TRIVIA_MIN_ANSWERS[window]} trivias en este periodo"
+            else:
+                message += "\n📍 Aún no apareces en este ranking"
+        
+        await update.message.reply_text(message, parse_mode="Markdown")
+    
+    except Exception as e:
+        logger.error(f"Error in ranking command: {e}")
+        await update.message.reply_text(
+            "❌ Error al obtener el ranking. Por favor, intenta de nuevo más tarde."
+        )
+    finally:
+        db.close()
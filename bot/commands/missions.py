@@ -22,6 +22,9 @@ async def missions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     try:
+        # Materialize today's daily missions on first touch
+        mission_service.ensure_daily_missions(user_id)
+        
         # Get active missions
         active_missions = mission_service.get_active_missions(user_id)
         
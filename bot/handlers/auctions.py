@@ -1,18 +1,21 @@
 """
 Auction handlers for Telegram bot
 """
+import json
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 from sqlalchemy.orm import Session
 
-from database.connection import get_db
-from modules.gamification.auctions import get_auction_service
+from database.connection import get_db, get_redis
+from modules.gamification.auctions import get_auction_service, NOTIFY_PENDING_KEY
 from modules.gamification.besitos import besitos_service
 from database.models import Auction, Bid, User
 
 logger = logging.getLogger(__name__)
 
+OUTBID_BATCH_SIZE = 100
+
 
 async def auctions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show active auctions"""
@@ -284,10 +287,65 @@ async def bid_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         )
 
 
+async def drain_outbid_notifications(context: ContextTypes.DEFAULT_TYPE):
+    """Send pending outbid notifications, coalesced into one message per user"""
+    try:
+        redis_client = get_redis()
+        user_ids = redis_client.spop(NOTIFY_PENDING_KEY, OUTBID_BATCH_SIZE)
+        
+        if not user_ids:
+            return
+        
+        # Read every user's queue in one round trip; entries are only removed once sent
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            pipe.lrange(f"auction_notification:{user_id}", 0, -1)
+        results = pipe.execute()
+        
+        for user_id, notifications in zip(user_ids, results):
+            if not notifications:
+                continue
+            
+            # Newest first: keep the latest outbid amount per auction
+            outbids = {}
+            for raw in notifications:
+                notification = json.loads(raw)
+                outbids.setdefault(notification["auction_id"], notification["amount"])
+            
+            message = "💔 *¡Te han superado!*\n\n"
+            for auction_id, amount in outbids.items():
+                message += f"🏷️ Subasta #{auction_id}: nueva puja de *{amount}* besitos\n"
+            message += "\nUsa /pujar <id\\_subasta> <cantidad> para volver a pujar"
+            
+            notification_key = f"auction_notification:{user_id}"
+            try:
+                await context.bot.send_message(chat_id=int(user_id), text=message, parse_mode="Markdown")
+            except Exception as e:
+                logger.error(f"Error sending outbid notification to user {user_id}: {e}")
+                # Retry on the next drain; the notification TTL bounds the retries
+                redis_client.sadd(NOTIFY_PENDING_KEY, user_id)
+                continue
+            
+            # Drop only what was sent; newer notifications were pushed at the head
+            redis_client.ltrim(notification_key, 0, -len(notifications) - 1)
+        
+    except Exception as e:
+        logger.error(f"Error draining outbid notifications: {e}")
+
+
 def setup_auction_handlers(application):
     """Setup auction handlers"""
     application.add_handler(CommandHandler("subastas", auctions_command))
     application.add_handler(CommandHandler("pujar", bid_command))
     application.add_handler(CommandHandler("estadosubasta", auction_status_command))
     application.add_handler(CommandHandler("mispujas", my_bids_command))
-    application.add_handler(CallbackQueryHandler(bid_callback_handler, pattern="^(bid_|auctions_list)"))
\ No newline at end of file
+    application.add_handler(CallbackQueryHandler(bid_callback_handler, pattern="^(bid_|auctions_list)"))
+    
+    # Drain outbid notifications in batches
+    if application.job_queue:
+        application.job_queue.run_repeating(
+            drain_outbid_notifications,
+            interval=5,
+            first=5,
+            name="auction_outbid_notifications"
+        )
\ No newline at end of file
@@ -9,13 +9,17 @@ from telegram.ext import ContextTypes
 from typing import Dict, Any
 
 from modules.gamification.reactions import reaction_processor
+from modules.admin.reactions import reactions_service, REACTION_NOTIFY_PENDING_KEY
 from modules.gamification.missions import mission_service
 from core.coordinator import coordinador_central
 from database.models import ChannelPost
-from database.connection import get_db
+from database.connection import get_db, get_redis
+from utils.rate_limiter import async_rate_limiter
 
 logger = logging.getLogger(__name__)
 
+REACTION_NOTIFY_BATCH_SIZE = 100
+
 
 async def handle_reaction_added(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -33,24 +37,32 @@ async def handle_reaction_added(update: Update, context: ContextTypes.DEFAULT_TY
         post_id = reaction_data["post_id"]
         emoji = reaction_data["emoji"]
         
-        # Process the reaction using the new reaction processor
-        result = reaction_processor.process_reaction(
-            user_id=user_id,
-            content_type="channel_post",
-            content_id=post_id,
-            reaction_type=emoji
-        )
+        try:
+            allowed = await async_rate_limiter.check_limits(user_id, ["channel_reaction"])
+        except Exception as e:
+            # Fail open: a limiter outage must not drop reactions
+            logger.warning(f"Reaction rate limit check failed for user {user_id}: {e}")
+            allowed = True
+        
+        if not allowed:
+            logger.info(f"Reaction rate limit reached for user {user_id}")
+            return
+        
+        channel_post_id = reactions_service.get_post_id(reaction_data["channel_id"], post_id)
+        if channel_post_id is None:
+            logger.debug(f"Reaction to untracked message {post_id} ignored")
+            return
+        
+        # Queue the reaction; it is stored, rewarded and notified in batches
+        result = reactions_service.handle_reaction(user_id, channel_post_id, emoji)
         
-        if result.get("success"):
+        if result.get("queued"):
             # Update mission progress for reaction-based missions
             _update_reaction_missions(user_id, post_id, emoji)
             
-            # Send reward notification if possible
-            await _send_reward_notification(update, context, result)
-            
-            logger.info(f"Reaction processed successfully: user {user_id}, post {post_id}, emoji {emoji}")
+            logger.info(f"Reaction queued: user {user_id}, post {post_id}, emoji {emoji}")
         else:
-            logger.info(f"Reaction processed without rewards: {result.get('reason', 'No rewards')}")
+            logger.info(f"Reaction processed without rewards: {result.get('reason') or result.get('error')}")
             
     except Exception as e:
         logger.error(f"Error handling reaction: {e}")
@@ -70,6 +82,7 @@ def _extract_reaction_data(update: Update) -> Dict[str, Any]:
         # For testing/demo purposes, return mock data
         return {
             "user_id": update.effective_user.id if update.effective_user else 12345,
+            "channel_id": update.effective_chat.id if update.effective_chat else None,
             "post_id": update.message.message_id if update.message else 67890,
             "emoji": "❤️"  # Default emoji for testing
         }
@@ -114,28 +127,40 @@ def _update_reaction_missions(user_id: int, post_id: int, emoji: str) -> None:
         logger.error(f"Error updating reaction missions: {e}")
 
 
-async def _send_reward_notification(update: Update, context: ContextTypes.DEFAULT_TYPE, result: Dict[str, Any]) -> None:
-    """Send notification about rewards granted"""
+async def drain_reaction_notifications(context: ContextTypes.DEFAULT_TYPE):
+    """Send pending reaction reward notifications, coalesced into one message per user"""
     try:
-        besitos_earned = result.get("besitos_earned", 0)
+        redis_client = get_redis()
+        user_ids = redis_client.spop(REACTION_NOTIFY_PENDING_KEY, REACTION_NOTIFY_BATCH_SIZE)
         
-        if besitos_earned <= 0:
+        if not user_ids:
             return
         
-        message = f"🎉 ¡Reacción registrada! 🎉\n\n💋 +{besitos_earned} besitos"
-        
-        # Try to send DM to user
-        if update.effective_user:
+        # Read and clear every user's totals in one round trip
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            notification_key = f"reaction_notification:{user_id}"
+            pipe.hgetall(notification_key)
+            pipe.delete(notification_key)
+        results = pipe.execute()
+        
+        for user_id, totals in zip(user_ids, results[::2]):
+            besitos_earned = int(totals.get("besitos", 0))
+            if besitos_earned <= 0:
+                continue
+            
+            reaction_count = int(totals.get("reactions", 0))
+            message = f"🎉 ¡Reacción registrada! 🎉\n\n💋 +{besitos_earned} besitos"
+            if reaction_count > 1:
+                message = f"🎉 ¡{reaction_count} reacciones registradas! 🎉\n\n💋 +{besitos_earned} besitos"
+            
             try:
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=message
-                )
+                await context.bot.send_message(chat_id=int(user_id), text=message)
             except Exception as e:
-                logger.warning(f"Could not send DM reward notification: {e}")
-                
+                logger.warning(f"Could not send DM reward notification to user {user_id}: {e}")
+        
     except Exception as e:
-        logger.error(f"Error sending reward notification: {e}")
+        logger.error(f"Error draining reaction notifications: {e}")
 
 
 async def get_reaction_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -9,6 +9,8 @@ from telegram.ext import ContextTypes, CallbackQueryHandler
 from telegram.error import BadRequest
 
 from modules.gamification.trivias import trivia_service
+from modules.admin.subscriptions import subscription_service
+from utils.rate_limiter import async_rate_limiter
 from bot.keyboards.trivia_keyboards import (
     get_trivia_options_keyboard,
     get_trivia_categories_keyboard,
@@ -47,7 +49,7 @@ async def trivia_new(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Get random trivia
-    trivia = trivia_service.get_random_trivia()
+    trivia = trivia_service.get_random_trivia(user_id=user_id)
     
     if not trivia:
         await query.edit_message_text(
@@ -94,6 +96,24 @@ async def trivia_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     trivia_id = data[1]
     answer = data[2]
     
+    # Only answers to a question still being served count against the daily
+    # allowance; late or replayed ones earn nothing in submit_answer
+    if trivia_service.is_served(user_id, trivia_id):
+        limit_name = "trivia_vip" if subscription_service.is_vip(user_id) else "trivia_free"
+        try:
+            allowed = await async_rate_limiter.check_limits(user_id, [limit_name])
+        except Exception as e:
+            # Fail open: a limiter outage must not block answering
+            logger.warning(f"Trivia rate limit check failed for user {user_id}: {e}")
+            allowed = True
+        
+        if not allowed:
+            await query.edit_message_text(
+                "⏳ Has alcanzado el límite de trivias por hoy. ¡Vuelve mañana!",
+                reply_markup=get_trivia_main_menu_keyboard()
+            )
+            return
+    
     # Calculate response time
     start_time = context.user_data.get(f"trivia_start_{trivia_id}")
     if not start_time:
@@ -134,6 +154,9 @@ async def trivia_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"💰 Recompensa: *{result['rewards'].get('besitos', 0)} besitos*"
         )
     
+    if result.get("late"):
+        result_text += "\n\n⌛ _Respuesta fuera de tiempo: no suma recompensas._"
+    
     await query.edit_message_text(
         result_text,
         reply_markup=get_trivia_result_keyboard(result["correct"], trivia_id),
@@ -169,7 +192,7 @@ async def trivia_category_selected(update: Update, context: ContextTypes.DEFAULT
     user_id = update.effective_user.id
     
     # Get trivia from selected category
-    trivia = trivia_service.get_random_trivia(category=category)
+    trivia = trivia_service.get_random_trivia(category=category, user_id=user_id)
     
     if not trivia:
         await query.edit_message_text(
@@ -229,7 +252,7 @@ async def trivia_difficulty_selected(update: Update, context: ContextTypes.DEFAU
     user_id = update.effective_user.id
     
     # Get trivia with selected difficulty
-    trivia = trivia_service.get_random_trivia(difficulty=difficulty)
+    trivia = trivia_service.get_random_trivia(difficulty=difficulty, user_id=user_id)
     
     if not trivia:
         await query.edit_message_text(
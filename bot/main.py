@@ -12,6 +12,13 @@ from config.settings import settings
 from database.connection import get_db
 from database.models import User
 from modules.gamification.missions import mission_service
+from modules.gamification.auctions import get_auction_service
+from modules.gamification.besitos import besitos_service
+from modules.gamification.daily_rewards import daily_reward_service
+from modules.admin.reactions import reactions_service
+from modules.gamification.reactions import reaction_processor
+from modules.gamification.leaderboards import leaderboard_service
+from tasks.scheduled import AuctionScheduler, ScheduledTasks
 
 # Import handlers
 from bot.handlers.start import start_handler
@@ -38,6 +45,9 @@ from bot.commands.missions import missions_command
 # Import achievements command
 from bot.commands.achievements import achievements_command
 
+# Import leaderboard command
+from bot.commands.leaderboard import ranking_command
+
 # Import trivia commands
 from bot.commands.trivia import register_trivia_commands
 
@@ -59,6 +69,9 @@ from bot.handlers.channels import handle_new_channel_member, handle_channel_post
 # Import narrative handlers
 from bot.handlers.narrative import register_narrative_handlers
 
+# Import reaction handlers
+from bot.handlers.reactions import drain_reaction_notifications
+
 # Import auction handlers
 from bot.handlers.auctions import setup_auction_handlers
 
@@ -98,6 +111,61 @@ async def assign_daily_missions_to_all_users(context):
         logger.error(f"Error assigning daily missions: {e}")
 
 
+async def flush_auction_bids(context):
+    """Persist bids accepted in Redis to the bids table in batches"""
+    try:
+        auction_service = get_auction_service()
+        persisted = auction_service.flush_pending_bids()
+        
+        if persisted:
+            logger.debug(f"Persisted {persisted} auction bids")
+        
+    except Exception as e:
+        logger.error(f"Error persisting auction bids: {e}")
+
+
+async def process_besitos_ledger(context):
+    """Apply besitos grants queued in the ledger"""
+    try:
+        # Only grants whose worker's lease ran out are requeued
+        besitos_service.recover_processing_grants()
+        applied = besitos_service.process_grant_queue()
+        
+        if applied:
+            logger.debug(f"Applied {applied} queued besitos grants")
+        
+    except Exception as e:
+        logger.error(f"Error applying queued besitos grants: {e}")
+
+
+async def flush_reactions(context):
+    """Persist queued channel reactions and grant their rewards in batches"""
+    try:
+        persisted = reactions_service.flush_reactions()
+        
+        if persisted:
+            logger.debug(f"Persisted {persisted} channel reactions")
+        
+    except Exception as e:
+        logger.error(f"Error persisting channel reactions: {e}")
+
+
+async def rollup_daily_metrics(context):
+    """Aggregate closed analytics days into DailyMetrics"""
+    try:
+        ScheduledTasks().rollup_daily_metrics()
+    except Exception as e:
+        logger.error(f"Error rolling up daily metrics: {e}")
+
+
+async def sessionize_analytics_events(context):
+    """Split new analytics events into user sessions"""
+    try:
+        ScheduledTasks().sessionize_events()
+    except Exception as e:
+        logger.error(f"Error sessionizing analytics events: {e}")
+
+
 def main():
     """Main function to run the bot"""
     # Setup event handlers
@@ -107,18 +175,92 @@ def main():
     event_thread = threading.Thread(target=event_bus.listen, daemon=True)
     event_thread.start()
     
+    # Start auction scheduler in background thread; it is woken whenever a
+    # deadline is created or moved by an anti-sniping extension
+    auction_scheduler = AuctionScheduler()
+    auction_scheduler.sync_deadlines()
+    event_bus.subscribe("gamification.auction_started", auction_scheduler.wake)
+    event_bus.subscribe("gamification.bid_placed", auction_scheduler.wake)
+    scheduler_thread = threading.Thread(target=auction_scheduler.run_forever, daemon=True)
+    scheduler_thread.start()
+    
     # Create the Application
     application = Application.builder().token(settings.telegram_bot_token).build()
     
-    # Setup daily mission assignment job (runs every day at 00:00)
+    # Setup daily mission assignment job (runs every day at 00:00).
+    # In lazy mode daily missions are materialized on first touch instead.
     job_queue = application.job_queue
-    if job_queue:
+    if job_queue and not mission_service.lazy_daily:
         job_queue.run_daily(
             assign_daily_missions_to_all_users,
             time=dt_time(hour=0, minute=0),
             name="daily_missions_assignment"
         )
         logger.info("Daily mission assignment job scheduled")
+    elif mission_service.lazy_daily:
+        logger.info("Lazy daily missions enabled, skipping midnight assignment job")
+
+    # Setup auction bid persistence job (bids are accepted in Redis)
+    if job_queue:
+        get_auction_service().recover_processing_bids()
+        job_queue.run_repeating(
+            flush_auction_bids,
+            interval=2,
+            first=2,
+            name="auction_bid_flush"
+        )
+        logger.info("Auction bid flush job scheduled")
+
+    # Move daily claims stored by earlier versions into the state hashes
+    daily_reward_service.migrate_legacy_state()
+
+    # Setup besitos ledger job (daily rewards queue their grants)
+    if job_queue:
+        job_queue.run_repeating(
+            process_besitos_ledger,
+            interval=5,
+            first=1,
+            name="besitos_ledger"
+        )
+        logger.info("Besitos ledger job scheduled")
+
+    # Setup nightly analytics rollup (shortly after midnight, once the day is closed)
+    if job_queue:
+        job_queue.run_daily(
+            rollup_daily_metrics,
+            time=dt_time(hour=0, minute=10),
+            name="daily_metrics_rollup"
+        )
+        logger.info("Daily metrics rollup job scheduled")
+
+    # Setup analytics sessionizer (resumes from its Redis checkpoint)
+    if job_queue:
+        job_queue.run_repeating(
+            sessionize_analytics_events,
+            interval=60,
+            first=30,
+            name="analytics_sessionizer"
+        )
+        logger.info("Analytics sessionizer job scheduled")
+
+    # Setup reaction ingestion jobs (reactions are queued in Redis)
+    if job_queue:
+        reactions_service.ensure_reaction_counters()
+        reaction_processor.ensure_reaction_counters()
+        leaderboard_service.ensure_global_boards()
+        job_queue.run_repeating(
+            flush_reactions,
+            interval=2,
+            first=2,
+            name="reaction_flush"
+        )
+        job_queue.run_repeating(
+            drain_reaction_notifications,
+            interval=5,
+            first=5,
+            name="reaction_notifications"
+        )
+        logger.info("Reaction ingestion jobs scheduled")
 
     # Add handlers
     application.add_handler(CommandHandler("start", start_handler))
@@ -146,6 +288,9 @@ def main():
     # Add achievements command
     application.add_handler(CommandHandler("achievements", achievements_command))
 
+    # Add leaderboard command
+    application.add_handler(CommandHandler("ranking", ranking_command))
+
     # Add trivia commands
     register_trivia_commands(application)
 
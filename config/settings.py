@@ -36,9 +36,16 @@ class Settings(BaseSettings):
     debug: bool = False
     log_level: str = "INFO"
     
+    # Gamification
+    lazy_daily_missions: bool = True
+    
     # Admin Users
     admin_user_ids: str = ""
     
+    # Analytics
+    analytics_spool_dir: str = "data/analytics_spool"
+    analytics_max_pending_events: int = 10000
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -10,14 +10,28 @@ import random
 from typing import Dict, Any, List, Optional, Set
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
+from sqlalchemy import func, and_, desc, exists
 
 from database.connection import get_db
 from database.models import User, UserBalance, EventLog, Subscription
 from core.feature_flags import FeatureFlags
+from utils.cache_manager import cache_manager
 
 logger = logging.getLogger(__name__)
 
+# Candidate scores are cached briefly so repeated selections reuse them
+SCORE_CACHE_TTL = 300
+
+# User IDs scored per grouped query
+SCORE_CHUNK_SIZE = 5000
+
+# The 'active' strategy ranks this many times the requested testers
+ACTIVE_POOL_FACTOR = 5
+
+
+def _score_cache_key(user_id: int) -> str:
+    return f"beta_tester:score:{user_id}"
+
 
 class BetaTesterManager:
     """Manages beta tester selection and management"""
@@ -92,8 +106,11 @@ class BetaTesterManager:
                 User.last_active >= thirty_days_ago
             ).order_by(desc(User.last_active)).limit(count).all()
             
+            scores = self._score_users([candidate.id for candidate in candidates])
+            
             result = []
             for candidate in candidates:
+                user_scores = scores.get(candidate.id, {})
                 user_data = {
                     'user_id': candidate.id,
                     'username': candidate.username,
@@ -101,8 +118,8 @@ class BetaTesterManager:
                     'last_active': candidate.last_active.isoformat() if candidate.last_active else None,
                     'besitos_balance': candidate.besitos or 0,
                     'is_vip': candidate.status == 'active',
-                    'activity_score': self._calculate_activity_score(candidate.id),
-                    'engagement_score': self._calculate_engagement_score(candidate.id)
+                    'activity_score': user_scores.get('activity_score', 0),
+                    'engagement_score': user_scores.get('engagement_score', 0)
                 }
                 result.append(user_data)
             
@@ -133,8 +150,10 @@ class BetaTesterManager:
             active_count = 0
             total_activity_score = 0
             
+            users_info = self._get_users_info(list(beta_testers))
+            
             for user_id in beta_testers:
-                user_info = self._get_user_info(user_id)
+                user_info = users_info.get(user_id)
                 if user_info:
                     testers_info.append(user_info)
                     
@@ -204,8 +223,16 @@ class BetaTesterManager:
         return testers
     
     def _select_active_testers(self, count: int) -> List[int]:
-        """Select the most active users"""
-        return self._get_active_candidates(count)
+        """Select the most engaged of the recently active users"""
+        pool = self._get_active_candidates(count * ACTIVE_POOL_FACTOR)
+        scores = self._score_users(pool)
+        
+        ranked = sorted(
+            pool,
+            key=lambda user_id: scores.get(user_id, {}).get('engagement_score', 0),
+            reverse=True
+        )
+        return ranked[:count]
     
     def _select_new_testers(self, count: int) -> List[int]:
         """Select recently joined users"""
@@ -281,96 +308,133 @@ class BetaTesterManager:
     
     def _calculate_activity_score(self, user_id: int) -> float:
         """Calculate activity score for a user (0-100)"""
-        try:
-            seven_days_ago = datetime.now() - timedelta(days=7)
-            
-            # Count events in the last 7 days
-            event_count = self.db_session.query(func.count(EventLog.id)).filter(
-                and_(
-                    EventLog.user_id == user_id,
-                    EventLog.created_at >= seven_days_ago
-                )
-            ).scalar() or 0
-            
-            # Normalize to 0-100 scale (assuming 50+ events is max activity)
-            return min(event_count * 2, 100)
-            
-        except Exception as e:
-            logger.error(f"Error calculating activity score for user {user_id}: {e}")
-            return 0
+        return self._score_users([user_id]).get(user_id, {}).get('activity_score', 0)
     
     def _calculate_engagement_score(self, user_id: int) -> float:
         """Calculate engagement score for a user (0-100)"""
-        try:
-            # Simple engagement score based on multiple factors
-            activity_score = self._calculate_activity_score(user_id)
-            
-            # Check if user has besitos balance
-            balance = self.db_session.query(UserBalance.besitos).filter(
-                UserBalance.user_id == user_id
-            ).scalar() or 0
-            
-            # Check if user is VIP
-            is_vip = self.db_session.query(Subscription.id).filter(
-                and_(
-                    Subscription.user_id == user_id,
-                    Subscription.status == 'active'
-                )
-            ).first() is not None
+        return self._score_users([user_id]).get(user_id, {}).get('engagement_score', 0)
+    
+    def _score_users(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Score a set of users, reusing cached scores
+        
+        Args:
+            user_ids: Users to score
+            
+        Returns:
+            Dict of user ID -> activity_score, engagement_score,
+            besitos_balance and is_vip
+        """
+        scores = {}
+        missing = []
+        
+        for user_id in dict.fromkeys(user_ids):
+            cached = cache_manager.get(_score_cache_key(user_id))
+            if cached is not None:
+                scores[user_id] = cached
+            else:
+                missing.append(user_id)
+        
+        for i in range(0, len(missing), SCORE_CHUNK_SIZE):
+            scores.update(self._compute_scores(missing[i:i + SCORE_CHUNK_SIZE]))
+        
+        return scores
+    
+    def _compute_scores(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Compute the scores of up to SCORE_CHUNK_SIZE users with two grouped queries"""
+        seven_days_ago = datetime.now() - timedelta(days=7)
+        
+        # Count events in the last 7 days
+        event_counts = dict(self.db_session.query(
+            EventLog.user_id,
+            func.count(EventLog.id)
+        ).filter(
+            and_(
+                EventLog.user_id.in_(user_ids),
+                EventLog.created_at >= seven_days_ago
+            )
+        ).group_by(EventLog.user_id).all())
+        
+        # Besitos balance and VIP status
+        is_vip = exists().where(
+            and_(
+                Subscription.user_id == User.id,
+                Subscription.status == 'active'
+            )
+        )
+        profiles = {
+            user_id: (besitos or 0, bool(vip))
+            for user_id, besitos, vip in self.db_session.query(
+                User.id,
+                UserBalance.besitos,
+                is_vip
+            ).outerjoin(UserBalance, User.id == UserBalance.user_id).filter(
+                User.id.in_(user_ids)
+            ).all()
+        }
+        
+        scores = {}
+        for user_id in user_ids:
+            balance, vip = profiles.get(user_id, (0, False))
+            
+            # Normalize to 0-100 scale (assuming 50+ events is max activity)
+            activity_score = min(event_counts.get(user_id, 0) * 2, 100)
             
             # Calculate engagement score
             engagement_score = activity_score * 0.6  # 60% weight on activity
             engagement_score += (min(balance / 100, 1) * 20)  # 20% weight on balance
-            engagement_score += (20 if is_vip else 0)  # 20% weight on VIP status
+            engagement_score += (20 if vip else 0)  # 20% weight on VIP status
             
-            return min(engagement_score, 100)
-            
-        except Exception as e:
-            logger.error(f"Error calculating engagement score for user {user_id}: {e}")
-            return 0
+            scores[user_id] = {
+                'activity_score': activity_score,
+                'engagement_score': min(engagement_score, 100),
+                'besitos_balance': balance,
+                'is_vip': vip
+            }
+            cache_manager.set(_score_cache_key(user_id), scores[user_id], SCORE_CACHE_TTL)
+        
+        return scores
     
     def _get_user_info(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get detailed information about a user"""
+        return self._get_users_info([user_id]).get(user_id)
+    
+    def _get_users_info(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Get detailed information about a set of users"""
         try:
-            user = self.db_session.query(User).filter(User.id == user_id).first()
-            if not user:
-                return None
+            users = []
+            for i in range(0, len(user_ids), SCORE_CHUNK_SIZE):
+                users.extend(self.db_session.query(User).filter(
+                    User.id.in_(user_ids[i:i + SCORE_CHUNK_SIZE])
+                ).all())
             
-            balance = self.db_session.query(UserBalance.besitos).filter(
-                UserBalance.user_id == user_id
-            ).scalar() or 0
+            scores = self._score_users([user.id for user in users])
             
-            is_vip = self.db_session.query(Subscription.id).filter(
-                and_(
-                    Subscription.user_id == user_id,
-                    Subscription.status == 'active'
-                )
-            ).first() is not None
-            
-            # Check if user is new (joined in last 30 days)
+            # New users joined in the last 30 days; active users were seen in the last 7
             thirty_days_ago = datetime.now() - timedelta(days=30)
-            is_new_user = user.created_at >= thirty_days_ago if user.created_at else False
-            
-            # Check if user is active (active in last 7 days)
             seven_days_ago = datetime.now() - timedelta(days=7)
-            is_active = user.last_active >= seven_days_ago if user.last_active else False
             
-            return {
-                'user_id': user_id,
-                'username': user.username,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'last_active': user.last_active.isoformat() if user.last_active else None,
-                'besitos_balance': balance,
-                'is_vip': is_vip,
-                'is_new_user': is_new_user,
-                'is_active': is_active,
-                'activity_score': self._calculate_activity_score(user_id),
-                'engagement_score': self._calculate_engagement_score(user_id)
-            }
+            result = {}
+            for user in users:
+                user_scores = scores.get(user.id, {})
+                result[user.id] = {
+                    'user_id': user.id,
+                    'username': user.username,
+                    'created_at': user.created_at.isoformat() if user.created_at else None,
+                    'last_active': user.last_active.isoformat() if user.last_active else None,
+                    'besitos_balance': user_scores.get('besitos_balance', 0),
+                    'is_vip': user_scores.get('is_vip', False),
+                    'is_new_user': user.created_at >= thirty_days_ago if user.created_at else False,
+                    'is_active': user.last_active >= seven_days_ago if user.last_active else False,
+                    'activity_score': user_scores.get('activity_score', 0),
+                    'engagement_score': user_scores.get('engagement_score', 0)
+                }
+            
+            return result
             
         except Exception as e:
-            logger.error(f"Error getting user info for {user_id}: {e}")
-            return None
+            logger.error(f"Error getting user info for {len(user_ids)} users: {e}")
+            return {}
 
 
 # Global instance for easy access
@@ -150,6 +150,8 @@ class ConfigurationManager:
                     # Continue anyway, but log the warning
             
             self.db_session.commit()
+            if propagate:
+                self._invalidate_propagated_caches(instance)
             
             logger.info(f"Updated config instance {instance_id}")
             return True, instance, []
@@ -198,6 +200,7 @@ class ConfigurationManager:
                 return False, propagation_errors
             
             self.db_session.commit()
+            self._invalidate_propagated_caches(instance)
             logger.info(f"Activated config instance {instance_id}")
             return True, []
             
@@ -224,6 +227,7 @@ class ConfigurationManager:
                 return False, propagation_errors
             
             self.db_session.commit()
+            self._invalidate_propagated_caches(instance)
             logger.info(f"Archived config instance {instance_id}")
             return True, []
             
@@ -289,6 +293,7 @@ class ConfigurationManager:
                 return False, propagation_errors
             
             self.db_session.commit()
+            self._invalidate_propagated_caches(instance)
             logger.info(f"Rolled back config instance {instance_id} to version {version_number}")
             return True, []
             
@@ -297,6 +302,15 @@ class ConfigurationManager:
             logger.error(f"Error rolling back config instance {instance_id}: {e}")
             return False, [str(e)]
     
+    def _invalidate_propagated_caches(self, instance: ConfigInstance) -> None:
+        """Drop caches built from entities a committed propagation changed"""
+        try:
+            if instance.template.template_type == 'mission':
+                from modules.gamification.missions import mission_service
+                mission_service.invalidate_daily_set()
+        except Exception as e:
+            logger.error(f"Error invalidating caches for config instance {instance.id}: {e}")
+    
     def _create_version(
         self, 
         instance: ConfigInstance, 
@@ -0,0 +1,358 @@
+"""
+Economy Aggregates
+
+Incrementally maintained aggregates of the besitos economy, kept in Redis:
+hourly faucet/sink totals per source and a histogram of user balances.
+The ledger (BesitosService) updates them on every transaction, so the
+economy monitor never has to scan Transaction or load every UserBalance.
+Only hours from before the increments started are rebuilt from the ledger.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database.connection import get_redis
+
+logger = logging.getLogger(__name__)
+
+FLOW_TYPES = ('earn', 'spend')
+
+# Hourly flow buckets are kept long enough for weekly windows
+FLOW_TTL_SECONDS = 8 * 86400
+
+# Marks a flow bucket (or the histogram) as complete; buckets of hours that
+# began before LIVE_SINCE_KEY are rebuilt from the ledger on first read
+BUILT_FIELD = '_built'
+
+# Time of the first live increment; every ledger transaction since then has
+# been counted, so buckets of the hours that start after it are complete
+LIVE_SINCE_KEY = "economy:flows_live_since"
+
+# An hour is only marked complete once it has been over this long, so
+# increments for transactions committed at the end of the hour land first
+FLOW_SETTLE_SECONDS = 60
+
+BALANCE_HISTOGRAM_KEY = "economy:balance_histogram"
+
+# The histogram is rebuilt from UserBalance after this long, which also
+# picks up balance changes made outside the ledger
+HISTOGRAM_MAX_AGE_SECONDS = 6 * 3600
+
+# Sub-buckets per power of two: bucket edges are 2^(1/4) ~ 19% apart,
+# so percentiles read from the histogram are within ~9% of the true value
+BUCKETS_PER_OCTAVE = 4
+
+
+def _flow_key(flow_type: str, hour: datetime) -> str:
+    return f"economy:flow:{flow_type}:{hour.strftime('%Y%m%d%H')}"
+
+
+def _hour_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def balance_bucket(balance: int) -> int:
+    """Histogram bucket of a balance; bucket 0 holds empty balances"""
+    if balance <= 0:
+        return 0
+    return 1 + int(math.floor(BUCKETS_PER_OCTAVE * math.log2(balance)))
+
+
+def _bucket_values(buckets: np.ndarray) -> np.ndarray:
+    """Representative balance of each bucket (geometric midpoint of its edges)"""
+    exponents = (buckets - 1 + 0.5) / BUCKETS_PER_OCTAVE
+    return np.where(buckets > 0, np.power(2.0, exponents), 0.0)
+
+
+def gini_coefficient(values: np.ndarray, weights: Optional[np.ndarray] = None) -> float:
+    """
+    Gini coefficient of a distribution in one vectorized pass
+    
+    Args:
+        values: Balances (any order)
+        weights: Number of users holding each value (defaults to one each)
+    
+    Returns:
+        float: Gini coefficient (0 = perfect equality)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+    if not len(values):
+        return 0.0
+    
+    order = np.argsort(values, kind='stable')
+    values, weights = values[order], weights[order]
+    
+    n = weights.sum()
+    total = (values * weights).sum()
+    if n == 0 or total == 0:
+        return 0.0
+    
+    # Mean 1-based rank of each group of equal values
+    ranks = np.cumsum(weights) - weights + (weights + 1) / 2
+    return float(2 * (ranks * values * weights).sum() / (n * total) - (n + 1) / n)
+
+
+def weighted_percentiles(values: np.ndarray, weights: np.ndarray, quantiles: Sequence[float]) -> List[float]:
+    """Nearest-rank percentiles of a weighted distribution"""
+    order = np.argsort(values, kind='stable')
+    values, cumulative = values[order], np.cumsum(weights[order])
+    ranks = np.floor(np.asarray(quantiles) * cumulative[-1])
+    positions = np.searchsorted(cumulative, ranks, side='right')
+    return [float(v) for v in values[np.minimum(positions, len(values) - 1)]]
+
+
+class EconomyAggregates:
+    """
+    Running economy aggregates in Redis
+    
+    Flows: one hash per transaction type and hour, with '<source>:amount' and
+    '<source>:count' fields incremented by the ledger.
+    Balances: one hash of bucket -> users, moved on every balance change.
+    """
+    
+    def __init__(self):
+        self.redis_client = get_redis()
+    
+    def record_transaction(self, transaction_type: str, source: str, amount: int,
+                           old_balance: Optional[int], new_balance: int,
+                           timestamp: Optional[datetime] = None) -> bool:
+        """
+        Apply a committed ledger transaction to the aggregates
+        
+        Args:
+            transaction_type: 'earn' or 'spend'
+            source: Faucet or sink the besitos came from / went to
+            amount: Amount of besitos moved
+            old_balance: User balance before the transaction (None for a new balance)
+            new_balance: User balance after the transaction
+            timestamp: Time of the transaction (defaults to now)
+        
+        Returns:
+            bool: True if recorded
+        """
+        if transaction_type not in FLOW_TYPES:
+            return False
+        
+        key = _flow_key(transaction_type, _hour_start(timestamp or datetime.now()))
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hincrby(key, f"{source}:amount", amount)
+            pipe.hincrby(key, f"{source}:count", 1)
+            pipe.expire(key, FLOW_TTL_SECONDS)
+            pipe.set(LIVE_SINCE_KEY, datetime.now().timestamp(), nx=True)
+            
+            new_bucket = balance_bucket(new_balance)
+            if old_balance is None:
+                pipe.hincrby(BALANCE_HISTOGRAM_KEY, str(new_bucket), 1)
+            elif balance_bucket(old_balance) != new_bucket:
+                pipe.hincrby(BALANCE_HISTOGRAM_KEY, str(balance_bucket(old_balance)), -1)
+                pipe.hincrby(BALANCE_HISTOGRAM_KEY, str(new_bucket), 1)
+            pipe.execute()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error recording economy aggregates: {e}")
+            return False
+    
+    def get_flows(self, transaction_type: str, since: datetime, db: Session) -> Dict[str, Any]:
+        """
+        Get faucet ('earn') or sink ('spend') totals per source since a moment
+        
+        The window is rounded down to whole hours. Hours since the live
+        increments started are read from their buckets as they are. Older
+        hours without a complete bucket are rebuilt from Transaction with a
+        single grouped query; one still open is never stored as complete.
+        
+        Args:
+            transaction_type: 'earn' or 'spend'
+            since: Start of the window
+            db: Session used to rebuild missing hours
+        
+        Returns:
+            Dict with the total and a per-source breakdown of amount,
+            transaction_count and avg_amount_per_transaction
+        """
+        now = datetime.now()
+        hours = []
+        hour = _hour_start(since)
+        while hour <= now:
+            hours.append(hour)
+            hour += timedelta(hours=1)
+        
+        keys = [_flow_key(transaction_type, hour) for hour in hours]
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(LIVE_SINCE_KEY)
+        for key in keys:
+            pipe.hgetall(key)
+        live_since, *buckets = pipe.execute()
+        live_since = float(live_since) if live_since else None
+        
+        missing = [
+            hour for hour, bucket in zip(hours, buckets)
+            if BUILT_FIELD not in bucket and (live_since is None or hour.timestamp() < live_since)
+        ]
+        if missing:
+            rebuilt = self._rebuild_flows(transaction_type, missing, db)
+            for i, hour in enumerate(hours):
+                if hour in rebuilt:
+                    buckets[i] = rebuilt[hour]
+        
+        amounts: Dict[str, int] = {}
+        counts: Dict[str, int] = {}
+        for bucket in buckets:
+            for field, value in bucket.items():
+                source, _, measure = field.rpartition(':')
+                if measure == 'amount':
+                    amounts[source] = amounts.get(source, 0) + int(value)
+                elif measure == 'count':
+                    counts[source] = counts.get(source, 0) + int(value)
+        
+        breakdown = {
+            source: {
+                'amount': amount,
+                'transaction_count': counts.get(source, 0),
+                'avg_amount_per_transaction': amount / counts[source] if counts.get(source) else 0
+            }
+            for source, amount in amounts.items()
+        }
+        
+        return {
+            'total': sum(amounts.values()),
+            'breakdown': breakdown
+        }
+    
+    def get_balance_distribution(self, db: Session) -> Dict[str, Any]:
+        """
+        Get balance percentiles and the Gini coefficient from the histogram
+        
+        Args:
+            db: Session used for the exact count/avg/min/max and to rebuild
+                the histogram when it is missing or stale
+        
+        Returns:
+            Dict with total_users, avg/median/max/min/p90/p95 balance and
+            gini_coefficient, or an empty dict when there are no balances
+        """
+        from database.models import UserBalance
+        
+        total_users, avg_balance, max_balance, min_balance = db.query(
+            func.count(UserBalance.besitos),
+            func.avg(UserBalance.besitos),
+            func.max(UserBalance.besitos),
+            func.min(UserBalance.besitos)
+        ).one()
+        
+        if not total_users:
+            return {}
+        
+        histogram = self.redis_client.hgetall(BALANCE_HISTOGRAM_KEY)
+        built_at = float(histogram.pop(BUILT_FIELD, 0) or 0)
+        if datetime.now().timestamp() - built_at > HISTOGRAM_MAX_AGE_SECONDS:
+            histogram = self.rebuild_balance_histogram(db)
+        
+        counts = {int(bucket): int(users) for bucket, users in histogram.items() if int(users) > 0}
+        if not counts:
+            return {}
+        
+        buckets = np.fromiter(counts.keys(), dtype=np.int64)
+        weights = np.fromiter(counts.values(), dtype=np.float64)
+        # Bucket midpoints are clipped to the real extremes of the distribution
+        values = np.clip(_bucket_values(buckets), min_balance, max_balance)
+        
+        median_balance, p90_balance, p95_balance = weighted_percentiles(values, weights, (0.5, 0.9, 0.95))
+        
+        return {
+            'total_users': int(total_users),
+            'avg_balance': float(avg_balance or 0),
+            'median_balance': median_balance,
+            'max_balance': max_balance,
+            'min_balance': min_balance,
+            'p90_balance': p90_balance,
+            'p95_balance': p95_balance,
+            'gini_coefficient': gini_coefficient(values, weights)
+        }
+    
+    def rebuild_balance_histogram(self, db: Session) -> Dict[str, str]:
+        """
+        Rebuild the balance histogram from UserBalance
+        
+        Balances are grouped database-side, so one row per distinct balance is
+        read instead of one per user, and bucketed in a single NumPy pass.
+        
+        Returns:
+            The new histogram as stored in Redis (bucket -> users)
+        """
+        from database.models import UserBalance
+        
+        rows = db.query(UserBalance.besitos, func.count()).group_by(UserBalance.besitos).all()
+        
+        histogram: Dict[str, int] = {}
+        if rows:
+            balances = np.array([balance or 0 for balance, _ in rows], dtype=np.int64)
+            users = np.array([count for _, count in rows], dtype=np.int64)
+            positive = balances > 0
+            buckets = np.zeros(len(balances), dtype=np.int64)
+            buckets[positive] = 1 + np.floor(BUCKETS_PER_OCTAVE * np.log2(balances[positive])).astype(np.int64)
+            totals = np.bincount(buckets, weights=users)
+            histogram = {str(bucket): int(totals[bucket]) for bucket in np.flatnonzero(totals)}
+        
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(BALANCE_HISTOGRAM_KEY)
+        pipe.hset(BALANCE_HISTOGRAM_KEY, mapping={**histogram, BUILT_FIELD: datetime.now().timestamp()})
+        pipe.execute()
+        
+        logger.info(f"Rebuilt balance histogram: {len(histogram)} buckets")
+        return {bucket: str(users) for bucket, users in histogram.items()}
+    
+    def _rebuild_flows(self, transaction_type: str, hours: List[datetime], db: Session) -> Dict[datetime, Dict[str, str]]:
+        """Rebuild the given hourly flow buckets from Transaction in one query grouped by hour and source"""
+        from database.models import Transaction
+        
+        hour_column = func.date_trunc('hour', Transaction.created_at)
+        rows = db.query(
+            hour_column,
+            Transaction.source,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id)
+        ).filter(
+            Transaction.transaction_type == transaction_type,
+            Transaction.created_at >= min(hours),
+            Transaction.created_at < max(hours) + timedelta(hours=1)
+        ).group_by(hour_column, Transaction.source).all()
+        
+        rebuilt: Dict[datetime, Dict[str, str]] = {hour: {BUILT_FIELD: '1'} for hour in hours}
+        for hour, source, amount, count in rows:
+            # date_trunc works in the session time zone, like the naive hours
+            bucket = rebuilt.get(hour.replace(tzinfo=None))
+            if bucket is not None:
+                bucket[f"{source}:amount"] = str(int(amount or 0))
+                bucket[f"{source}:count"] = str(int(count))
+        
+        settled_before = datetime.now() - timedelta(seconds=FLOW_SETTLE_SECONDS)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for hour, bucket in rebuilt.items():
+            if hour + timedelta(hours=1) > settled_before:
+                # Open hour: replacing the bucket would drop increments made
+                # while it was being rebuilt
+                continue
+            
+            key = _flow_key(transaction_type, hour)
+            # Overwrite any live increments; they are already in the ledger
+            pipe.delete(key)
+            pipe.hset(key, mapping=bucket)
+            pipe.expire(key, FLOW_TTL_SECONDS)
+        
+        pipe.execute()
+        return rebuilt
+
+
+# Global aggregates instance
+economy_aggregates = EconomyAggregates()
@@ -10,10 +10,11 @@ import time
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, case
+from sqlalchemy import func, case
 
 from database.connection import get_db
 from database.models import Transaction, UserBalance, User
+from core.economy_aggregates import economy_aggregates
 
 logger = logging.getLogger(__name__)
 
@@ -115,74 +116,18 @@ class EconomyMonitor:
             }
     
     def _get_faucet_metrics(self, since: datetime) -> Dict[str, Any]:
-        """Get metrics for besitos faucets (sources)"""
+        """Get metrics for besitos faucets (sources) from the running hourly totals"""
         try:
-            # Query transactions where besitos are earned
-            faucet_query = self.db_session.query(
-                Transaction.source,
-                func.sum(Transaction.amount).label('total_amount'),
-                func.count(Transaction.id).label('transaction_count')
-            ).filter(
-                and_(
-                    Transaction.created_at >= since,
-                    Transaction.transaction_type == 'earn'
-                )
-            ).group_by(Transaction.source)
-            
-            faucet_results = faucet_query.all()
-            
-            breakdown = {}
-            total_faucets = 0
-            
-            for source, amount, count in faucet_results:
-                breakdown[source] = {
-                    'amount': amount,
-                    'transaction_count': count,
-                    'avg_amount_per_transaction': amount / count if count > 0 else 0
-                }
-                total_faucets += amount
-            
-            return {
-                'total': total_faucets,
-                'breakdown': breakdown
-            }
+            return economy_aggregates.get_flows('earn', since, self.db_session)
             
         except Exception as e:
             logger.error(f"Error getting faucet metrics: {e}")
             return {'total': 0, 'breakdown': {}}
     
     def _get_sink_metrics(self, since: datetime) -> Dict[str, Any]:
-        """Get metrics for besitos sinks (spending)"""
+        """Get metrics for besitos sinks (spending) from the running hourly totals"""
         try:
-            # Query transactions where besitos are spent
-            sink_query = self.db_session.query(
-                Transaction.source,
-                func.sum(Transaction.amount).label('total_amount'),
-                func.count(Transaction.id).label('transaction_count')
-            ).filter(
-                and_(
-                    Transaction.created_at >= since,
-                    Transaction.transaction_type == 'spend'
-                )
-            ).group_by(Transaction.source)
-            
-            sink_results = sink_query.all()
-            
-            breakdown = {}
-            total_sinks = 0
-            
-            for source, amount, count in sink_results:
-                breakdown[source] = {
-                    'amount': amount,
-                    'transaction_count': count,
-                    'avg_amount_per_transaction': amount / count if count > 0 else 0
-                }
-                total_sinks += amount
-            
-            return {
-                'total': total_sinks,
-                'breakdown': breakdown
-            }
+            return economy_aggregates.get_flows('spend', since, self.db_session)
             
         except Exception as e:
             logger.error(f"Error getting sink metrics: {e}")
@@ -220,41 +165,16 @@ class EconomyMonitor:
             return {'avg_transactions_per_user': 0, 'avg_besitos_per_transaction': 0}
     
     def _get_user_distribution_metrics(self) -> Dict[str, Any]:
-        """Get user distribution metrics for besitos"""
+        """Get user distribution metrics for besitos from the balance histogram"""
         try:
-            # Get user balances
-            balances = self.db_session.query(UserBalance.besitos).all()
-            balance_values = [b[0] for b in balances if b[0] is not None]
+            distribution = economy_aggregates.get_balance_distribution(self.db_session)
             
-            if not balance_values:
+            if not distribution:
                 return {}
             
-            # Calculate distribution metrics
-            total_users = len(balance_values)
-            avg_balance = sum(balance_values) / total_users
-            max_balance = max(balance_values)
-            min_balance = min(balance_values)
-            
-            # Calculate percentiles
-            sorted_balances = sorted(balance_values)
-            median_balance = sorted_balances[len(sorted_balances) // 2]
-            p90_balance = sorted_balances[int(len(sorted_balances) * 0.9)]
-            p95_balance = sorted_balances[int(len(sorted_balances) * 0.95)]
-            
-            # Gini coefficient (simplified)
-            gini = self._calculate_gini_coefficient(balance_values)
-            
-            return {
-                'total_users': total_users,
-                'avg_balance': avg_balance,
-                'median_balance': median_balance,
-                'max_balance': max_balance,
-                'min_balance': min_balance,
-                'p90_balance': p90_balance,
-                'p95_balance': p95_balance,
-                'gini_coefficient': gini,
-                'wealth_inequality': 'high' if gini > 0.6 else 'moderate' if gini > 0.4 else 'low'
-            }
+            gini = distribution['gini_coefficient']
+            distribution['wealth_inequality'] = 'high' if gini > 0.6 else 'moderate' if gini > 0.4 else 'low'
+            return distribution
             
         except Exception as e:
             logger.error(f"Error getting user distribution metrics: {e}")
@@ -335,27 +255,6 @@ class EconomyMonitor:
             return 100.0  # Infinite inflation if no sinks
         
         return ((faucets - sinks) / sinks) * 100
-    
-    def _calculate_gini_coefficient(self, values: List[float]) -> float:
-        """Calculate Gini coefficient for wealth inequality"""
-        if not values:
-            return 0.0
-        
-        # Sort values
-        sorted_values = sorted(values)
-        n = len(sorted_values)
-        
-        # Calculate Gini coefficient
-        total = sum(sorted_values)
-        if total == 0:
-            return 0.0
-        
-        cumulative_sum = 0
-        for i, value in enumerate(sorted_values):
-            cumulative_sum += (i + 1) * value
-        
-        gini = (2 * cumulative_sum) / (n * total) - (n + 1) / n
-        return gini
 
 
 # Global instance for easy access
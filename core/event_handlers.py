@@ -104,6 +104,9 @@ def mission_tracking_handler(event: Dict[str, Any]) -> None:
         # Import mission service here to avoid circular imports
         from modules.gamification.missions import mission_service
         
+        # Materialize today's daily missions on the first tracked event
+        mission_service.ensure_daily_missions(user_id)
+        
         # Get active missions for user
         active_missions = mission_service.get_active_missions(user_id)
         
@@ -150,20 +153,11 @@ def achievement_detection_handler(event: Dict[str, Any]) -> None:
         # Import achievement service here to avoid circular imports
         from modules.gamification.achievements import achievement_service
         
-        # Check all achievements when relevant events occur
-        if event['type'] in [
-            'narrative.fragment_completed',
-            'narrative.level_completed',
-            'gamification.besitos_earned',
-            'gamification.item_acquired',
-            'gamification.mission_completed',
-            'gamification.daily_reward_claimed',
-            'admin.reaction_added'
-        ]:
-            unlocked_achievements = achievement_service.check_all_achievements(user_id)
-            
-            if unlocked_achievements:
-                logger.info(f"User {user_id} unlocked achievements: {unlocked_achievements}")
+        # Update progress counters and re-check only the achievements they feed
+        unlocked_achievements = achievement_service.process_event(event)
+        
+        if unlocked_achievements:
+            logger.info(f"User {user_id} unlocked achievements: {unlocked_achievements}")
                 
     except Exception as e:
         logger.error(f"Failed to detect achievements: {e}")
@@ -181,6 +175,9 @@ def reaction_tracking_handler(event: Dict[str, Any]) -> None:
         # Import mission service here to avoid circular imports
         from modules.gamification.missions import mission_service
         
+        # Materialize today's daily missions on the first tracked event
+        mission_service.ensure_daily_missions(user_id)
+        
         # Get active missions for user
         active_missions = mission_service.get_active_missions(user_id)
         
@@ -221,6 +218,9 @@ def trivia_tracking_handler(event: Dict[str, Any]) -> None:
         # Import mission service here to avoid circular imports
         from modules.gamification.missions import mission_service
         
+        # Materialize today's daily missions on the first tracked event
+        mission_service.ensure_daily_missions(user_id)
+        
         # Get active missions for user
         active_missions = mission_service.get_active_missions(user_id)
         
@@ -253,6 +253,18 @@ def trivia_tracking_handler(event: Dict[str, Any]) -> None:
         logger.error(f"Failed to track trivia mission progress: {e}")
 
 
+def leaderboard_handler(event: Dict[str, Any]) -> None:
+    """Handler for feeding leaderboards from gamification events"""
+    try:
+        # Import leaderboard service here to avoid circular imports
+        from modules.gamification.leaderboards import leaderboard_service
+        
+        leaderboard_service.handle_event(event)
+        
+    except Exception as e:
+        logger.error(f"Failed to update leaderboards: {e}")
+
+
 def setup_event_handlers() -> None:
     """Setup all event handlers"""
     # Log all user events
@@ -293,6 +305,8 @@ def setup_event_handlers() -> None:
     event_bus.subscribe("gamification.item_acquired", achievement_detection_handler)
     event_bus.subscribe("gamification.mission_completed", achievement_detection_handler)
     event_bus.subscribe("gamification.daily_reward_claimed", achievement_detection_handler)
+    event_bus.subscribe("gamification.besitos_spent", achievement_detection_handler)
+    event_bus.subscribe("gamification.item_used", achievement_detection_handler)
     
     # Achievement events logging
     event_bus.subscribe("gamification.achievement_unlocked", log_event_handler)
@@ -312,4 +326,10 @@ def setup_event_handlers() -> None:
     event_bus.subscribe("gamification.trivia_answered", trivia_tracking_handler)
     event_bus.subscribe("gamification.trivia_answered", achievement_detection_handler)
     
+    # Leaderboards
+    event_bus.subscribe("gamification.besitos_earned", leaderboard_handler)
+    event_bus.subscribe("gamification.trivia_answered", leaderboard_handler)
+    event_bus.subscribe("admin.reaction_added", leaderboard_handler)
+    event_bus.subscribe("gamification.mission_completed", leaderboard_handler)
+    
     logger.info("Event handlers setup completed")
\ No newline at end of file
@@ -3,6 +3,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pymongo import MongoClient
 import redis
+import redis.asyncio
 from config.settings import settings
 
 # PostgreSQL connection
@@ -30,6 +31,9 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# Async Redis connection (created lazily, for use inside async bot handlers)
+async_redis_client = None
+
 
 def get_db():
     """Dependency for PostgreSQL database session"""
@@ -47,4 +51,19 @@ def get_mongo():
 
 def get_redis():
     """Dependency for Redis client"""
-    return redis_client
\ No newline at end of file
+    return redis_client
+
+
+def get_async_redis():
+    """Dependency for async Redis client"""
+    global async_redis_client
+    
+    if async_redis_client is None:
+        async_redis_client = redis.asyncio.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            decode_responses=True
+        )
+    
+    return async_redis_client
\ No newline at end of file
@@ -0,0 +1,7 @@
+-- Columns filled by the nightly DailyMetrics rollup
+ALTER TABLE daily_metrics ADD COLUMN IF NOT EXISTS events_by_type JSON;
+ALTER TABLE daily_metrics ADD COLUMN IF NOT EXISTS total_revenue FLOAT DEFAULT 0.0;
+
+-- One row per day: keep the latest duplicate so the rollup can upsert on date
+DELETE FROM daily_metrics a USING daily_metrics b WHERE a.date = b.date AND a.id < b.id;
+CREATE UNIQUE INDEX IF NOT EXISTS unique_daily_metrics_date ON daily_metrics(date);
@@ -0,0 +1,3 @@
+-- Idempotency key of besitos grants applied from the ledger queue
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS grant_id VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_grant_id ON transactions(grant_id);
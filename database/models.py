@@ -127,6 +127,7 @@ class Transaction(Base):
     source = Column(String(100), nullable=False, index=True)  # 'mission', 'purchase', 'daily_reward', etc.
     description = Column(Text, nullable=True)
     transaction_metadata = Column(JSON_COLUMN_TYPE, nullable=True)
+    grant_id = Column(String(64), nullable=True, unique=True)  # Idempotency key of ledger grants
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     # Relationships
@@ -923,6 +924,10 @@ class DailyMetrics(Base):
     total_trivia_answered = Column(Integer, default=0)
     total_auction_participations = Column(Integer, default=0)
     
+    # Rollup metrics
+    events_by_type = Column(JSON, nullable=True)  # event_type -> count
+    total_revenue = Column(Float, default=0.0)
+    
     # Retention metrics
     retention_rate = Column(Float, default=0.0)  # Percentage of returning users
     
@@ -953,6 +958,8 @@ class DailyMetrics(Base):
             "total_content_views": self.total_content_views,
             "total_trivia_answered": self.total_trivia_answered,
             "total_auction_participations": self.total_auction_participations,
+            "events_by_type": self.events_by_type,
+            "total_revenue": self.total_revenue,
             "retention_rate": self.retention_rate,
             "created_at": self.created_at.isoformat() if hasattr(self.created_at, 'isoformat') else None,
             "updated_at": self.updated_at.isoformat() if hasattr(self.updated_at, 'isoformat') else None
@@ -461,6 +461,10 @@ def seed_trivia_questions():
     result = trivia_collection.insert_many(trivia_questions)
     print(f"Inserted {len(result.inserted_ids)} trivia questions")
     
+    # Refresh the random-pick pools
+    from modules.gamification.trivias import trivia_service
+    trivia_service.rebuild_pools()
+    
     return result.inserted_ids
 
 
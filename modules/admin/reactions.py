@@ -3,25 +3,83 @@ Gamified reactions service for Telegram channels
 Handles reaction rewards, limits, and tracking
 """
 
+import hashlib
+import json
 import logging
-from datetime import datetime
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from database.models import UserReaction, ChannelPost
-from database.connection import get_db
+from database.connection import get_db, get_redis
 from modules.gamification.besitos import BesitosService
 from core.event_bus import event_bus
+from utils.cache_manager import cache_manager
 
 logger = logging.getLogger(__name__)
 
+REACTION_QUEUE_KEY = "reactions:ingest_queue"
+REACTION_PROCESSING_KEY = "reactions:ingest_processing"
+REACTION_NOTIFY_PENDING_KEY = "reaction_notification:pending"
+POST_CONFIG_CACHE_TTL = 300
+LIMITS_TTL = 7 * 86400
+NOTIFICATION_TTL = 86400
+SEEDED_FIELD = "__seeded"
+
+# Materialized reaction counters, maintained by flush_reactions
+# reactions:post:{post_id} and reactions:user:{user_id} hashes hold
+# "{emoji}" -> total and "{emoji}:rewarded" -> rewarded count
+TOP_REACTORS_KEY = "reactions:top_reactors"
+COUNTERS_SEEDED_KEY = "reactions:counters:seeded"
+
+# Check the per-user limit and queue the reaction for persistence in one step
+# KEYS[1]: reactions:limits:{post_id} hash of "{user_id}:{emoji}" -> count
+# KEYS[2]: ingest queue
+# ARGV: field, limit_per_user (0 = unlimited), entry json, ttl
+# Returns -1 if the limits hash must be seeded first, 0 if the limit is
+# reached, otherwise the user's new count for this emoji
+RECORD_REACTION_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '__seeded') == 0 then
+    return -1
+end
+local limit = tonumber(ARGV[2])
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if limit > 0 and count > limit then
+    redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return count
+"""
+
+# Seed the limits hash from the database unless another worker already did
+# KEYS[1]: reactions:limits:{post_id}
+# ARGV: ttl, then (field, count) pairs
+SEED_LIMITS_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '__seeded') == 1 then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], '__seeded', 1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]))
+return 1
+"""
+
 
 class ReactionsService:
     """Service for managing gamified reactions in channels"""
     
     def __init__(self):
         self.besitos_service = BesitosService()
+        self.redis_client = get_redis()
+        self._record_script = self.redis_client.register_script(RECORD_REACTION_SCRIPT)
+        self._seed_script = self.redis_client.register_script(SEED_LIMITS_SCRIPT)
     
     def configure_post_reactions(self, post_id: int, reaction_config: Dict[str, Any]) -> bool:
         """
@@ -57,6 +115,7 @@ class ReactionsService:
             
             post.reaction_rewards = reaction_config
             db.commit()
+            cache_manager.delete(f"reactions:config:{post_id}")
             
             logger.info(f"Configured reaction rewards for post {post_id}")
             return True
@@ -72,6 +131,10 @@ class ReactionsService:
         """
         Handle a user reaction to a post
         
+        The post config comes from cache and the per-user limit is enforced
+        with Redis counters; the reaction itself is queued and persisted,
+        rewarded and notified in batches by flush_reactions.
+        
         Args:
             user_id: User ID who reacted
             post_id: Post ID that was reacted to
@@ -80,220 +143,405 @@ class ReactionsService:
         Returns:
             Dict with rewards granted and status
         """
-        db: Session = next(get_db())
         try:
-            # Get the post and its reaction configuration
-            post = db.query(ChannelPost).filter(ChannelPost.id == post_id).first()
-            if not post:
+            # Get the post reaction configuration
+            reaction_config = self._get_post_config(post_id)
+            if reaction_config is None:
                 return {"success": False, "error": "Post not found"}
             
-            reaction_config = post.reaction_rewards or {}
-            
             # Check if this emoji has rewards configured
             if emoji not in reaction_config:
                 return {"success": True, "rewards_granted": False, "reason": "No rewards configured for this emoji"}
             
             emoji_config = reaction_config[emoji]
             
-            # Check user limits
-            if not self._can_user_react(db, user_id, post_id, emoji, emoji_config):
-                return {"success": True, "rewards_granted": False, "reason": "User limit reached"}
-            
-            # Record the reaction
-            reaction = UserReaction(
-                user_id=user_id,
-                post_id=post_id,
-                emoji=emoji
-            )
-            db.add(reaction)
-            
-            # Grant rewards
-            rewards = self._grant_rewards(user_id, emoji_config)
-            
-            # Mark as rewarded
-            reaction.rewarded_at = datetime.now()
-            
-            db.commit()
-            
-            # Publish event
-            event_bus.publish("admin.reaction_added", {
+            # Check user limits and queue the reaction
+            entry = json.dumps({
                 "user_id": user_id,
                 "post_id": post_id,
                 "emoji": emoji,
-                "rewards_granted": rewards,
-                "reaction_id": reaction.id
+                "besitos": emoji_config.get("besitos") or 0,
+                "ts": time.time()
             })
+            if not self._record_reaction(user_id, post_id, emoji, emoji_config, entry):
+                return {"success": True, "rewards_granted": False, "reason": "User limit reached"}
+            
+            rewards = self._build_rewards(emoji_config)
             
-            logger.info(f"User {user_id} reacted with {emoji} to post {post_id}, rewards: {rewards}")
+            logger.debug(f"User {user_id} reacted with {emoji} to post {post_id}, rewards: {rewards}")
             
             return {
                 "success": True,
                 "rewards_granted": True,
                 "rewards": rewards,
-                "reaction_id": reaction.id
+                "queued": True
             }
             
         except Exception as e:
-            db.rollback()
             logger.error(f"Error handling reaction for user {user_id} on post {post_id}: {e}")
             return {"success": False, "error": str(e)}
-        finally:
-            db.close()
     
-    def _can_user_react(self, db: Session, user_id: int, post_id: int, emoji: str, emoji_config: Dict[str, Any]) -> bool:
-        """Check if user can react with this emoji to this post"""
-        try:
-            limit_per_user = emoji_config.get("limit_per_user")
-            if not limit_per_user:
-                return True
+    def flush_reactions(self, batch_size: int = 500) -> int:
+        """
+        Persist queued reactions, grant their besitos and queue notifications
+        
+        The batch is moved to a processing list and only removed from it once
+        the reactions are committed and rewarded. A batch a crash left there is
+        replayed as it was before any new reactions are taken: stored reactions
+        are skipped, and its grants are queued again under the same grant ids,
+        so the ledger credits each of them once.
+        
+        Args:
+            batch_size: Maximum number of reactions to persist per call
             
-            # Count existing reactions by this user to this post with this emoji
-            existing_count = db.query(UserReaction).filter(
-                UserReaction.user_id == user_id,
-                UserReaction.post_id == post_id,
-                UserReaction.emoji == emoji
-            ).count()
+        Returns:
+            Number of reactions persisted
+        """
+        raw_entries = self.redis_client.lrange(REACTION_PROCESSING_KEY, 0, -1)
+        if not raw_entries:
+            pipe = self.redis_client.pipeline(transaction=True)
+            for _ in range(batch_size):
+                pipe.lmove(REACTION_QUEUE_KEY, REACTION_PROCESSING_KEY, "LEFT", "RIGHT")
+            raw_entries = [raw for raw in pipe.execute() if raw is not None]
+        
+        if not raw_entries:
+            return 0
+        
+        batch = [json.loads(raw) for raw in raw_entries]
+        
+        db: Session = next(get_db())
+        try:
+            # Skip reactions committed before a crash and then replayed
+            persisted = set(db.query(
+                UserReaction.user_id,
+                UserReaction.post_id,
+                UserReaction.emoji,
+                UserReaction.created_at
+            ).filter(
+                UserReaction.post_id.in_({entry["post_id"] for entry in batch}),
+                UserReaction.created_at.in_({self._created_at(entry) for entry in batch})
+            ).all())
+            entries = [
+                entry for entry in batch
+                if (entry["user_id"], entry["post_id"], entry["emoji"], self._created_at(entry)) not in persisted
+            ]
             
-            return existing_count < limit_per_user
+            now = datetime.now(timezone.utc)
+            reactions = [
+                UserReaction(
+                    user_id=entry["user_id"],
+                    post_id=entry["post_id"],
+                    emoji=entry["emoji"],
+                    rewarded_at=now,
+                    created_at=self._created_at(entry)
+                )
+                for entry in entries
+            ]
+            db.add_all(reactions)
+            db.commit()
+            reaction_ids = [reaction.id for reaction in reactions]
             
         except Exception as e:
-            logger.error(f"Error checking reaction limits: {e}")
-            return False
+            db.rollback()
+            logger.error(f"Failed to persist {len(raw_entries)} queued reactions: {e}")
+            # Put the batch back at the head of the queue in its original order
+            pipe = self.redis_client.pipeline(transaction=True)
+            for raw in raw_entries:
+                pipe.lrem(REACTION_PROCESSING_KEY, 1, raw)
+            pipe.lpush(REACTION_QUEUE_KEY, *reversed(raw_entries))
+            pipe.execute()
+            return 0
+        finally:
+            db.close()
+        
+        # One grant per user for the whole batch, including reactions stored
+        # before a crash: their grants may not have been queued
+        besitos_by_user = defaultdict(int)
+        reactions_by_user = defaultdict(int)
+        for entry in batch:
+            if entry["besitos"] > 0:
+                besitos_by_user[entry["user_id"]] += entry["besitos"]
+                reactions_by_user[entry["user_id"]] += 1
+        
+        batch_digest = hashlib.sha1("\n".join(raw_entries).encode()).hexdigest()[:32]
+        for user_id, amount in besitos_by_user.items():
+            self.besitos_service.queue_grant(
+                user_id=user_id,
+                amount=amount,
+                source="reaction_reward",
+                description=f"Reaction rewards: {amount} besitos ({reactions_by_user[user_id]} reactions)",
+                grant_id=f"reactions:{batch_digest}:{user_id}"
+            )
+        
+        self._update_counters(entries)
+        self._queue_reward_notifications(besitos_by_user, reactions_by_user)
+        
+        for entry, reaction_id in zip(entries, reaction_ids):
+            event_bus.publish("admin.reaction_added", {
+                "user_id": entry["user_id"],
+                "post_id": entry["post_id"],
+                "emoji": entry["emoji"],
+                "rewards_granted": {"besitos": entry["besitos"]} if entry["besitos"] else {},
+                "reaction_id": reaction_id
+            })
+        
+        pipe = self.redis_client.pipeline(transaction=True)
+        for raw in raw_entries:
+            pipe.lrem(REACTION_PROCESSING_KEY, 1, raw)
+        pipe.execute()
+        
+        logger.info(f"Persisted {len(entries)} reactions for {len(besitos_by_user)} rewarded users")
+        return len(entries)
     
-    def _grant_rewards(self, user_id: int, emoji_config: Dict[str, Any]) -> Dict[str, Any]:
-        """Grant rewards based on reaction configuration"""
-        rewards = {}
+    def _created_at(self, entry: Dict[str, Any]) -> datetime:
+        return datetime.fromtimestamp(entry["ts"], timezone.utc)
+    
+    def _get_post_config(self, post_id: int) -> Optional[Dict[str, Any]]:
+        """Get a post's reaction config from cache, or None if the post does not exist"""
+        cache_key = f"reactions:config:{post_id}"
+        cached = cache_manager.get(cache_key)
+        if cached is not None:
+            return cached.get("config")
         
+        db: Session = next(get_db())
         try:
-            # Grant besitos
-            besitos_amount = emoji_config.get("besitos")
-            if besitos_amount:
-                self.besitos_service.grant_besitos(
-                    user_id=user_id,
-                    amount=besitos_amount,
-                    source="reaction_reward",
-                    description=f"Reaction reward: {besitos_amount} besitos"
-                )
-                rewards["besitos"] = besitos_amount
-            
-            # Handle achievement triggers
-            achievement_trigger = emoji_config.get("achievement_trigger")
-            if achievement_trigger:
-                # In production, this would trigger achievement progress
-                rewards["achievement_trigger"] = achievement_trigger
-            
-            # Handle unlock hints
-            unlock_hint = emoji_config.get("unlock_hint")
-            if unlock_hint:
-                rewards["unlock_hint"] = unlock_hint
-            
-            # Handle trivia triggers
-            trivia_trigger = emoji_config.get("trigger_trivia")
-            if trivia_trigger:
-                rewards["trivia_trigger"] = trivia_trigger
-            
-            return rewards
-            
-        except Exception as e:
-            logger.error(f"Error granting rewards: {e}")
-            return rewards
+            post = db.query(ChannelPost).filter(ChannelPost.id == post_id).first()
+            config = (post.reaction_rewards or {}) if post else None
+        finally:
+            db.close()
+        
+        cache_manager.set(cache_key, {"config": config}, ttl=POST_CONFIG_CACHE_TTL)
+        return config
     
-    def get_user_reaction_stats(self, user_id: int) -> Dict[str, Any]:
-        """Get user reaction statistics"""
+    def get_post_id(self, channel_id: int, message_id: int) -> Optional[int]:
+        """Map a channel message to its ChannelPost id, or None if it is not a tracked post"""
+        cache_key = f"reactions:post_id:{channel_id}:{message_id}"
+        cached = cache_manager.get(cache_key)
+        if cached is not None:
+            return cached.get("id")
+        
         db: Session = next(get_db())
         try:
-            total_reactions = db.query(UserReaction).filter(
-                UserReaction.user_id == user_id
-            ).count()
-            
-            rewarded_reactions = db.query(UserReaction).filter(
-                UserReaction.user_id == user_id,
-                UserReaction.rewarded_at.isnot(None)
-            ).count()
-            
-            # Group by emoji
-            emoji_stats = {}
-            reactions_by_emoji = db.query(
+            post = db.query(ChannelPost.id).filter(
+                ChannelPost.channel_id == channel_id,
+                ChannelPost.post_id == message_id
+            ).first()
+        finally:
+            db.close()
+        
+        post_id = post[0] if post else None
+        cache_manager.set(cache_key, {"id": post_id}, ttl=POST_CONFIG_CACHE_TTL)
+        return post_id
+    
+    def _limits_key(self, post_id: int) -> str:
+        return f"reactions:limits:{post_id}"
+    
+    def _record_reaction(self, user_id: int, post_id: int, emoji: str, emoji_config: Dict[str, Any], entry: str) -> bool:
+        """Check the user's limit and queue the reaction; False if the limit is reached"""
+        keys = [self._limits_key(post_id), REACTION_QUEUE_KEY]
+        args = [f"{user_id}:{emoji}", emoji_config.get("limit_per_user") or 0, entry, LIMITS_TTL]
+        
+        result = self._record_script(keys=keys, args=args)
+        if result == -1:
+            self._seed_limits(post_id)
+            result = self._record_script(keys=keys, args=args)
+        
+        return result > 0
+    
+    def _seed_limits(self, post_id: int):
+        """Seed a post's per-user reaction counters from the database"""
+        db: Session = next(get_db())
+        try:
+            rows = db.query(
+                UserReaction.user_id,
                 UserReaction.emoji,
-                UserReaction.rewarded_at
+                func.count(UserReaction.id)
             ).filter(
-                UserReaction.user_id == user_id
+                UserReaction.post_id == post_id
+            ).group_by(
+                UserReaction.user_id,
+                UserReaction.emoji
             ).all()
+        finally:
+            db.close()
+        
+        args = [LIMITS_TTL]
+        for user_id, emoji, count in rows:
+            args.extend([f"{user_id}:{emoji}", count])
+        
+        self._seed_script(keys=[self._limits_key(post_id)], args=args)
+    
+    def _queue_reward_notifications(self, besitos_by_user: Dict[int, int], reactions_by_user: Dict[int, int]):
+        """Add rewards to each user's coalesced notification; the bot drains them in batches"""
+        if not besitos_by_user:
+            return
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id, amount in besitos_by_user.items():
+            notification_key = f"reaction_notification:{user_id}"
+            pipe.hincrby(notification_key, "besitos", amount)
+            pipe.hincrby(notification_key, "reactions", reactions_by_user[user_id])
+            pipe.expire(notification_key, NOTIFICATION_TTL)
+        pipe.sadd(REACTION_NOTIFY_PENDING_KEY, *besitos_by_user.keys())
+        pipe.execute()
+    
+    def _build_rewards(self, emoji_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Describe the rewards for a reaction; besitos are granted by flush_reactions"""
+        rewards = {}
+        
+        besitos_amount = emoji_config.get("besitos")
+        if besitos_amount:
+            rewards["besitos"] = besitos_amount
+        
+        # Handle achievement triggers
+        achievement_trigger = emoji_config.get("achievement_trigger")
+        if achievement_trigger:
+            # In production, this would trigger achievement progress
+            rewards["achievement_trigger"] = achievement_trigger
+        
+        # Handle unlock hints
+        unlock_hint = emoji_config.get("unlock_hint")
+        if unlock_hint:
+            rewards["unlock_hint"] = unlock_hint
+        
+        # Handle trivia triggers
+        trivia_trigger = emoji_config.get("trigger_trivia")
+        if trivia_trigger:
+            rewards["trivia_trigger"] = trivia_trigger
+        
+        return rewards
+    
+    def _post_counters_key(self, post_id: int) -> str:
+        return f"reactions:post:{post_id}"
+    
+    def _user_counters_key(self, user_id: int) -> str:
+        return f"reactions:user:{user_id}"
+    
+    def _update_counters(self, entries: List[Dict[str, Any]]):
+        """Increment post, user and top-reactor counters for persisted reactions"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for entry in entries:
+                emoji = entry["emoji"]
+                for key in (self._post_counters_key(entry["post_id"]), self._user_counters_key(entry["user_id"])):
+                    pipe.hincrby(key, emoji, 1)
+                    pipe.hincrby(key, f"{emoji}:rewarded", 1)
+                pipe.zincrby(TOP_REACTORS_KEY, 1, entry["user_id"])
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Error updating reaction counters: {e}")
+    
+    def ensure_reaction_counters(self) -> bool:
+        """Build the materialized counters from user_reactions if they were never built"""
+        if self.redis_client.exists(COUNTERS_SEEDED_KEY):
+            return False
+        return self.rebuild_reaction_counters()
+    
+    def rebuild_reaction_counters(self) -> bool:
+        """
+        Rebuild every materialized reaction counter from user_reactions
+        
+        Returns:
+            bool: True if rebuilt successfully
+        """
+        db: Session = next(get_db())
+        try:
+            aggregates = {}
+            for column, key_func in (
+                (UserReaction.post_id, self._post_counters_key),
+                (UserReaction.user_id, self._user_counters_key)
+            ):
+                aggregates[key_func] = db.query(
+                    column,
+                    UserReaction.emoji,
+                    func.count(UserReaction.id),
+                    func.count(UserReaction.rewarded_at)
+                ).group_by(
+                    column,
+                    UserReaction.emoji
+                ).all()
             
-            for emoji, rewarded_at in reactions_by_emoji:
-                if emoji not in emoji_stats:
-                    emoji_stats[emoji] = {"total": 0, "rewarded": 0}
-                
-                emoji_stats[emoji]["total"] += 1
-                if rewarded_at:
-                    emoji_stats[emoji]["rewarded"] += 1
+        except Exception as e:
+            logger.error(f"Error aggregating reactions for counters: {e}")
+            return False
+        finally:
+            db.close()
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            for pattern in ("reactions:post:*", "reactions:user:*"):
+                for key in self.redis_client.scan_iter(match=pattern):
+                    pipe.delete(key)
+            pipe.delete(TOP_REACTORS_KEY)
+            
+            top_reactors = defaultdict(int)
+            for key_func, rows in aggregates.items():
+                for owner_id, emoji, total, rewarded in rows:
+                    pipe.hset(key_func(owner_id), mapping={emoji: total, f"{emoji}:rewarded": rewarded})
+                    if key_func == self._user_counters_key:
+                        top_reactors[owner_id] += total
+            
+            if top_reactors:
+                pipe.zadd(TOP_REACTORS_KEY, top_reactors)
+            pipe.set(COUNTERS_SEEDED_KEY, int(time.time()))
+            pipe.execute()
+            
+            logger.info(f"Rebuilt reaction counters for {len(top_reactors)} users")
+            return True
             
-            return {
-                "total_reactions": total_reactions,
-                "rewarded_reactions": rewarded_reactions,
-                "emoji_stats": emoji_stats
-            }
+        except Exception as e:
+            logger.error(f"Error rebuilding reaction counters: {e}")
+            return False
+    
+    def _read_counters(self, key: str) -> Dict[str, Any]:
+        """Turn a counters hash into totals and per-emoji stats"""
+        emoji_stats = {}
+        for field, value in self.redis_client.hgetall(key).items():
+            if field.endswith(":rewarded"):
+                emoji, kind = field[:-len(":rewarded")], "rewarded"
+            else:
+                emoji, kind = field, "total"
+            emoji_stats.setdefault(emoji, {"total": 0, "rewarded": 0})[kind] = int(value)
+        
+        return {
+            "total_reactions": sum(stats["total"] for stats in emoji_stats.values()),
+            "rewarded_reactions": sum(stats["rewarded"] for stats in emoji_stats.values()),
+            "emoji_stats": emoji_stats
+        }
+    
+    def get_user_reaction_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get user reaction statistics"""
+        try:
+            return self._read_counters(self._user_counters_key(user_id))
             
         except Exception as e:
             logger.error(f"Error getting user reaction stats: {e}")
             return {}
-        finally:
-            db.close()
     
     def get_post_reaction_stats(self, post_id: int) -> Dict[str, Any]:
         """Get post reaction statistics"""
-        db: Session = next(get_db())
         try:
-            total_reactions = db.query(UserReaction).filter(
-                UserReaction.post_id == post_id
-            ).count()
-            
-            # Group by emoji
-            emoji_stats = {}
-            reactions_by_emoji = db.query(
-                UserReaction.emoji,
-                UserReaction.rewarded_at
-            ).filter(
-                UserReaction.post_id == post_id
-            ).all()
-            
-            for emoji, rewarded_at in reactions_by_emoji:
-                if emoji not in emoji_stats:
-                    emoji_stats[emoji] = {"total": 0, "rewarded": 0}
-                
-                emoji_stats[emoji]["total"] += 1
-                if rewarded_at:
-                    emoji_stats[emoji]["rewarded"] += 1
+            stats = self._read_counters(self._post_counters_key(post_id))
             
             return {
                 "post_id": post_id,
-                "total_reactions": total_reactions,
-                "emoji_stats": emoji_stats
+                "total_reactions": stats["total_reactions"],
+                "emoji_stats": stats["emoji_stats"]
             }
             
         except Exception as e:
             logger.error(f"Error getting post reaction stats: {e}")
             return {}
-        finally:
-            db.close()
     
     def get_top_reactors(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get top users by reaction count"""
-        db: Session = next(get_db())
         try:
-            top_reactors = db.query(
-                UserReaction.user_id,
-                func.count(UserReaction.id).label('reaction_count')
-            ).group_by(
-                UserReaction.user_id
-            ).order_by(
-                func.count(UserReaction.id).desc()
-            ).limit(limit).all()
+            top_reactors = self.redis_client.zrevrange(TOP_REACTORS_KEY, 0, limit - 1, withscores=True)
             
             return [
                 {
-                    "user_id": user_id,
-                    "reaction_count": reaction_count
+                    "user_id": int(user_id),
+                    "reaction_count": int(reaction_count)
                 }
                 for user_id, reaction_count in top_reactors
             ]
@@ -301,8 +549,6 @@ class ReactionsService:
         except Exception as e:
             logger.error(f"Error getting top reactors: {e}")
             return []
-        finally:
-            db.close()
 
 
 # Global instance
@@ -0,0 +1,197 @@
+"""
+Active User Counter for DianaBot Analytics System
+Counts distinct active users with per-day HyperLogLog sketches in Redis
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from database.connection import get_db, get_redis
+from .rollup import day_bounds
+
+logger = logging.getLogger(__name__)
+
+# Relative standard error of a Redis HyperLogLog (1.04 / sqrt(16384))
+HLL_STANDARD_ERROR = 0.0081
+
+# Sketches are kept long enough to answer yearly dashboard windows
+HLL_TTL_SECONDS = 400 * 86400
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def _sketch_key(day: date) -> str:
+    return f"analytics:hll:dau:{day.isoformat()}"
+
+
+def _backfilled_key(day: date) -> str:
+    return f"analytics:hll:dau_backfilled:{day.isoformat()}"
+
+
+class ActiveUserCounter:
+    """
+    Answers DAU/WAU/MAU for any window by merging per-day sketches
+    
+    Every stored analytics event adds its user to the sketch of its day.
+    Each day is also merged once with its users from AnalyticsEvent on first
+    read, since live adds alone miss history from before sketches existed;
+    a separate marker key records that the day was backfilled.
+    """
+    
+    def __init__(self):
+        self.redis_client = get_redis()
+    
+    def record_events(self, events: Iterable[Tuple[int, datetime]]) -> bool:
+        """
+        Add active users to their day's sketch
+        
+        Args:
+            events: (user_id, timestamp) pairs
+        
+        Returns:
+            bool: True if recorded
+        """
+        users_by_day: Dict[date, set] = {}
+        for user_id, timestamp in events:
+            if user_id is not None:
+                users_by_day.setdefault(timestamp.date(), set()).add(user_id)
+        
+        if not users_by_day:
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for day, user_ids in users_by_day.items():
+                key = _sketch_key(day)
+                pipe.pfadd(key, *user_ids)
+                pipe.expire(key, HLL_TTL_SECONDS)
+            pipe.execute()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error recording active user sketches: {e}")
+            return False
+    
+    def count(self, first_day: date, last_day: date, db: Optional[Session] = None) -> Dict[str, float]:
+        """
+        Count distinct users active in [first_day, last_day]
+        
+        Args:
+            first_day: First day of the window
+            last_day: Last day of the window (inclusive)
+            db: Session used to backfill missing sketches (optional)
+        
+        Returns:
+            Dict with the estimated count, the relative standard error and
+            the absolute error margin of the estimate
+        """
+        days = self._days(first_day, last_day)
+        if not days:
+            return self._result(0)
+        
+        self._ensure_sketches(days, db)
+        return self._result(self.redis_client.pfcount(*[_sketch_key(day) for day in days]))
+    
+    def daily_counts(self, first_day: date, last_day: date, db: Optional[Session] = None) -> Dict[date, int]:
+        """
+        Get the estimated active users of every day in [first_day, last_day]
+        
+        Args:
+            first_day: First day
+            last_day: Last day (inclusive)
+            db: Session used to backfill missing sketches (optional)
+        
+        Returns:
+            Dict of day -> estimated active users
+        """
+        days = self._days(first_day, last_day)
+        if not days:
+            return {}
+        
+        self._ensure_sketches(days, db)
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for day in days:
+            pipe.pfcount(_sketch_key(day))
+        
+        return dict(zip(days, pipe.execute()))
+    
+    def dau(self, day: Optional[date] = None, db: Optional[Session] = None) -> Dict[str, float]:
+        """Distinct users active on a day (defaults to today)"""
+        day = day or date.today()
+        return self.count(day, day, db)
+    
+    def wau(self, last_day: Optional[date] = None, db: Optional[Session] = None) -> Dict[str, float]:
+        """Distinct users active in the 7 days ending on last_day"""
+        last_day = last_day or date.today()
+        return self.count(last_day - timedelta(days=6), last_day, db)
+    
+    def mau(self, last_day: Optional[date] = None, db: Optional[Session] = None) -> Dict[str, float]:
+        """Distinct users active in the 30 days ending on last_day"""
+        last_day = last_day or date.today()
+        return self.count(last_day - timedelta(days=29), last_day, db)
+    
+    def _days(self, first_day: date, last_day: date) -> List[date]:
+        # Future days have no activity and would only create empty sketches
+        last_day = min(last_day, date.today())
+        return [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    
+    def _result(self, estimate: int) -> Dict[str, float]:
+        return {
+            'count': estimate,
+            'standard_error': HLL_STANDARD_ERROR,
+            'error_margin': round(estimate * HLL_STANDARD_ERROR, 1)
+        }
+    
+    def _ensure_sketches(self, days: List[date], db: Optional[Session] = None):
+        """Backfill the sketches of days not yet merged with AnalyticsEvent"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for day in days:
+            pipe.exists(_backfilled_key(day))
+        missing = [day for day, backfilled in zip(days, pipe.execute()) if not backfilled]
+        
+        if not missing:
+            return
+        
+        owns_session = db is None
+        if owns_session:
+            db = next(get_db())
+        
+        try:
+            for day in missing:
+                self._backfill_day(db, day)
+        except Exception as e:
+            logger.error(f"Error backfilling active user sketches: {e}")
+        finally:
+            if owns_session:
+                db.close()
+    
+    def _backfill_day(self, db: Session, day: date):
+        from database.models import AnalyticsEvent
+        
+        start, end = day_bounds(day)
+        user_ids = [
+            user_id for (user_id,) in db.query(AnalyticsEvent.user_id).filter(
+                and_(AnalyticsEvent.timestamp >= start, AnalyticsEvent.timestamp < end)
+            ).distinct()
+            if user_id is not None
+        ]
+        
+        key = _sketch_key(day)
+        pipe = self.redis_client.pipeline(transaction=False)
+        # Merged into whatever live adds already recorded; PFADD is idempotent
+        for i in range(0, len(user_ids), BACKFILL_CHUNK_SIZE):
+            pipe.pfadd(key, *user_ids[i:i + BACKFILL_CHUNK_SIZE])
+        # The sketch must not expire before its marker, or the day would read as empty
+        pipe.expire(key, HLL_TTL_SECONDS)
+        pipe.set(_backfilled_key(day), 1, ex=HLL_TTL_SECONDS)
+        pipe.execute()
+        
+        logger.info(f"Backfilled active user sketch for {day}: {len(user_ids)} users")
+
+
+# Global counter instance
+active_user_counter = ActiveUserCounter()
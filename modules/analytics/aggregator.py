@@ -4,12 +4,18 @@ Aggregates and computes metrics from raw analytics events
 """
 
 import logging
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from sqlalchemy import func, and_, or_, text
 from sqlalchemy.orm import Session
 
+from .active_users import active_user_counter, HLL_STANDARD_ERROR
+from .cohorts import CohortRetentionEngine
+from .rollup import DailyMetricsRollup, compute_revenue, day_bounds
+from .sessionizer import average_session_duration
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,11 +53,12 @@ class EngagementMetrics:
     """Engagement metrics data structure"""
     mau: int  # Monthly Active Users
     dau: int  # Daily Active Users
-    retention_d1: float  # Day 1 retention
-    retention_d7: float  # Day 7 retention
-    retention_d30: float  # Day 30 retention
+    retention_d1: Optional[float]  # Day 1 retention, None until observable
+    retention_d7: Optional[float]  # Day 7 retention
+    retention_d30: Optional[float]  # Day 30 retention
     avg_session_duration: float  # Average session duration in seconds
     engagement_by_module: Dict[str, int]  # Engagement count by module
+    active_users_error: float = HLL_STANDARD_ERROR  # Relative standard error of mau/dau
 
 
 @dataclass
@@ -89,6 +96,38 @@ class MetricsAggregator:
     def __init__(self, db_session: Session):
         self.db = db_session
     
+    def _split_range(self, time_range: TimeRange) -> Tuple[List[Any], List[Tuple[datetime, datetime]]]:
+        """
+        Split a time range into rolled-up closed days and raw segments
+        
+        Closed days fully inside the range are read from DailyMetrics; the
+        partial first day, today and any day without a rollup are returned
+        as [start, end) segments to be queried from raw events.
+        """
+        start, end = time_range.start_date, time_range.end_date
+        first_full = start.date() if start == day_bounds(start.date())[0] else start.date() + timedelta(days=1)
+        last_full = min(end.date() - timedelta(days=1), date.today() - timedelta(days=1))
+        
+        if first_full > last_full:
+            return [], [(start, end)]
+        
+        rollups = DailyMetricsRollup(self.db).get_rollups(first_full, last_full)
+        
+        segments = []
+        segment_start = start
+        day = first_full
+        while day <= last_full:
+            day_start, day_end = day_bounds(day)
+            if day in rollups:
+                if segment_start < day_start:
+                    segments.append((segment_start, day_start))
+                segment_start = day_end
+            day += timedelta(days=1)
+        if segment_start < end:
+            segments.append((segment_start, end))
+        
+        return list(rollups.values()), segments
+    
     def get_engagement_metrics(self, time_range: TimeRange) -> EngagementMetrics:
         """Get engagement metrics for the given time range"""
         logger.info(f"Computing engagement metrics for {time_range}")
@@ -99,10 +138,11 @@ class MetricsAggregator:
         # Get DAU (Daily Active Users)
         dau = self._get_daily_active_users(time_range)
         
-        # Get retention rates
-        retention_d1 = self._get_retention_rate(time_range, days=1)
-        retention_d7 = self._get_retention_rate(time_range, days=7)
-        retention_d30 = self._get_retention_rate(time_range, days=30)
+        # Get retention rates for users who signed up in the range
+        retention = self._get_retention_rates(time_range)
+        retention_d1 = retention[1]
+        retention_d7 = retention[7]
+        retention_d30 = retention[30]
         
         # Get average session duration
         avg_session_duration = self._get_avg_session_duration(time_range)
@@ -200,113 +240,68 @@ class MetricsAggregator:
     # Private helper methods for metric calculations
     
     def _get_monthly_active_users(self, time_range: TimeRange) -> int:
-        """Get monthly active users count"""
-        from database.models import AnalyticsEvent
-        
-        result = self.db.query(func.count(func.distinct(AnalyticsEvent.user_id))).filter(
-            and_(
-                AnalyticsEvent.timestamp >= time_range.start_date,
-                AnalyticsEvent.timestamp <= time_range.end_date
-            )
-        ).scalar()
-        
-        return result or 0
+        """Get monthly active users count (distinct users over the whole range)"""
+        return active_user_counter.count(
+            time_range.start_date.date(), time_range.end_date.date(), db=self.db
+        )['count']
     
     def _get_daily_active_users(self, time_range: TimeRange) -> int:
         """Get daily active users count (average over time range)"""
-        from database.models import AnalyticsEvent
-        
-        # Get unique users per day and average
-        daily_counts = self.db.query(
-            func.date(AnalyticsEvent.timestamp),
-            func.count(func.distinct(AnalyticsEvent.user_id))
-        ).filter(
-            and_(
-                AnalyticsEvent.timestamp >= time_range.start_date,
-                AnalyticsEvent.timestamp <= time_range.end_date
-            )
-        ).group_by(func.date(AnalyticsEvent.timestamp)).all()
+        daily_counts = active_user_counter.daily_counts(
+            time_range.start_date.date(), time_range.end_date.date(), db=self.db
+        )
         
         if not daily_counts:
             return 0
         
-        total_dau = sum(count for _, count in daily_counts)
+        total_dau = sum(daily_counts.values())
         avg_dau = total_dau / len(daily_counts)
         
         return int(avg_dau)
     
-    def _get_retention_rate(self, time_range: TimeRange, days: int) -> float:
-        """Get retention rate for given number of days"""
-        # This is a simplified implementation
-        # In production, you'd need cohort analysis
-        from database.models import AnalyticsEvent
-        
-        # Get users who had activity in the first day of the range
-        cohort_start = time_range.start_date
-        cohort_end = cohort_start + timedelta(days=1)
-        
-        cohort_users = self.db.query(func.distinct(AnalyticsEvent.user_id)).filter(
-            and_(
-                AnalyticsEvent.timestamp >= cohort_start,
-                AnalyticsEvent.timestamp <= cohort_end
-            )
-        ).all()
-        
-        if not cohort_users:
-            return 0.0
-        
-        cohort_user_ids = [user_id for (user_id,) in cohort_users]
-        
-        # Check how many of these users were active after N days
-        retention_start = cohort_start + timedelta(days=days)
-        retention_end = retention_start + timedelta(days=1)
-        
-        retained_users = self.db.query(func.distinct(AnalyticsEvent.user_id)).filter(
-            and_(
-                AnalyticsEvent.timestamp >= retention_start,
-                AnalyticsEvent.timestamp <= retention_end,
-                AnalyticsEvent.user_id.in_(cohort_user_ids)
-            )
-        ).count()
-        
-        return retained_users / len(cohort_user_ids) if cohort_user_ids else 0.0
+    def _get_retention_rates(self, time_range: TimeRange) -> Dict[int, Optional[float]]:
+        """Get D1/D7/D30 retention of the users who signed up in the time range"""
+        return CohortRetentionEngine(self.db).get_retention(
+            time_range.start_date.date(), time_range.end_date.date(), offsets=(1, 7, 30)
+        )
     
     def _get_avg_session_duration(self, time_range: TimeRange) -> float:
         """Get average session duration in seconds"""
-        # This would require session tracking in the events
-        # For now, return a placeholder value
-        return 300.0  # 5 minutes average
+        return average_session_duration(self.db, time_range.start_date, time_range.end_date)
     
     def _get_engagement_by_module(self, time_range: TimeRange) -> Dict[str, int]:
         """Get engagement count by module"""
         from database.models import AnalyticsEvent
         
-        # Group events by event_type (which corresponds to modules)
-        module_engagement = self.db.query(
-            AnalyticsEvent.event_type,
-            func.count(AnalyticsEvent.id)
-        ).filter(
-            and_(
-                AnalyticsEvent.timestamp >= time_range.start_date,
-                AnalyticsEvent.timestamp <= time_range.end_date
-            )
-        ).group_by(AnalyticsEvent.event_type).all()
+        rollups, segments = self._split_range(time_range)
+        engagement = Counter()
+        for rollup in rollups:
+            engagement.update(rollup.events_by_type or {})
         
-        return {module: count for module, count in module_engagement}
+        # Group events by event_type (which corresponds to modules)
+        for segment_start, segment_end in segments:
+            module_engagement = self.db.query(
+                AnalyticsEvent.event_type,
+                func.count(AnalyticsEvent.id)
+            ).filter(
+                and_(
+                    AnalyticsEvent.timestamp >= segment_start,
+                    AnalyticsEvent.timestamp < segment_end
+                )
+            ).group_by(AnalyticsEvent.event_type).all()
+            engagement.update(dict(module_engagement))
+        
+        return dict(engagement)
     
     def _get_total_revenue(self, time_range: TimeRange) -> float:
         """Get total revenue for time range"""
-        from database.models import Transaction
+        rollups, segments = self._split_range(time_range)
         
-        result = self.db.query(func.sum(Transaction.amount)).filter(
-            and_(
-                Transaction.created_at >= time_range.start_date,
-                Transaction.created_at <= time_range.end_date,
-                Transaction.status == 'completed'
-            )
-        ).scalar()
+        total = sum(rollup.total_revenue or 0.0 for rollup in rollups)
+        for segment_start, segment_end in segments:
+            total += compute_revenue(self.db, segment_start, segment_end)
         
-        return float(result or 0)
+        return float(total)
     
     def _get_arpu(self, time_range: TimeRange) -> float:
         """Get Average Revenue Per User"""
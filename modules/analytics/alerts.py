@@ -11,6 +11,9 @@ from dataclasses import dataclass
 from sqlalchemy import func, and_, or_, text
 from sqlalchemy.orm import Session
 
+from .active_users import active_user_counter
+from .sessionizer import average_session_duration
+
 logger = logging.getLogger(__name__)
 
 
@@ -367,35 +370,22 @@ class AlertSystem:
     
     def _get_current_dau(self) -> int:
         """Get current daily active users"""
-        from database.models import AnalyticsEvent
-        
-        today = datetime.now().date()
-        result = self.db.query(func.count(func.distinct(AnalyticsEvent.user_id))).filter(
-            func.date(AnalyticsEvent.timestamp) == today
-        ).scalar()
-        
-        return result or 0
+        return active_user_counter.dau(db=self.db)['count']
     
     def _get_previous_dau(self) -> int:
         """Get previous day's active users"""
-        from database.models import AnalyticsEvent
-        
         yesterday = (datetime.now() - timedelta(days=1)).date()
-        result = self.db.query(func.count(func.distinct(AnalyticsEvent.user_id))).filter(
-            func.date(AnalyticsEvent.timestamp) == yesterday
-        ).scalar()
-        
-        return result or 0
+        return active_user_counter.dau(yesterday, db=self.db)['count']
     
     def _get_current_session_duration(self) -> float:
-        """Get current average session duration"""
-        # Placeholder implementation
-        return 300.0  # 5 minutes
+        """Get average duration of the sessions started in the last 24 hours"""
+        now = datetime.now()
+        return average_session_duration(self.db, now - timedelta(days=1), now)
     
     def _get_previous_session_duration(self) -> float:
-        """Get previous average session duration"""
-        # Placeholder implementation
-        return 350.0  # 5.8 minutes
+        """Get average duration of the sessions started in the 24 hours before that"""
+        now = datetime.now()
+        return average_session_duration(self.db, now - timedelta(days=2), now - timedelta(days=1))
     
     def _get_current_conversion_rate(self) -> float:
         """Get current conversion rate"""
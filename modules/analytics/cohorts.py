@@ -0,0 +1,226 @@
+"""
+Cohort Retention Engine for DianaBot Analytics System
+Computes retention matrices for signup cohorts from a user x day activity bitmap
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import func, and_
+from sqlalchemy.orm import Session
+
+from .rollup import day_bounds
+
+logger = logging.getLogger(__name__)
+
+RETENTION_OFFSETS = (1, 7, 30)
+
+# Cohort definition -> how far back cohorts are built
+COHORT_LOOKBACK_DAYS = {
+    'daily': 45,
+    'weekly': 26 * 7,
+    'monthly': 365
+}
+
+
+class CohortRetentionEngine:
+    """
+    Builds signup cohorts and their Dn retention in one pass
+    
+    Distinct (user, day) activity pairs are loaded with a single grouped
+    query and laid out as a boolean matrix with one row per cohort user and
+    one column per day. Every retention figure is then a fancy-indexed read
+    of that matrix, aggregated per cohort with bincount.
+    """
+    
+    def __init__(self, db_session: Session):
+        self.db = db_session
+    
+    def get_cohorts(self, cohort_definition: str = 'monthly', since: Optional[date] = None,
+                    offsets: Sequence[int] = RETENTION_OFFSETS) -> List[Dict[str, Any]]:
+        """
+        Get the retention of every cohort that signed up since a day
+        
+        Args:
+            cohort_definition: 'daily', 'weekly' or 'monthly'
+            since: First signup day (defaults to the definition's lookback)
+            offsets: Retention days to compute (Dn)
+        
+        Returns:
+            List of dicts with cohort_period, cohort_size, retention
+            ({offset: rate or None while not yet observable}) and
+            avg_lifetime_value, oldest cohort first
+        """
+        if cohort_definition not in COHORT_LOOKBACK_DAYS:
+            raise ValueError(f"Unknown cohort definition: {cohort_definition}")
+        
+        today = date.today()
+        since = since or today - timedelta(days=COHORT_LOOKBACK_DAYS[cohort_definition])
+        
+        user_ids, signup_days, activity = self._load(since, today, today)
+        if not len(user_ids):
+            return []
+        
+        periods = self._period_starts(since, signup_days, cohort_definition)
+        cohort_periods, cohort_index = np.unique(periods, return_inverse=True)
+        n_cohorts = len(cohort_periods)
+        
+        sizes = np.bincount(cohort_index, minlength=n_cohorts)
+        rates = {
+            offset: self._cohort_rates(activity, signup_days, cohort_index, n_cohorts, offset)
+            for offset in offsets
+        }
+        revenue = np.bincount(
+            cohort_index, weights=self._revenue_per_user(user_ids, since), minlength=n_cohorts
+        )
+        
+        return [
+            {
+                'cohort_period': self._format_period(cohort_periods[i], cohort_definition),
+                'cohort_size': int(sizes[i]),
+                'retention': {offset: rates[offset][i] for offset in offsets},
+                'avg_lifetime_value': float(revenue[i] / sizes[i])
+            }
+            for i in range(n_cohorts)
+        ]
+    
+    def get_retention(self, first_day: date, last_day: date,
+                      offsets: Sequence[int] = RETENTION_OFFSETS) -> Dict[int, Optional[float]]:
+        """
+        Get the blended Dn retention of users who signed up in [first_day, last_day]
+        
+        Only users whose Dn day has already closed count towards each rate.
+        
+        Returns:
+            Dict of offset -> retention rate (0-1), or None while no user's
+            Dn day has closed yet
+        """
+        today = date.today()
+        user_ids, signup_days, activity = self._load(first_day, last_day, today)
+        if not len(user_ids):
+            return {offset: None for offset in offsets}
+        
+        single_cohort = np.zeros(len(user_ids), dtype=np.int64)
+        return {
+            offset: self._cohort_rates(activity, signup_days, single_cohort, 1, offset)[0]
+            for offset in offsets
+        }
+    
+    def _load(self, first_signup: date, last_signup: date, today: date):
+        """
+        Load the cohort users and their activity bitmap
+        
+        Returns:
+            (user_ids, signup_days, activity): sorted user IDs, each user's
+            signup day as a column index, and the users x days boolean matrix
+            whose columns run from first_signup to today
+        """
+        from database.models import AnalyticsEvent, User
+        
+        start, _ = day_bounds(first_signup)
+        _, end = day_bounds(last_signup)
+        origin = np.datetime64(first_signup, 'D')
+        n_days = (today - first_signup).days + 1
+        
+        signups = self.db.query(User.id, User.created_at).filter(
+            and_(User.created_at >= start, User.created_at < end)
+        ).order_by(User.id).all()
+        
+        if not signups:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.zeros((0, n_days), dtype=bool)
+        
+        user_ids = np.array([user_id for user_id, _ in signups], dtype=np.int64)
+        signup_days = (
+            np.array([created_at.date() for _, created_at in signups], dtype='datetime64[D]') - origin
+        ).astype(np.int64)
+        
+        pairs = self.db.query(
+            AnalyticsEvent.user_id,
+            func.date(AnalyticsEvent.timestamp)
+        ).join(
+            User, User.id == AnalyticsEvent.user_id
+        ).filter(
+            and_(
+                User.created_at >= start,
+                User.created_at < end,
+                AnalyticsEvent.timestamp >= start
+            )
+        ).distinct().all()
+        
+        activity = np.zeros((len(user_ids), n_days), dtype=bool)
+        if pairs:
+            event_users = np.array([user_id for user_id, _ in pairs], dtype=np.int64)
+            event_days = (
+                np.array([str(day)[:10] for _, day in pairs], dtype='datetime64[D]') - origin
+            ).astype(np.int64)
+            rows = np.searchsorted(user_ids, event_users)
+            valid = (event_days >= 0) & (event_days < n_days)
+            activity[rows[valid], event_days[valid]] = True
+        
+        return user_ids, signup_days, activity
+    
+    def _cohort_rates(self, activity: np.ndarray, signup_days: np.ndarray, cohort_index: np.ndarray,
+                      n_cohorts: int, offset: int) -> List[Optional[float]]:
+        """Dn retention per cohort; None for cohorts with no user whose Dn day has closed"""
+        target = signup_days + offset
+        # The last column is today, which is still open
+        observable = target < activity.shape[1] - 1
+        
+        retained = np.zeros(len(signup_days), dtype=bool)
+        retained[observable] = activity[np.flatnonzero(observable), target[observable]]
+        
+        eligible = np.bincount(cohort_index, weights=observable, minlength=n_cohorts)
+        kept = np.bincount(cohort_index, weights=retained, minlength=n_cohorts)
+        
+        return [
+            float(kept[i] / eligible[i]) if eligible[i] else None
+            for i in range(n_cohorts)
+        ]
+    
+    def _period_starts(self, since: date, signup_days: np.ndarray, cohort_definition: str) -> np.ndarray:
+        """First day of each user's cohort period"""
+        days = np.datetime64(since, 'D') + signup_days
+        if cohort_definition == 'monthly':
+            return days.astype('datetime64[M]').astype('datetime64[D]')
+        if cohort_definition == 'weekly':
+            # 1970-01-01 was a Thursday; shift so weeks start on Monday
+            weekday = (days.astype(np.int64) + 3) % 7
+            return days - weekday
+        return days
+    
+    def _format_period(self, period_start: np.datetime64, cohort_definition: str) -> str:
+        if cohort_definition == 'monthly':
+            return str(period_start.astype('datetime64[M]'))
+        return str(period_start)
+    
+    def _revenue_per_user(self, user_ids: np.ndarray, since: date) -> np.ndarray:
+        """Lifetime real-money revenue of each cohort user, aligned with user_ids"""
+        from database.models import User, UserPurchase, VIPSubscription
+        
+        start, _ = day_bounds(since)
+        revenue = np.zeros(len(user_ids), dtype=np.float64)
+        
+        queries = (
+            self.db.query(UserPurchase.user_id, func.sum(UserPurchase.amount_paid)).join(
+                User, User.id == UserPurchase.user_id
+            ).filter(
+                and_(User.created_at >= start, UserPurchase.status == 'completed')
+            ).group_by(UserPurchase.user_id),
+            self.db.query(VIPSubscription.user_id, func.sum(VIPSubscription.amount_paid)).join(
+                User, User.id == VIPSubscription.user_id
+            ).filter(
+                User.created_at >= start
+            ).group_by(VIPSubscription.user_id)
+        )
+        
+        for query in queries:
+            totals = [(user_id, float(amount or 0)) for user_id, amount in query.all()]
+            if not totals:
+                continue
+            paying = np.array([user_id for user_id, _ in totals], dtype=np.int64)
+            rows = np.searchsorted(user_ids, paying)
+            found = (rows < len(user_ids)) & (user_ids[np.minimum(rows, len(user_ids) - 1)] == paying)
+            np.add.at(revenue, rows[found], np.array([amount for _, amount in totals])[found])
+        
+        return revenue
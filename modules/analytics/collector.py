@@ -4,13 +4,29 @@ Handles collection, buffering, and storage of analytics events
 """
 
 import asyncio
+import json
 import logging
+import os
+import time
+import uuid
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 
+from config.settings import settings
+from .active_users import active_user_counter
+
 logger = logging.getLogger(__name__)
 
+# What add_event does when the buffer holds max_pending events
+OVERFLOW_BLOCK = 'block'  # Wait for a flush to make room (backpressure)
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+
+STORE_RETRY_ATTEMPTS = 3
+STORE_RETRY_BASE_DELAY = 0.5  # seconds, doubled after every failed attempt
+
 
 @dataclass
 class AnalyticsEvent:
@@ -30,24 +46,51 @@ class AnalyticsEvent:
             'metadata': self.metadata,
             'session_id': self.session_id
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AnalyticsEvent':
+        """Rebuild an event stored with to_dict"""
+        return cls(
+            event_type=data['event_type'],
+            user_id=data['user_id'],
+            timestamp=datetime.fromisoformat(data['timestamp']),
+            metadata=data.get('metadata') or {},
+            session_id=data.get('session_id')
+        )
 
 
 class EventCollectorBuffer:
-    """Buffer for analytics events to optimize database writes"""
+    """Bounded buffer for analytics events to optimize database writes"""
     
-    def __init__(self, max_size: int = 100, flush_interval: int = 30):
+    def __init__(self, max_size: int = 100, flush_interval: int = 30,
+                 max_pending: Optional[int] = None, overflow_policy: str = OVERFLOW_BLOCK,
+                 block_timeout: float = 5.0):
         self.max_size = max_size
         self.flush_interval = flush_interval
-        self.buffer: List[AnalyticsEvent] = []
+        self.max_pending = max(max_pending or settings.analytics_max_pending_events, max_size)
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.buffer: Deque[AnalyticsEvent] = deque()
         self._flush_task: Optional[asyncio.Task] = None
         self._running = False
         self._flush_handler: Optional[Any] = None
-        
+        self._flush_lock = asyncio.Lock()
+        self._space_available = asyncio.Event()
+        self.metrics = {
+            'events_buffered': 0,
+            'events_dropped': 0,
+            'max_depth': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'last_flush_latency_ms': 0.0,
+            'total_flush_latency_ms': 0.0
+        }
+    
     async def start(self):
         """Start the automatic flush task"""
         if self._running:
             return
-            
+        
         self._running = True
         self._flush_task = asyncio.create_task(self._auto_flush())
         logger.info("EventCollectorBuffer started")
@@ -56,7 +99,7 @@ class EventCollectorBuffer:
         """Stop the buffer and flush remaining events"""
         if not self._running:
             return
-            
+        
         self._running = False
         if self._flush_task:
             self._flush_task.cancel()
@@ -70,12 +113,49 @@ class EventCollectorBuffer:
             await self._flush()
         logger.info("EventCollectorBuffer stopped")
     
-    async def add_event(self, event: AnalyticsEvent):
-        """Add event to buffer, flush if buffer is full"""
+    async def add_event(self, event: AnalyticsEvent) -> bool:
+        """
+        Add event to buffer, flush if buffer is full
+        
+        Returns:
+            bool: False if the event was dropped by the overflow policy
+        """
+        if len(self.buffer) >= self.max_pending and not await self._make_room():
+            self.metrics['events_dropped'] += 1
+            logger.warning(f"Analytics buffer full ({len(self.buffer)} events), dropped {event.event_type} event")
+            return False
+        
         self.buffer.append(event)
+        self.metrics['events_buffered'] += 1
+        self.metrics['max_depth'] = max(self.metrics['max_depth'], len(self.buffer))
         
         if len(self.buffer) >= self.max_size:
             await self._flush()
+        return True
+    
+    async def _make_room(self) -> bool:
+        """Apply the overflow policy; True if the new event may be buffered"""
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            self.buffer.popleft()
+            self.metrics['events_dropped'] += 1
+            return True
+        
+        if self.overflow_policy != OVERFLOW_BLOCK:
+            return False
+        
+        # Wait for the in-flight flush to take the pending events
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.block_timeout
+        while len(self.buffer) >= self.max_pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            self._space_available.clear()
+            try:
+                await asyncio.wait_for(self._space_available.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
     
     async def _auto_flush(self):
         """Automatically flush buffer at regular intervals"""
@@ -86,33 +166,73 @@ class EventCollectorBuffer:
     
     async def _flush(self):
         """Flush buffer to storage using the flush handler"""
-        if not self.buffer:
-            return
+        async with self._flush_lock:
+            if not self.buffer:
+                return
             
-        events_to_flush = self.buffer.copy()
-        self.buffer.clear()
-        
-        logger.info(f"Flushing {len(events_to_flush)} analytics events")
-        
-        # Use flush handler if available
-        if self._flush_handler:
-            await self._flush_handler(events_to_flush)
-        
-        return events_to_flush
+            events_to_flush = list(self.buffer)
+            self.buffer.clear()
+            self._space_available.set()
+            
+            logger.info(f"Flushing {len(events_to_flush)} analytics events")
+            
+            started = time.perf_counter()
+            try:
+                # Use flush handler if available
+                if self._flush_handler:
+                    await self._flush_handler(events_to_flush)
+            except Exception as e:
+                self.metrics['flush_errors'] += 1
+                logger.error(f"Error flushing analytics events: {e}")
+            finally:
+                latency_ms = (time.perf_counter() - started) * 1000
+                self.metrics['flushes'] += 1
+                self.metrics['last_flush_latency_ms'] = round(latency_ms, 2)
+                self.metrics['total_flush_latency_ms'] += latency_ms
+            
+            return events_to_flush
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get buffer depth and flush latency metrics"""
+        flushes = self.metrics['flushes']
+        return {
+            **self.metrics,
+            'buffer_depth': len(self.buffer),
+            'max_pending': self.max_pending,
+            'avg_flush_latency_ms': round(self.metrics['total_flush_latency_ms'] / flushes, 2) if flushes else 0.0
+        }
 
 
 class EventCollector:
-    """Main event collector for DianaBot analytics"""
+    """
+    Main event collector for DianaBot analytics
+    
+    Events are written with an AsyncSession when one is given; otherwise the
+    insert runs on a worker thread, with the given synchronous session or a
+    fresh one per flush. Batches that still fail after retries are spooled
+    to disk and replayed once the database accepts writes again.
+    """
     
-    def __init__(self, db_connection, buffer_size: int = 100, flush_interval: int = 30):
+    def __init__(self, db_connection=None, buffer_size: int = 100, flush_interval: int = 30,
+                 max_pending: Optional[int] = None, overflow_policy: str = OVERFLOW_BLOCK,
+                 spool_dir: Optional[str] = None):
         self.db = db_connection
-        self.buffer = EventCollectorBuffer(buffer_size, flush_interval)
+        self.buffer = EventCollectorBuffer(buffer_size, flush_interval, max_pending, overflow_policy)
+        self.spool_dir = spool_dir or settings.analytics_spool_dir
         self._buffer_flush_handler = None
-        
+        self._spool_pending = True
+        self.metrics = {
+            'events_stored': 0,
+            'store_failures': 0,
+            'events_spooled': 0,
+            'events_replayed': 0
+        }
+    
     async def start(self):
         """Start the event collector and buffer"""
         # Set the flush handler for the buffer
         self.buffer._flush_handler = self._store_events
+        await self._replay_spool()
         await self.buffer.start()
         logger.info("EventCollector started")
     
@@ -121,10 +241,10 @@ class EventCollector:
         await self.buffer.stop()
         logger.info("EventCollector stopped")
     
-    async def record_event(self, event_type: str, user_id: int, 
+    async def record_event(self, event_type: str, user_id: int,
                           metadata: Optional[Dict[str, Any]] = None,
-                          session_id: Optional[str] = None):
-        """Record an analytics event"""
+                          session_id: Optional[str] = None) -> bool:
+        """Record an analytics event; False if it was dropped because the buffer is full"""
         event = AnalyticsEvent(
             event_type=event_type,
             user_id=user_id,
@@ -133,27 +253,55 @@ class EventCollector:
             session_id=session_id
         )
         
-        await self.buffer.add_event(event)
-        logger.debug(f"Recorded analytics event: {event_type} for user {user_id}")
+        recorded = await self.buffer.add_event(event)
+        if recorded:
+            logger.debug(f"Recorded analytics event: {event_type} for user {user_id}")
+        return recorded
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get buffer, storage and spool metrics"""
+        return {**self.buffer.get_metrics(), **self.metrics}
     
     async def _store_events(self, events: List[AnalyticsEvent]):
-        """Store events in database"""
+        """Store events in database, spooling them to disk if storage keeps failing"""
         if not events:
             return
+        
+        if not await self._store_with_retry(events, STORE_RETRY_ATTEMPTS):
+            await asyncio.to_thread(self._write_spool, events)
+            return
+        
+        logger.info(f"Stored {len(events)} analytics events")
+        self._after_store(events)
+        
+        if self._spool_pending:
+            await self._replay_spool()
+    
+    def _after_store(self, events: List[AnalyticsEvent]):
+        self.metrics['events_stored'] += len(events)
+        # Feed the DAU/WAU/MAU sketches only with events that were stored
+        active_user_counter.record_events(
+            (event.user_id, event.timestamp) for event in events
+        )
+    
+    async def _store_with_retry(self, events: List[AnalyticsEvent], attempts: int) -> bool:
+        delay = STORE_RETRY_BASE_DELAY
+        for attempt in range(1, attempts + 1):
+            try:
+                await self._store_events_in_db(events)
+                return True
             
-        try:
-            await self._store_events_in_db(events)
-            logger.info(f"Stored {len(events)} analytics events")
-            
-        except Exception as e:
-            logger.error(f"Error storing analytics events: {e}")
-            # In production, you might want to implement retry logic here
+            except Exception as e:
+                self.metrics['store_failures'] += 1
+                logger.warning(f"Error storing {len(events)} analytics events (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        
+        return False
     
     async def _store_events_in_db(self, events: List[AnalyticsEvent]):
         """Store events in database using SQLAlchemy models"""
-        from sqlalchemy import insert
-        from database.models import AnalyticsEvent as AnalyticsEventModel
-        
         # Convert our AnalyticsEvent objects to database model format
         event_data = []
         for event in events:
@@ -165,10 +313,91 @@ class EventCollector:
                 'event_metadata': event.metadata
             })
         
-        # Batch insert events
-        if event_data:
-            stmt = insert(AnalyticsEventModel).values(event_data)
-            await self.db.execute(stmt)
+        if not event_data:
+            return
+        
+        if asyncio.iscoroutinefunction(getattr(self.db, 'execute', None)):
+            # Async driver: the event loop is not blocked by the insert
+            from sqlalchemy import insert
+            from database.models import AnalyticsEvent as AnalyticsEventModel
+            
+            try:
+                await self.db.execute(insert(AnalyticsEventModel).values(event_data))
+                await self.db.commit()
+            except Exception:
+                await self.db.rollback()
+                raise
+        else:
+            # Synchronous session: run the blocking insert on a worker thread
+            await asyncio.to_thread(self._insert_events_sync, event_data)
+    
+    def _insert_events_sync(self, event_data: List[Dict[str, Any]]):
+        from sqlalchemy import insert
+        from database.connection import SessionLocal
+        from database.models import AnalyticsEvent as AnalyticsEventModel
+        
+        db = self.db if self.db is not None else SessionLocal()
+        try:
+            # Batch insert events
+            db.execute(insert(AnalyticsEventModel).values(event_data))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if self.db is None:
+                db.close()
+    
+    def _write_spool(self, events: List[AnalyticsEvent]):
+        """Append a failed batch to a new spool file"""
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            name = f"events-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+            path = os.path.join(self.spool_dir, name)
+            
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as spool_file:
+                for event in events:
+                    spool_file.write(json.dumps(event.to_dict()) + "\n")
+            # Only complete files are ever replayed
+            os.replace(f"{path}.tmp", path)
+            
+            self._spool_pending = True
+            self.metrics['events_spooled'] += len(events)
+            logger.warning(f"Spooled {len(events)} analytics events to {path}")
+        
+        except Exception as e:
+            logger.error(f"Error spooling {len(events)} analytics events, events lost: {e}")
+    
+    async def _replay_spool(self):
+        """Store spooled batches, oldest first, stopping at the first failure"""
+        if not os.path.isdir(self.spool_dir):
+            self._spool_pending = False
+            return
+        
+        for name in sorted(f for f in os.listdir(self.spool_dir) if f.endswith('.jsonl')):
+            path = os.path.join(self.spool_dir, name)
+            events = await asyncio.to_thread(self._read_spool, path)
+            
+            if events and not await self._store_with_retry(events, 1):
+                return
+            
+            os.remove(path)
+            if events:
+                self.metrics['events_replayed'] += len(events)
+                self._after_store(events)
+                logger.info(f"Replayed {len(events)} spooled analytics events from {name}")
+        
+        self._spool_pending = False
+    
+    def _read_spool(self, path: str) -> List[AnalyticsEvent]:
+        events = []
+        with open(path, encoding='utf-8') as spool_file:
+            for line in spool_file:
+                try:
+                    events.append(AnalyticsEvent.from_dict(json.loads(line)))
+                except (ValueError, KeyError) as e:
+                    logger.error(f"Skipping corrupt spooled analytics event in {path}: {e}")
+        return events
 
 
 # Common event types for DianaBot
@@ -183,4 +412,4 @@ EVENT_TYPES = {
     'CONTENT_VIEWED': 'content_viewed',
     'TRIVIA_ANSWERED': 'trivia_answered',
     'AUCTION_PARTICIPATION': 'auction_participation'
-}
\ No newline at end of file
+}
@@ -9,8 +9,14 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from sqlalchemy.orm import Session
 
+from utils.cache_manager import cache_manager
+from .active_users import active_user_counter
+from .cohorts import CohortRetentionEngine
+
 logger = logging.getLogger(__name__)
 
+COHORT_CACHE_TTL = 600
+
 
 @dataclass
 class DashboardOverview:
@@ -24,6 +30,7 @@ class DashboardOverview:
     engagement_score: float
     active_alerts: int
     system_health: str  # "healthy", "warning", "critical"
+    active_users_error: float = 0.0  # Relative standard error of the active user counts
 
 
 @dataclass
@@ -40,9 +47,9 @@ class CohortAnalysis:
     """Cohort analysis data structure"""
     cohort_period: str
     cohort_size: int
-    retention_d1: float
-    retention_d7: float
-    retention_d30: float
+    retention_d1: Optional[float]  # None until the cohort's Dn day has closed
+    retention_d7: Optional[float]
+    retention_d30: Optional[float]
     avg_lifetime_value: float
 
 
@@ -56,17 +63,22 @@ class DashboardDataProvider:
         """Get overview statistics for dashboard"""
         logger.info("Getting dashboard overview statistics")
         
-        # Placeholder implementation - will integrate with actual analytics components
+        # Active users come from the HyperLogLog sketches; the rest is still placeholder data
+        dau = active_user_counter.dau(db=self.db)
+        wau = active_user_counter.wau(db=self.db)
+        mau = active_user_counter.mau(db=self.db)
+        
         return DashboardOverview(
-            active_users_today=150,
-            active_users_week=450,
-            active_users_month=1200,
+            active_users_today=dau['count'],
+            active_users_week=wau['count'],
+            active_users_month=mau['count'],
             total_revenue_today=25.50,
             total_revenue_month=850.75,
             conversion_rate=12.5,
             engagement_score=78.3,
             active_alerts=2,
-            system_health="healthy"
+            system_health="healthy",
+            active_users_error=mau['standard_error']
         )
     
     def get_funnel_data(self) -> List[FunnelData]:
@@ -105,24 +117,25 @@ class DashboardDataProvider:
         """Get cohort analysis data"""
         logger.info(f"Getting cohort analysis for {cohort_definition}")
         
-        # Placeholder implementation
+        cache_key = f"analytics:cohorts:{cohort_definition}"
+        cohorts = cache_manager.get(cache_key)
+        if cohorts is None:
+            cohorts = CohortRetentionEngine(self.db).get_cohorts(cohort_definition)
+            cache_manager.set(cache_key, cohorts, COHORT_CACHE_TTL)
+        
+        def as_percentage(rate: Optional[float]) -> Optional[float]:
+            return round(rate * 100, 1) if rate is not None else None
+        
         return [
             CohortAnalysis(
-                cohort_period="2024-01",
-                cohort_size=200,
-                retention_d1=85.0,
-                retention_d7=65.0,
-                retention_d30=45.0,
-                avg_lifetime_value=25.0
-            ),
-            CohortAnalysis(
-                cohort_period="2024-02",
-                cohort_size=180,
-                retention_d1=82.0,
-                retention_d7=62.0,
-                retention_d30=42.0,
-                avg_lifetime_value=23.5
+                cohort_period=cohort['cohort_period'],
+                cohort_size=cohort['cohort_size'],
+                retention_d1=as_percentage(cohort['retention'][1]),
+                retention_d7=as_percentage(cohort['retention'][7]),
+                retention_d30=as_percentage(cohort['retention'][30]),
+                avg_lifetime_value=round(cohort['avg_lifetime_value'], 2)
             )
+            for cohort in cohorts
         ]
     
     def get_user_segments(self) -> Dict[str, Any]:
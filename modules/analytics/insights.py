@@ -7,6 +7,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
+import numpy as np
 from sqlalchemy import func, and_, or_, text
 from sqlalchemy.orm import Session
 
@@ -45,6 +46,15 @@ class HighValueUser:
     recommended_actions: List[str]
 
 
+@dataclass
+class UserFeatureMatrix:
+    """Per-user event counts, one row per user and one column per event type"""
+    user_ids: np.ndarray
+    event_types: List[str]
+    counts: np.ndarray
+    is_subscribed: np.ndarray
+
+
 @dataclass
 class ContentOptimization:
     """Content optimization suggestion"""
@@ -85,32 +95,39 @@ class InsightEngine:
         """Identify users with high conversion potential"""
         logger.info(f"Identifying high-value users for last {days_back} days")
         
-        high_value_users = []
-        
-        # Get user engagement data
-        user_engagement = self._get_user_engagement_data(days_back)
+        features = self._build_feature_matrix(days_back)
+        if not len(features.user_ids):
+            return []
         
-        # Calculate conversion probability for each user
-        for user_id, engagement_data in user_engagement.items():
-            conversion_prob = self._calculate_conversion_probability(user_id, engagement_data)
-            potential_ltv = self._calculate_potential_ltv(engagement_data)
-            
-            # Only include users with high conversion probability
-            if conversion_prob > 0.7:
-                recommended_actions = self._get_recommended_actions(user_id, engagement_data)
-                
-                high_value_users.append(HighValueUser(
-                    user_id=user_id,
-                    engagement_score=engagement_data.get('engagement_score', 0),
-                    conversion_probability=conversion_prob,
-                    potential_lifetime_value=potential_ltv,
-                    recommended_actions=recommended_actions
-                ))
+        engagement_scores = self._calculate_engagement_scores(features)
+        event_diversity = (features.counts > 0).sum(axis=1)
+        conversion_probs = self._calculate_conversion_probability(
+            engagement_scores, event_diversity, features.is_subscribed
+        )
+        potential_ltvs = self._calculate_potential_ltv(engagement_scores)
         
-        # Sort by conversion probability (highest first)
-        high_value_users.sort(key=lambda x: x.conversion_probability, reverse=True)
+        # Only include users with high conversion probability, highest first
+        candidates = np.flatnonzero(conversion_probs > 0.7)
+        top = candidates[np.argsort(-conversion_probs[candidates], kind='stable')][:20]  # Return top 20
         
-        return high_value_users[:20]  # Return top 20
+        high_value_users = []
+        for row in top:
+            event_types = {
+                features.event_types[column]: int(features.counts[row, column])
+                for column in np.flatnonzero(features.counts[row])
+            }
+            
+            high_value_users.append(HighValueUser(
+                user_id=int(features.user_ids[row]),
+                engagement_score=float(engagement_scores[row]),
+                conversion_probability=float(conversion_probs[row]),
+                potential_lifetime_value=float(potential_ltvs[row]),
+                recommended_actions=self._get_recommended_actions(
+                    int(features.user_ids[row]), {'event_types': event_types}
+                )
+            ))
+        
+        return high_value_users
     
     def suggest_content_optimizations(self, days_back: int = 30) -> List[ContentOptimization]:
         """Suggest content optimizations based on performance data"""
@@ -254,48 +271,68 @@ class InsightEngine:
         
         return drop_off_points
     
-    def _get_user_engagement_data(self, days_back: int) -> Dict[int, Dict[str, Any]]:
-        """Get engagement data for all users"""
-        from database.models import AnalyticsEvent
+    def _build_feature_matrix(self, days_back: int) -> UserFeatureMatrix:
+        """
+        Load per-user event counts and subscription status as arrays
+        
+        One grouped query returns the (user, event type) counts, which are
+        scattered into a users x event types matrix; active subscriptions
+        are joined in with a second, bulk query.
         
-        user_engagement = {}
+        Args:
+            days_back: Days of activity to include
+        
+        Returns:
+            UserFeatureMatrix with users sorted by ID
+        """
+        from database.models import AnalyticsEvent, Subscription
         
-        # Get user activity counts
         user_activity = self.db.query(
             AnalyticsEvent.user_id,
             AnalyticsEvent.event_type,
             func.count(AnalyticsEvent.id).label('count')
         ).filter(
-            AnalyticsEvent.timestamp >= datetime.now() - timedelta(days=days_back)
+            and_(
+                AnalyticsEvent.timestamp >= datetime.now() - timedelta(days=days_back),
+                AnalyticsEvent.user_id.isnot(None)
+            )
         ).group_by(AnalyticsEvent.user_id, AnalyticsEvent.event_type).all()
         
-        # Aggregate by user
-        for user_id, event_type, count in user_activity:
-            if user_id not in user_engagement:
-                user_engagement[user_id] = {
-                    'total_events': 0,
-                    'event_types': {},
-                    'engagement_score': 0
-                }
-            
-            user_engagement[user_id]['total_events'] += count
-            user_engagement[user_id]['event_types'][event_type] = count
-        
-        # Calculate engagement scores
-        for user_id, data in user_engagement.items():
-            # Simple scoring based on event diversity and frequency
-            event_diversity = len(data['event_types'])
-            total_events = data['total_events']
-            
-            # Weight different event types
-            weighted_score = 0
-            for event_type, count in data['event_types'].items():
-                weight = self._get_event_weight(event_type)
-                weighted_score += count * weight
-            
-            data['engagement_score'] = weighted_score
+        if not user_activity:
+            return UserFeatureMatrix(
+                user_ids=np.array([], dtype=np.int64),
+                event_types=[],
+                counts=np.zeros((0, 0)),
+                is_subscribed=np.array([], dtype=bool)
+            )
         
-        return user_engagement
+        user_ids, rows = np.unique(
+            np.array([user_id for user_id, _, _ in user_activity], dtype=np.int64), return_inverse=True
+        )
+        event_types, columns = np.unique(
+            np.array([event_type for _, event_type, _ in user_activity], dtype=object), return_inverse=True
+        )
+        
+        counts = np.zeros((len(user_ids), len(event_types)))
+        counts[rows, columns] = [count for _, _, count in user_activity]
+        
+        subscribed_ids = np.array([
+            user_id for (user_id,) in self.db.query(Subscription.user_id).filter(
+                Subscription.status == 'active'
+            ).distinct()
+        ], dtype=np.int64)
+        
+        return UserFeatureMatrix(
+            user_ids=user_ids,
+            event_types=[str(event_type) for event_type in event_types],
+            counts=counts,
+            is_subscribed=np.isin(user_ids, subscribed_ids)
+        )
+    
+    def _calculate_engagement_scores(self, features: UserFeatureMatrix) -> np.ndarray:
+        """Weighted event count of every user"""
+        weights = np.array([self._get_event_weight(event_type) for event_type in features.event_types])
+        return features.counts @ weights
     
     def _get_event_weight(self, event_type: str) -> float:
         """Get weight for event type in engagement scoring"""
@@ -314,40 +351,23 @@ class InsightEngine:
         
         return weights.get(event_type, 1.0)
     
-    def _calculate_conversion_probability(self, user_id: int, engagement_data: Dict[str, Any]) -> float:
-        """Calculate probability that user will convert to VIP"""
-        from database.models import Subscription
-        
-        # Check if user is already VIP
-        existing_subscription = self.db.query(Subscription).filter(
-            and_(
-                Subscription.user_id == user_id,
-                Subscription.status == 'active'
-            )
-        ).first()
-        
-        if existing_subscription:
-            return 1.0  # Already converted
-        
-        # Calculate probability based on engagement
-        engagement_score = engagement_data.get('engagement_score', 0)
-        event_diversity = len(engagement_data.get('event_types', {}))
-        
+    def _calculate_conversion_probability(self, engagement_scores: np.ndarray, event_diversity: np.ndarray,
+                                          is_subscribed: np.ndarray) -> np.ndarray:
+        """Calculate probability that each user will convert to VIP"""
         # Simple probability calculation
         # In production, you'd use machine learning
-        base_probability = min(engagement_score / 100, 0.9)  # Cap at 90%
-        diversity_boost = min(event_diversity / 10, 0.2)  # Max 20% boost
+        base_probability = np.minimum(engagement_scores / 100, 0.9)  # Cap at 90%
+        diversity_boost = np.minimum(event_diversity / 10, 0.2)  # Max 20% boost
         
-        return base_probability + diversity_boost
+        # Users with an active subscription have already converted
+        return np.where(is_subscribed, 1.0, base_probability + diversity_boost)
     
-    def _calculate_potential_ltv(self, engagement_data: Dict[str, Any]) -> float:
-        """Calculate potential lifetime value"""
-        engagement_score = engagement_data.get('engagement_score', 0)
-        
+    def _calculate_potential_ltv(self, engagement_scores: np.ndarray) -> np.ndarray:
+        """Calculate potential lifetime value of each user"""
         # Simple LTV estimation based on engagement
         # In production, you'd use more sophisticated models
         base_ltv = 10.0  # Base LTV for average user
-        engagement_multiplier = engagement_score / 50  # Normalize
+        engagement_multiplier = engagement_scores / 50  # Normalize
         
         return base_ltv * engagement_multiplier
     
@@ -0,0 +1,180 @@
+"""
+Daily Metrics Rollup for DianaBot Analytics System
+Aggregates each closed day of raw analytics events into DailyMetrics
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Event type -> DailyMetrics counter column
+EVENT_COUNTERS = {
+    'reaction_added': 'total_reactions',
+    'mission_completed': 'total_missions_completed',
+    'achievement_unlocked': 'total_achievements_unlocked',
+    'content_viewed': 'total_content_views',
+    'trivia_answered': 'total_trivia_answered',
+    'auction_participation': 'total_auction_participations',
+    'message_sent': 'total_messages'
+}
+
+# Closed days are re-aggregated this far back to pick up late events
+LATE_EVENT_LOOKBACK_DAYS = 1
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Get the [start, end) datetimes of a day"""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def compute_revenue(db: Session, start: datetime, end: datetime) -> float:
+    """Real-money revenue from completed purchases and VIP subscriptions in [start, end)"""
+    from database.models import UserPurchase, VIPSubscription
+    
+    purchases = db.query(func.sum(UserPurchase.amount_paid)).filter(
+        and_(
+            UserPurchase.purchase_date >= start,
+            UserPurchase.purchase_date < end,
+            UserPurchase.status == 'completed'
+        )
+    ).scalar()
+    
+    subscriptions = db.query(func.sum(VIPSubscription.amount_paid)).filter(
+        and_(
+            VIPSubscription.start_date >= start,
+            VIPSubscription.start_date < end
+        )
+    ).scalar()
+    
+    return float(purchases or 0) + float(subscriptions or 0)
+
+
+class DailyMetricsRollup:
+    """Builds one DailyMetrics row per closed day"""
+    
+    def __init__(self, db_session: Session):
+        self.db = db_session
+    
+    def rollup_day(self, day: date) -> Dict[str, Any]:
+        """
+        Aggregate a single day into DailyMetrics
+        
+        Safe to re-run, even concurrently: the row is upserted on its
+        unique date, so it is overwritten, never duplicated.
+        
+        Args:
+            day: Day to aggregate
+        
+        Returns:
+            Dict of the stored column values
+        """
+        from database.models import AnalyticsEvent, DailyMetrics, Transaction, User
+        
+        start, end = day_bounds(day)
+        in_day = and_(AnalyticsEvent.timestamp >= start, AnalyticsEvent.timestamp < end)
+        
+        events_by_type = dict(
+            self.db.query(
+                AnalyticsEvent.event_type,
+                func.count(AnalyticsEvent.id)
+            ).filter(in_day).group_by(AnalyticsEvent.event_type).all()
+        )
+        
+        active_users = self.db.query(
+            func.count(func.distinct(AnalyticsEvent.user_id))
+        ).filter(in_day).scalar() or 0
+        
+        besitos = dict(
+            self.db.query(
+                Transaction.transaction_type,
+                func.sum(Transaction.amount)
+            ).filter(
+                and_(Transaction.created_at >= start, Transaction.created_at < end)
+            ).group_by(Transaction.transaction_type).all()
+        )
+        
+        new_users = self.db.query(func.count(User.id)).filter(
+            and_(User.created_at >= start, User.created_at < end)
+        ).scalar() or 0
+        
+        total_users = self.db.query(func.count(User.id)).filter(
+            User.created_at < end
+        ).scalar() or 0
+        
+        metrics = {
+            'total_users': total_users,
+            'active_users': active_users,
+            'new_users': new_users,
+            'events_by_type': events_by_type,
+            'total_besitos_earned': int(besitos.get('earn') or 0),
+            'total_besitos_spent': int(besitos.get('spend') or 0),
+            'total_revenue': compute_revenue(self.db, start, end)
+        }
+        for event_type, column in EVENT_COUNTERS.items():
+            metrics[column] = events_by_type.get(event_type, 0)
+        
+        self.db.execute(
+            insert(DailyMetrics).values(date=day, **metrics).on_conflict_do_update(
+                index_elements=[DailyMetrics.date],
+                set_={**metrics, 'updated_at': func.now()}
+            )
+        )
+        self.db.commit()
+        
+        logger.info(f"Rolled up daily metrics for {day}: {active_users} active users")
+        return metrics
+    
+    def rollup_pending(self, today: Optional[date] = None) -> List[date]:
+        """
+        Roll up every closed day that has no rollup yet, plus the last few
+        closed days to absorb late events
+        
+        Args:
+            today: Current day (defaults to today); it is never rolled up
+        
+        Returns:
+            List of days rolled up
+        """
+        from database.models import AnalyticsEvent, DailyMetrics
+        
+        today = today or date.today()
+        last_closed = today - timedelta(days=1)
+        
+        last_rolled = self.db.query(func.max(DailyMetrics.date)).scalar()
+        if last_rolled:
+            first_day = min(last_rolled + timedelta(days=1), today - timedelta(days=LATE_EVENT_LOOKBACK_DAYS))
+        else:
+            first_event = self.db.query(func.min(AnalyticsEvent.timestamp)).scalar()
+            if not first_event:
+                return []
+            first_day = first_event.date()
+        
+        rolled = []
+        day = first_day
+        while day <= last_closed:
+            try:
+                self.rollup_day(day)
+                rolled.append(day)
+            except Exception as e:
+                logger.error(f"Error rolling up daily metrics for {day}: {e}")
+                self.db.rollback()
+                break
+            day += timedelta(days=1)
+        
+        return rolled
+    
+    def get_rollups(self, first_day: date, last_day: date) -> Dict[date, object]:
+        """Get stored rollups for [first_day, last_day] keyed by date"""
+        from database.models import DailyMetrics
+        
+        rows = self.db.query(DailyMetrics).filter(
+            and_(DailyMetrics.date >= first_day, DailyMetrics.date <= last_day)
+        ).all()
+        
+        return {row.date: row for row in rows}
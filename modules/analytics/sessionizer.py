@@ -0,0 +1,252 @@
+"""
+Sessionizer for DianaBot Analytics System
+Splits the analytics event stream into user sessions and stores UserSessionMetrics
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from sqlalchemy import func, and_
+from sqlalchemy.orm import Session
+
+from database.connection import get_redis
+from utils.locks import DistributedLock
+
+logger = logging.getLogger(__name__)
+
+# A user's session ends after this much inactivity
+SESSION_GAP = timedelta(minutes=30)
+
+SESSIONIZER_BATCH_SIZE = 5000
+
+# Events are only consumed once they have been stored for this long; ids are
+# handed out at insert time, so a lower id can still be committed after a
+# higher one and the id cursor would otherwise skip it
+SESSION_SETTLE_DELAY = timedelta(seconds=30)
+
+# Checkpoint: id of the last consumed event and the sessions still open
+CHECKPOINT_EVENT_KEY = "analytics:sessionizer:last_event_id"
+CHECKPOINT_OPEN_KEY = "analytics:sessionizer:open_sessions"
+
+# Only one sessionizer may advance the checkpoint at a time
+SESSIONIZER_LOCK_NAME = "analytics_sessionizer"
+SESSIONIZER_LOCK_LEASE = 60
+
+# Event type -> UserSessionMetrics counter column
+SESSION_COUNTERS = {
+    'message_sent': 'messages_sent',
+    'reaction_added': 'reactions_added',
+    'mission_completed': 'missions_completed',
+    'achievement_unlocked': 'achievements_unlocked',
+    'content_viewed': 'content_views',
+    'trivia_answered': 'trivia_answered'
+}
+
+
+def _new_session(user_id: int, timestamp: datetime) -> Dict[str, Any]:
+    session = {
+        'user_id': user_id,
+        # Deterministic, so re-emitting a session after a crash is detectable
+        'session_id': f"{user_id}-{int(timestamp.timestamp())}",
+        'start_time': timestamp,
+        'end_time': timestamp,
+        'besitos_earned': 0
+    }
+    for column in SESSION_COUNTERS.values():
+        session[column] = 0
+    return session
+
+
+def _encode_session(session: Dict[str, Any]) -> str:
+    return json.dumps({
+        **session,
+        'start_time': session['start_time'].isoformat(),
+        'end_time': session['end_time'].isoformat()
+    })
+
+
+def _decode_session(raw: str) -> Dict[str, Any]:
+    session = json.loads(raw)
+    session['start_time'] = datetime.fromisoformat(session['start_time'])
+    session['end_time'] = datetime.fromisoformat(session['end_time'])
+    return session
+
+
+def average_session_duration(db: Session, start: datetime, end: datetime) -> float:
+    """Average duration in seconds of the sessions that started in [start, end)"""
+    from database.models import UserSessionMetrics
+    
+    result = db.query(func.avg(UserSessionMetrics.session_duration)).filter(
+        and_(
+            UserSessionMetrics.start_time >= start,
+            UserSessionMetrics.start_time < end
+        )
+    ).scalar()
+    
+    return float(result or 0.0)
+
+
+class Sessionizer:
+    """
+    Streaming sessionizer over analytics_events
+    
+    Events are consumed in id order from the last checkpoint, stopping at
+    the first one stored less than SESSION_SETTLE_DELAY ago. Only the open
+    session of each recently active user is kept; a session is closed and
+    written to UserSessionMetrics once its user has been idle for SESSION_GAP.
+    """
+    
+    def __init__(self, db_session: Session):
+        self.db = db_session
+        self.redis_client = get_redis()
+        self.lock = DistributedLock()
+    
+    def run(self, batch_size: int = SESSIONIZER_BATCH_SIZE, max_batches: int = 20) -> Dict[str, int]:
+        """
+        Consume new events and store every session that has closed
+        
+        Runs under a distributed lock; when another run holds it this one
+        returns immediately instead of consuming the same events twice.
+        
+        Args:
+            batch_size: Events read per batch
+            max_batches: Upper bound of batches per run, so a large backlog is
+                worked off over several runs
+        
+        Returns:
+            Dict with the number of events consumed and sessions stored
+        """
+        stats = {'events': 0, 'sessions': 0}
+        
+        lock_identifier = self.lock.acquire_lock(
+            SESSIONIZER_LOCK_NAME, timeout=SESSIONIZER_LOCK_LEASE, wait_timeout=0, renew=True
+        )
+        if not lock_identifier:
+            logger.info("Sessionizer already running elsewhere, skipping this run")
+            return stats
+        
+        try:
+            for _ in range(max_batches):
+                consumed, stored = self._run_batch(batch_size)
+                stats['events'] += consumed
+                stats['sessions'] += stored
+                if consumed < batch_size:
+                    break
+        finally:
+            self.lock.release_lock(SESSIONIZER_LOCK_NAME, lock_identifier)
+        
+        if stats['events'] or stats['sessions']:
+            logger.info(f"Sessionizer consumed {stats['events']} events, stored {stats['sessions']} sessions")
+        return stats
+    
+    def _run_batch(self, batch_size: int):
+        from database.models import AnalyticsEvent
+        
+        last_event_id = int(self.redis_client.get(CHECKPOINT_EVENT_KEY) or 0)
+        
+        # Stop before the first unsettled event so none behind it is skipped
+        settled_before = datetime.now(timezone.utc) - SESSION_SETTLE_DELAY
+        first_unsettled = self.db.query(func.min(AnalyticsEvent.id)).filter(
+            AnalyticsEvent.id > last_event_id,
+            AnalyticsEvent.created_at >= settled_before
+        ).scalar()
+        
+        conditions = [AnalyticsEvent.id > last_event_id]
+        if first_unsettled is not None:
+            conditions.append(AnalyticsEvent.id < first_unsettled)
+        
+        events = self.db.query(
+            AnalyticsEvent.id,
+            AnalyticsEvent.user_id,
+            AnalyticsEvent.event_type,
+            AnalyticsEvent.timestamp,
+            AnalyticsEvent.event_metadata
+        ).filter(*conditions).order_by(AnalyticsEvent.id).limit(batch_size).all()
+        
+        open_sessions = {
+            int(user_id): _decode_session(raw)
+            for user_id, raw in self.redis_client.hgetall(CHECKPOINT_OPEN_KEY).items()
+        }
+        touched_users = set()
+        closed: List[Dict[str, Any]] = []
+        
+        for event_id, user_id, event_type, timestamp, metadata in events:
+            last_event_id = event_id
+            touched_users.add(user_id)
+            session = open_sessions.get(user_id)
+            
+            if session and timestamp - session['end_time'] > SESSION_GAP:
+                closed.append(session)
+                session = None
+            if session is None:
+                session = open_sessions[user_id] = _new_session(user_id, timestamp)
+            
+            # Events may arrive slightly out of order
+            session['start_time'] = min(session['start_time'], timestamp)
+            session['end_time'] = max(session['end_time'], timestamp)
+            if event_type in SESSION_COUNTERS:
+                session[SESSION_COUNTERS[event_type]] += 1
+            elif event_type == 'besitos_earned':
+                session['besitos_earned'] += int((metadata or {}).get('amount') or 0)
+        
+        # Close the sessions of users who have gone idle
+        for user_id, session in list(open_sessions.items()):
+            now = datetime.now(session['end_time'].tzinfo)
+            if now - session['end_time'] > SESSION_GAP:
+                closed.append(session)
+                del open_sessions[user_id]
+        
+        stored = self._store_sessions(closed)
+        self._save_checkpoint(
+            last_event_id,
+            {user_id: open_sessions[user_id] for user_id in touched_users if user_id in open_sessions},
+            {session['user_id'] for session in closed} - set(open_sessions)
+        )
+        
+        return len(events), stored
+    
+    def _store_sessions(self, sessions: List[Dict[str, Any]]) -> int:
+        """Bulk insert closed sessions, skipping any stored before a crash"""
+        from database.models import UserSessionMetrics
+        
+        if not sessions:
+            return 0
+        
+        existing = {
+            session_id for (session_id,) in self.db.query(UserSessionMetrics.session_id).filter(
+                UserSessionMetrics.session_id.in_([session['session_id'] for session in sessions])
+            )
+        }
+        
+        rows = [
+            {
+                **session,
+                'session_duration': int((session['end_time'] - session['start_time']).total_seconds())
+            }
+            for session in sessions
+            if session['session_id'] not in existing
+        ]
+        
+        try:
+            if rows:
+                self.db.bulk_insert_mappings(UserSessionMetrics, rows)
+            self.db.commit()
+            return len(rows)
+        
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error storing user sessions: {e}")
+            raise
+    
+    def _save_checkpoint(self, last_event_id: int, updated: Dict[int, Dict[str, Any]], finished_users):
+        """Persist the stream position and the changed open sessions once the sessions are committed"""
+        pipe = self.redis_client.pipeline(transaction=True)
+        if finished_users:
+            pipe.hdel(CHECKPOINT_OPEN_KEY, *finished_users)
+        if updated:
+            pipe.hset(CHECKPOINT_OPEN_KEY, mapping={
+                user_id: _encode_session(session) for user_id, session in updated.items()
+            })
+        pipe.set(CHECKPOINT_EVENT_KEY, last_event_id)
+        pipe.execute()
@@ -10,9 +10,10 @@ import logging
 
 from sqlalchemy.orm import Session
 from database.models import (
-    User, UserBalance, UserInventory, UserAchievement, 
+    User, UserBalance, UserAchievement, 
     ExperienceRequirement, VIPSubscription
 )
+from modules.gamification.inventory import inventory_service
 
 logger = logging.getLogger(__name__)
 
@@ -185,13 +186,14 @@ class CompositeValidator:
         if not item_ids:
             return True, {'items_required': False}
         
-        # Verificar items en inventario
-        user_items = self.db.query(UserInventory).filter(
-            UserInventory.user_id == user_id,
-            UserInventory.item_id.in_(item_ids)
-        ).all()
-        
-        owned_item_ids = [item.item_id for item in user_items]
+        # Verificar items en inventario (mapa cacheado + catálogo en memoria)
+        inventory_map = inventory_service.get_inventory_map(user_id)
+        catalog = inventory_service.get_item_catalog()
+        owned_item_ids = [
+            catalog[item_key]["id"]
+            for item_key, quantity in inventory_map.items()
+            if quantity > 0 and item_key in catalog and catalog[item_key]["id"] in item_ids
+        ]
         
         if all_required:
             is_met = set(item_ids).issubset(set(owned_item_ids))
@@ -8,18 +8,61 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 from sqlalchemy.orm import Session
 
-from database.connection import get_db
+from database.connection import get_db, get_redis
 from database.models import Achievement, UserAchievement, User, UserBalance, Item, UserInventory
 from core.event_bus import event_bus
+from modules.gamification.inventory import InventoryService
+from utils.cache_manager import cache_manager
 
 logger = logging.getLogger(__name__)
 
+# Apply counter updates only while the progress hash exists, so a hash that
+# expires between the check and the update is never recreated partially
+# KEYS[1]: achievements:progress:{user_id}
+# ARGV: ttl, then (op, field, value) triples; op is 'incr', 'set' or 'max'
+# Returns nil if the hash must be seeded first, otherwise the new value of
+# each updated field
+UPDATE_PROGRESS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local values = {}
+for i = 2, #ARGV, 3 do
+    local op, field, value = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2])
+    if op == 'incr' then
+        values[#values + 1] = redis.call('HINCRBY', KEYS[1], field, value)
+    elseif op == 'set' then
+        redis.call('HSET', KEYS[1], field, value)
+        values[#values + 1] = value
+    else
+        local current = tonumber(redis.call('HGET', KEYS[1], field))
+        if current == nil or current < value then
+            redis.call('HSET', KEYS[1], field, value)
+            current = value
+        end
+        values[#values + 1] = current
+    end
+end
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]))
+end
+return values
+"""
+
 
 class AchievementService:
     """Service for managing achievements and user achievement progress"""
     
+    INDEX_CACHE_KEY = "achievements:index"
+    INDEX_CACHE_TTL = 300  # 5 minutes
+    # Counters are re-seeded from the database once a day to bound drift from
+    # balance/inventory changes that bypass the event bus
+    PROGRESS_TTL = 86400
+    
     def __init__(self):
         self.db: Session = next(get_db())
+        self.redis = get_redis()
+        self._progress_script = self.redis.register_script(UPDATE_PROGRESS_SCRIPT)
     
     def check_achievement_unlock(self, user_id: int, achievement_key: str) -> bool:
         """
@@ -53,7 +96,7 @@ class AchievementService:
                 return False
             
             # Check unlock conditions
-            user_progress = self._get_user_progress(user_id)
+            user_progress = self.get_progress_counters(user_id)
             can_unlock = self._check_conditions(achievement.unlock_conditions, user_progress)
             
             if can_unlock:
@@ -94,6 +137,7 @@ class AchievementService:
             
             if existing:
                 logger.info(f"User {user_id} already has achievement {achievement_key}")
+                self._mark_unlocked(user_id, achievement.id)
                 return True
             
             # Create user achievement
@@ -105,10 +149,15 @@ class AchievementService:
             self.db.add(user_achievement)
             
             # Award rewards
-            self._award_rewards(user_id, achievement)
+            new_item = self._award_rewards(user_id, achievement)
             
             self.db.commit()
             
+            if achievement.reward_item_id:
+                InventoryService.invalidate_inventory_map(user_id)
+            
+            self._record_unlock(user_id, achievement, new_item)
+            
             # Publish event
             event_bus.publish("gamification.achievement_unlocked", {
                 "user_id": user_id,
@@ -192,7 +241,7 @@ class AchievementService:
                 }
             
             # Calculate current progress
-            user_progress = self._get_user_progress(user_id)
+            user_progress = self.get_progress_counters(user_id)
             conditions = achievement.unlock_conditions
             
             progress_data = {}
@@ -246,6 +295,8 @@ class AchievementService:
         """
         Check all achievements for a user and unlock any that are ready
         
+        Evaluated in memory against the user's progress counters.
+        
         Args:
             user_id: User ID
             
@@ -253,14 +304,10 @@ class AchievementService:
             list: List of achievement keys that were unlocked
         """
         try:
-            unlocked_achievements = []
-            
-            # Get all achievements
-            all_achievements = self.db.query(Achievement).all()
-            
-            for achievement in all_achievements:
-                if self.check_achievement_unlock(user_id, achievement.achievement_key):
-                    unlocked_achievements.append(achievement.achievement_key)
+            index = self._get_achievement_index()
+            unlocked_achievements = self._evaluate_achievements(
+                user_id, list(index["achievements"].values())
+            )
             
             logger.info(f"Checked all achievements for user {user_id}, unlocked {len(unlocked_achievements)}")
             return unlocked_achievements
@@ -269,6 +316,240 @@ class AchievementService:
             logger.error(f"Failed to check all achievements for user {user_id}: {e}")
             return []
     
+    def process_event(self, event: Dict[str, Any]) -> List[str]:
+        """
+        Apply an event to the user's progress counters and re-evaluate only
+        the achievements that depend on the counters it changed
+        
+        Args:
+            event: Event from the event bus
+            
+        Returns:
+            list: List of achievement keys that were unlocked
+        """
+        event_data = event.get('data', {})
+        user_id = event_data.get('user_id')
+        
+        if not user_id:
+            return []
+        
+        try:
+            changed_counters = self._apply_event(user_id, event['type'], event_data)
+            if not changed_counters:
+                return []
+            
+            index = self._get_achievement_index()
+            affected = {}
+            for counter in changed_counters:
+                for achievement_id in index["by_counter"].get(counter, []):
+                    affected[achievement_id] = index["achievements"][achievement_id]
+            
+            if not affected:
+                return []
+            
+            return self._evaluate_achievements(user_id, list(affected.values()))
+            
+        except Exception as e:
+            logger.error(f"Failed to process achievement event {event.get('type')} for user {user_id}: {e}")
+            return []
+    
+    def get_progress_counters(self, user_id: int) -> Dict[str, int]:
+        """
+        Get the user's achievement progress counters, seeding them from the
+        database on first use
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            dict: Counter name -> value
+        """
+        counters = self.redis.hgetall(self._progress_key(user_id))
+        
+        if not counters:
+            return self._seed_progress(user_id)
+        
+        return {key: int(value) for key, value in counters.items()}
+    
+    def _apply_event(self, user_id: int, event_type: str, event_data: Dict[str, Any]) -> List[str]:
+        """
+        Translate an event into counter updates
+        
+        Returns:
+            list: Names of the counters that changed
+        """
+        updates = []
+        changed = []
+        
+        if event_type == 'gamification.besitos_earned':
+            updates = [
+                ('incr', "lifetime_besitos", event_data.get('amount', 0)),
+                ('set', "besitos", event_data.get('new_balance', 0))
+            ]
+            changed = ["lifetime_besitos", "besitos"]
+        
+        elif event_type == 'gamification.besitos_spent':
+            updates = [('set', "besitos", event_data.get('new_balance', 0))]
+            changed = ["besitos"]
+        
+        elif event_type == 'gamification.item_acquired':
+            # Only a brand new inventory row changes the distinct item count
+            if event_data.get('new_quantity') == event_data.get('quantity'):
+                updates = [('incr', "items_owned", 1)]
+                changed = ["items_owned"]
+        
+        elif event_type == 'gamification.item_used':
+            if event_data.get('remaining_quantity') == 0:
+                updates = [('incr', "items_owned", -1)]
+                changed = ["items_owned"]
+        
+        elif event_type == 'narrative.fragment_completed':
+            updates = [('incr', "fragments_completed", 1)]
+            changed = ["fragments_completed", "narrative_level"]
+        
+        elif event_type == 'narrative.level_completed':
+            level_number = event_data.get('level_number')
+            if level_number:
+                updates = [('max', "narrative_level", int(level_number))]
+                changed = ["narrative_level"]
+        
+        elif event_type == 'gamification.mission_completed':
+            updates = [('incr', "missions_completed", 1)]
+            changed = ["missions_completed"]
+            if event_data.get('mission_type') == "daily":
+                updates.append(('incr', "daily_missions_completed", 1))
+                changed.append("daily_missions_completed")
+        
+        if not updates:
+            return []
+        
+        values = self._update_progress(user_id, updates)
+        if values is None:
+            # Seeding reads the committed state, which already includes this event
+            self._seed_progress(user_id)
+            return list(self._get_achievement_index()["by_counter"].keys())
+        
+        if event_type == 'narrative.fragment_completed':
+            self._update_progress(user_id, [('max', "narrative_level", self._level_from_fragments(values[0]))])
+        
+        return changed
+    
+    def _update_progress(self, user_id: int, updates: List[tuple]) -> Optional[List[int]]:
+        """
+        Atomically apply (op, counter, value) updates to cached progress counters
+        
+        Returns:
+            list: New value of each counter, or None if the counters are not cached
+        """
+        args = [self.PROGRESS_TTL]
+        for op, counter, value in updates:
+            args.extend([op, counter, value])
+        
+        return self._progress_script(keys=[self._progress_key(user_id)], args=args)
+    
+    def _evaluate_achievements(self, user_id: int, achievements: List[Dict[str, Any]]) -> List[str]:
+        """Evaluate achievements in memory and unlock the ones that are met"""
+        progress = self.get_progress_counters(user_id)
+        unlocked_ids = self.redis.smembers(self._unlocked_key(user_id))
+        
+        unlocked = []
+        for achievement in achievements:
+            if str(achievement["id"]) in unlocked_ids:
+                continue
+            
+            if self._check_conditions(achievement["unlock_conditions"], progress):
+                if self.unlock_achievement(user_id, achievement["achievement_key"]):
+                    unlocked.append(achievement["achievement_key"])
+        
+        return unlocked
+    
+    def _get_achievement_index(self) -> Dict[str, Any]:
+        """
+        Get the achievement catalog and the counter -> achievements index
+        
+        Returns:
+            dict: {"achievements": {id: data}, "by_counter": {counter: [id, ...]}}
+        """
+        index = cache_manager.get(self.INDEX_CACHE_KEY)
+        
+        if index is None:
+            achievements = {}
+            by_counter: Dict[str, List[int]] = {}
+            
+            for achievement in self.db.query(Achievement).all():
+                achievements[achievement.id] = {
+                    "id": achievement.id,
+                    "achievement_key": achievement.achievement_key,
+                    "unlock_conditions": achievement.unlock_conditions or {}
+                }
+                for counter in (achievement.unlock_conditions or {}):
+                    by_counter.setdefault(counter, []).append(achievement.id)
+            
+            index = {"achievements": achievements, "by_counter": by_counter}
+            cache_manager.set(self.INDEX_CACHE_KEY, index, self.INDEX_CACHE_TTL)
+        
+        return index
+    
+    def _seed_progress(self, user_id: int) -> Dict[str, int]:
+        """Seed progress counters and the unlocked set from the database"""
+        progress = {key: int(value) for key, value in self._get_user_progress(user_id).items()}
+        unlocked_ids = [ua.achievement_id for ua in self.db.query(UserAchievement.achievement_id).filter(
+            UserAchievement.user_id == user_id
+        ).all()]
+        
+        pipe = self.redis.pipeline()
+        progress_key = self._progress_key(user_id)
+        unlocked_key = self._unlocked_key(user_id)
+        pipe.delete(progress_key, unlocked_key)
+        if progress:
+            pipe.hset(progress_key, mapping=progress)
+            pipe.expire(progress_key, self.PROGRESS_TTL)
+        if unlocked_ids:
+            pipe.sadd(unlocked_key, *unlocked_ids)
+            pipe.expire(unlocked_key, self.PROGRESS_TTL)
+        pipe.execute()
+        
+        return progress
+    
+    def _record_unlock(self, user_id: int, achievement: Achievement, new_item: bool) -> None:
+        """Keep counters coherent with an unlock and its rewards"""
+        try:
+            self._mark_unlocked(user_id, achievement.id)
+            
+            updates = []
+            if achievement.reward_besitos:
+                updates.append(('incr', "besitos", achievement.reward_besitos))
+                updates.append(('incr', "lifetime_besitos", achievement.reward_besitos))
+            if new_item:
+                updates.append(('incr', "items_owned", 1))
+            if updates:
+                self._update_progress(user_id, updates)
+        except Exception as e:
+            logger.warning(f"Failed to update achievement counters for user {user_id}: {e}")
+    
+    def _mark_unlocked(self, user_id: int, achievement_id: int) -> None:
+        """Add an achievement to the user's cached unlocked set"""
+        unlocked_key = self._unlocked_key(user_id)
+        self.redis.sadd(unlocked_key, achievement_id)
+        if self.redis.ttl(unlocked_key) < 0:
+            self.redis.expire(unlocked_key, self.PROGRESS_TTL)
+    
+    def _level_from_fragments(self, completed_fragments: int) -> int:
+        """Estimate narrative level based on completed fragments"""
+        if completed_fragments >= 10:
+            return 3
+        elif completed_fragments >= 5:
+            return 2
+        elif completed_fragments >= 1:
+            return 1
+        return 0
+    
+    def _progress_key(self, user_id: int) -> str:
+        return f"achievements:progress:{user_id}"
+    
+    def _unlocked_key(self, user_id: int) -> str:
+        return f"achievements:unlocked:{user_id}"
+    
     def _get_user_progress(self, user_id: int) -> Dict[str, Any]:
         """Get comprehensive user progress data for achievement checking"""
         progress = {}
@@ -299,14 +580,7 @@ class AchievementService:
             progress["fragments_completed"] = completed_fragments
             
             # Estimate narrative level based on completed fragments
-            if completed_fragments >= 10:
-                progress["narrative_level"] = 3
-            elif completed_fragments >= 5:
-                progress["narrative_level"] = 2
-            elif completed_fragments >= 1:
-                progress["narrative_level"] = 1
-            else:
-                progress["narrative_level"] = 0
+            progress["narrative_level"] = self._level_from_fragments(completed_fragments)
             
             # Get mission stats
             from database.models import UserMission, Mission
@@ -344,8 +618,14 @@ class AchievementService:
                 return False
         return True
     
-    def _award_rewards(self, user_id: int, achievement: Achievement) -> None:
-        """Award rewards for unlocking an achievement"""
+    def _award_rewards(self, user_id: int, achievement: Achievement) -> bool:
+        """
+        Award rewards for unlocking an achievement
+        
+        Returns:
+            bool: True if the reward item created a new inventory entry
+        """
+        new_item = False
         try:
             # Award besitos
             if achievement.reward_besitos and achievement.reward_besitos > 0:
@@ -353,10 +633,12 @@ class AchievementService:
             
             # Award item
             if achievement.reward_item_id:
-                self._award_item(user_id, achievement.reward_item_id)
+                new_item = self._award_item(user_id, achievement.reward_item_id)
             
         except Exception as e:
             logger.error(f"Failed to award rewards for achievement {achievement.achievement_key}: {e}")
+        
+        return new_item
     
     def _award_besitos(self, user_id: int, amount: int) -> None:
         """Award besitos to user"""
@@ -376,8 +658,8 @@ class AchievementService:
             )
             self.db.add(user_balance)
     
-    def _award_item(self, user_id: int, item_id: int) -> None:
-        """Award item to user"""
+    def _award_item(self, user_id: int, item_id: int) -> bool:
+        """Award item to user, returning True if a new inventory entry was created"""
         # Check if user already has this item
         existing_inventory = self.db.query(UserInventory).filter(
             UserInventory.user_id == user_id,
@@ -388,13 +670,15 @@ class AchievementService:
             # Get current quantity and add 1
             current_quantity = existing_inventory.quantity or 0
             existing_inventory.quantity = current_quantity + 1
-        else:
-            inventory = UserInventory(
-                user_id=user_id,
-                item_id=item_id,
-                quantity=1
-            )
-            self.db.add(inventory)
+            return False
+        
+        inventory = UserInventory(
+            user_id=user_id,
+            item_id=item_id,
+            quantity=1
+        )
+        self.db.add(inventory)
+        return True
 
 
 # Global achievement service instance
@@ -1,6 +1,16 @@
 """
 Auction service for real-time item auctions with dynamic timer and anti-sniping
+
+Live auction state (current bid, bidder, end/extended time, per-user last bid)
+is held in Redis and bids are accepted by a single Lua script that also checks
+the bidder's mirrored balance, so the bid hot path takes no lock and does not
+touch Postgres once the auction and the balance are cached. Accepted bids are queued and
+persisted to the bids table in batches by flush_pending_bids(); a batch
+stays in a processing list until its transaction commits.
 """
+import json
+import logging
+import time
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from datetime import datetime, timedelta, timezone
@@ -11,8 +21,113 @@ from database.models import Auction, Bid, User, Item, UserBalance, UserInventory
 from database.connection import get_db
 from utils.locks import with_auction_lock, get_lock_manager
 from core.event_bus import EventBus
+from modules.gamification.inventory import InventoryService
+from modules.gamification.besitos import BALANCE_MIRROR_KEY, BALANCE_MIRROR_TTL
 from config.settings import settings
 
+logger = logging.getLogger(__name__)
+
+BID_RATE_LIMIT_SECONDS = 5
+EXTENSION_WINDOW_SECONDS = 60
+LIVE_STATE_TTL = 7 * 86400
+BID_QUEUE_KEY = "auction:bid_queue"
+BID_PROCESSING_KEY = "auction:bid_processing"
+AUCTION_DEADLINES_KEY = "auction:deadlines"
+NOTIFY_PENDING_KEY = "auction_notification:pending"
+NOTIFICATION_TTL = 3600
+
+# Load live auction state only if it is not already cached
+HYDRATE_AUCTION_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]))
+return 1
+"""
+
+# Validate and accept a bid atomically
+# KEYS: live state hash, per-user last bid hash, bid queue, deadlines sorted set,
+#       bidder set, bidder's balance mirror
+# ARGV: user_id, amount, now, rate_limit_seconds, extension_window_seconds,
+#       queue entry (JSON with auction_id, user_id, amount, ts)
+# 'not_found' and 'no_balance' mean the live state or the balance mirror is
+# not cached yet; the caller loads it and retries
+PLACE_BID_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'status', 'current_bid', 'min_bid_increment',
+    'end_ts', 'extended_end_ts', 'current_bidder_id', 'bid_count')
+if not state[1] then
+    return {'not_found'}
+end
+if state[1] ~= 'active' then
+    return {'not_active'}
+end
+
+local user_id = ARGV[1]
+local amount = tonumber(ARGV[2])
+local balance = redis.call('GET', KEYS[6])
+if not balance then
+    return {'no_balance'}
+end
+if tonumber(balance) < amount then
+    return {'insufficient'}
+end
+local now = tonumber(ARGV[3])
+local end_ts = tonumber(state[4])
+if state[5] and state[5] ~= '' then
+    end_ts = math.max(end_ts, tonumber(state[5]))
+end
+if now > end_ts then
+    return {'ended'}
+end
+
+local min_bid = tonumber(state[2]) + tonumber(state[3])
+if amount < min_bid then
+    return {'min_bid', tostring(min_bid)}
+end
+
+local last_bid = redis.call('HGET', KEYS[2], user_id)
+if last_bid and (now - tonumber(last_bid)) < tonumber(ARGV[4]) then
+    return {'rate_limited'}
+end
+
+local previous_bidder = state[6] or ''
+local bid_count = redis.call('HINCRBY', KEYS[1], 'bid_count', 1)
+redis.call('HSET', KEYS[1], 'current_bid', amount, 'current_bidder_id', user_id)
+
+local extended_end_ts = state[5] or ''
+if end_ts - now <= tonumber(ARGV[5]) then
+    extended_end_ts = tostring(now + tonumber(ARGV[5]))
+    redis.call('HSET', KEYS[1], 'extended_end_ts', extended_end_ts)
+    redis.call('ZADD', KEYS[4], extended_end_ts, string.match(KEYS[1], '(%d+)$'))
+end
+
+redis.call('HSET', KEYS[2], user_id, ARGV[3])
+redis.call('EXPIRE', KEYS[2], redis.call('TTL', KEYS[1]))
+redis.call('SADD', KEYS[5], user_id)
+redis.call('EXPIRE', KEYS[5], redis.call('TTL', KEYS[1]))
+redis.call('RPUSH', KEYS[3], ARGV[6])
+
+return {'ok', previous_bidder, tostring(bid_count), extended_end_ts}
+"""
+
+# Stop accepting bids once the effective end time has passed
+FREEZE_AUCTION_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'status', 'end_ts', 'extended_end_ts')
+if not state[1] then
+    return -1
+end
+local end_ts = tonumber(state[2])
+if state[3] and state[3] ~= '' then
+    end_ts = math.max(end_ts, tonumber(state[3]))
+end
+if tonumber(ARGV[1]) < end_ts then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', 'closed')
+return 1
+"""
+
 
 class AuctionService:
     """Service for managing auctions and bids"""
@@ -22,6 +137,9 @@ class AuctionService:
         self.redis_client = redis_client
         self.lock_manager = get_lock_manager()
         self.event_bus = EventBus()
+        self._hydrate_script = redis_client.register_script(HYDRATE_AUCTION_SCRIPT)
+        self._place_bid_script = redis_client.register_script(PLACE_BID_SCRIPT)
+        self._freeze_script = redis_client.register_script(FREEZE_AUCTION_SCRIPT)
     
     def create_auction(
         self, 
@@ -74,6 +192,9 @@ class AuctionService:
         self.db.commit()
         self.db.refresh(auction)
         
+        self._hydrate_live_state(auction)
+        self.schedule_deadline(auction.auction_id, end_time)
+        
         # Publish auction started event
         self.event_bus.publish("gamification.auction_started", {
             "auction_id": auction.auction_id,
@@ -84,87 +205,291 @@ class AuctionService:
         
         return auction
     
-    @with_auction_lock(operation="bid")
     def place_bid(self, user_id: int, auction_id: int, amount: int) -> Bid:
         """
         Place a bid on an auction
         
+        The bid is validated against the live state and the bidder's mirrored
+        balance, and accepted, by a single Lua script. The database is only
+        read when either is not cached yet. The returned bid is persisted
+        asynchronously by flush_pending_bids(), so its bid_id is not set yet.
+        
         Args:
             user_id: ID of the user placing the bid
             auction_id: ID of the auction
             amount: Bid amount in besitos
             
         Returns:
-            Created bid object
+            Unsaved bid object (bid_id is None until the bid is flushed)
         """
-        # Get auction
-        auction = self.db.query(Auction).filter(
-            Auction.auction_id == auction_id,
-            Auction.status == "active"
-        ).first()
+        live_key = self._live_key(auction_id)
+        keys = [
+            live_key, self._last_bid_key(auction_id), BID_QUEUE_KEY,
+            AUCTION_DEADLINES_KEY, self._bidders_key(auction_id), BALANCE_MIRROR_KEY.format(user_id=user_id)
+        ]
+        now = time.time()
+        args = [
+            user_id, amount, now, BID_RATE_LIMIT_SECONDS, EXTENSION_WINDOW_SECONDS,
+            json.dumps({"auction_id": auction_id, "user_id": user_id, "amount": amount, "ts": now})
+        ]
         
-        if auction is None:
-            raise ValueError(f"Active auction with ID {auction_id} not found")
+        # Balance check is advisory; the final deduction is enforced when the auction closes
+        loaded = set()
+        while True:
+            result = [r.decode() if isinstance(r, bytes) else r for r in self._place_bid_script(keys=keys, args=args)]
+            if result[0] in loaded:
+                break
+            loaded.add(result[0])
+            if result[0] == "not_found":
+                self._load_live_state(auction_id)
+            elif result[0] == "no_balance":
+                self._load_balance_mirror(user_id)
+            else:
+                break
         
-        # Check if auction has ended
-        if datetime.now(timezone.utc).timestamp() > auction.end_time.timestamp():
-            raise ValueError("Auction has already ended")
-        
-        # Check minimum bid
-        min_bid = auction.current_bid + auction.min_bid_increment
-        if amount < min_bid:
-            raise ValueError(f"Minimum bid is {min_bid} besitos")
-        
-        # Check user balance
-        user_balance = self.db.query(UserBalance).filter(UserBalance.user_id == user_id).first()
-        if user_balance is None or user_balance.besitos < amount:
+        if result[0] == "not_found" or result[0] == "not_active":
+            raise ValueError(f"Active auction with ID {auction_id} not found")
+        if result[0] == "insufficient" or result[0] == "no_balance":
             raise ValueError("Insufficient besitos")
+        if result[0] == "ended":
+            raise ValueError("Auction has already ended")
+        if result[0] == "min_bid":
+            raise ValueError(f"Minimum bid is {result[1]} besitos")
+        if result[0] == "rate_limited":
+            raise ValueError(f"Please wait {BID_RATE_LIMIT_SECONDS} seconds between bids")
         
-        # Check rate limiting (max 1 bid every 5 seconds)
-        last_bid = self.db.query(Bid).filter(
-            Bid.user_id == user_id,
-            Bid.auction_id == auction_id
-        ).order_by(Bid.created_at.desc()).first()
-        
-        if last_bid is not None and (datetime.now(timezone.utc).timestamp() - last_bid.created_at.timestamp()) < 5:
-            raise ValueError("Please wait 5 seconds between bids")
+        previous_bidder, bid_count, extended_end_ts = result[1], int(result[2]), result[3]
         
-        # Create bid
         bid = Bid(
             auction_id=auction_id,
             user_id=user_id,
             amount=amount,
-            is_winning=True
+            is_winning=True,
+            created_at=datetime.fromtimestamp(now, timezone.utc)
         )
         
-        # Update auction
-        auction.current_bid = amount
-        auction.current_bidder_id = user_id
-        auction.bid_count = auction.bid_count + 1
-        
-        # Apply dynamic timer extension
-        time_remaining = (auction.end_time - datetime.now(timezone.utc)).total_seconds()
-        if time_remaining <= 60:  # If less than 60 seconds remaining
-            auction.extended_end_time = datetime.now(timezone.utc) + timedelta(seconds=60)
-        
-        self.db.add(bid)
-        self.db.commit()
-        self.db.refresh(bid)
-        
         # Publish bid placed event
         self.event_bus.publish("gamification.bid_placed", {
             "auction_id": auction_id,
             "user_id": user_id,
             "amount": amount,
-            "current_bid": auction.current_bid
+            "current_bid": amount,
+            "extended_end_time": (
+                datetime.fromtimestamp(float(extended_end_ts), timezone.utc).isoformat()
+                if extended_end_ts else None
+            )
         })
         
-        # Notify previous bidder if they were outbid
-        if auction.bid_count > 1:
-            self._notify_outbid_users(auction_id, user_id)
+        # Notify previous bidders that they were outbid
+        if bid_count > 1 and previous_bidder:
+            self._notify_outbid_users(auction_id, user_id, amount)
         
         return bid
     
+    def flush_pending_bids(self, batch_size: int = 500) -> int:
+        """
+        Persist queued bids to the bids table in one transaction per batch
+        
+        The batch is moved to a processing list and only removed from it once
+        the transaction has committed, so a crash never loses accepted bids;
+        recover_processing_bids() requeues whatever a crash left behind.
+        
+        Args:
+            batch_size: Maximum number of bids to persist per call
+            
+        Returns:
+            Number of bids persisted
+        """
+        pipe = self.redis_client.pipeline(transaction=True)
+        for _ in range(batch_size):
+            pipe.lmove(BID_QUEUE_KEY, BID_PROCESSING_KEY, "LEFT", "RIGHT")
+        raw_bids = [raw for raw in pipe.execute() if raw is not None]
+        
+        if not raw_bids:
+            return 0
+        
+        bids = [json.loads(raw) for raw in raw_bids]
+        
+        try:
+            auction_ids = {bid["auction_id"] for bid in bids}
+            last_bid_index = {bid["auction_id"]: i for i, bid in enumerate(bids)}
+            
+            # Bids must increase, so (auction, user, amount) identifies a bid;
+            # skip any that were committed before a crash and then requeued
+            persisted = set(self.db.query(Bid.auction_id, Bid.user_id, Bid.amount).filter(
+                Bid.auction_id.in_(auction_ids),
+                Bid.amount.in_({bid["amount"] for bid in bids})
+            ).all())
+            
+            # Earlier bids stop being the winning one
+            self.db.query(Bid).filter(
+                Bid.auction_id.in_(auction_ids),
+                Bid.is_winning == True
+            ).update({Bid.is_winning: False}, synchronize_session=False)
+            
+            self.db.add_all([
+                Bid(
+                    auction_id=bid["auction_id"],
+                    user_id=bid["user_id"],
+                    amount=bid["amount"],
+                    is_winning=(last_bid_index[bid["auction_id"]] == i),
+                    created_at=datetime.fromtimestamp(bid["ts"], timezone.utc)
+                )
+                for i, bid in enumerate(bids)
+                if (bid["auction_id"], bid["user_id"], bid["amount"]) not in persisted
+            ])
+            
+            # Sync auction rows from the live state
+            for auction in self.db.query(Auction).filter(Auction.auction_id.in_(auction_ids)).all():
+                live_state = self.get_live_state(auction.auction_id)
+                if live_state is None:
+                    continue
+                auction.current_bid = live_state["current_bid"]
+                auction.current_bidder_id = live_state["current_bidder_id"]
+                auction.bid_count = live_state["bid_count"]
+                auction.extended_end_time = live_state["extended_end_time"]
+            
+            self.db.commit()
+            
+        except Exception as e:
+            logger.error(f"Failed to persist {len(bids)} queued bids: {e}")
+            self.db.rollback()
+            # Put the batch back at the head of the queue in its original order
+            pipe = self.redis_client.pipeline(transaction=True)
+            for raw in raw_bids:
+                pipe.lrem(BID_PROCESSING_KEY, 1, raw)
+            pipe.lpush(BID_QUEUE_KEY, *reversed(raw_bids))
+            pipe.execute()
+            return 0
+        
+        pipe = self.redis_client.pipeline(transaction=True)
+        for raw in raw_bids:
+            pipe.lrem(BID_PROCESSING_KEY, 1, raw)
+        pipe.execute()
+        
+        logger.info(f"Persisted {len(bids)} bids for {len(auction_ids)} auctions")
+        return len(bids)
+    
+    def recover_processing_bids(self) -> int:
+        """
+        Move bids left in the processing list (e.g. after a crash) back to the queue
+        
+        Returns:
+            Number of bids requeued
+        """
+        recovered = 0
+        
+        while self.redis_client.lmove(BID_PROCESSING_KEY, BID_QUEUE_KEY, "RIGHT", "LEFT") is not None:
+            recovered += 1
+        
+        if recovered:
+            logger.warning(f"Requeued {recovered} auction bids left in processing")
+        
+        return recovered
+    
+    def get_queued_bids(self, auction_id: Optional[int] = None, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get accepted bids that are not persisted yet, oldest first
+        
+        Args:
+            auction_id: Only bids on this auction
+            user_id: Only bids by this user
+            
+        Returns:
+            List of queued bid entries (auction_id, user_id, amount, ts)
+        """
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.lrange(BID_PROCESSING_KEY, 0, -1)
+        pipe.lrange(BID_QUEUE_KEY, 0, -1)
+        processing, queued = pipe.execute()
+        
+        return [
+            bid for bid in (json.loads(raw) for raw in processing + queued)
+            if (auction_id is None or bid["auction_id"] == auction_id)
+            and (user_id is None or bid["user_id"] == user_id)
+        ]
+    
+    def get_live_state(self, auction_id: int) -> Optional[Dict[str, Any]]:
+        """Get the live auction state from Redis, or None if it is not cached"""
+        state = self.redis_client.hgetall(self._live_key(auction_id))
+        if not state:
+            return None
+        
+        state = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in state.items()
+        }
+        
+        extended_end_ts = state.get("extended_end_ts")
+        return {
+            "status": state["status"],
+            "current_bid": int(state["current_bid"]),
+            "current_bidder_id": int(state["current_bidder_id"]) if state.get("current_bidder_id") else None,
+            "bid_count": int(state["bid_count"]),
+            "end_time": datetime.fromtimestamp(float(state["end_ts"]), timezone.utc),
+            "extended_end_time": (
+                datetime.fromtimestamp(float(extended_end_ts), timezone.utc) if extended_end_ts else None
+            )
+        }
+    
+    def schedule_deadline(self, auction_id: int, end_time: datetime) -> None:
+        """Register (or move) an auction's closing deadline in the scheduler set"""
+        self.redis_client.zadd(AUCTION_DEADLINES_KEY, {str(auction_id): end_time.timestamp()})
+    
+    def _load_live_state(self, auction_id: int) -> None:
+        """Hydrate an active auction's live state from the database (cold path of place_bid)"""
+        auction = self.db.query(Auction).filter(
+            Auction.auction_id == auction_id,
+            Auction.status == "active"
+        ).first()
+        
+        if auction is None:
+            raise ValueError(f"Active auction with ID {auction_id} not found")
+        
+        self._hydrate_live_state(auction)
+    
+    def _load_balance_mirror(self, user_id: int) -> None:
+        """Mirror a bidder's balance into Redis (cold path of place_bid)"""
+        balance = self.db.query(UserBalance.besitos).filter(UserBalance.user_id == user_id).first()
+        # NX: a value mirrored meanwhile is at least as fresh as this read
+        self.redis_client.set(
+            BALANCE_MIRROR_KEY.format(user_id=user_id), balance.besitos if balance else 0,
+            ex=BALANCE_MIRROR_TTL, nx=True
+        )
+    
+    def _hydrate_live_state(self, auction: Auction) -> None:
+        """Load an auction's live state into Redis if it is not already there"""
+        mapping = {
+            "status": auction.status,
+            "current_bid": auction.current_bid,
+            "current_bidder_id": auction.current_bidder_id or "",
+            "min_bid_increment": auction.min_bid_increment,
+            "bid_count": auction.bid_count or 0,
+            "end_ts": auction.end_time.timestamp(),
+            "extended_end_ts": auction.extended_end_time.timestamp() if auction.extended_end_time else ""
+        }
+        args = [LIVE_STATE_TTL]
+        for field, value in mapping.items():
+            args.extend([field, value])
+        
+        if self._hydrate_script(keys=[self._live_key(auction.auction_id)], args=args) and auction.bid_count:
+            # Seed the bidder set for auctions that already have persisted bids
+            bidders = [row[0] for row in self.db.query(Bid.user_id).filter(
+                Bid.auction_id == auction.auction_id
+            ).distinct().all()]
+            if bidders:
+                self.redis_client.sadd(self._bidders_key(auction.auction_id), *bidders)
+                self.redis_client.expire(self._bidders_key(auction.auction_id), LIVE_STATE_TTL)
+    
+    def _live_key(self, auction_id: int) -> str:
+        return f"auction:live:{auction_id}"
+    
+    def _last_bid_key(self, auction_id: int) -> str:
+        return f"auction:last_bid:{auction_id}"
+    
+    def _bidders_key(self, auction_id: int) -> str:
+        return f"auction:bidders:{auction_id}"
+    
     def get_active_auctions(self) -> List[Auction]:
         """Get all active auctions"""
         return self.db.query(Auction).filter(
@@ -183,8 +508,15 @@ class AuctionService:
             Bid.auction_id == auction_id
         ).order_by(Bid.amount.desc()).limit(5).all()
         
+        # Overlay bids that are accepted but not yet persisted
+        auction_data = auction.to_dict()
+        live_state = self.get_live_state(auction_id)
+        if live_state is not None:
+            for field in ("current_bid", "current_bidder_id", "bid_count", "extended_end_time"):
+                auction_data[field] = live_state[field]
+        
         return {
-            "auction": auction.to_dict(),
+            "auction": auction_data,
             "item": auction.item.to_dict() if auction.item else None,
             "current_bidder": auction.current_bidder.to_dict() if auction.current_bidder else None,
             "top_bids": [bid.to_dict() for bid in top_bids],
@@ -199,88 +531,157 @@ class AuctionService:
         Returns:
             Dictionary with auction result
         """
-        auction = self.db.query(Auction).filter(Auction.auction_id == auction_id).first()
-        if auction is None or auction.status != "active":
+        # Stop accepting bids, then persist everything accepted so far
+        if self._freeze_script(keys=[self._live_key(auction_id)], args=[time.time()]) == 0:
             return None
         
-        # Check if auction should be closed
-        end_time = auction.extended_end_time or auction.end_time
-        if datetime.now(timezone.utc) < end_time:
-            return None
+        while self.flush_pending_bids():
+            pass
         
-        # Determine winner
-        if auction.current_bidder_id is not None:
-            auction.winner_id = auction.current_bidder_id
-            auction.status = "closed"
+        # A failed flush leaves bids queued; closing now could pick the wrong winner
+        if self.get_queued_bids(auction_id=auction_id):
+            raise RuntimeError(f"Queued bids for auction {auction_id} are not persisted yet")
+        
+        try:
+            auction = self.db.query(Auction).filter(Auction.auction_id == auction_id).first()
+            if auction is None or auction.status != "active":
+                return None
             
-            # Transfer item to winner
-            inventory_item = UserInventory(
-                user_id=auction.winner_id,
-                item_id=auction.item_id,
-                quantity=1,
-                acquired_at=datetime.now(timezone.utc)
-            )
-            self.db.add(inventory_item)
+            # Check if auction should be closed
+            end_time = auction.extended_end_time or auction.end_time
+            if datetime.now(timezone.utc) < end_time:
+                return None
             
-            # Deduct besitos from winner using atomic operation
-            user_balance = self.db.query(UserBalance).filter(
-                UserBalance.user_id == auction.winner_id
-            ).with_for_update().first()
+            # Determine winner
+            if auction.current_bidder_id is not None:
+                auction.winner_id = auction.current_bidder_id
+                auction.status = "closed"
+                
+                # Transfer item to winner
+                inventory_item = UserInventory(
+                    user_id=auction.winner_id,
+                    item_id=auction.item_id,
+                    quantity=1,
+                    acquired_at=datetime.now(timezone.utc)
+                )
+                self.db.add(inventory_item)
+                
+                # Deduct besitos from winner using atomic operation
+                user_balance = self.db.query(UserBalance).filter(
+                    UserBalance.user_id == auction.winner_id
+                ).with_for_update().first()
+                
+                if user_balance is not None:
+                    user_balance.besitos -= auction.current_bid
+                
+                result = {
+                    "winner_id": auction.winner_id,
+                    "winning_bid": auction.current_bid,
+                    "item_id": auction.item_id,
+                    "status": "won"
+                }
+            else:
+                # No bids, auction closed without winner
+                auction.status = "closed"
+                result = {
+                    "winner_id": None,
+                    "winning_bid": None,
+                    "item_id": auction.item_id,
+                    "status": "no_bids"
+                }
             
-            if user_balance is not None:
-                user_balance.besitos -= auction.current_bid
+            self.db.commit()
+            
+        except Exception as e:
+            logger.error(f"Failed to close auction {auction_id}: {e}")
+            self.db.rollback()
+            raise
+        
+        self.redis_client.delete(
+            self._live_key(auction_id), self._last_bid_key(auction_id), self._bidders_key(auction_id)
+        )
+        self.redis_client.zrem(AUCTION_DEADLINES_KEY, auction_id)
+        
+        if result["status"] == "won":
+            InventoryService.invalidate_inventory_map(result["winner_id"])
+            self.redis_client.delete(BALANCE_MIRROR_KEY.format(user_id=result["winner_id"]))
             
             # Publish auction won event
             self.event_bus.publish("gamification.auction_won", {
                 "auction_id": auction_id,
-                "user_id": auction.winner_id,
-                "item_id": auction.item_id,
-                "winning_bid": auction.current_bid
+                "user_id": result["winner_id"],
+                "item_id": result["item_id"],
+                "winning_bid": result["winning_bid"]
             })
-            
-            result = {
-                "winner_id": auction.winner_id,
-                "winning_bid": auction.current_bid,
-                "item_id": auction.item_id,
-                "status": "won"
-            }
-        else:
-            # No bids, auction closed without winner
-            auction.status = "closed"
-            result = {
-                "winner_id": None,
-                "winning_bid": None,
-                "item_id": auction.item_id,
-                "status": "no_bids"
-            }
-        
-        self.db.commit()
         
         return result
     
     def get_user_bid_history(self, user_id: int, limit: int = 10) -> List[Bid]:
-        """Get user's bid history"""
-        return self.db.query(Bid).filter(
+        """
+        Get user's bid history, newest first
+        
+        Bids still waiting in the queue are included as unsaved Bid objects
+        (bid_id None), marked winning if they are the auction's live top bid.
+        """
+        bids = self.db.query(Bid).filter(
             Bid.user_id == user_id
         ).order_by(Bid.created_at.desc()).limit(limit).all()
+        
+        persisted = {(bid.auction_id, bid.amount) for bid in bids}
+        live_states = {}
+        
+        for queued in self.get_queued_bids(user_id=user_id):
+            if (queued["auction_id"], queued["amount"]) in persisted:
+                continue
+            if queued["auction_id"] not in live_states:
+                live_states[queued["auction_id"]] = self.get_live_state(queued["auction_id"])
+            live_state = live_states[queued["auction_id"]]
+            
+            bids.append(Bid(
+                auction_id=queued["auction_id"],
+                user_id=user_id,
+                amount=queued["amount"],
+                is_winning=bool(
+                    live_state
+                    and live_state["current_bidder_id"] == user_id
+                    and live_state["current_bid"] == queued["amount"]
+                ),
+                created_at=datetime.fromtimestamp(queued["ts"], timezone.utc)
+            ))
+        
+        bids.sort(key=lambda bid: bid.created_at, reverse=True)
+        return bids[:limit]
     
-    def _notify_outbid_users(self, auction_id: int, new_bidder_id: int):
-        """Notify users who were outbid"""
-        # Get all unique bidders except the new bidder
-        bidders = self.db.query(Bid.user_id).filter(
-            Bid.auction_id == auction_id,
-            Bid.user_id != new_bidder_id
-        ).distinct().all()
-        
-        # Store notification in Redis for bot to process
+    def _notify_outbid_users(self, auction_id: int, new_bidder_id: int, amount: int):
+        """
+        Notify users who were outbid
+        
+        Bidders come from the per-auction bidder set maintained by the bid
+        script; all notification writes go out in a single pipeline and the
+        bot drains them in batches (see bot/handlers/auctions.py).
+        """
+        bidders = [
+            bidder for bidder in self.redis_client.smembers(self._bidders_key(auction_id))
+            if str(bidder) != str(new_bidder_id)
+        ]
+        
+        if not bidders:
+            return
+        
+        notification = json.dumps({"auction_id": auction_id, "amount": amount})
+        
+        # Store notifications in Redis for bot to process
+        pipe = self.redis_client.pipeline(transaction=False)
         for bidder in bidders:
-            notification_key = f"auction_notification:{bidder[0]}"
-            self.redis_client.lpush(notification_key, auction_id)
-            self.redis_client.expire(notification_key, 3600)  # Keep for 1 hour
+            notification_key = f"auction_notification:{bidder}"
+            pipe.lpush(notification_key, notification)
+            pipe.expire(notification_key, NOTIFICATION_TTL)
+        pipe.sadd(NOTIFY_PENDING_KEY, *bidders)
+        pipe.execute()
 
 
 def get_auction_service() -> AuctionService:
     """Get auction service instance"""
     db = next(get_db())
-    redis_client = redis.from_url(settings.redis_url)
+    redis_client = redis.from_url(settings.redis_url, decode_responses=True)
     return AuctionService(db, redis_client)
\ No newline at end of file
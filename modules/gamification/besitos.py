@@ -1,19 +1,69 @@
+import json
 import logging
+import time
+import uuid
 from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from database.connection import get_db
+from database.connection import get_db, get_redis
 from database.models import UserBalance, Transaction
 from core.event_bus import event_bus
+from core.economy_aggregates import economy_aggregates
 
 logger = logging.getLogger(__name__)
 
+# Ledger of pending grants; producers (e.g. Lua scripts) RPUSH JSON entries
+# with grant_id, user_id, amount, source, description and metadata.
+# grant_id is stored on the Transaction, so a replayed entry is applied once
+GRANT_QUEUE_KEY = "besitos:grant_queue"
+GRANT_PROCESSING_KEY = "besitos:grant_processing"
+GRANT_DEAD_LETTER_KEY = "besitos:grant_dead_letter"
+GRANT_MAX_ATTEMPTS = 5
+
+# Read-through mirror of each user's balance for checks on hot paths (auction
+# bids). The ledger drops it after every change; balance writes made outside
+# the ledger are picked up when it expires
+BALANCE_MIRROR_KEY = "besitos:balance:{user_id}"
+BALANCE_MIRROR_TTL = 60
+
+# Entry -> time it was taken for processing; entries whose lease has run out
+# belong to a worker that died and are put back in the queue
+GRANT_LEASES_KEY = "besitos:grant_leases"
+GRANT_LEASE_SECONDS = 60
+
+# Take the next grant for processing and record when it was taken
+# KEYS[1]: queue, KEYS[2]: processing list, KEYS[3]: leases
+# ARGV[1]: now
+# Returns the entry, or nil when the queue is empty
+CLAIM_GRANT_SCRIPT = """
+local raw = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+if raw then
+    redis.call('ZADD', KEYS[3], ARGV[1], raw)
+end
+return raw
+"""
+
+# Put an abandoned grant back at the head of the queue, unless its worker
+# acknowledged it in the meantime
+# KEYS[1]: processing list, KEYS[2]: leases, KEYS[3]: queue
+# ARGV[1]: entry
+# Returns 1 if requeued, 0 otherwise
+RECOVER_GRANT_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('LPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
 
 class BesitosService:
     """Service for managing besitos economy with atomic transactions"""
     
     @staticmethod
-    def grant_besitos(user_id: int, amount: int, source: str, description: str = None, metadata: Dict[str, Any] = None) -> bool:
+    def grant_besitos(user_id: int, amount: int, source: str, description: str = None, metadata: Dict[str, Any] = None,
+                      grant_id: str = None) -> bool:
         """
         Grant besitos to a user with atomic transaction
         
@@ -23,9 +73,11 @@ class BesitosService:
             source: Source of besitos (e.g., 'daily_reward', 'mission', 'trivia')
             description: Optional description
             metadata: Optional metadata
+            grant_id: Optional idempotency key; a grant whose id is already
+                recorded is not applied again
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if successful (or already applied), False otherwise
         """
         if amount <= 0:
             logger.error(f"Cannot grant non-positive amount: {amount}")
@@ -37,6 +89,13 @@ class BesitosService:
             # Get or create user balance with lock
             balance = db.query(UserBalance).filter(UserBalance.user_id == user_id).with_for_update().first()
             
+            # Checked under the balance lock, so a concurrent replay waits for us
+            if grant_id and db.query(Transaction.id).filter(Transaction.grant_id == grant_id).first():
+                logger.info(f"Besitos grant {grant_id} already applied, skipping")
+                db.rollback()
+                return True
+            
+            old_balance = balance.besitos if balance else None
             if not balance:
                 balance = UserBalance(user_id=user_id, besitos=0, lifetime_besitos=0)
                 db.add(balance)
@@ -52,18 +111,25 @@ class BesitosService:
                 transaction_type='earn',
                 source=source,
                 description=description,
-                transaction_metadata=metadata
+                transaction_metadata=metadata,
+                grant_id=grant_id
             )
             db.add(transaction)
             
+            # Read before commit: the committed row is expired and would reload
+            new_balance = balance.besitos
             db.commit()
+            BesitosService.invalidate_balance_mirror(user_id)
+            
+            # Keep the economy monitor's running aggregates current
+            economy_aggregates.record_transaction('earn', source, amount, old_balance, new_balance)
             
             # Publish event
             event_bus.publish("gamification.besitos_earned", {
                 "user_id": user_id,
                 "amount": amount,
                 "source": source,
-                "new_balance": balance.besitos,
+                "new_balance": new_balance,
                 "description": description
             })
             
@@ -124,14 +190,20 @@ class BesitosService:
             )
             db.add(transaction)
             
+            # Read before commit: the committed row is expired and would reload
+            new_balance = balance.besitos
             db.commit()
+            BesitosService.invalidate_balance_mirror(user_id)
+            
+            # Keep the economy monitor's running aggregates current
+            economy_aggregates.record_transaction('spend', purpose, amount, new_balance + amount, new_balance)
             
             # Publish event
             event_bus.publish("gamification.besitos_spent", {
                 "user_id": user_id,
                 "amount": amount,
                 "purpose": purpose,
-                "new_balance": balance.besitos,
+                "new_balance": new_balance,
                 "description": description
             })
             
@@ -167,6 +239,14 @@ class BesitosService:
         finally:
             db.close()
     
+    @staticmethod
+    def invalidate_balance_mirror(user_id: int) -> None:
+        """Drop a user's balance mirror after the balance changed"""
+        try:
+            get_redis().delete(BALANCE_MIRROR_KEY.format(user_id=user_id))
+        except Exception as e:
+            logger.error(f"Failed to invalidate balance mirror for user {user_id}: {e}")
+    
     @staticmethod
     def get_transaction_history(user_id: int, limit: int = 10) -> list:
         """
@@ -227,6 +307,128 @@ class BesitosService:
         finally:
             db.close()
 
+    
+    @staticmethod
+    def queue_grant(user_id: int, amount: int, source: str, description: str = None, metadata: Dict[str, Any] = None,
+                    grant_id: str = None) -> bool:
+        """
+        Queue a besitos grant in the ledger to be applied by process_grant_queue
+        
+        Args:
+            user_id: User ID
+            amount: Amount of besitos to grant
+            source: Source of besitos
+            description: Optional description
+            metadata: Optional metadata
+            grant_id: Idempotency key; pass one derived from the triggering
+                record when the caller itself may be replayed (defaults to a
+                random id)
+            
+        Returns:
+            bool: True if queued, False otherwise
+        """
+        try:
+            get_redis().rpush(GRANT_QUEUE_KEY, json.dumps({
+                "grant_id": grant_id or uuid.uuid4().hex,
+                "user_id": user_id,
+                "amount": amount,
+                "source": source,
+                "description": description,
+                "metadata": metadata
+            }))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to queue besitos grant for user {user_id}: {e}")
+            return False
+    
+    @staticmethod
+    def process_grant_queue(batch_size: int = 100) -> int:
+        """
+        Apply queued grants from the ledger
+        
+        Each entry is moved to a processing list under a lease while it is
+        applied, so a crash never loses it, and its grant_id keeps a replayed
+        entry from being credited twice. Failed entries are retried and moved
+        to a dead-letter list after GRANT_MAX_ATTEMPTS.
+        
+        Args:
+            batch_size: Maximum number of grants to apply
+            
+        Returns:
+            int: Number of grants applied
+        """
+        redis_client = get_redis()
+        claim_grant = redis_client.register_script(CLAIM_GRANT_SCRIPT)
+        applied = 0
+        
+        for _ in range(batch_size):
+            raw = claim_grant(keys=[GRANT_QUEUE_KEY, GRANT_PROCESSING_KEY, GRANT_LEASES_KEY], args=[time.time()])
+            if raw is None:
+                break
+            
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                logger.error(f"Discarding malformed besitos grant: {raw}")
+                redis_client.lrem(GRANT_PROCESSING_KEY, 1, raw)
+                redis_client.zrem(GRANT_LEASES_KEY, raw)
+                continue
+            
+            success = BesitosService.grant_besitos(
+                user_id=entry["user_id"],
+                amount=entry["amount"],
+                source=entry["source"],
+                description=entry.get("description"),
+                metadata=entry.get("metadata"),
+                grant_id=entry.get("grant_id")
+            )
+            
+            pipe = redis_client.pipeline()
+            pipe.lrem(GRANT_PROCESSING_KEY, 1, raw)
+            pipe.zrem(GRANT_LEASES_KEY, raw)
+            
+            if success:
+                applied += 1
+            else:
+                entry["attempts"] = entry.get("attempts", 0) + 1
+                target = GRANT_DEAD_LETTER_KEY if entry["attempts"] >= GRANT_MAX_ATTEMPTS else GRANT_QUEUE_KEY
+                pipe.rpush(target, json.dumps(entry))
+            
+            pipe.execute()
+        
+        return applied
+    
+    @staticmethod
+    def recover_processing_grants(lease_seconds: int = GRANT_LEASE_SECONDS) -> int:
+        """
+        Move grants whose processing lease ran out (their worker died) back to the queue
+        
+        Entries another worker is still applying keep their lease and are left
+        alone, so this is safe to run while other workers are live.
+        
+        Args:
+            lease_seconds: Age after which a processing entry is considered abandoned
+        
+        Returns:
+            int: Number of grants requeued
+        """
+        redis_client = get_redis()
+        recover_grant = redis_client.register_script(RECOVER_GRANT_SCRIPT)
+        expired_before = time.time() - lease_seconds
+        recovered = 0
+        
+        for raw in redis_client.lrange(GRANT_PROCESSING_KEY, 0, -1):
+            taken_at = redis_client.zscore(GRANT_LEASES_KEY, raw)
+            if taken_at is not None and taken_at > expired_before:
+                continue
+            
+            recovered += recover_grant(keys=[GRANT_PROCESSING_KEY, GRANT_LEASES_KEY, GRANT_QUEUE_KEY], args=[raw])
+        
+        if recovered:
+            logger.warning(f"Requeued {recovered} besitos grants left in processing")
+        
+        return recovered
+
 
 # Global service instance
 besitos_service = BesitosService()
\ No newline at end of file
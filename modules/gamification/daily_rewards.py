@@ -1,13 +1,56 @@
 import logging
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 from database.connection import get_db, get_redis
 from database.models import User
-from modules.gamification.besitos import besitos_service
+from modules.gamification.besitos import GRANT_QUEUE_KEY
 
 logger = logging.getLogger(__name__)
 
+CLAIM_INTERVAL_SECONDS = 86400  # 24 hours between claims
+STREAK_WINDOW_SECONDS = 172800  # streak breaks after 48 hours without a claim
+
+# Atomic daily claim: eligibility check, streak update, claim timestamp and
+# queueing of the besitos grant in the ledger, all in one round trip. The
+# grant id is derived from the user and claim time
+# KEYS[1]: daily_reward:{user_id} hash (last_claim, streak)
+# KEYS[2]: besitos grant queue
+# ARGV: now, claim_interval, streak_window, base_reward, user_id,
+#       then (streak_days, bonus) pairs
+# Returns {0, next_claim_ts} if already claimed, otherwise
+# {1, new_streak, streak_bonus, total_amount}
+CLAIM_DAILY_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local streak_window = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'last_claim', 'streak')
+local last_claim = tonumber(state[1])
+if last_claim and now - last_claim < interval then
+    return {0, last_claim + interval}
+end
+local streak = 0
+if last_claim and now - last_claim < streak_window then
+    streak = tonumber(state[2]) or 0
+end
+streak = streak + 1
+local bonus = 0
+for i = 6, #ARGV, 2 do
+    if tonumber(ARGV[i]) == streak then
+        bonus = tonumber(ARGV[i + 1])
+    end
+end
+local amount = tonumber(ARGV[4]) + bonus
+redis.call('HSET', KEYS[1], 'last_claim', now, 'streak', streak)
+redis.call('EXPIRE', KEYS[1], streak_window)
+redis.call('RPUSH', KEYS[2], string.format(
+    '{"grant_id": "daily_reward:%d:%d", "user_id": %d, "amount": %d, "source": "daily_reward", ' ..
+    '"description": "Recompensa diaria (racha: %d días)", "metadata": {"streak": %d}}',
+    tonumber(ARGV[5]), now, tonumber(ARGV[5]), amount, streak, streak))
+return {1, streak, bonus, amount}
+"""
+
 
 class DailyRewardService:
     """Service for managing daily rewards with streak tracking and progressive rewards"""
@@ -21,34 +64,108 @@ class DailyRewardService:
             14: 15, # +15 bonus for 14-day streak
             30: 25  # +25 bonus for 30-day streak
         }
+        self._claim_script = self.redis_client.register_script(CLAIM_DAILY_SCRIPT)
+    
+    def _state_key(self, user_id: int) -> str:
+        return f"daily_reward:{user_id}"
+    
+    def migrate_legacy_state(self) -> int:
+        """
+        Move claims stored under the old per-field keys into the state hash
+        
+        Earlier versions kept daily_reward:{user_id}:last_claim (ISO datetime,
+        24h TTL) and daily_reward:{user_id}:streak (48h TTL) as separate keys.
+        Users who claimed 24-48h ago only have the streak key left; their
+        claim time is recovered from its remaining TTL so the streak carries
+        on. Run once at startup; users who already have a state hash are left
+        alone.
+        
+        Returns:
+            int: Number of users migrated
+        """
+        migrated = 0
+        now = time.time()
+        
+        user_ids = set()
+        for pattern in ("daily_reward:*:last_claim", "daily_reward:*:streak"):
+            for legacy_key in self.redis_client.scan_iter(pattern):
+                if isinstance(legacy_key, bytes):
+                    legacy_key = legacy_key.decode()
+                user_ids.add(legacy_key.split(":")[1])
+        
+        for user_id in user_ids:
+            last_claim_key = f"daily_reward:{user_id}:last_claim"
+            streak_key = f"daily_reward:{user_id}:streak"
+            
+            last_claim, streak = self.redis_client.mget(last_claim_key, streak_key)
+            if last_claim is not None:
+                try:
+                    last_claim_ts = int(datetime.fromisoformat(
+                        last_claim.decode() if isinstance(last_claim, bytes) else last_claim
+                    ).timestamp())
+                except ValueError:
+                    logger.warning(f"Skipping unreadable legacy daily claim for user {user_id}")
+                    continue
+            else:
+                # The streak key was written with the claim and a 48h TTL; the
+                # last_claim key (24h TTL) is gone, so the claim is over a day old
+                streak_ttl = self.redis_client.ttl(streak_key)
+                last_claim_ts = None
+                if streak_ttl > 0:
+                    last_claim_ts = int(min(
+                        now - (STREAK_WINDOW_SECONDS - streak_ttl),
+                        now - CLAIM_INTERVAL_SECONDS
+                    ))
+            
+            state_key = self._state_key(int(user_id))
+            if last_claim_ts is not None:
+                remaining = int(last_claim_ts + STREAK_WINDOW_SECONDS - now)
+                if remaining > 0 and self.redis_client.hsetnx(state_key, "last_claim", last_claim_ts):
+                    self.redis_client.hset(state_key, "streak", int(streak or 0))
+                    self.redis_client.expire(state_key, remaining)
+                    migrated += 1
+            
+            self.redis_client.delete(last_claim_key, streak_key)
+        
+        if migrated:
+            logger.info(f"Migrated {migrated} legacy daily reward claims")
+        
+        return migrated
+    
+    def _user_exists(self, user_id: int) -> bool:
+        db: Session = next(get_db())
+        try:
+            return db.query(User.id).filter(User.id == user_id).first() is not None
+        finally:
+            db.close()
+    
+    def _get_state(self, user_id: int):
+        """Return (last_claim_ts, streak) for a user"""
+        last_claim, streak = self.redis_client.hmget(
+            self._state_key(user_id), "last_claim", "streak"
+        )
+        return (int(last_claim) if last_claim else None, int(streak or 0))
     
     def can_claim_daily_reward(self, user_id: int) -> bool:
         """
         Check if user can claim daily reward
         
+        This is informational only; claim_daily_reward re-checks eligibility
+        atomically, so a failed lookup denies rather than allows the claim.
+        
         Args:
             user_id: User ID
             
         Returns:
             bool: True if user can claim, False otherwise
         """
-        last_claim_key = f"daily_reward:{user_id}:last_claim"
-        
         try:
-            last_claim_str = self.redis_client.get(last_claim_key)
-            
-            if not last_claim_str:
-                return True
-            
-            last_claim = datetime.fromisoformat(last_claim_str)
-            now = datetime.now()
-            
-            # Check if 24 hours have passed
-            return (now - last_claim) >= timedelta(hours=24)
+            last_claim, _ = self._get_state(user_id)
+            return last_claim is None or time.time() - last_claim >= CLAIM_INTERVAL_SECONDS
             
         except Exception as e:
             logger.error(f"Error checking daily reward eligibility for user {user_id}: {e}")
-            return True  # Allow claim on error
+            return False
     
     def get_streak_info(self, user_id: int) -> Dict[str, Any]:
         """
@@ -60,29 +177,21 @@ class DailyRewardService:
         Returns:
             Dict with streak count, next bonus, and streak status
         """
-        streak_key = f"daily_reward:{user_id}:streak"
-        last_claim_key = f"daily_reward:{user_id}:last_claim"
-        
         try:
-            streak_count = int(self.redis_client.get(streak_key) or 0)
-            last_claim_str = self.redis_client.get(last_claim_key)
+            last_claim, streak_count = self._get_state(user_id)
             
-            if not last_claim_str:
+            if last_claim is None:
                 return {
                     'streak_count': 0,
                     'next_bonus': None,
                     'is_active': False
                 }
             
-            last_claim = datetime.fromisoformat(last_claim_str)
-            now = datetime.now()
-            
             # Check if streak is broken (more than 48 hours since last claim)
-            is_active = (now - last_claim) < timedelta(hours=48)
+            is_active = time.time() - last_claim < STREAK_WINDOW_SECONDS
             
             if not is_active:
                 streak_count = 0
-                self.redis_client.set(streak_key, 0)
             
             # Find next streak bonus
             next_bonus = None
@@ -112,84 +221,56 @@ class DailyRewardService:
         """
         Claim daily reward for user with streak bonuses
         
+        The besitos are queued in the ledger and credited by the ledger job
+        within a few seconds.
+        
         Args:
             user_id: User ID
             
         Returns:
             Dict with reward details or None if failed
         """
-        if not self.can_claim_daily_reward(user_id):
+        try:
+            if not self._user_exists(user_id):
+                logger.error(f"User {user_id} not found for daily reward")
+                return None
+        except Exception as e:
+            logger.error(f"Error claiming daily reward for user {user_id}: {e}")
             return None
         
-        db: Session = next(get_db())
+        args = [
+            int(time.time()),
+            CLAIM_INTERVAL_SECONDS,
+            STREAK_WINDOW_SECONDS,
+            self.base_reward,
+            user_id
+        ]
+        for streak_days, bonus in self.streak_bonuses.items():
+            args.extend([streak_days, bonus])
         
         try:
-            # Get user to verify existence
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                logger.error(f"User {user_id} not found for daily reward")
-                return None
-            
-            # Get current streak info
-            streak_info = self.get_streak_info(user_id)
-            current_streak = streak_info['streak_count']
-            
-            # Calculate total reward
-            base_amount = self.base_reward
-            streak_bonus = 0
-            
-            # Check for streak bonus
-            new_streak = current_streak + 1
-            if new_streak in self.streak_bonuses:
-                streak_bonus = self.streak_bonuses[new_streak]
-            
-            total_amount = base_amount + streak_bonus
-            
-            # Grant reward
-            success = besitos_service.grant_besitos(
-                user_id=user_id,
-                amount=total_amount,
-                source="daily_reward",
-                description=f"Recompensa diaria (racha: {new_streak} días)"
+            result = self._claim_script(
+                keys=[self._state_key(user_id), GRANT_QUEUE_KEY],
+                args=args
             )
-            
-            if success:
-                # Update streak and last claim
-                now = datetime.now()
-                
-                last_claim_key = f"daily_reward:{user_id}:last_claim"
-                streak_key = f"daily_reward:{user_id}:streak"
-                
-                self.redis_client.set(
-                    last_claim_key,
-                    now.isoformat(),
-                    ex=86400  # 24 hours expiration
-                )
-                
-                self.redis_client.set(
-                    streak_key,
-                    new_streak,
-                    ex=172800  # 48 hours expiration (streak breaks after 2 days)
-                )
-                
-                logger.info(f"Daily reward claimed by user {user_id}: {total_amount} besitos (streak: {new_streak})")
-                
-                return {
-                    'base_amount': base_amount,
-                    'streak_bonus': streak_bonus,
-                    'total_amount': total_amount,
-                    'new_streak': new_streak,
-                    'next_streak_bonus': self._get_next_streak_bonus(new_streak)
-                }
-            else:
-                logger.error(f"Failed to grant daily reward to user {user_id}")
-                return None
-                
         except Exception as e:
             logger.error(f"Error claiming daily reward for user {user_id}: {e}")
             return None
-        finally:
-            db.close()
+        
+        if not result[0]:
+            return None
+        
+        _, new_streak, streak_bonus, total_amount = (int(value) for value in result)
+        
+        logger.info(f"Daily reward claimed by user {user_id}: {total_amount} besitos (streak: {new_streak})")
+        
+        return {
+            'base_amount': self.base_reward,
+            'streak_bonus': streak_bonus,
+            'total_amount': total_amount,
+            'new_streak': new_streak,
+            'next_streak_bonus': self._get_next_streak_bonus(new_streak)
+        }
     
     def _get_next_streak_bonus(self, current_streak: int) -> Optional[Dict[str, Any]]:
         """Get information about the next streak bonus"""
@@ -211,18 +292,13 @@ class DailyRewardService:
         Returns:
             datetime: Next claim time, or None if can claim now
         """
-        last_claim_key = f"daily_reward:{user_id}:last_claim"
-        
         try:
-            last_claim_str = self.redis_client.get(last_claim_key)
+            last_claim, _ = self._get_state(user_id)
             
-            if not last_claim_str:
+            if last_claim is None:
                 return None
             
-            last_claim = datetime.fromisoformat(last_claim_str)
-            next_claim = last_claim + timedelta(hours=24)
-            
-            return next_claim
+            return datetime.fromtimestamp(last_claim + CLAIM_INTERVAL_SECONDS)
             
         except Exception as e:
             logger.error(f"Error getting next claim time for user {user_id}: {e}")
@@ -2,16 +2,207 @@ import logging
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from database.connection import get_db
+from database.connection import get_db, get_redis
 from database.models import Item, UserInventory
 from core.event_bus import event_bus
+from utils.cache_manager import cache_manager
 
 logger = logging.getLogger(__name__)
 
+ITEM_CATALOG_CACHE_KEY = "inventory:item_catalog"
+ITEM_CATALOG_TTL = 600
+INVENTORY_MAP_TTL = 3600
+LOADED_FIELD = "__loaded"
+
+# Write-through update of a cached inventory map; maps that are not cached
+# are left alone and get loaded from the database on next read. The map's
+# generation is bumped either way, so a load that read the database before
+# this write does not store its stale map
+# KEYS[1]: inventory:map:{user_id}, KEYS[2]: inventory:map_gen:{user_id}
+# ARGV: item_key, new quantity (0 removes the field), generation ttl
+UPDATE_MAP_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+else
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# Store a map loaded from the database unless the inventory changed meanwhile
+# KEYS[1]: inventory:map:{user_id}, KEYS[2]: inventory:map_gen:{user_id}
+# ARGV: generation read before loading ('' if none), ttl, then (field, value) pairs
+STORE_MAP_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+def _map_keys(user_id: int) -> List[str]:
+    return [f"inventory:map:{user_id}", f"inventory:map_gen:{user_id}"]
+
+
+def _item_to_dict(item: Item) -> Dict[str, Any]:
+    return {
+        "id": item.id,
+        "item_key": item.item_key,
+        "name": item.name,
+        "description": item.description,
+        "item_type": item.item_type,
+        "rarity": item.rarity,
+        "price_besitos": item.price_besitos,
+        "item_metadata": item.item_metadata,
+        "created_at": item.created_at.isoformat() if hasattr(item.created_at, 'isoformat') else None
+    }
+
 
 class InventoryService:
     """Service for managing user inventory with atomic operations"""
     
+    _update_map_script = None
+    _store_map_script = None
+    
+    @staticmethod
+    def get_item_catalog() -> Dict[str, Dict[str, Any]]:
+        """
+        Get the in-memory item catalog keyed by item_key
+        
+        Returns:
+            dict: item_key -> item details
+        """
+        catalog = cache_manager.get(ITEM_CATALOG_CACHE_KEY)
+        if catalog is not None:
+            return catalog
+        
+        db: Session = next(get_db())
+        
+        try:
+            catalog = {item.item_key: _item_to_dict(item) for item in db.query(Item).all()}
+            cache_manager.set(ITEM_CATALOG_CACHE_KEY, catalog, ttl=ITEM_CATALOG_TTL)
+            return catalog
+        except Exception as e:
+            logger.error(f"Failed to load item catalog: {e}")
+            return {}
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _get_catalog_item(item_key: str) -> Optional[Dict[str, Any]]:
+        """Look up an item in the catalog, reloading once in case it was created recently"""
+        item = InventoryService.get_item_catalog().get(item_key)
+        if item is None:
+            InventoryService.invalidate_item_catalog()
+            item = InventoryService.get_item_catalog().get(item_key)
+        return item
+    
+    @staticmethod
+    def invalidate_item_catalog():
+        """Drop the cached item catalog, e.g. after items are created or edited"""
+        cache_manager.delete(ITEM_CATALOG_CACHE_KEY)
+    
+    @staticmethod
+    def get_inventory_map(user_id: int) -> Dict[str, int]:
+        """
+        Get a user's inventory as item_key -> quantity
+        
+        The map is cached in Redis and kept up to date by
+        add_item_to_inventory and remove_item_from_inventory. A map loaded
+        from the database is only cached if no write bumped the user's map
+        generation while it was being read.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            dict: item_key -> quantity
+        """
+        redis_client = get_redis()
+        map_key, generation_key = _map_keys(user_id)
+        generation = None
+        
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hgetall(map_key)
+            pipe.get(generation_key)
+            cached, generation = pipe.execute()
+            if cached:
+                return {key: int(quantity) for key, quantity in cached.items() if key != LOADED_FIELD}
+            generation = generation or ''
+        except Exception as e:
+            logger.error(f"Failed to read cached inventory for user {user_id}: {e}")
+        
+        db: Session = next(get_db())
+        
+        try:
+            rows = db.query(Item.item_key, UserInventory.quantity).join(
+                Item, UserInventory.item_id == Item.id
+            ).filter(
+                UserInventory.user_id == user_id
+            ).all()
+            inventory_map = {item_key: quantity for item_key, quantity in rows}
+        except Exception as e:
+            logger.error(f"Failed to load inventory for user {user_id}: {e}")
+            return {}
+        finally:
+            db.close()
+        
+        if generation is None:
+            return inventory_map
+        
+        try:
+            if InventoryService._store_map_script is None:
+                InventoryService._store_map_script = redis_client.register_script(STORE_MAP_SCRIPT)
+            args = [generation, INVENTORY_MAP_TTL, LOADED_FIELD, 1]
+            for item_key, quantity in inventory_map.items():
+                args.extend([item_key, quantity])
+            InventoryService._store_map_script(keys=[map_key, generation_key], args=args)
+        except Exception as e:
+            logger.error(f"Failed to cache inventory for user {user_id}: {e}")
+        
+        return inventory_map
+    
+    @staticmethod
+    def _update_inventory_map(user_id: int, item_key: str, quantity: int):
+        """Write a changed quantity through to the cached inventory map"""
+        try:
+            if InventoryService._update_map_script is None:
+                InventoryService._update_map_script = get_redis().register_script(UPDATE_MAP_SCRIPT)
+            InventoryService._update_map_script(keys=_map_keys(user_id), args=[item_key, quantity, INVENTORY_MAP_TTL])
+        except Exception as e:
+            logger.error(f"Failed to update cached inventory for user {user_id}, dropping it: {e}")
+            get_redis().delete(f"inventory:map:{user_id}")
+    
+    @staticmethod
+    def invalidate_inventory_map(user_id: int):
+        """
+        Drop a user's cached inventory map
+        
+        Call after committing UserInventory changes made outside this service
+        (e.g. rewards written in the caller's transaction); the map is reloaded
+        from the database on next read.
+        """
+        map_key, generation_key = _map_keys(user_id)
+        try:
+            pipe = get_redis().pipeline(transaction=True)
+            pipe.incr(generation_key)
+            pipe.expire(generation_key, INVENTORY_MAP_TTL)
+            pipe.delete(map_key)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to drop cached inventory for user {user_id}: {e}")
+    
     @staticmethod
     def add_item_to_inventory(user_id: int, item_key: str, quantity: int = 1, source: str = "unknown") -> bool:
         """
@@ -34,7 +225,7 @@ class InventoryService:
         
         try:
             # Get item by key
-            item = db.query(Item).filter(Item.item_key == item_key).first()
+            item = InventoryService._get_catalog_item(item_key)
             if not item:
                 logger.error(f"Item not found: {item_key}")
                 return False
@@ -42,8 +233,8 @@ class InventoryService:
             # Get or create inventory entry
             inventory_entry = db.query(UserInventory).filter(
                 UserInventory.user_id == user_id,
-                UserInventory.item_id == item.id
-            ).first()
+                UserInventory.item_id == item["id"]
+            ).with_for_update().first()
             
             if inventory_entry:
                 # Update existing entry
@@ -52,19 +243,20 @@ class InventoryService:
                 # Create new entry
                 inventory_entry = UserInventory(
                     user_id=user_id,
-                    item_id=item.id,
+                    item_id=item["id"],
                     quantity=quantity
                 )
                 db.add(inventory_entry)
             
             db.commit()
+            InventoryService._update_inventory_map(user_id, item_key, inventory_entry.quantity)
             
             # Publish event
             event_bus.publish("gamification.item_acquired", {
                 "user_id": user_id,
                 "item_key": item_key,
-                "item_id": item.id,
-                "item_name": item.name,
+                "item_id": item["id"],
+                "item_name": item["name"],
                 "quantity": quantity,
                 "source": source,
                 "new_quantity": inventory_entry.quantity
@@ -102,7 +294,7 @@ class InventoryService:
         
         try:
             # Get item by key
-            item = db.query(Item).filter(Item.item_key == item_key).first()
+            item = InventoryService._get_catalog_item(item_key)
             if not item:
                 logger.error(f"Item not found: {item_key}")
                 return False
@@ -110,8 +302,8 @@ class InventoryService:
             # Get inventory entry
             inventory_entry = db.query(UserInventory).filter(
                 UserInventory.user_id == user_id,
-                UserInventory.item_id == item.id
-            ).first()
+                UserInventory.item_id == item["id"]
+            ).with_for_update().first()
             
             if not inventory_entry:
                 logger.error(f"User {user_id} doesn't have item {item_key}")
@@ -122,24 +314,26 @@ class InventoryService:
                 return False
             
             # Update or remove entry
-            if inventory_entry.quantity == quantity:
+            remaining_quantity = inventory_entry.quantity - quantity
+            if remaining_quantity == 0:
                 # Remove entry completely
                 db.delete(inventory_entry)
             else:
                 # Reduce quantity
-                inventory_entry.quantity -= quantity
+                inventory_entry.quantity = remaining_quantity
             
             db.commit()
+            InventoryService._update_inventory_map(user_id, item_key, remaining_quantity)
             
             # Publish event
             event_bus.publish("gamification.item_used", {
                 "user_id": user_id,
                 "item_key": item_key,
-                "item_id": item.id,
-                "item_name": item.name,
+                "item_id": item["id"],
+                "item_name": item["name"],
                 "quantity": quantity,
                 "purpose": purpose,
-                "remaining_quantity": inventory_entry.quantity if inventory_entry.quantity > quantity else 0
+                "remaining_quantity": remaining_quantity
             })
             
             logger.info(f"Removed {quantity} {item_key} from user {user_id}'s inventory for {purpose}")
@@ -166,33 +360,34 @@ class InventoryService:
         db: Session = next(get_db())
         
         try:
-            inventory = db.query(
-                UserInventory,
-                Item
-            ).join(
-                Item, UserInventory.item_id == Item.id
-            ).filter(
+            entries = db.query(UserInventory).filter(
                 UserInventory.user_id == user_id
-            ).order_by(
-                Item.item_type,
-                Item.rarity.desc(),
-                Item.name
             ).all()
             
+            items_by_id = {item["id"]: item for item in InventoryService.get_item_catalog().values()}
+            
             result = []
-            for inventory_entry, item in inventory:
+            for inventory_entry in entries:
+                item = items_by_id.get(inventory_entry.item_id)
+                if not item:
+                    continue
                 result.append({
                     "inventory_id": inventory_entry.id,
-                    "item_id": item.id,
-                    "item_key": item.item_key,
-                    "name": item.name,
-                    "description": item.description,
-                    "item_type": item.item_type,
-                    "rarity": item.rarity,
+                    "item_id": item["id"],
+                    "item_key": item["item_key"],
+                    "name": item["name"],
+                    "description": item["description"],
+                    "item_type": item["item_type"],
+                    "rarity": item["rarity"],
                     "quantity": inventory_entry.quantity,
                     "acquired_at": inventory_entry.acquired_at.isoformat() if hasattr(inventory_entry.acquired_at, 'isoformat') else None
                 })
             
+            # Same ordering as before: type, rarity descending, name
+            result.sort(key=lambda entry: entry["name"] or "")
+            result.sort(key=lambda entry: entry["rarity"] or "", reverse=True)
+            result.sort(key=lambda entry: entry["item_type"] or "")
+            
             return result
             
         except Exception as e:
@@ -214,25 +409,7 @@ class InventoryService:
         Returns:
             bool: True if user has the item with sufficient quantity
         """
-        db: Session = next(get_db())
-        
-        try:
-            inventory_entry = db.query(UserInventory).join(
-                Item, UserInventory.item_id == Item.id
-            ).filter(
-                UserInventory.user_id == user_id,
-                Item.item_key == item_key
-            ).first()
-            
-            if inventory_entry and inventory_entry.quantity >= min_quantity:
-                return True
-            return False
-            
-        except Exception as e:
-            logger.error(f"Failed to check item {item_key} for user {user_id}: {e}")
-            return False
-        finally:
-            db.close()
+        return InventoryService.get_inventory_map(user_id).get(item_key, 0) >= min_quantity
     
     @staticmethod
     def get_item_quantity(user_id: int, item_key: str) -> int:
@@ -246,23 +423,7 @@ class InventoryService:
         Returns:
             int: Quantity of the item, 0 if not found
         """
-        db: Session = next(get_db())
-        
-        try:
-            inventory_entry = db.query(UserInventory).join(
-                Item, UserInventory.item_id == Item.id
-            ).filter(
-                UserInventory.user_id == user_id,
-                Item.item_key == item_key
-            ).first()
-            
-            return inventory_entry.quantity if inventory_entry else 0
-            
-        except Exception as e:
-            logger.error(f"Failed to get quantity of {item_key} for user {user_id}: {e}")
-            return 0
-        finally:
-            db.close()
+        return InventoryService.get_inventory_map(user_id).get(item_key, 0)
     
     @staticmethod
     def get_item_by_key(item_key: str) -> Optional[Dict[str, Any]]:
@@ -275,31 +436,7 @@ class InventoryService:
         Returns:
             dict: Item details, or None if not found
         """
-        db: Session = next(get_db())
-        
-        try:
-            item = db.query(Item).filter(Item.item_key == item_key).first()
-            
-            if item:
-                return {
-                    "id": item.id,
-                    "item_key": item.item_key,
-                    "name": item.name,
-                    "description": item.description,
-                    "item_type": item.item_type,
-                    "rarity": item.rarity,
-                    "price_besitos": item.price_besitos,
-                    "item_metadata": item.item_metadata,
-                    "created_at": item.created_at.isoformat() if hasattr(item.created_at, 'isoformat') else None
-                }
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Failed to get item {item_key}: {e}")
-            return None
-        finally:
-            db.close()
+        return InventoryService._get_catalog_item(item_key)
 
 
 # Global service instance
@@ -0,0 +1,355 @@
+"""
+Leaderboards backed by Redis sorted sets
+Keeps global, weekly and daily rankings fed by gamification events
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from database.connection import get_db, get_redis, get_mongo
+from database.models import UserBalance, EventLog
+
+logger = logging.getLogger(__name__)
+
+# Board name -> description
+BOARDS = {
+    "besitos": "Besitos ganados",
+    "trivia": "Precisión en trivia (%)",
+    "reactions": "Reacciones en el canal",
+    "missions": "Misiones completadas"
+}
+
+WINDOWS = ("global", "weekly", "daily")
+
+# Finished periods stay readable for a while after rollover
+WINDOW_TTL = {
+    "weekly": 14 * 86400,
+    "daily": 2 * 86400
+}
+
+# The trivia board ranks accuracy, so users only appear on it once they have
+# answered enough questions in the window for the ratio to mean something
+TRIVIA_MIN_ANSWERS = {
+    "global": 20,
+    "weekly": 10,
+    "daily": 5
+}
+
+# Count a trivia answer and re-rank the user by accuracy
+# KEYS[1]: "{user_id}:answered" / "{user_id}:correct" counters hash of the
+# window, KEYS[2]: the window's trivia board
+# ARGV: user_id, 1 if correct else 0, minimum answers, ttl (0 = no expiry)
+# Returns the user's accuracy in percent, or -1 while below the minimum
+RECORD_TRIVIA_SCRIPT = """
+local answered = redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':answered', 1)
+local correct = redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':correct', tonumber(ARGV[2]))
+local ttl = tonumber(ARGV[4])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+if answered < tonumber(ARGV[3]) then
+    return -1
+end
+local accuracy = math.floor(correct * 10000 / answered + 0.5) / 100
+redis.call('ZADD', KEYS[2], accuracy, ARGV[1])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[2], ttl)
+end
+return tostring(accuracy)
+"""
+
+
+def _accuracy(correct: int, answered: int) -> float:
+    """Accuracy in percent, rounded like RECORD_TRIVIA_SCRIPT"""
+    return int(correct * 10000 / answered + 0.5) / 100
+
+
+class LeaderboardService:
+    """Service for ranking users with O(log n) sorted set queries"""
+    
+    def __init__(self):
+        self.redis_client = get_redis()
+        self._trivia_script = self.redis_client.register_script(RECORD_TRIVIA_SCRIPT)
+    
+    def _period_id(self, window: str, now: Optional[datetime] = None) -> str:
+        """Get the period identifier for a window; new periods start new keys"""
+        now = now or datetime.now(timezone.utc)
+        if window == "daily":
+            return now.strftime("%Y-%m-%d")
+        if window == "weekly":
+            year, week, _ = now.isocalendar()
+            return f"{year}-W{week:02d}"
+        return "all"
+    
+    def _key(self, board: str, window: str, now: Optional[datetime] = None) -> str:
+        if board not in BOARDS:
+            raise ValueError(f"Unknown leaderboard: {board}")
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown leaderboard window: {window}")
+        return f"leaderboard:{board}:{window}:{self._period_id(window, now)}"
+    
+    def record(self, board: str, user_id: int, amount: float = 1) -> bool:
+        """
+        Add points to a user in every window of a board
+        
+        Args:
+            board: Board name (see BOARDS)
+            user_id: User ID
+            amount: Points to add
+        
+        Returns:
+            bool: True if recorded
+        """
+        if amount <= 0:
+            return False
+        
+        try:
+            now = datetime.now(timezone.utc)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for window in WINDOWS:
+                key = self._key(board, window, now)
+                pipe.zincrby(key, amount, user_id)
+                if window in WINDOW_TTL:
+                    pipe.expire(key, WINDOW_TTL[window])
+            pipe.execute()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error recording {board} leaderboard points for user {user_id}: {e}")
+            return False
+    
+    def record_trivia(self, user_id: int, correct: bool) -> bool:
+        """
+        Count a trivia answer in every window and re-rank the user by accuracy
+        
+        Args:
+            user_id: User ID
+            correct: Whether the answer was correct
+        
+        Returns:
+            bool: True if recorded
+        """
+        try:
+            now = datetime.now(timezone.utc)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for window in WINDOWS:
+                key = self._key("trivia", window, now)
+                self._trivia_script(
+                    keys=[f"{key}:counts", key],
+                    args=[user_id, 1 if correct else 0, TRIVIA_MIN_ANSWERS[window], WINDOW_TTL.get(window, 0)],
+                    client=pipe
+                )
+            pipe.execute()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error recording trivia leaderboard answer for user {user_id}: {e}")
+            return False
+    
+    def get_top(self, board: str, window: str = "global", limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the top N users of a board
+        
+        Args:
+            board: Board name
+            window: 'global', 'weekly' or 'daily'
+            limit: Number of users to return
+        
+        Returns:
+            List of dicts with rank, user_id and score
+        """
+        try:
+            entries = self.redis_client.zrevrange(self._key(board, window), 0, limit - 1, withscores=True)
+            return self._format_entries(entries, start_rank=1)
+        
+        except Exception as e:
+            logger.error(f"Error getting top of {board} leaderboard: {e}")
+            return []
+    
+    def get_rank(self, board: str, user_id: int, window: str = "global") -> Optional[Dict[str, Any]]:
+        """
+        Get a user's rank and score on a board
+        
+        Args:
+            board: Board name
+            user_id: User ID
+            window: 'global', 'weekly' or 'daily'
+        
+        Returns:
+            Dict with rank, score and total users, or None if the user is not ranked
+        """
+        try:
+            key = self._key(board, window)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zrevrank(key, user_id)
+            pipe.zscore(key, user_id)
+            pipe.zcard(key)
+            rank, score, total = pipe.execute()
+            
+            if rank is None:
+                return None
+            
+            return {
+                "user_id": user_id,
+                "rank": rank + 1,
+                "score": int(round(score)),
+                "total_users": total
+            }
+        
+        except Exception as e:
+            logger.error(f"Error getting {board} rank for user {user_id}: {e}")
+            return None
+    
+    def get_around_me(self, board: str, user_id: int, window: str = "global", radius: int = 5) -> List[Dict[str, Any]]:
+        """
+        Get the users ranked just above and below a user
+        
+        Args:
+            board: Board name
+            user_id: User ID
+            window: 'global', 'weekly' or 'daily'
+            radius: Number of neighbours on each side
+        
+        Returns:
+            List of dicts with rank, user_id and score, or empty if not ranked
+        """
+        try:
+            key = self._key(board, window)
+            rank = self.redis_client.zrevrank(key, user_id)
+            
+            if rank is None:
+                return []
+            
+            start = max(0, rank - radius)
+            entries = self.redis_client.zrevrange(key, start, rank + radius, withscores=True)
+            return self._format_entries(entries, start_rank=start + 1)
+        
+        except Exception as e:
+            logger.error(f"Error getting {board} neighbours for user {user_id}: {e}")
+            return []
+    
+    def _format_entries(self, entries, start_rank: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "rank": start_rank + i,
+                "user_id": int(member),
+                "score": int(round(score))
+            }
+            for i, (member, score) in enumerate(entries)
+        ]
+    
+    def handle_event(self, event: Dict[str, Any]):
+        """Update boards from a gamification event"""
+        event_type = event.get("type")
+        data = event.get("data", {})
+        user_id = data.get("user_id")
+        
+        if not user_id:
+            return
+        
+        if event_type == "gamification.besitos_earned":
+            self.record("besitos", user_id, data.get("amount", 0))
+        elif event_type == "gamification.trivia_answered":
+            self.record_trivia(user_id, bool(data.get("correct")))
+        elif event_type == "admin.reaction_added":
+            self.record("reactions", user_id)
+        elif event_type == "gamification.mission_completed":
+            self.record("missions", user_id)
+    
+    def ensure_global_boards(self) -> bool:
+        """Build the global boards from stored data if they were never built"""
+        if self.redis_client.exists("leaderboard:seeded"):
+            return False
+        return self.rebuild_global_boards()
+    
+    def rebuild_global_boards(self) -> bool:
+        """
+        Rebuild the all-time boards from Postgres and Mongo
+        
+        Each board reads the record its live events come from: the balance
+        ledger, the event log of completed missions and the trivia stats,
+        whose answer counters are restored too so live answers keep
+        re-ranking from the right totals. Every key is written to a temporary
+        key and renamed into place, so readers never see a partially built
+        ranking. Weekly and daily windows are not rebuilt; they fill up from
+        events.
+        
+        Returns:
+            bool: True if rebuilt successfully
+        """
+        db: Session = next(get_db())
+        try:
+            scores = {
+                "besitos": {
+                    user_id: lifetime
+                    for user_id, lifetime in db.query(
+                        UserBalance.user_id, UserBalance.lifetime_besitos
+                    ).filter(UserBalance.lifetime_besitos > 0)
+                },
+                # user_missions rows are recycled by the daily reset, so count
+                # the logged completion events the live board is fed from
+                "missions": {
+                    user_id: completed
+                    for user_id, completed in db.query(
+                        EventLog.user_id, func.count(EventLog.id)
+                    ).filter(
+                        EventLog.event_type == "gamification.mission_completed",
+                        EventLog.user_id.isnot(None)
+                    ).group_by(EventLog.user_id)
+                },
+                "trivia": {}
+            }
+            
+            trivia_counts = {}
+            for doc in get_mongo().trivia_stats.find(
+                {"total_answered": {"$gt": 0}},
+                {"user_id": 1, "total_answered": 1, "correct_answers": 1}
+            ):
+                answered, correct = doc["total_answered"], doc.get("correct_answers", 0)
+                trivia_counts[f"{doc['user_id']}:answered"] = answered
+                trivia_counts[f"{doc['user_id']}:correct"] = correct
+                if answered >= TRIVIA_MIN_ANSWERS["global"]:
+                    scores["trivia"][doc["user_id"]] = _accuracy(correct, answered)
+        
+        except Exception as e:
+            logger.error(f"Error aggregating leaderboard data: {e}")
+            return False
+        finally:
+            db.close()
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            for board, board_scores in scores.items():
+                key = self._key(board, "global")
+                if board_scores:
+                    pipe.delete(f"{key}:rebuild")
+                    pipe.zadd(f"{key}:rebuild", board_scores)
+                    pipe.rename(f"{key}:rebuild", key)
+                else:
+                    pipe.delete(key)
+            
+            counts_key = f"{self._key('trivia', 'global')}:counts"
+            if trivia_counts:
+                pipe.delete(f"{counts_key}:rebuild")
+                pipe.hset(f"{counts_key}:rebuild", mapping=trivia_counts)
+                pipe.rename(f"{counts_key}:rebuild", counts_key)
+            else:
+                pipe.delete(counts_key)
+            
+            # Reactions are already ranked by the reactions service
+            pipe.zunionstore(self._key("reactions", "global"), ["reactions:top_reactors"])
+            pipe.set("leaderboard:seeded", int(datetime.now(timezone.utc).timestamp()))
+            pipe.execute()
+            
+            logger.info("Rebuilt global leaderboards")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error rebuilding global leaderboards: {e}")
+            return False
+
+
+# Global service instance
+leaderboard_service = LeaderboardService()
@@ -5,12 +5,15 @@ Handles mission assignment, progress tracking, and completion
 
 import logging
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 from sqlalchemy.orm import Session
 
-from database.connection import get_db
+from config.settings import settings
+from database.connection import get_db, get_redis
 from database.models import Mission, UserMission, User, UserBalance, Item, UserInventory
 from core.event_bus import event_bus
+from modules.gamification.inventory import InventoryService
+from utils.cache_manager import cache_manager
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +21,15 @@ logger = logging.getLogger(__name__)
 class MissionService:
     """Service for managing missions and user mission progress"""
     
-    def __init__(self):
+    DAILY_SET_CACHE_KEY = "missions:daily_set"
+    DAILY_SET_CACHE_TTL = 300  # 5 minutes
+    # Bumped on admin mission changes so every process drops its cached set
+    DAILY_SET_GENERATION_KEY = "missions:daily_set_generation"
+    
+    def __init__(self, lazy_daily: Optional[bool] = None):
         self.db: Session = next(get_db())
+        self.redis = get_redis()
+        self.lazy_daily = settings.lazy_daily_missions if lazy_daily is None else lazy_daily
     
     def assign_mission(self, user_id: int, mission_key: str) -> bool:
         """
@@ -165,12 +175,16 @@ class MissionService:
             
             self.db.commit()
             
+            if (mission.rewards or {}).get("items"):
+                InventoryService.invalidate_inventory_map(user_id)
+            
             # Publish event
             event_bus.publish("gamification.mission_completed", {
                 "user_id": user_id,
                 "mission_id": mission_id,
                 "mission_key": mission.mission_key,
                 "mission_title": mission.title,
+                "mission_type": mission.mission_type,
                 "rewards": mission.rewards
             })
             
@@ -253,22 +267,163 @@ class MissionService:
             bool: True if missions were assigned successfully
         """
         try:
-            daily_missions = self.db.query(Mission).filter(
-                Mission.mission_type == "daily",
-                Mission.is_active == True
-            ).all()
+            daily_set = self._get_daily_set()
+            if not daily_set["missions"]:
+                return False
             
-            success_count = 0
-            for mission in daily_missions:
-                if self.assign_mission(user_id, mission.mission_key):
-                    success_count += 1
+            success_count = self._materialize_daily_missions(user_id, daily_set["missions"])
             
             logger.info(f"Assigned {success_count} daily missions to user {user_id}")
             return success_count > 0
             
         except Exception as e:
             logger.error(f"Failed to assign daily missions to user {user_id}: {e}")
+            self.db.rollback()
+            return False
+    
+    def ensure_daily_missions(self, user_id: int) -> bool:
+        """
+        Lazily materialize today's daily missions for a user
+        
+        Called on the first /missions or tracked event of the day. A per-user
+        daily set version is cached in Redis so repeated calls are a single GET.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            bool: True if missions were materialized by this call
+        """
+        if not self.lazy_daily:
             return False
+        
+        try:
+            version_key = f"missions:daily_version:{user_id}"
+            stored_version, generation = self.redis.mget(version_key, self.DAILY_SET_GENERATION_KEY)
+            daily_set = self._get_daily_set(generation)
+            
+            if stored_version == daily_set["version"]:
+                return False
+            
+            if daily_set["missions"]:
+                created = self._materialize_daily_missions(user_id, daily_set["missions"])
+                logger.info(f"Materialized {created} daily missions for user {user_id}")
+            
+            self.redis.set(version_key, daily_set["version"], ex=self._seconds_until_midnight())
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to materialize daily missions for user {user_id}: {e}")
+            self.db.rollback()
+            return False
+    
+    def invalidate_daily_set(self) -> None:
+        """Drop the cached daily mission set in every process (call after admin mission changes)"""
+        cache_manager.delete(self.DAILY_SET_CACHE_KEY)
+        try:
+            self.redis.incr(self.DAILY_SET_GENERATION_KEY)
+        except Exception as e:
+            logger.error(f"Failed to invalidate daily mission set: {e}")
+    
+    def _get_daily_set(self, generation: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get today's daily mission set and its version
+        
+        The version combines the date and the active daily mission ids, so a
+        new day or a changed mission set forces re-materialization.
+        
+        Args:
+            generation: Current DAILY_SET_GENERATION_KEY value, if already read
+            
+        Returns:
+            dict: {"version": str, "missions": [(mission_id, mission_key, title), ...]}
+        """
+        today = date.today().isoformat()
+        if generation is None:
+            generation = self.redis.get(self.DAILY_SET_GENERATION_KEY)
+        generation = generation or "0"
+        daily_set = cache_manager.get(self.DAILY_SET_CACHE_KEY)
+        
+        if daily_set is None or daily_set["date"] != today or daily_set["generation"] != generation:
+            daily_missions = self.db.query(Mission.id, Mission.mission_key, Mission.title).filter(
+                Mission.mission_type == "daily",
+                Mission.is_active == True
+            ).order_by(Mission.id).all()
+            
+            missions = [(m.id, m.mission_key, m.title) for m in daily_missions]
+            daily_set = {
+                "date": today,
+                "generation": generation,
+                "version": f"{today}:{','.join(str(m[0]) for m in missions)}",
+                "missions": missions
+            }
+            cache_manager.set(self.DAILY_SET_CACHE_KEY, daily_set, self.DAILY_SET_CACHE_TTL)
+        
+        return daily_set
+    
+    def _materialize_daily_missions(self, user_id: int, missions: List[tuple]) -> int:
+        """
+        Create or reset today's UserMission rows for a user in one commit
+        
+        Args:
+            user_id: User ID
+            missions: List of (mission_id, mission_key, title) tuples
+            
+        Returns:
+            int: Number of missions assigned or reset for today
+        """
+        today = date.today()
+        mission_ids = [m[0] for m in missions]
+        
+        existing = {
+            um.mission_id: um for um in self.db.query(UserMission).filter(
+                UserMission.user_id == user_id,
+                UserMission.mission_id.in_(mission_ids)
+            ).all()
+        }
+        
+        assigned = []
+        for mission_id, mission_key, title in missions:
+            user_mission = existing.get(mission_id)
+            
+            if user_mission is None:
+                self.db.add(UserMission(
+                    user_id=user_id,
+                    mission_id=mission_id,
+                    status="active",
+                    progress={}
+                ))
+            elif user_mission.assigned_at is None or user_mission.assigned_at.date() < today:
+                # Recycle yesterday's row for today (user_missions is keyed by user+mission)
+                user_mission.status = "active"
+                user_mission.progress = {}
+                user_mission.assigned_at = datetime.now()
+                user_mission.completed_at = None
+            else:
+                continue
+            
+            assigned.append((mission_id, mission_key, title))
+        
+        if not assigned:
+            return 0
+        
+        self.db.commit()
+        
+        for mission_id, mission_key, title in assigned:
+            event_bus.publish("gamification.mission_assigned", {
+                "user_id": user_id,
+                "mission_id": mission_id,
+                "mission_key": mission_key,
+                "mission_title": title
+            })
+        
+        return len(assigned)
+    
+    def _seconds_until_midnight(self) -> int:
+        """Seconds left in the current day, used as the daily version TTL"""
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return max(1, int((midnight - now).total_seconds()))
     
     def _is_mission_completed(self, requirements: Dict[str, Any], progress: Dict[str, Any]) -> bool:
         """
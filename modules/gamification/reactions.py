@@ -1,14 +1,21 @@
 import logging
+import time
+from collections import defaultdict
 from typing import Dict, List, Optional, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, insert
 from datetime import datetime, timedelta
-from database.connection import get_db
+from database.connection import get_db, get_redis
+from database.models import ContentReaction
 from core.event_bus import event_bus
 from modules.gamification.besitos import besitos_service
 
 logger = logging.getLogger(__name__)
 
+# Per-content emoji counters live in reactions:content:{content_type}:{content_id}
+# hashes; this key records when they were last rebuilt from content_reactions
+CONTENT_COUNTERS_SEEDED_KEY = "reactions:content_counters:seeded"
+
 
 class ReactionProcessor:
     """Processor for handling user reactions to content with rewards"""
@@ -79,6 +86,9 @@ class ReactionProcessor:
                     description=f"Reacción {reaction_type} en {content_type}"
                 )
             
+            # Update materialized counters
+            ReactionProcessor._increment_counters(content_type, content_id, reaction_type)
+            
             # Emit event
             event_bus.publish("gamification.reaction_registered", {
                 "user_id": user_id,
@@ -151,28 +161,106 @@ class ReactionProcessor:
     def _register_reaction(user_id: int, content_type: str, content_id: int, reaction_type: str, besitos_amount: int, db: Session) -> int:
         """Register reaction in database"""
         try:
-            # This would create a ContentReaction record
-            # For now, we'll return a mock ID
-            return 1
+            reaction_id = db.execute(
+                insert(ContentReaction).values(
+                    user_id=user_id,
+                    content_type=content_type,
+                    content_id=content_id,
+                    reaction_type=reaction_type,
+                    besitos_earned=besitos_amount
+                ).returning(ContentReaction.id)
+            ).scalar()
+            db.commit()
+            return reaction_id
         except Exception as e:
             logger.error(f"Error registering reaction: {e}")
             raise e
     
+    @staticmethod
+    def _counters_key(content_type: str, content_id: int) -> str:
+        return f"reactions:content:{content_type}:{content_id}"
+    
+    @staticmethod
+    def _increment_counters(content_type: str, content_id: int, reaction_type: str):
+        """Increment the per-content reaction counter for this emoji"""
+        try:
+            get_redis().hincrby(
+                ReactionProcessor._counters_key(content_type, content_id), reaction_type, 1
+            )
+        except Exception as e:
+            logger.error(f"Error updating reaction counters: {e}")
+    
+    @staticmethod
+    def ensure_reaction_counters() -> bool:
+        """Build the per-content counters from content_reactions if they were never built"""
+        try:
+            if get_redis().exists(CONTENT_COUNTERS_SEEDED_KEY):
+                return False
+        except Exception as e:
+            logger.error(f"Error checking reaction counters: {e}")
+            return False
+        return ReactionProcessor.rebuild_reaction_counters()
+    
+    @staticmethod
+    def rebuild_reaction_counters() -> bool:
+        """
+        Rebuild every per-content reaction counter from content_reactions
+        
+        Returns:
+            bool: True if rebuilt successfully
+        """
+        db: Session = next(get_db())
+        try:
+            rows = db.query(
+                ContentReaction.content_type,
+                ContentReaction.content_id,
+                ContentReaction.reaction_type,
+                func.count(ContentReaction.id)
+            ).group_by(
+                ContentReaction.content_type,
+                ContentReaction.content_id,
+                ContentReaction.reaction_type
+            ).all()
+            
+        except Exception as e:
+            logger.error(f"Error aggregating content reactions for counters: {e}")
+            return False
+        finally:
+            db.close()
+        
+        try:
+            redis_client = get_redis()
+            pipe = redis_client.pipeline(transaction=True)
+            for key in redis_client.scan_iter(match=ReactionProcessor._counters_key("*", "*")):
+                pipe.delete(key)
+            
+            counters = defaultdict(dict)
+            for content_type, content_id, reaction_type, count in rows:
+                counters[ReactionProcessor._counters_key(content_type, content_id)][reaction_type] = count
+            for key, mapping in counters.items():
+                pipe.hset(key, mapping=mapping)
+            
+            pipe.set(CONTENT_COUNTERS_SEEDED_KEY, int(time.time()))
+            pipe.execute()
+            
+            logger.info(f"Rebuilt reaction counters for {len(counters)} content items")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error rebuilding reaction counters: {e}")
+            return False
+    
     @staticmethod
     def get_reaction_stats(content_type: str, content_id: int) -> Dict[str, int]:
         """Get reaction statistics for specific content"""
+        stats = {reaction_type: 0 for reaction_type in ReactionProcessor.DEFAULT_REACTION_REWARDS}
         try:
-            # This would aggregate reactions from ContentReaction model
-            # For now, return mock data
-            return {
-                '❤️': 5,
-                '🔥': 3,
-                '⭐': 2,
-                '👍': 8
-            }
+            counters = get_redis().hgetall(ReactionProcessor._counters_key(content_type, content_id))
+            stats.update({reaction_type: int(count) for reaction_type, count in counters.items()})
+            return stats
         except Exception as e:
             logger.error(f"Error getting reaction stats: {e}")
-            return {}
+            return stats
     
     @staticmethod
     def get_user_reactions(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
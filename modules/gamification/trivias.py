@@ -3,84 +3,182 @@ Trivia service for DianaBot
 Handles trivia questions, answers, and rewards
 """
 
-import random
+import json
+import logging
+import time
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 from pymongo import MongoClient
 from bson import ObjectId
 
 from database.mongo_schemas import TriviaQuestion
-from database.connection import mongo_db
+from database.connection import mongo_db, get_redis
 from core.event_bus import EventBus
 from modules.gamification.besitos import BesitosService
 from modules.gamification.inventory import InventoryService
+from utils.cache_manager import cache_manager
+
+logger = logging.getLogger(__name__)
+
+# Pick a random pool member the user has not seen recently
+# KEYS: pool set, user's recently seen set
+# ARGV: number of candidates to sample
+PICK_TRIVIA_SCRIPT = """
+local candidates = redis.call('SRANDMEMBER', KEYS[1], tonumber(ARGV[1]))
+for _, trivia_id in ipairs(candidates) do
+    if redis.call('SISMEMBER', KEYS[2], trivia_id) == 0 then
+        return trivia_id
+    end
+end
+return candidates[1]
+"""
 
 
 class TriviaService:
     """Service for managing trivia questions and answers"""
     
+    POOL_KEY_PREFIX = "trivia:pool"
+    POOL_ALL = "*"
+    PICK_CANDIDATES = 10
+    SEEN_TTL = 86400  # 24 hours
+    DOC_CACHE_TTL = 3600  # 1 hour
+    SERVED_GRACE_SECONDS = 60
+    
     def __init__(self):
         self.db = mongo_db
         self.trivia_collection = self.db.trivia_questions
         self.trivia_stats_collection = self.db.trivia_stats
+        self.redis = get_redis()
+        self._pick_script = self.redis.register_script(PICK_TRIVIA_SCRIPT)
         
         self.besitos_service = BesitosService()
         self.inventory_service = InventoryService()
         self.event_bus = EventBus()
     
-    def get_random_trivia(self, category: Optional[str] = None, difficulty: Optional[str] = None) -> Optional[Dict]:
-        """Get a random trivia question based on filters"""
-        query = {}
-        
-        if category:
-            query["category"] = category
-        
-        if difficulty:
-            query["difficulty"] = difficulty
-        
-        # Get count for random sampling
-        count = self.trivia_collection.count_documents(query)
-        if count == 0:
+    def get_random_trivia(
+        self,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Get a random trivia question based on filters
+        
+        Picks from pre-bucketed Redis id pools, avoiding questions the user
+        has seen in the last 24 hours when possible.
+        """
+        if not self.redis.exists(self._pool_key(None, None)):
+            self.rebuild_pools()
+        
+        seen_key = self._seen_key(user_id) if user_id else "trivia:seen:none"
+        trivia_id = self._pick_script(
+            keys=[self._pool_key(category, difficulty), seen_key],
+            args=[self.PICK_CANDIDATES]
+        )
+        if not trivia_id:
             return None
         
-        # Get random document
-        random_index = random.randint(0, count - 1)
-        trivia_doc = self.trivia_collection.find(query).skip(random_index).limit(1).next()
+        trivia = self.get_trivia_by_id(trivia_id)
+        
+        if user_id and trivia:
+            self.redis.sadd(seen_key, trivia_id)
+            self.redis.expire(seen_key, self.SEEN_TTL)
+            self._record_served(user_id, trivia)
         
-        return self._format_trivia_for_display(trivia_doc)
+        return trivia
     
     def get_trivia_by_id(self, trivia_id: str) -> Optional[Dict]:
         """Get trivia question by ID"""
+        cache_key = f"trivia:doc:{trivia_id}"
+        trivia = cache_manager.get(cache_key)
+        if trivia is not None:
+            return trivia
+        
         try:
             trivia_doc = self.trivia_collection.find_one({"_id": ObjectId(trivia_id)})
-            return self._format_trivia_for_display(trivia_doc) if trivia_doc else None
         except:
             return None
+        
+        if not trivia_doc:
+            return None
+        
+        trivia = self._format_trivia_for_display(trivia_doc)
+        cache_manager.set(cache_key, trivia, self.DOC_CACHE_TTL)
+        return trivia
+    
+    def rebuild_pools(self) -> int:
+        """
+        Rebuild the (category, difficulty) id pools from MongoDB
+        
+        Call after seeding or admin changes to trivia questions. Each question
+        is added to its exact bucket and to the wildcard buckets so any filter
+        combination is a single SRANDMEMBER.
+        
+        Returns:
+            int: Number of questions pooled
+        """
+        pools: Dict[str, List[str]] = {}
+        count = 0
+        
+        for doc in self.trivia_collection.find({}, {"_id": 1, "category": 1, "difficulty": 1}):
+            trivia_id = str(doc["_id"])
+            for category in (doc.get("category"), None):
+                for difficulty in (doc.get("difficulty"), None):
+                    pools.setdefault(self._pool_key(category, difficulty), []).append(trivia_id)
+            count += 1
+        
+        # Swap pools in atomically and drop stale ones
+        existing = set(self.redis.scan_iter(f"{self.POOL_KEY_PREFIX}:*"))
+        pipe = self.redis.pipeline(transaction=True)
+        for pool_key, trivia_ids in pools.items():
+            pipe.delete(pool_key)
+            pipe.sadd(pool_key, *trivia_ids)
+        stale = existing - set(pools)
+        if stale:
+            pipe.delete(*stale)
+        pipe.execute()
+        
+        cache_manager.invalidate_pattern("trivia:doc:")
+        logger.info(f"Rebuilt trivia pools with {count} questions in {len(pools)} buckets")
+        return count
     
     def submit_answer(
         self, 
         user_id: int, 
         trivia_id: str, 
         answer: str, 
-        response_time: float
+        response_time: Optional[float] = None
     ) -> Dict[str, Any]:
-        """Submit answer to trivia question and process rewards"""
+        """
+        Submit answer to trivia question and process rewards
         
-        # Get trivia question
-        trivia = self.get_trivia_by_id(trivia_id)
-        if not trivia:
-            return {"success": False, "error": "Trivia not found"}
+        The answer is checked against the served-question record written when
+        the question was handed out, so no Mongo fetch is needed. The record is
+        consumed atomically, which rejects replays, and its timestamp gives a
+        server-side response time; a client-reported time can only make the
+        answer slower, never earn a speed bonus it did not get.
+        
+        Without a served record (the question was handed out without a user
+        id, the answer came after the time limit plus SERVED_GRACE_SECONDS,
+        or it was already answered) the answer is graded against the stored
+        question but earns no rewards and is left out of the stats; the
+        result carries "late": True.
+        """
+        
+        served = self._consume_served(user_id, trivia_id)
+        if not served:
+            return self._grade_unserved(trivia_id, answer, response_time)
         
-        # Find correct answer
-        correct_option = None
-        for option in trivia["options"]:
-            if option["is_correct"]:
-                correct_option = option["option_id"]
-                break
+        trivia = served["trivia"]
+        correct_option = served["correct_option"]
         
         if not correct_option:
             return {"success": False, "error": "No correct option found"}
         
+        server_response_time = time.time() - served["served_at"]
+        if response_time is None or server_response_time > response_time:
+            response_time = server_response_time
+        
         # Check if answer is correct
         is_correct = (answer == correct_option)
         
@@ -96,7 +194,7 @@ class TriviaService:
                 self.inventory_service.add_item_to_inventory(user_id, item["item_key"], item.get("quantity", 1), "trivia_reward")
         
         # Update statistics
-        self._update_trivia_stats(user_id, trivia, is_correct, response_time)
+        self._update_trivia_stats(user_id, trivia, is_correct, response_time, rewards.get("besitos", 0))
         
         # Publish event
         self.event_bus.publish(
@@ -139,13 +237,14 @@ class TriviaService:
         
         total_answered = stats.get("total_answered", 0)
         correct_answers = stats.get("correct_answers", 0)
+        total_response_time = stats.get("total_response_time", 0.0)
         
         return {
             "total_answered": total_answered,
             "correct_answers": correct_answers,
             "incorrect_answers": total_answered - correct_answers,
             "accuracy": (correct_answers / total_answered * 100) if total_answered > 0 else 0.0,
-            "average_response_time": stats.get("average_response_time", 0.0),
+            "average_response_time": (total_response_time / total_answered) if total_answered > 0 else 0.0,
             "total_besitos_earned": stats.get("total_besitos_earned", 0),
             "category_stats": stats.get("category_stats", {}),
             "difficulty_stats": stats.get("difficulty_stats", {})
@@ -159,6 +258,68 @@ class TriviaService:
         """Get available difficulty levels"""
         return self.trivia_collection.distinct("difficulty")
     
+    def is_served(self, user_id: int, trivia_id: str) -> bool:
+        """Whether the user has an unanswered, unexpired served record for the trivia"""
+        return bool(self.redis.exists(self._served_key(user_id, trivia_id)))
+    
+    def _grade_unserved(self, trivia_id: str, answer: str, response_time: Optional[float]) -> Dict[str, Any]:
+        """Grade an answer with no served record, without rewards or stats"""
+        trivia = self.get_trivia_by_id(trivia_id)
+        if not trivia:
+            return {"success": False, "error": "Trivia not found"}
+        
+        correct_option = self._correct_option(trivia)
+        if not correct_option:
+            return {"success": False, "error": "No correct option found"}
+        
+        return {
+            "success": True,
+            "correct": answer == correct_option,
+            "correct_answer": correct_option,
+            "rewards": {},
+            "response_time": response_time or 0.0,
+            "late": True
+        }
+    
+    def _correct_option(self, trivia: Dict) -> Optional[str]:
+        return next(
+            (option["option_id"] for option in trivia["options"] if option["is_correct"]),
+            None
+        )
+    
+    def _record_served(self, user_id: int, trivia: Dict) -> None:
+        """Remember what was served to the user, for answer verification"""
+        correct_option = self._correct_option(trivia)
+        served = {
+            "trivia": {
+                "question_key": trivia["question_key"],
+                "category": trivia["category"],
+                "difficulty": trivia["difficulty"],
+                "rewards": trivia["rewards"]
+            },
+            "correct_option": correct_option,
+            "served_at": time.time()
+        }
+        ttl = int(trivia.get("time_limit_seconds", 30)) + self.SERVED_GRACE_SECONDS
+        self.redis.set(self._served_key(user_id, trivia["_id"]), json.dumps(served), ex=ttl)
+    
+    def _consume_served(self, user_id: int, trivia_id: str) -> Optional[Dict]:
+        """Atomically read and delete the served-question record"""
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(self._served_key(user_id, trivia_id))
+        pipe.delete(self._served_key(user_id, trivia_id))
+        raw, _ = pipe.execute()
+        return json.loads(raw) if raw else None
+    
+    def _served_key(self, user_id: int, trivia_id: str) -> str:
+        return f"trivia:served:{user_id}:{trivia_id}"
+    
+    def _pool_key(self, category: Optional[str], difficulty: Optional[str]) -> str:
+        return f"{self.POOL_KEY_PREFIX}:{category or self.POOL_ALL}:{difficulty or self.POOL_ALL}"
+    
+    def _seen_key(self, user_id: int) -> str:
+        return f"trivia:seen:{user_id}"
+    
     def _format_trivia_for_display(self, trivia_doc: Dict) -> Dict:
         """Format trivia document for display"""
         return {
@@ -189,54 +350,36 @@ class TriviaService:
         
         return rewards
     
-    def _update_trivia_stats(self, user_id: int, trivia: Dict, is_correct: bool, response_time: float):
-        """Update user trivia statistics"""
-        
-        stats = self.trivia_stats_collection.find_one({"user_id": user_id})
-        
-        if not stats:
-            stats = {
-                "user_id": user_id,
-                "total_answered": 0,
-                "correct_answers": 0,
-                "total_response_time": 0.0,
-                "total_besitos_earned": 0,
-                "category_stats": {},
-                "difficulty_stats": {}
-            }
-        
-        # Update basic stats
-        stats["total_answered"] += 1
-        stats["total_response_time"] += response_time
-        
-        if is_correct:
-            stats["correct_answers"] += 1
-        
-        # Update category stats
+    def _update_trivia_stats(
+        self,
+        user_id: int,
+        trivia: Dict,
+        is_correct: bool,
+        response_time: float,
+        besitos_earned: int = 0
+    ):
+        """
+        Update user trivia statistics
+        
+        A single upsert with $inc on the counters, so concurrent answers never
+        lose updates; averages are derived on read in get_trivia_stats.
+        """
+        correct = 1 if is_correct else 0
         category = trivia["category"]
-        if category not in stats["category_stats"]:
-            stats["category_stats"][category] = {"answered": 0, "correct": 0}
-        
-        stats["category_stats"][category]["answered"] += 1
-        if is_correct:
-            stats["category_stats"][category]["correct"] += 1
-        
-        # Update difficulty stats
         difficulty = trivia["difficulty"]
-        if difficulty not in stats["difficulty_stats"]:
-            stats["difficulty_stats"][difficulty] = {"answered": 0, "correct": 0}
-        
-        stats["difficulty_stats"][difficulty]["answered"] += 1
-        if is_correct:
-            stats["difficulty_stats"][difficulty]["correct"] += 1
-        
-        # Calculate averages
-        stats["average_response_time"] = stats["total_response_time"] / stats["total_answered"]
         
-        # Update or insert stats
         self.trivia_stats_collection.update_one(
             {"user_id": user_id},
-            {"$set": stats},
+            {"$inc": {
+                "total_answered": 1,
+                "correct_answers": correct,
+                "total_response_time": response_time,
+                "total_besitos_earned": besitos_earned,
+                f"category_stats.{category}.answered": 1,
+                f"category_stats.{category}.correct": correct,
+                f"difficulty_stats.{difficulty}.answered": 1,
+                f"difficulty_stats.{difficulty}.correct": correct
+            }},
             upsert=True
         )
 
@@ -9,6 +9,7 @@ from database.connection import get_db, get_mongo
 from database.models import NarrativeLevel, NarrativeFragment, UserNarrativeProgress, User
 from modules.narrative.unlocks import UnlockEngine
 from modules.narrative.flags import set_narrative_flag, get_narrative_flag, get_all_narrative_flags
+from modules.gamification.inventory import inventory_service
 
 logger = logging.getLogger(__name__)
 
@@ -232,10 +233,12 @@ class NarrativeEngine:
         
         # Check item requirements
         if "has_item" in visible_if:
-            required_item = visible_if["has_item"]
-            # TODO: Integrate with inventory system
-            # For now, assume user has the item
-            pass
+            required_items = visible_if["has_item"]
+            if isinstance(required_items, str):
+                required_items = [required_items]
+            inventory_map = inventory_service.get_inventory_map(user_id)
+            if not all(inventory_map.get(item_key, 0) > 0 for item_key in required_items):
+                return False
         
         # Check narrative flags
         if "narrative_flags" in visible_if:
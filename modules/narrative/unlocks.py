@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 from database.connection import get_db
 from database.models import User, UserNarrativeProgress, UserBalance, NarrativeFragment
 from modules.narrative.flags import get_narrative_flag, has_narrative_flags
+from modules.gamification.inventory import inventory_service
 
 logger = logging.getLogger(__name__)
 
@@ -101,10 +102,8 @@ class UnlockEngine:
     
     def _check_items_requirement(self, user_id: int, required_items: List[str]) -> bool:
         """Check if user has required items"""
-        # TODO: Integrate with inventory system
-        # For now, assume user has the items
-        logger.info(f"Item requirement check for user {user_id}: {required_items}")
-        return True
+        inventory_map = inventory_service.get_inventory_map(user_id)
+        return all(inventory_map.get(item_key, 0) > 0 for item_key in required_items)
     
     def _check_fragments_requirement(self, user_id: int, required_fragments: List[str]) -> bool:
         """Check if user has completed required fragments"""
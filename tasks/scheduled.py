@@ -5,28 +5,175 @@ Scheduled tasks for DianaBot
 - VIP membership verification
 - Automated notifications
 - Scheduled post publishing
+- Auction closing at deadline
+- Nightly analytics rollup
+- Analytics sessionization
 """
 
 import sys
 import os
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import Session
 
 # Add the project root to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.connection import get_db
-from database.models import Subscription, ChannelPost
+from database.models import Subscription, ChannelPost, Auction
 from modules.admin.subscriptions import SubscriptionService
 from modules.admin.vip_access import VIPAccessControl
 from modules.admin.channels import ChannelService
 from modules.admin.publishing import publishing_service
-from modules.gamification.auctions import get_auction_service
+from modules.gamification.auctions import get_auction_service, AUCTION_DEADLINES_KEY
+from modules.analytics.rollup import DailyMetricsRollup
+from modules.analytics.sessionizer import Sessionizer
+from utils.locks import lock_metrics
 
 logger = logging.getLogger(__name__)
 
+# Failed auction closes are retried with exponential backoff
+CLOSE_ATTEMPTS_KEY = "auction:close_attempts"
+CLOSE_MAX_ATTEMPTS = 8
+CLOSE_RETRY_MAX_DELAY = 300
+
+
+class AuctionScheduler:
+    """
+    Closes auctions exactly at their deadline
+    
+    Deadlines (including anti-sniping extensions written by place_bid) live
+    in a Redis sorted set scored by end timestamp. The scheduler sleeps until
+    the earliest deadline and is woken early when a new or moved deadline
+    arrives, so no periodic table scan is needed.
+    """
+    
+    def __init__(self, max_sleep: float = 30.0):
+        self.auction_service = get_auction_service()
+        self.redis = self.auction_service.redis_client
+        self.max_sleep = max_sleep
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+    
+    def sync_deadlines(self) -> int:
+        """Register deadlines for active auctions (run once at startup)"""
+        auctions = self.auction_service.db.query(Auction).filter(Auction.status == "active").all()
+        
+        for auction in auctions:
+            self.auction_service.schedule_deadline(
+                auction.auction_id, auction.extended_end_time or auction.end_time
+            )
+        
+        logger.info(f"Synced deadlines for {len(auctions)} active auctions")
+        return len(auctions)
+    
+    def next_deadline(self) -> Optional[float]:
+        """Get the earliest pending deadline as a timestamp"""
+        earliest = self.redis.zrange(AUCTION_DEADLINES_KEY, 0, 0, withscores=True)
+        return earliest[0][1] if earliest else None
+    
+    def run_due(self) -> dict:
+        """
+        Close every auction whose deadline has passed
+        
+        Each due entry is claimed with ZREM so that only one scheduler closes
+        it when several processes run one.
+        """
+        now = time.time()
+        due_ids = self.redis.zrangebyscore(AUCTION_DEADLINES_KEY, "-inf", now)
+        
+        closed_count = 0
+        failed_count = 0
+        results = []
+        
+        for raw_id in due_ids:
+            if not self.redis.zrem(AUCTION_DEADLINES_KEY, raw_id):
+                continue  # claimed by another scheduler
+            
+            auction_id = int(raw_id)
+            try:
+                result = self.auction_service.close_auction(auction_id)
+                
+                if result:
+                    closed_count += 1
+                    results.append({
+                        'auction_id': auction_id,
+                        'status': result['status'],
+                        'winner_id': result.get('winner_id'),
+                        'winning_bid': result.get('winning_bid')
+                    })
+                    logger.info(f"Successfully closed auction {auction_id}")
+                else:
+                    # Extended or already closed; re-arm from the live state if still running
+                    live_state = self.auction_service.get_live_state(auction_id)
+                    if live_state and live_state["status"] == "active":
+                        self.auction_service.schedule_deadline(
+                            auction_id, live_state["extended_end_time"] or live_state["end_time"]
+                        )
+            except Exception as e:
+                failed_count += 1
+                self._schedule_retry(raw_id, now, e)
+                continue
+            
+            self.redis.hdel(CLOSE_ATTEMPTS_KEY, raw_id)
+        
+        return {
+            'closed': closed_count,
+            'failed': failed_count,
+            'total_checked': len(due_ids),
+            'results': results,
+            'lock_stats': lock_metrics.get_stats()
+        }
+    
+    def _schedule_retry(self, raw_id: str, now: float, error: Exception) -> None:
+        """Re-arm a failed close with exponential backoff, giving up after CLOSE_MAX_ATTEMPTS"""
+        attempts = self.redis.hincrby(CLOSE_ATTEMPTS_KEY, raw_id, 1)
+        
+        if attempts >= CLOSE_MAX_ATTEMPTS:
+            # The auction stays active; sync_deadlines re-registers it on the next start
+            self.redis.hdel(CLOSE_ATTEMPTS_KEY, raw_id)
+            logger.error(f"Giving up closing auction {raw_id} after {attempts} attempts: {error}")
+            return
+        
+        delay = min(2 ** attempts, CLOSE_RETRY_MAX_DELAY)
+        logger.error(f"Error closing auction {raw_id} (attempt {attempts}), retrying in {delay}s: {error}")
+        self.redis.zadd(AUCTION_DEADLINES_KEY, {raw_id: now + delay})
+    
+    def wake(self, event: Optional[dict] = None) -> None:
+        """Wake the scheduler so it re-reads the earliest deadline"""
+        self._wakeup.set()
+    
+    def stop(self) -> None:
+        """Stop run_forever"""
+        self._stop.set()
+        self._wakeup.set()
+    
+    def run_forever(self) -> None:
+        """Sleep until the next deadline, close due auctions, repeat"""
+        logger.info("Auction scheduler started")
+        
+        while not self._stop.is_set():
+            try:
+                stats = self.run_due()
+                if stats['closed'] or stats['failed']:
+                    logger.info(
+                        f"Closed {stats['closed']} auctions ({stats['failed']} failed), "
+                        f"lock waits: {stats['lock_stats']}"
+                    )
+                
+                next_deadline = self.next_deadline()
+                sleep_for = self.max_sleep if next_deadline is None else next_deadline - time.time()
+                sleep_for = min(max(sleep_for, 0), self.max_sleep)
+            except Exception as e:
+                logger.error(f"Auction scheduler error: {e}")
+                sleep_for = 1.0
+            
+            self._wakeup.wait(sleep_for)
+            self._wakeup.clear()
+
 
 class ScheduledTasks:
     """Scheduled tasks for automated subscription management"""
@@ -257,51 +404,52 @@ class ScheduledTasks:
         Returns auction closing statistics
         """
         try:
-            auction_service = get_auction_service()
+            result_stats = AuctionScheduler().run_due()
             
-            # Get active auctions that should be closed
-            active_auctions = auction_service.get_active_auctions()
-            
-            closed_count = 0
-            failed_count = 0
-            results = []
-            
-            for auction in active_auctions:
-                try:
-                    # Check if auction should be closed
-                    end_time = auction.extended_end_time or auction.end_time
-                    if datetime.now() >= end_time:
-                        result = auction_service.close_auction(auction.auction_id)
-                        
-                        if result:
-                            closed_count += 1
-                            results.append({
-                                'auction_id': auction.auction_id,
-                                'status': result['status'],
-                                'winner_id': result.get('winner_id'),
-                                'winning_bid': result.get('winning_bid')
-                            })
-                            logger.info(f"Successfully closed auction {auction.auction_id}")
-                        else:
-                            failed_count += 1
-                            logger.error(f"Failed to close auction {auction.auction_id}")
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Error closing auction {auction.auction_id}: {e}")
-            
-            result_stats = {
-                'closed': closed_count,
-                'failed': failed_count,
-                'total_checked': len(active_auctions),
-                'results': results
-            }
-            
-            logger.info(f"Auction closing completed: {closed_count} closed, {failed_count} failed")
+            logger.info(
+                f"Auction closing completed: {result_stats['closed']} closed, {result_stats['failed']} failed, "
+                f"lock waits: {result_stats['lock_stats']}"
+            )
             return result_stats
                 
         except Exception as e:
             logger.error(f"Error in close_expired_auctions: {e}")
             return {'closed': 0, 'failed': 0, 'total_checked': 0, 'error': str(e)}
+    
+    def rollup_daily_metrics(self) -> dict:
+        """
+        Aggregate closed days of analytics events into DailyMetrics
+        Returns rollup statistics
+        """
+        db: Session = next(get_db())
+        
+        try:
+            rolled_days = DailyMetricsRollup(db).rollup_pending()
+            
+            logger.info(f"Daily metrics rollup completed: {len(rolled_days)} days")
+            return {'rolled_up': len(rolled_days), 'days': [day.isoformat() for day in rolled_days]}
+            
+        except Exception as e:
+            logger.error(f"Error in rollup_daily_metrics: {e}")
+            return {'rolled_up': 0, 'days': [], 'error': str(e)}
+        finally:
+            db.close()
+    
+    def sessionize_events(self) -> dict:
+        """
+        Turn new analytics events into UserSessionMetrics rows
+        Returns sessionizer statistics
+        """
+        db: Session = next(get_db())
+        
+        try:
+            return Sessionizer(db).run()
+            
+        except Exception as e:
+            logger.error(f"Error in sessionize_events: {e}")
+            return {'events': 0, 'sessions': 0, 'error': str(e)}
+        finally:
+            db.close()
 
 
 def run_scheduled_tasks():
@@ -330,6 +478,12 @@ def run_scheduled_tasks():
     # Close expired auctions
     auction_results = tasks.close_expired_auctions()
     
+    # Roll up closed analytics days
+    rollup_results = tasks.rollup_daily_metrics()
+    
+    # Split new analytics events into sessions
+    session_results = tasks.sessionize_events()
+    
     logger.info(f"Scheduled tasks completed: {len(expiring)} expiring, {len(expired)} expired, {len(reminders)} reminders, {len(users_to_remove)} users to remove from channels, {publishing_results['published']} posts published, {auction_results['closed']} auctions closed")
     
     return {
@@ -340,7 +494,9 @@ def run_scheduled_tasks():
         'welcome_messages_sent': welcome_messages,
         'channel_reports': channel_reports,
         'publishing_results': publishing_results,
-        'auction_results': auction_results
+        'auction_results': auction_results,
+        'rollup_results': rollup_results,
+        'session_results': session_results
     }
 
 
@@ -0,0 +1,68 @@
+"""
+Tests for incremental achievement progress counters
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+
+from modules.gamification.achievements import AchievementService
+
+fakeredis = pytest.importorskip("fakeredis")
+
+USER_ID = 7
+PROGRESS_KEY = f"achievements:progress:{USER_ID}"
+
+
+class TestAchievementProgress:
+    """Tests for AchievementService counter updates"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with patch("modules.gamification.achievements.get_redis", return_value=self.redis):
+            self.service = AchievementService()
+        self.service.db = Mock()
+        self.index = {"achievements": {}, "by_counter": {"besitos": [], "missions_completed": []}}
+    
+    def test_missing_hash_is_seeded_not_incremented(self):
+        """An event for uncached counters seeds them instead of creating a partial hash"""
+        with patch.object(self.service, "_seed_progress") as mock_seed, \
+                patch.object(self.service, "_get_achievement_index", return_value=self.index):
+            changed = self.service._apply_event(USER_ID, 'gamification.mission_completed', {'user_id': USER_ID})
+        
+        mock_seed.assert_called_once_with(USER_ID)
+        assert sorted(changed) == ["besitos", "missions_completed"]
+        assert not self.redis.exists(PROGRESS_KEY)
+    
+    def test_increments_existing_counters(self):
+        """Cached counters are updated in place and keep their TTL"""
+        self.redis.hset(PROGRESS_KEY, mapping={"missions_completed": 2, "daily_missions_completed": 1})
+        self.redis.expire(PROGRESS_KEY, 100)
+        
+        changed = self.service._apply_event(
+            USER_ID, 'gamification.mission_completed', {'user_id': USER_ID, 'mission_type': 'daily'}
+        )
+        
+        assert changed == ["missions_completed", "daily_missions_completed"]
+        assert self.redis.hgetall(PROGRESS_KEY) == {"missions_completed": "3", "daily_missions_completed": "2"}
+        assert 0 < self.redis.ttl(PROGRESS_KEY) <= 100
+    
+    def test_hash_without_ttl_gets_one(self):
+        """A hash left without TTL is given the progress TTL"""
+        self.redis.hset(PROGRESS_KEY, "besitos", 5)
+        
+        self.service._apply_event(USER_ID, 'gamification.besitos_spent', {'user_id': USER_ID, 'new_balance': 3})
+        
+        assert self.redis.hget(PROGRESS_KEY, "besitos") == "3"
+        assert self.redis.ttl(PROGRESS_KEY) > 0
+    
+    def test_fragment_completion_raises_level(self):
+        """Completed fragments raise the narrative level but never lower it"""
+        self.redis.hset(PROGRESS_KEY, mapping={"fragments_completed": 4, "narrative_level": 1})
+        self.redis.expire(PROGRESS_KEY, 100)
+        
+        self.service._apply_event(USER_ID, 'narrative.fragment_completed', {'user_id': USER_ID})
+        assert self.redis.hget(PROGRESS_KEY, "narrative_level") == "2"
+        
+        self.service._apply_event(USER_ID, 'narrative.level_completed', {'user_id': USER_ID, 'level_number': 1})
+        assert self.redis.hget(PROGRESS_KEY, "narrative_level") == "2"
@@ -0,0 +1,67 @@
+"""
+Tests for DAU/WAU/MAU counted from per-day HyperLogLog sketches
+"""
+
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.analytics.active_users import ActiveUserCounter, _backfilled_key, _sketch_key
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestActiveUserCounter:
+    """Tests for ActiveUserCounter over Redis"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with patch("modules.analytics.active_users.get_redis", return_value=self.redis):
+            self.counter = ActiveUserCounter()
+        self.db = Mock()
+        self.stored_users = self.db.query.return_value.filter.return_value.distinct
+        self.stored_users.return_value = []
+    
+    def test_live_adds_do_not_skip_backfill(self):
+        """A day that already has live adds is still merged with its stored events"""
+        today = date.today()
+        self.counter.record_events([(1, datetime.now())])
+        self.stored_users.return_value = [(1,), (2,), (3,), (None,)]
+        
+        assert self.counter.dau(today, self.db)['count'] == 3
+        assert self.redis.exists(_backfilled_key(today))
+        
+        self.counter.record_events([(4, datetime.now())])
+        self.db.query.reset_mock()
+        assert self.counter.dau(today, self.db)['count'] == 4
+        self.db.query.assert_not_called()
+    
+    def test_empty_days_are_backfilled_once(self):
+        """Days without events are marked and not scanned again"""
+        last_day = date.today() - timedelta(days=1)
+        
+        assert self.counter.wau(last_day, self.db)['count'] == 0
+        assert self.db.query.call_count == 7
+        assert not self.redis.exists(_sketch_key(last_day))
+        
+        self.db.query.reset_mock()
+        self.counter.wau(last_day, self.db)
+        self.db.query.assert_not_called()
+    
+    def test_window_counts_distinct_users(self):
+        """Users active on several days of the window are counted once"""
+        today = datetime.now()
+        events = [(user_id, today - timedelta(days=day)) for day in range(3) for user_id in range(100)]
+        for day in range(3):
+            self.redis.set(_backfilled_key((today - timedelta(days=day)).date()), 1)
+        self.counter.record_events(events)
+        
+        result = self.counter.count(today.date() - timedelta(days=2), today.date(), self.db)
+        
+        assert result['count'] == pytest.approx(100, abs=2)
+        assert self.counter.daily_counts(today.date() - timedelta(days=2), today.date(), self.db) == {
+            (today - timedelta(days=day)).date(): pytest.approx(100, abs=2) for day in range(3)
+        }
+        self.db.query.assert_not_called()
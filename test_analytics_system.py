@@ -55,6 +55,28 @@ async def test_event_collector():
         raise
 
 
+async def test_async_store_rolls_back():
+    """Test that a failed insert on an async session is rolled back"""
+    print("Testing EventCollector async rollback...")
+    
+    mock_db = AsyncMock()
+    mock_db.execute = AsyncMock(side_effect=RuntimeError("database unavailable"))
+    collector = EventCollector(mock_db)
+    event = AnalyticsEvent(event_type='test_event', user_id=1, timestamp=datetime.now(), metadata={})
+    
+    try:
+        await collector._store_events_in_db([event])
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("store error was swallowed")
+    
+    mock_db.rollback.assert_awaited_once()
+    mock_db.commit.assert_not_awaited()
+    
+    print("✅ EventCollector async rollback test passed")
+
+
 async def test_event_subscriber():
     """Test the AnalyticsEventSubscriber functionality"""
     print("Testing AnalyticsEventSubscriber...")
@@ -141,6 +163,7 @@ async def main():
     try:
         await test_analytics_event_structure()
         await test_event_collector()
+        await test_async_store_rolls_back()
         await test_event_subscriber()
         
         print("\n🎉 All analytics tests passed!")
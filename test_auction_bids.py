@@ -0,0 +1,306 @@
+"""
+Tests for Redis-backed auction bidding, batched bid persistence and closing
+"""
+
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from bot.handlers.auctions import drain_outbid_notifications
+from modules.gamification.auctions import (
+    AuctionService, BID_QUEUE_KEY, BID_PROCESSING_KEY, AUCTION_DEADLINES_KEY, NOTIFY_PENDING_KEY
+)
+from modules.gamification.besitos import BALANCE_MIRROR_KEY, BALANCE_MIRROR_TTL
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestAuctionBids:
+    """Tests for PLACE_BID_SCRIPT and flush_pending_bids"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.db = Mock()
+        # Every bidder has enough besitos
+        self.db.query.return_value.filter.return_value.first.return_value = SimpleNamespace(besitos=10000)
+        
+        with patch("modules.gamification.auctions.get_lock_manager"), \
+                patch("modules.gamification.auctions.EventBus"):
+            self.service = AuctionService(self.db, self.redis)
+    
+    def _live_auction(self, auction_id=1, current_bid=100, ends_in=3600):
+        self.redis.hset(f"auction:live:{auction_id}", mapping={
+            "status": "active",
+            "current_bid": current_bid,
+            "current_bidder_id": "",
+            "min_bid_increment": 10,
+            "bid_count": 0,
+            "end_ts": time.time() + ends_in,
+            "extended_end_ts": ""
+        })
+        self.redis.expire(f"auction:live:{auction_id}", 86400)
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_place_bid_updates_live_state_and_queues(self, mock_bid):
+        """An accepted bid moves the live state and is queued, not persisted"""
+        self._live_auction()
+        
+        self.service.place_bid(42, 1, 150)
+        
+        state = self.service.get_live_state(1)
+        assert state["current_bid"] == 150
+        assert state["current_bidder_id"] == 42
+        assert state["bid_count"] == 1
+        assert mock_bid.call_args.kwargs["amount"] == 150
+        self.db.add.assert_not_called()
+        
+        queued = self.service.get_queued_bids()
+        assert [(bid["auction_id"], bid["user_id"], bid["amount"]) for bid in queued] == [(1, 42, 150)]
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_cached_bids_do_not_query_the_database(self, mock_bid):
+        """Once the auction and the balances are cached, bidding is Redis only"""
+        self._live_auction()
+        self.service.place_bid(42, 1, 150)
+        
+        assert int(self.redis.get(BALANCE_MIRROR_KEY.format(user_id=42))) == 10000
+        assert 0 < self.redis.ttl(BALANCE_MIRROR_KEY.format(user_id=42)) <= BALANCE_MIRROR_TTL
+        
+        self.redis.set(BALANCE_MIRROR_KEY.format(user_id=7), 500)
+        self.db.query.reset_mock()
+        self.service.place_bid(7, 1, 200)
+        
+        self.db.query.assert_not_called()
+        assert self.service.get_live_state(1)["current_bidder_id"] == 7
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_mirrored_balance_must_cover_the_bid(self, mock_bid):
+        """A bid above the mirrored balance is refused inside the script"""
+        self._live_auction()
+        self.redis.set(BALANCE_MIRROR_KEY.format(user_id=42), 120)
+        
+        with pytest.raises(ValueError, match="Insufficient besitos"):
+            self.service.place_bid(42, 1, 150)
+        
+        assert self.redis.llen(BID_QUEUE_KEY) == 0
+        assert self.service.get_live_state(1)["bid_count"] == 0
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_place_bid_rejections(self, mock_bid):
+        """Low bids, bids too close together and closed auctions are refused"""
+        self._live_auction()
+        
+        with pytest.raises(ValueError, match="Minimum bid is 110"):
+            self.service.place_bid(42, 1, 105)
+        
+        self.service.place_bid(42, 1, 150)
+        with pytest.raises(ValueError, match="Please wait"):
+            self.service.place_bid(42, 1, 200)
+        
+        self.redis.hset("auction:live:1", "status", "closed")
+        with pytest.raises(ValueError, match="not found"):
+            self.service.place_bid(7, 1, 300)
+        
+        assert self.redis.llen(BID_QUEUE_KEY) == 1
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_late_bid_extends_deadline(self, mock_bid):
+        """A bid inside the extension window pushes the deadline out"""
+        self._live_auction(ends_in=10)
+        
+        self.service.place_bid(42, 1, 150)
+        
+        deadline = self.redis.zscore(AUCTION_DEADLINES_KEY, "1")
+        assert deadline == pytest.approx(time.time() + 60, abs=5)
+        assert self.service.get_live_state(1)["extended_end_time"] is not None
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_flush_acknowledges_after_commit(self, mock_bid):
+        """Flushed bids leave the processing list only once committed"""
+        self._live_auction()
+        self.service.place_bid(42, 1, 150)
+        self.service.place_bid(7, 1, 200)
+        self.db.query.return_value.filter.return_value.all.return_value = []
+        
+        def commit():
+            assert self.redis.llen(BID_PROCESSING_KEY) == 2
+        self.db.commit.side_effect = commit
+        
+        assert self.service.flush_pending_bids() == 2
+        
+        assert self.redis.llen(BID_QUEUE_KEY) == 0
+        assert self.redis.llen(BID_PROCESSING_KEY) == 0
+        assert [call.kwargs["is_winning"] for call in mock_bid.call_args_list[-2:]] == [False, True]
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_failed_flush_requeues_in_order(self, mock_bid):
+        """A failed transaction puts the batch back at the head of the queue"""
+        self._live_auction()
+        self.service.place_bid(42, 1, 150)
+        self.service.place_bid(7, 1, 200)
+        self.db.commit.side_effect = RuntimeError("database unavailable")
+        
+        assert self.service.flush_pending_bids() == 0
+        
+        self.db.rollback.assert_called_once()
+        assert self.redis.llen(BID_PROCESSING_KEY) == 0
+        assert [json.loads(raw)["amount"] for raw in self.redis.lrange(BID_QUEUE_KEY, 0, -1)] == [150, 200]
+    
+    @patch("modules.gamification.auctions.Bid")
+    def test_flush_skips_bids_already_persisted(self, mock_bid):
+        """Bids committed before a crash are not inserted twice after recovery"""
+        self._live_auction()
+        self.service.place_bid(42, 1, 150)
+        # Simulate a crash after the commit but before the acknowledgement
+        self.redis.lmove(BID_QUEUE_KEY, BID_PROCESSING_KEY, "LEFT", "RIGHT")
+        
+        assert self.service.recover_processing_bids() == 1
+        
+        mock_bid.reset_mock()
+        self.db.query.return_value.filter.return_value.all.side_effect = [[(1, 42, 150)], []]
+        
+        assert self.service.flush_pending_bids() == 1
+        mock_bid.assert_not_called()
+        self.db.add_all.assert_called_once_with([])
+    
+    @patch("modules.gamification.auctions.Bid", side_effect=lambda **kwargs: SimpleNamespace(bid_id=None, **kwargs))
+    def test_history_merges_queued_bids(self, mock_bid):
+        """Queued bids appear in the history before they are persisted"""
+        self._live_auction()
+        self.service.place_bid(42, 1, 150)
+        persisted = SimpleNamespace(
+            auction_id=2, amount=80, is_winning=False,
+            created_at=datetime.now(timezone.utc) - timedelta(days=1)
+        )
+        self.db.query.return_value.filter.return_value.order_by.return_value.limit.return_value.all.return_value = [persisted]
+        
+        history = self.service.get_user_bid_history(42)
+        
+        assert [(bid.auction_id, bid.amount) for bid in history] == [(1, 150), (2, 80)]
+        assert history[0].bid_id is None
+        assert history[0].is_winning is True
+
+
+class TestAuctionClose:
+    """Tests for close_auction and the deadline scheduler retries"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.db = Mock()
+        
+        with patch("modules.gamification.auctions.get_lock_manager"), \
+                patch("modules.gamification.auctions.EventBus"):
+            self.service = AuctionService(self.db, self.redis)
+        
+        self.redis.hset("auction:live:1", mapping={"status": "active", "end_ts": time.time() - 1})
+        self.auction = SimpleNamespace(
+            auction_id=1, item_id=5, status="active", current_bidder_id=42, current_bid=150,
+            winner_id=None, extended_end_time=None, end_time=datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+        self.db.query.return_value.filter.return_value.first.return_value = self.auction
+        self.db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = \
+            SimpleNamespace(besitos=1000)
+    
+    @patch("utils.locks.get_lock_manager")
+    def test_close_aborts_when_bids_cannot_be_flushed(self, mock_lock_manager):
+        """A failed flush leaves the auction open instead of picking a stale winner"""
+        self.redis.rpush(BID_QUEUE_KEY, json.dumps({"auction_id": 1, "user_id": 7, "amount": 200, "ts": time.time()}))
+        self.db.commit.side_effect = RuntimeError("database unavailable")
+        
+        with pytest.raises(RuntimeError, match="not persisted"):
+            self.service.close_auction(1)
+        
+        assert self.auction.status == "active"
+        self.service.event_bus.publish.assert_not_called()
+    
+    @patch("modules.gamification.auctions.InventoryService")
+    @patch("modules.gamification.auctions.UserInventory")
+    @patch("utils.locks.get_lock_manager")
+    def test_close_rolls_back_and_does_not_announce_on_commit_failure(self, mock_lock_manager, mock_inventory,
+                                                                        mock_inventory_service):
+        """auction_won is only published once the close is committed"""
+        self.db.commit.side_effect = RuntimeError("database unavailable")
+        
+        with pytest.raises(RuntimeError):
+            self.service.close_auction(1)
+        
+        self.db.rollback.assert_called_once()
+        self.service.event_bus.publish.assert_not_called()
+        mock_inventory_service.invalidate_inventory_map.assert_not_called()
+        assert self.redis.exists("auction:live:1")
+        
+        # The rollback restores the row
+        self.auction.status, self.auction.winner_id = "active", None
+        self.redis.set(BALANCE_MIRROR_KEY.format(user_id=42), 1000)
+        self.db.commit.side_effect = None
+        result = self.service.close_auction(1)
+        
+        assert result["status"] == "won"
+        assert not self.redis.exists(BALANCE_MIRROR_KEY.format(user_id=42))
+        self.service.event_bus.publish.assert_called_once()
+        assert self.service.event_bus.publish.call_args.args[0] == "gamification.auction_won"
+        mock_inventory_service.invalidate_inventory_map.assert_called_once_with(42)
+    
+    def test_scheduler_backs_off_and_gives_up(self):
+        """Failed closes are retried with growing delays, then dropped"""
+        from tasks.scheduled import AuctionScheduler, CLOSE_ATTEMPTS_KEY, CLOSE_MAX_ATTEMPTS
+        
+        service = Mock(redis_client=self.redis)
+        service.close_auction.side_effect = RuntimeError("database unavailable")
+        with patch("tasks.scheduled.get_auction_service", return_value=service):
+            scheduler = AuctionScheduler()
+        
+        delays = []
+        self.redis.zadd(AUCTION_DEADLINES_KEY, {"1": time.time() - 1})
+        for attempt in range(CLOSE_MAX_ATTEMPTS):
+            now = time.time() + 1000 * (attempt + 1)
+            with patch("tasks.scheduled.time.time", return_value=now):
+                assert scheduler.run_due()["failed"] == 1
+            retry_at = self.redis.zscore(AUCTION_DEADLINES_KEY, "1")
+            if retry_at is not None:
+                delays.append(round(retry_at - now))
+        
+        assert delays == [2, 4, 8, 16, 32, 64, 128]
+        assert self.redis.zscore(AUCTION_DEADLINES_KEY, "1") is None
+        assert not self.redis.hexists(CLOSE_ATTEMPTS_KEY, "1")
+
+
+class TestOutbidNotifications:
+    """Tests for the outbid notification drain job"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.context = Mock()
+        self.context.bot.send_message = AsyncMock()
+        for amount in (150, 200):
+            self.redis.lpush("auction_notification:42", json.dumps({"auction_id": 1, "amount": amount}))
+        self.redis.sadd(NOTIFY_PENDING_KEY, "42")
+    
+    @pytest.mark.asyncio
+    async def test_sent_notifications_are_removed(self):
+        """One escaped Markdown message per user; entries go once it is sent"""
+        with patch("bot.handlers.auctions.get_redis", return_value=self.redis):
+            await drain_outbid_notifications(self.context)
+        
+        text = self.context.bot.send_message.call_args.kwargs["text"]
+        assert "*200*" in text and "*150*" not in text
+        assert "<id\\_subasta>" in text
+        assert not self.redis.exists("auction_notification:42")
+    
+    @pytest.mark.asyncio
+    async def test_failed_send_keeps_notifications(self):
+        """A failed send leaves the entries queued for the next drain"""
+        self.context.bot.send_message.side_effect = RuntimeError("Bad Request")
+        
+        with patch("bot.handlers.auctions.get_redis", return_value=self.redis):
+            await drain_outbid_notifications(self.context)
+        
+        assert self.redis.llen("auction_notification:42") == 2
+        assert self.redis.sismember(NOTIFY_PENDING_KEY, "42")
@@ -80,7 +80,10 @@ def test_auction_basics():
             
             bid = auction_service.place_bid(user_id, auction_id, 150)
             print(f"✅ Bid placed: {bid.amount} besitos")
-            print(f"   Bid ID: {bid.bid_id}")
+            # Bids are persisted in batches; the returned bid has no ID yet
+            assert bid.bid_id is None
+            persisted = auction_service.flush_pending_bids()
+            print(f"   Persisted {persisted} queued bids")
         except Exception as e:
             print(f"❌ Failed to place bid: {e}")
             return False
@@ -0,0 +1,114 @@
+"""
+Tests for the besitos grant ledger: leases, recovery and idempotent grants
+"""
+
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.gamification.besitos import (
+    BesitosService, BALANCE_MIRROR_KEY, GRANT_QUEUE_KEY, GRANT_PROCESSING_KEY, GRANT_LEASES_KEY, GRANT_LEASE_SECONDS
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestGrantLedger:
+    """Tests for queue_grant, process_grant_queue and recover_processing_grants"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.patcher = patch("modules.gamification.besitos.get_redis", return_value=self.redis)
+        self.patcher.start()
+    
+    def teardown_method(self):
+        """Teardown for each test"""
+        self.patcher.stop()
+    
+    def _entry(self, grant_id):
+        return json.dumps({"grant_id": grant_id, "user_id": 42, "amount": 10, "source": "test"})
+    
+    @patch.object(BesitosService, "grant_besitos", return_value=True)
+    def test_queued_grants_carry_an_id(self, mock_grant):
+        """Each queued grant gets an id that reaches grant_besitos"""
+        BesitosService.queue_grant(42, 10, "test")
+        BesitosService.queue_grant(42, 10, "test", grant_id="reaction:1")
+        
+        assert BesitosService.process_grant_queue() == 2
+        
+        grant_ids = [call.kwargs["grant_id"] for call in mock_grant.call_args_list]
+        assert len(grant_ids[0]) == 32 and grant_ids[1] == "reaction:1"
+        assert self.redis.llen(GRANT_PROCESSING_KEY) == 0
+        assert self.redis.zcard(GRANT_LEASES_KEY) == 0
+    
+    @patch.object(BesitosService, "grant_besitos", return_value=True)
+    def test_grants_are_leased_while_applied(self, mock_grant):
+        """The entry is in processing, under a lease, while it is applied"""
+        BesitosService.queue_grant(42, 10, "test", grant_id="g1")
+        
+        def apply(**kwargs):
+            raw = self.redis.lindex(GRANT_PROCESSING_KEY, 0)
+            assert self.redis.zscore(GRANT_LEASES_KEY, raw) == pytest.approx(time.time(), abs=5)
+            return True
+        mock_grant.side_effect = apply
+        
+        assert BesitosService.process_grant_queue() == 1
+    
+    def test_recovery_leaves_live_workers_alone(self):
+        """Only entries whose lease ran out, or that have none, are requeued"""
+        live, abandoned, unleased = self._entry("live"), self._entry("abandoned"), self._entry("unleased")
+        self.redis.rpush(GRANT_PROCESSING_KEY, live, abandoned, unleased)
+        self.redis.zadd(GRANT_LEASES_KEY, {live: time.time(), abandoned: time.time() - GRANT_LEASE_SECONDS - 1})
+        
+        assert BesitosService.recover_processing_grants() == 2
+        
+        assert self.redis.lrange(GRANT_PROCESSING_KEY, 0, -1) == [live]
+        assert sorted(self.redis.lrange(GRANT_QUEUE_KEY, 0, -1)) == sorted([abandoned, unleased])
+        assert self.redis.zrange(GRANT_LEASES_KEY, 0, -1) == [live]
+
+
+class TestIdempotentGrant:
+    """Tests for grant_besitos with a grant_id"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.db = Mock()
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.redis.set(BALANCE_MIRROR_KEY.format(user_id=42), 100)
+        self.balance = SimpleNamespace(besitos=100, lifetime_besitos=100)
+        self.db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = self.balance
+    
+    def _grant(self, **kwargs):
+        with patch("modules.gamification.besitos.get_db", return_value=iter([self.db])), \
+                patch("modules.gamification.besitos.get_redis", return_value=self.redis), \
+                patch("modules.gamification.besitos.Transaction") as mock_transaction, \
+                patch("modules.gamification.besitos.economy_aggregates"), \
+                patch("modules.gamification.besitos.event_bus"):
+            return BesitosService.grant_besitos(42, 10, "test", **kwargs), mock_transaction
+    
+    def test_replayed_grant_is_not_credited_twice(self):
+        """A grant id already on a Transaction is acknowledged without crediting"""
+        self.db.query.return_value.filter.return_value.first.return_value = (1,)
+        
+        applied, mock_transaction = self._grant(grant_id="g1")
+        
+        assert applied is True
+        assert self.balance.besitos == 100
+        mock_transaction.assert_not_called()
+        self.db.commit.assert_not_called()
+    
+    def test_new_grant_records_its_id(self):
+        """A new grant is credited and its id stored on the Transaction"""
+        self.db.query.return_value.filter.return_value.first.return_value = None
+        
+        applied, mock_transaction = self._grant(grant_id="g2")
+        
+        assert applied is True
+        assert self.balance.besitos == 110
+        assert mock_transaction.call_args.kwargs["grant_id"] == "g2"
+        self.db.commit.assert_called_once()
+        assert not self.redis.exists(BALANCE_MIRROR_KEY.format(user_id=42))
@@ -0,0 +1,84 @@
+"""
+Tests for grouped beta tester scoring
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.beta_tester_manager import BetaTesterManager
+from utils.cache_manager import CacheManager
+
+
+class TestScoreUsers:
+    """Tests for BetaTesterManager._score_users"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.db = MagicMock()
+        self.event_counts = [(1, 30), (2, 60)]
+        self.profiles = [(1, 250, False), (2, None, True), (3, 50, False)]
+        self.db.query.side_effect = self._query
+        
+        self.cache_patch = patch("core.beta_tester_manager.cache_manager", CacheManager())
+        self.cache_patch.start()
+        self.manager = BetaTesterManager(self.db)
+    
+    def teardown_method(self):
+        """Restore the shared cache"""
+        self.cache_patch.stop()
+    
+    def _query(self, *columns):
+        query = MagicMock()
+        if len(columns) == 2:
+            requested = self._requested(query.filter)
+            query.filter.return_value.group_by.return_value.all.side_effect = lambda: [
+                row for row in self.event_counts if row[0] in requested()
+            ]
+        else:
+            requested = self._requested(query.outerjoin.return_value.filter)
+            query.outerjoin.return_value.filter.return_value.all.side_effect = lambda: [
+                row for row in self.profiles if row[0] in requested()
+            ]
+        return query
+    
+    @staticmethod
+    def _requested(filter_mock):
+        """User IDs bound in the IN clause the query was filtered with"""
+        def requested():
+            clause = filter_mock.call_args.args[0]
+            compiled = clause.compile()
+            return {
+                value for value in compiled.params.values() if isinstance(value, list) for value in value
+            }
+        return requested
+    
+    def test_scores_use_two_queries_per_chunk(self):
+        """Activity, engagement, balance and VIP status come from two grouped queries"""
+        scores = self.manager._score_users([1, 2, 3, 1])
+        
+        assert self.db.query.call_count == 2
+        assert scores == {
+            1: {'activity_score': 60, 'engagement_score': pytest.approx(56.0), 'besitos_balance': 250, 'is_vip': False},
+            2: {'activity_score': 100, 'engagement_score': 80.0, 'besitos_balance': 0, 'is_vip': True},
+            3: {'activity_score': 0, 'engagement_score': pytest.approx(10.0), 'besitos_balance': 50, 'is_vip': False},
+        }
+    
+    def test_chunks_and_cache(self):
+        """Users are scored in chunks and cached scores are not queried again"""
+        with patch("core.beta_tester_manager.SCORE_CHUNK_SIZE", 2):
+            first = self.manager._score_users([1, 2, 3])
+        assert self.db.query.call_count == 4
+        
+        assert self.manager._score_users([3, 2, 1]) == first
+        assert self.db.query.call_count == 4
+    
+    def test_query_errors_surface(self):
+        """A failing query raises instead of scoring everyone zero, and nothing is cached"""
+        self.db.query.side_effect = RuntimeError("database unavailable")
+        
+        with pytest.raises(RuntimeError):
+            self.manager._score_users([1])
+        
+        self.db.query.side_effect = self._query
+        assert self.manager._score_users([1])[1]['activity_score'] == 60
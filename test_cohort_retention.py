@@ -0,0 +1,73 @@
+"""
+Tests for cohort retention from the activity bitmap
+"""
+
+from datetime import date
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from modules.analytics.cohorts import CohortRetentionEngine
+
+SINCE = date(2024, 1, 1)  # a Monday
+
+
+def _activity():
+    """Four users over ten days; the last column is today (still open)"""
+    user_ids = np.array([1, 2, 3, 4])
+    signup_days = np.array([0, 0, 1, 8])
+    activity = np.zeros((4, 10), dtype=bool)
+    activity[0, 1] = True  # user 1 back on D1
+    activity[2, 2] = True  # user 3 back on D1 ...
+    activity[2, 8] = True  # ... and on D7
+    activity[3, 9] = True  # user 4 active today, which does not count yet
+    return user_ids, signup_days, activity
+
+
+class TestCohortRetention:
+    """Tests for CohortRetentionEngine"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.engine = CohortRetentionEngine(Mock())
+    
+    def test_daily_cohorts(self):
+        """Each signup day is a cohort; unobservable offsets are None"""
+        with patch.object(self.engine, "_load", return_value=_activity()), \
+                patch.object(self.engine, "_revenue_per_user", return_value=np.array([10.0, 0.0, 5.0, 0.0])):
+            cohorts = self.engine.get_cohorts('daily', since=SINCE, offsets=(1, 7, 30))
+        
+        assert [c['cohort_period'] for c in cohorts] == ['2024-01-01', '2024-01-02', '2024-01-09']
+        assert [c['cohort_size'] for c in cohorts] == [2, 1, 1]
+        assert cohorts[0]['retention'] == {1: 0.5, 7: 0.0, 30: None}
+        assert cohorts[1]['retention'] == {1: 1.0, 7: 1.0, 30: None}
+        assert cohorts[2]['retention'] == {1: None, 7: None, 30: None}
+        assert cohorts[0]['avg_lifetime_value'] == 5.0
+    
+    def test_weekly_cohorts_start_on_monday(self):
+        """Weekly cohorts group signups by the Monday of their week"""
+        with patch.object(self.engine, "_load", return_value=_activity()), \
+                patch.object(self.engine, "_revenue_per_user", return_value=np.zeros(4)):
+            cohorts = self.engine.get_cohorts('weekly', since=SINCE, offsets=(1,))
+        
+        assert [(c['cohort_period'], c['cohort_size']) for c in cohorts] == [('2024-01-01', 3), ('2024-01-08', 1)]
+        assert cohorts[0]['retention'][1] == pytest.approx(2 / 3)
+    
+    def test_blended_retention(self):
+        """get_retention only counts users whose Dn day has closed"""
+        with patch.object(self.engine, "_load", return_value=_activity()):
+            retention = self.engine.get_retention(SINCE, date(2024, 1, 9), offsets=(1, 7, 30))
+        
+        assert retention == {1: pytest.approx(2 / 3), 7: pytest.approx(1 / 3), 30: None}
+    
+    def test_blended_retention_without_signups(self):
+        """Without signups no rate is observable, rather than a 0% retention"""
+        empty = (np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.zeros((0, 10), dtype=bool))
+        with patch.object(self.engine, "_load", return_value=empty):
+            assert self.engine.get_retention(SINCE, date(2024, 1, 9), offsets=(1, 7)) == {1: None, 7: None}
+    
+    def test_unknown_definition(self):
+        """Only daily, weekly and monthly cohorts exist"""
+        with pytest.raises(ValueError):
+            self.engine.get_cohorts('yearly')
@@ -0,0 +1,67 @@
+"""
+Tests for the per-content reaction counters of ReactionProcessor
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.gamification.reactions import ReactionProcessor, CONTENT_COUNTERS_SEEDED_KEY
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestContentReactionCounters:
+    """Tests for rebuild_reaction_counters and get_reaction_stats"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.db = Mock()
+        self.db.query.return_value.group_by.return_value.all.return_value = [
+            ("channel_post", 7, "❤️", 3),
+            ("channel_post", 7, "🔥", 1),
+            ("narrative_fragment", 2, "⭐", 4),
+        ]
+        self.patches = [
+            patch("modules.gamification.reactions.get_redis", return_value=self.redis),
+            patch("modules.gamification.reactions.get_db", side_effect=lambda: iter([self.db])),
+        ]
+        for p in self.patches:
+            p.start()
+    
+    def teardown_method(self):
+        """Teardown for each test"""
+        for p in self.patches:
+            p.stop()
+    
+    def test_rebuild_replaces_drifted_counters(self):
+        """Counters are recomputed from content_reactions and stale hashes are dropped"""
+        self.redis.hset(ReactionProcessor._counters_key("channel_post", 7), "❤️", 10)
+        self.redis.hset(ReactionProcessor._counters_key("channel_post", 99), "👍", 1)
+        
+        assert ReactionProcessor.rebuild_reaction_counters() is True
+        
+        assert ReactionProcessor.get_reaction_stats("channel_post", 7) == {"❤️": 3, "🔥": 1, "⭐": 0, "👍": 0}
+        assert ReactionProcessor.get_reaction_stats("narrative_fragment", 2)["⭐"] == 4
+        assert not self.redis.exists(ReactionProcessor._counters_key("channel_post", 99))
+        assert self.redis.exists(CONTENT_COUNTERS_SEEDED_KEY)
+    
+    def test_ensure_rebuilds_once(self):
+        """Counters are only built from the database when they were never seeded"""
+        assert ReactionProcessor.ensure_reaction_counters() is True
+        
+        ReactionProcessor._increment_counters("channel_post", 7, "❤️")
+        
+        assert ReactionProcessor.ensure_reaction_counters() is False
+        assert ReactionProcessor.get_reaction_stats("channel_post", 7)["❤️"] == 4
+        assert self.db.query.call_count == 1
+    
+    def test_failed_aggregation_keeps_counters(self):
+        """A database error leaves the existing counters untouched"""
+        self.redis.hset(ReactionProcessor._counters_key("channel_post", 7), "❤️", 10)
+        self.db.query.side_effect = RuntimeError("database unavailable")
+        
+        assert ReactionProcessor.rebuild_reaction_counters() is False
+        assert ReactionProcessor.get_reaction_stats("channel_post", 7)["❤️"] == 10
+        assert not self.redis.exists(CONTENT_COUNTERS_SEEDED_KEY)
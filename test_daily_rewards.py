@@ -0,0 +1,121 @@
+"""
+Tests for atomic daily reward claims
+"""
+
+import json
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.gamification.besitos import GRANT_QUEUE_KEY
+from modules.gamification.daily_rewards import DailyRewardService, CLAIM_INTERVAL_SECONDS
+
+fakeredis = pytest.importorskip("fakeredis")
+
+DAY = CLAIM_INTERVAL_SECONDS + 60
+
+
+class TestDailyRewardClaim:
+    """Tests for CLAIM_DAILY_SCRIPT through claim_daily_reward"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with patch("modules.gamification.daily_rewards.get_redis", return_value=self.redis):
+            self.service = DailyRewardService()
+        
+        self.db = Mock()
+        self.db.query.return_value.filter.return_value.first.return_value = (42,)
+        self.now = 1_700_000_000
+    
+    def _claim(self, user_id=42, after=0):
+        self.now += after
+        with patch("modules.gamification.daily_rewards.get_db", side_effect=lambda: iter([self.db])), \
+                patch("modules.gamification.daily_rewards.time.time", return_value=self.now):
+            return self.service.claim_daily_reward(user_id)
+    
+    def _queued(self):
+        return [json.loads(raw) for raw in self.redis.lrange(GRANT_QUEUE_KEY, 0, -1)]
+    
+    def test_first_claim_queues_grant(self):
+        """The grant is queued in the ledger as a JSON entry, not applied inline"""
+        result = self._claim()
+        
+        assert result["total_amount"] == 10
+        assert result["new_streak"] == 1
+        assert self._queued() == [{
+            "grant_id": "daily_reward:42:1700000000",
+            "user_id": 42,
+            "amount": 10,
+            "source": "daily_reward",
+            "description": "Recompensa diaria (racha: 1 días)",
+            "metadata": {"streak": 1}
+        }]
+    
+    def test_second_claim_same_day_is_refused(self):
+        """Only one claim per interval is accepted"""
+        self._claim()
+        
+        assert self._claim(after=3600) is None
+        assert len(self._queued()) == 1
+    
+    def test_streak_grows_and_pays_bonus(self):
+        """Daily claims extend the streak; the 3-day streak adds its bonus"""
+        self._claim()
+        self._claim(after=DAY)
+        result = self._claim(after=DAY)
+        
+        assert result["new_streak"] == 3
+        assert result["streak_bonus"] == 5
+        assert self._queued()[-1]["amount"] == 15
+    
+    def test_streak_resets_after_missed_day(self):
+        """More than 48 hours without a claim starts a new streak"""
+        self._claim()
+        self._claim(after=DAY)
+        
+        assert self._claim(after=3 * DAY)["new_streak"] == 1
+    
+    def test_unknown_user_is_refused(self):
+        """Nothing is recorded for users that do not exist"""
+        self.db.query.return_value.filter.return_value.first.return_value = None
+        
+        assert self._claim() is None
+        assert self._queued() == []
+        assert not self.redis.exists(self.service._state_key(42))
+    
+    def test_legacy_keys_are_migrated(self):
+        """Claims stored under the old per-field keys keep their streak"""
+        last_claim = datetime.now().replace(microsecond=0)
+        self.redis.set("daily_reward:42:last_claim", last_claim.isoformat(), ex=86400)
+        self.redis.set("daily_reward:42:streak", 6, ex=172800)
+        
+        assert self.service.migrate_legacy_state() == 1
+        
+        assert self.service._get_state(42) == (int(last_claim.timestamp()), 6)
+        assert not self.redis.exists("daily_reward:42:last_claim", "daily_reward:42:streak")
+        assert self.service.can_claim_daily_reward(42) is False
+        
+        self.now = int(last_claim.timestamp())
+        result = self._claim(after=DAY)
+        assert result["new_streak"] == 7
+        assert result["streak_bonus"] == 10
+    
+    def test_streak_only_legacy_keys_are_migrated(self):
+        """Users who claimed 24-48h ago only have the streak key and keep their streak"""
+        self.redis.set("daily_reward:42:streak", 2, ex=172800 - 30 * 3600)
+        self.redis.set("daily_reward:7:streak", 0)
+        
+        assert self.service.migrate_legacy_state() == 1
+        
+        last_claim, streak = self.service._get_state(42)
+        assert streak == 2
+        assert last_claim == pytest.approx(datetime.now().timestamp() - 30 * 3600, abs=5)
+        assert not self.redis.exists("daily_reward:42:streak", "daily_reward:7:streak")
+        assert not self.redis.exists(self.service._state_key(7))
+        
+        self.now = int(datetime.now().timestamp())
+        result = self._claim()
+        assert result["new_streak"] == 3
+        assert result["streak_bonus"] == 5
@@ -0,0 +1,72 @@
+"""
+Tests for the DailyMetrics rollup upsert
+"""
+
+from datetime import date
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from modules.analytics.rollup import DailyMetricsRollup
+
+DAY = date(2024, 3, 5)
+
+
+def _query(**chain):
+    """A query mock whose filter() chain ends in the given results"""
+    query = MagicMock()
+    if 'rows' in chain:
+        query.filter.return_value.group_by.return_value.all.return_value = chain['rows']
+    else:
+        query.filter.return_value.scalar.return_value = chain['scalar']
+    return query
+
+
+class TestRollupDay:
+    """Tests for DailyMetricsRollup.rollup_day"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.db = MagicMock()
+        # Queries in the order rollup_day runs them
+        self.results = [
+            _query(rows=[('reaction_added', 4), ('custom_event', 2)]),  # events by type
+            _query(scalar=3),  # active users
+            _query(rows=[('earn', 50), ('spend', 20)]),  # besitos
+            _query(scalar=1),  # new users
+            _query(scalar=10),  # total users
+            _query(scalar=5.0),  # purchases
+            _query(scalar=None),  # subscriptions
+        ]
+        self.db.query.side_effect = lambda *columns: self.results.pop(0)
+        self.rollup = DailyMetricsRollup(self.db)
+    
+    def _statement(self):
+        statement = self.db.execute.call_args.args[0]
+        return statement.compile(dialect=postgresql.dialect())
+    
+    def test_rollup_upserts_on_date(self):
+        """The day's row is written with one INSERT ... ON CONFLICT (date) DO UPDATE"""
+        metrics = self.rollup.rollup_day(DAY)
+        
+        compiled = self._statement()
+        assert "ON CONFLICT (date) DO UPDATE" in str(compiled)
+        assert compiled.params["date"] == DAY
+        assert compiled.params["active_users"] == 3
+        assert compiled.params["total_reactions"] == 4
+        assert compiled.params["total_missions_completed"] == 0
+        assert compiled.params["total_besitos_spent"] == 20
+        assert compiled.params["total_revenue"] == 5.0
+        assert metrics["events_by_type"] == {'reaction_added': 4, 'custom_event': 2}
+        self.db.add.assert_not_called()
+        self.db.commit.assert_called_once()
+    
+    def test_rerun_overwrites_every_column(self):
+        """A repeated rollup updates all computed columns instead of inserting a second row"""
+        metrics = self.rollup.rollup_day(DAY)
+        
+        update = str(self._statement()).split("DO UPDATE SET", 1)[1]
+        
+        for column in set(metrics) | {'updated_at'}:
+            assert f"{column} = " in update
+        assert "date = " not in update
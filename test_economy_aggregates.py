@@ -0,0 +1,152 @@
+"""
+Tests for the running economy aggregates: balance histogram, Gini and hourly flows
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from core.economy_aggregates import (
+    EconomyAggregates, BALANCE_HISTOGRAM_KEY, BUILT_FIELD, LIVE_SINCE_KEY, balance_bucket, gini_coefficient,
+    weighted_percentiles, _bucket_values, _flow_key, _hour_start
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _reference_gini(values):
+    """The per-user loop the economy monitor used before the histogram"""
+    sorted_values = sorted(values)
+    n, total = len(sorted_values), sum(sorted_values)
+    cumulative_sum = sum((i + 1) * value for i, value in enumerate(sorted_values))
+    return (2 * cumulative_sum) / (n * total) - (n + 1) / n
+
+
+class TestDistributionMath:
+    """Tests for gini_coefficient, weighted_percentiles and balance buckets"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.balances = np.random.default_rng(7).integers(0, 5000, size=500)
+    
+    def test_gini_matches_per_user_loop(self):
+        """Grouped and weighted Gini equals the per-user formula"""
+        values, weights = np.unique(self.balances, return_counts=True)
+        
+        assert gini_coefficient(self.balances) == pytest.approx(_reference_gini(self.balances.tolist()))
+        assert gini_coefficient(values, weights) == pytest.approx(_reference_gini(self.balances.tolist()))
+    
+    def test_gini_edge_cases(self):
+        """Empty and all-zero distributions are equal; one holder of everything is not"""
+        assert gini_coefficient([]) == 0.0
+        assert gini_coefficient([0, 0, 0]) == 0.0
+        assert gini_coefficient([5, 5, 5]) == pytest.approx(0.0)
+        assert gini_coefficient([0, 0, 0, 10]) == pytest.approx(0.75)
+    
+    def test_weighted_percentiles_match_sorted_index(self):
+        """Weighted percentiles pick the same rank as sorted[int(n * q)]"""
+        values, weights = np.unique(self.balances, return_counts=True)
+        expected = sorted(self.balances.tolist())
+        
+        result = weighted_percentiles(values.astype(float), weights.astype(float), (0.5, 0.9, 0.95))
+        
+        assert result == [expected[int(len(expected) * q)] for q in (0.5, 0.9, 0.95)]
+    
+    def test_bucket_midpoint_error(self):
+        """Every balance is within ~9% of its bucket's representative value"""
+        balances = np.arange(1, 100000)
+        buckets = np.array([balance_bucket(int(balance)) for balance in balances])
+        
+        assert balance_bucket(0) == 0
+        assert np.max(np.abs(_bucket_values(buckets) / balances - 1)) < 0.0906
+
+
+class TestEconomyAggregates:
+    """Tests for EconomyAggregates over Redis"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.db = Mock()
+        with patch("core.economy_aggregates.get_redis", return_value=self.redis):
+            self.aggregates = EconomyAggregates()
+    
+    def test_balance_distribution_from_histogram(self):
+        """Percentiles and Gini read from the histogram track the exact values"""
+        balances = np.random.default_rng(3).lognormal(5, 1.5, size=2000).astype(int)
+        values, counts = np.unique(balances, return_counts=True)
+        self.db.query.return_value.group_by.return_value.all.return_value = list(zip(values.tolist(), counts.tolist()))
+        self.db.query.return_value.one.return_value = (len(balances), balances.mean(), balances.max(), balances.min())
+        
+        distribution = self.aggregates.get_balance_distribution(self.db)
+        
+        assert self.redis.hexists(BALANCE_HISTOGRAM_KEY, BUILT_FIELD)
+        assert distribution['total_users'] == 2000
+        exact = sorted(balances.tolist())
+        for name, q in (('median_balance', 0.5), ('p90_balance', 0.9), ('p95_balance', 0.95)):
+            assert distribution[name] == pytest.approx(exact[int(len(exact) * q)], rel=0.1)
+        assert distribution['gini_coefficient'] == pytest.approx(_reference_gini(exact), abs=0.02)
+    
+    def test_record_transaction_moves_users_between_buckets(self):
+        """A balance change moves the user from the old bucket to the new one"""
+        self.aggregates.record_transaction('earn', 'daily_reward', 10, None, 10)
+        self.aggregates.record_transaction('earn', 'daily_reward', 990, 10, 1000)
+        self.aggregates.record_transaction('spend', 'shop', 1, 1000, 999)
+        
+        histogram = self.redis.hgetall(BALANCE_HISTOGRAM_KEY)
+        assert histogram[str(balance_bucket(10))] == "0"
+        assert histogram[str(balance_bucket(1000))] == "1"
+        assert balance_bucket(999) == balance_bucket(1000)
+    
+    def test_open_hour_is_never_marked_built(self):
+        """Closed hours are stored as complete; the current hour keeps its live increments"""
+        self.aggregates.record_transaction('earn', 'trivia', 5, 0, 5)
+        now = datetime.now()
+        hours = [_hour_start(now - timedelta(hours=offset)) for offset in range(4)]
+        self.db.query.return_value.filter.return_value.group_by.return_value.all.return_value = [
+            (hour, 'trivia', 50, 2) for hour in hours
+        ]
+        
+        flows = self.aggregates.get_flows('earn', now - timedelta(hours=3), self.db)
+        
+        assert flows['breakdown']['trivia']['transaction_count'] == 8
+        assert self.redis.hexists(_flow_key('earn', hours[-1]), BUILT_FIELD)
+        
+        current = self.redis.hgetall(_flow_key('earn', hours[0]))
+        assert BUILT_FIELD not in current
+        assert current['trivia:amount'] == "5"
+        
+        # The current hour began before the increments, so it is read from the ledger again
+        self.db.query.reset_mock()
+        self.aggregates.get_flows('earn', now, self.db)
+        assert self.db.query.called
+    
+    def test_missing_hours_are_rebuilt_with_one_query(self):
+        """A multi-day window costs a single grouped query however many hours are missing"""
+        now = datetime.now()
+        old_hour = _hour_start(now - timedelta(days=2))
+        self.db.query.return_value.filter.return_value.group_by.return_value.all.return_value = [
+            (old_hour, 'shop', 30, 3)
+        ]
+        
+        flows = self.aggregates.get_flows('spend', now - timedelta(days=7), self.db)
+        
+        assert self.db.query.call_count == 1
+        assert flows['total'] == 30
+        assert flows['breakdown']['shop']['transaction_count'] == 3
+        assert self.redis.hget(_flow_key('spend', old_hour), 'shop:count') == "3"
+    
+    def test_hours_after_live_since_are_trusted(self):
+        """Buckets of hours that started after the first live increment are read without the ledger"""
+        now = datetime.now()
+        self.redis.set(LIVE_SINCE_KEY, (now - timedelta(hours=3)).timestamp())
+        self.aggregates.record_transaction('earn', 'trivia', 5, 0, 5)
+        self.aggregates.record_transaction('earn', 'mission', 20, 5, 25)
+        
+        flows = self.aggregates.get_flows('earn', now - timedelta(hours=1), self.db)
+        
+        self.db.query.assert_not_called()
+        assert flows['total'] == 25
+        assert flows['breakdown']['mission']['transaction_count'] == 1
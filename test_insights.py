@@ -0,0 +1,109 @@
+"""
+Tests for the vectorized high-value user scoring in InsightEngine
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from modules.analytics.insights import InsightEngine
+
+
+ACTIVITY = [
+    (7, 'experience_completed', 9),
+    (7, 'mission_completed', 2),
+    (3, 'user_login', 4),
+    (3, 'content_viewed', 1),
+    (5, 'experience_started', 4),
+    (5, 'reaction_added', 20),
+    (5, 'unknown_event', 3),
+    (9, 'achievement_unlocked', 1),
+]
+SUBSCRIBED = [9, 42]
+
+
+class TestHighValueUsers:
+    """Tests for the feature matrix and the array formulas"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.db = MagicMock()
+        activity_query = MagicMock()
+        activity_query.filter.return_value.group_by.return_value.all.return_value = ACTIVITY
+        subscription_query = MagicMock()
+        subscription_query.filter.return_value.distinct.return_value = [(user_id,) for user_id in SUBSCRIBED]
+        self.db.query.side_effect = [activity_query, subscription_query]
+        self.engine = InsightEngine(self.db)
+    
+    def _reference(self):
+        """Per-user scores computed with the scalar formulas the matrix replaced"""
+        users = {}
+        for user_id, event_type, count in ACTIVITY:
+            users.setdefault(user_id, {})[event_type] = count
+        
+        reference = {}
+        for user_id, event_types in users.items():
+            score = sum(count * self.engine._get_event_weight(event_type) for event_type, count in event_types.items())
+            if user_id in SUBSCRIBED:
+                probability = 1.0
+            else:
+                probability = min(score / 100, 0.9) + min(len(event_types) / 10, 0.2)
+            reference[user_id] = (event_types, score, probability, 10.0 * (score / 50))
+        return reference
+    
+    def test_feature_matrix_matches_the_grouped_counts(self):
+        """Every (user, event type) count lands in its cell; subscriptions are joined by ID"""
+        features = self.engine._build_feature_matrix(30)
+        
+        assert features.user_ids.tolist() == [3, 5, 7, 9]
+        assert features.is_subscribed.tolist() == [False, False, False, True]
+        assert self.db.query.call_count == 2
+        for user_id, event_type, count in ACTIVITY:
+            row = features.user_ids.tolist().index(user_id)
+            assert features.counts[row, features.event_types.index(event_type)] == count
+        assert features.counts.sum() == sum(count for _, _, count in ACTIVITY)
+    
+    def test_scores_match_the_scalar_formulas(self):
+        """Engagement, conversion probability and LTV equal the per-user computation"""
+        reference = self._reference()
+        features = self.engine._build_feature_matrix(30)
+        
+        scores = self.engine._calculate_engagement_scores(features)
+        probabilities = self.engine._calculate_conversion_probability(
+            scores, (features.counts > 0).sum(axis=1), features.is_subscribed
+        )
+        ltvs = self.engine._calculate_potential_ltv(scores)
+        
+        for row, user_id in enumerate(features.user_ids.tolist()):
+            _, score, probability, ltv = reference[user_id]
+            assert scores[row] == pytest.approx(score)
+            assert probabilities[row] == pytest.approx(probability)
+            assert ltvs[row] == pytest.approx(ltv)
+    
+    def test_high_value_users_are_ranked_by_probability(self):
+        """Only users above 0.7 are returned, highest probability first"""
+        reference = self._reference()
+        expected = sorted(
+            (user_id for user_id, (_, _, probability, _) in reference.items() if probability > 0.7),
+            key=lambda user_id: -reference[user_id][2]
+        )
+        
+        users = self.engine.identify_high_value_users(30)
+        
+        assert [user.user_id for user in users] == expected
+        for user in users:
+            event_types, score, probability, ltv = reference[user.user_id]
+            assert user.engagement_score == pytest.approx(score)
+            assert user.conversion_probability == pytest.approx(probability)
+            assert user.potential_lifetime_value == pytest.approx(ltv)
+            assert user.recommended_actions == self.engine._get_recommended_actions(
+                user.user_id, {'event_types': event_types}
+            )
+    
+    def test_no_activity(self):
+        """Without events no user is scored and subscriptions are not queried"""
+        self.db.query.side_effect = None
+        self.db.query.return_value.filter.return_value.group_by.return_value.all.return_value = []
+        
+        assert self.engine.identify_high_value_users(30) == []
+        assert self.db.query.call_count == 1
@@ -0,0 +1,76 @@
+"""
+Tests for the sorted-set leaderboards
+"""
+
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from database.models import EventLog
+from modules.gamification.leaderboards import LeaderboardService, TRIVIA_MIN_ANSWERS
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestLeaderboards:
+    """Tests for LeaderboardService over Redis"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with patch("modules.gamification.leaderboards.get_redis", return_value=self.redis):
+            self.service = LeaderboardService()
+    
+    def _answer(self, user_id, correct, wrong):
+        for is_correct in [True] * correct + [False] * wrong:
+            self.service.handle_event({
+                "type": "gamification.trivia_answered",
+                "data": {"user_id": user_id, "correct": is_correct}
+            })
+    
+    def test_trivia_ranks_accuracy(self):
+        """A careful player outranks one who answers more but gets less right"""
+        self._answer(1, correct=5, wrong=0)
+        self._answer(2, correct=8, wrong=4)
+        
+        top = self.service.get_top("trivia", "daily")
+        
+        assert [(entry["user_id"], entry["score"]) for entry in top] == [(1, 100), (2, 67)]
+        assert self.service.get_rank("trivia", 2, "weekly") is not None
+    
+    def test_trivia_needs_minimum_answers(self):
+        """Users are ranked only once they reach the window's minimum number of answers"""
+        minimum = TRIVIA_MIN_ANSWERS["daily"]
+        self._answer(1, correct=minimum - 1, wrong=0)
+        
+        assert self.service.get_rank("trivia", 1, "daily") is None
+        
+        self._answer(1, correct=0, wrong=1)
+        rank = self.service.get_rank("trivia", 1, "daily")
+        assert rank["score"] == round((minimum - 1) * 100 / minimum)
+        assert self.service.get_rank("trivia", 1, "global") is None
+    
+    def test_rebuild_uses_live_sources(self):
+        """Missions come from logged completion events and trivia counters are restored"""
+        balances, missions = MagicMock(), MagicMock()
+        balances.__iter__.return_value = iter([(1, 300)])
+        missions.__iter__.return_value = iter([(1, 2), (2, 40)])
+        db = Mock()
+        db.query.return_value.filter.side_effect = [balances, Mock(group_by=Mock(return_value=missions))]
+        mongo = Mock()
+        mongo.trivia_stats.find.return_value = [
+            {"user_id": 1, "total_answered": 40, "correct_answers": 30},
+            {"user_id": 2, "total_answered": 3, "correct_answers": 3}
+        ]
+        
+        with patch("modules.gamification.leaderboards.get_db", return_value=iter([db])), \
+                patch("modules.gamification.leaderboards.get_mongo", return_value=mongo):
+            assert self.service.rebuild_global_boards() is True
+        
+        assert db.query.call_args_list[1].args[0] is EventLog.user_id
+        assert self.service.get_top("missions")[0] == {"rank": 1, "user_id": 2, "score": 40}
+        assert [entry["user_id"] for entry in self.service.get_top("trivia")] == [1]
+        
+        # User 2's stored answers count towards the global minimum
+        self._answer(2, correct=TRIVIA_MIN_ANSWERS["global"] - 3, wrong=0)
+        assert self.service.get_top("trivia")[0] == {"rank": 1, "user_id": 2, "score": 100}
@@ -0,0 +1,138 @@
+"""
+Tests for the FIFO distributed lock: heartbeats, hand-off and the async lock
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from utils.locks import DistributedLock, AsyncDistributedLock, WAITER_HEARTBEAT_TTL, _lock_keys
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestDistributedLock:
+    """Tests for DistributedLock"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self.keys = _lock_keys("job")
+    
+    def _lock(self):
+        with patch("utils.locks.get_redis", return_value=fakeredis.FakeRedis(server=self.server, decode_responses=True)):
+            return DistributedLock()
+    
+    def _queue_waiter(self, token, expires_in):
+        self.redis.zadd(self.keys["queue"], {token: time.time()})
+        self.redis.zadd(self.keys["expiry"], {token: time.time() + expires_in})
+    
+    def test_release_hands_off_to_waiter(self):
+        """A queued waiter gets the lock as soon as the holder releases"""
+        holder_lock, waiter_lock = self._lock(), self._lock()
+        holder = holder_lock.acquire_lock("job", timeout=30)
+        result = {}
+        
+        def wait():
+            result["token"] = waiter_lock.acquire_lock("job", timeout=30, wait_timeout=5)
+            result["acquired_at"] = time.monotonic()
+        
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.2)
+        assert self.redis.zcard(self.keys["queue"]) == 1
+        
+        released_at = time.monotonic()
+        holder_lock.release_lock("job", holder)
+        waiter.join(5)
+        
+        assert result["token"] is not None
+        assert result["acquired_at"] - released_at < 0.25
+        assert self.redis.zcard(self.keys["queue"]) == 0
+        assert self.redis.zcard(self.keys["expiry"]) == 0
+    
+    def test_dead_waiter_does_not_block_a_free_lock(self):
+        """A queued waiter that stopped heartbeating is dropped"""
+        self._queue_waiter("crashed", expires_in=-1)
+        
+        assert self._lock().acquire_lock("job", wait_timeout=0) is not None
+        assert self.redis.zcard(self.keys["queue"]) == 0
+    
+    def test_short_wait_does_not_evict_longer_waiter(self):
+        """A caller with a short wait leaves live waiters queued ahead of it"""
+        lock = self._lock()
+        holder = lock.acquire_lock("job", timeout=30)
+        self._queue_waiter("patient", expires_in=WAITER_HEARTBEAT_TTL)
+        
+        assert lock.acquire_lock("job", wait_timeout=0.1) is None
+        
+        assert self.redis.zrange(self.keys["queue"], 0, -1) == ["patient"]
+        lock.release_lock("job", holder)
+    
+    def test_timed_out_waiter_wakes_the_next_one(self):
+        """Leaving the queue is announced on the release channel"""
+        lock = self._lock()
+        holder = lock.acquire_lock("job", timeout=30)
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.keys["channel"])
+        
+        assert lock.acquire_lock("job", wait_timeout=0.1) is None
+        
+        # The first read returns the (ignored) subscribe confirmation as None
+        messages = [pubsub.get_message(timeout=0.1) for _ in range(3)]
+        assert "dequeued" in [message["data"] for message in messages if message]
+        assert self.redis.zcard(self.keys["queue"]) == 0
+        lock.release_lock("job", holder)
+
+
+class TestAsyncDistributedLock:
+    """Tests for AsyncDistributedLock"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.server = fakeredis.FakeServer()
+    
+    def _lock(self):
+        redis = fakeredis.aioredis.FakeRedis(server=self.server, decode_responses=True)
+        with patch("utils.locks.get_async_redis", return_value=redis):
+            return AsyncDistributedLock()
+    
+    @pytest.mark.asyncio
+    async def test_waiter_does_not_block_the_event_loop(self):
+        """Other coroutines keep running while a waiter waits for the release"""
+        holder_lock, waiter_lock = self._lock(), self._lock()
+        holder = await holder_lock.acquire_lock("job", timeout=30)
+        ticks = 0
+        
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        
+        async def release_later():
+            await asyncio.sleep(0.3)
+            await holder_lock.release_lock("job", holder)
+        
+        ticker = asyncio.create_task(tick())
+        releaser = asyncio.create_task(release_later())
+        token = await waiter_lock.acquire_lock("job", timeout=30, wait_timeout=5)
+        ticker.cancel()
+        await releaser
+        
+        assert token is not None
+        assert ticks > 10
+        assert await waiter_lock.release_lock("job", token) is True
+    
+    @pytest.mark.asyncio
+    async def test_timeout_returns_none(self):
+        """A held lock is not acquired within a short wait"""
+        lock = self._lock()
+        holder = await lock.acquire_lock("job", timeout=30)
+        
+        assert await lock.acquire_lock("job", wait_timeout=0.1) is None
+        await lock.release_lock("job", holder)
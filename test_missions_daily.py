@@ -0,0 +1,96 @@
+"""
+Tests for lazy daily mission materialization
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from modules.gamification.missions import MissionService
+from utils.cache_manager import cache_manager
+
+fakeredis = pytest.importorskip("fakeredis")
+
+MISSIONS = [(1, "daily_login", "Login"), (2, "daily_react", "React")]
+
+
+class TestDailyMissions:
+    """Tests for MissionService daily sets"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        cache_manager.delete(MissionService.DAILY_SET_CACHE_KEY)
+        self.service = MissionService(lazy_daily=True)
+        self.service.db = Mock()
+        self.service.redis = fakeredis.FakeRedis(decode_responses=True)
+    
+    def _existing(self, *user_missions):
+        self.service.db.query.return_value.filter.return_value.all.return_value = list(user_missions)
+    
+    @patch("modules.gamification.missions.event_bus")
+    def test_recycles_yesterdays_row(self, mock_bus):
+        """A row assigned yesterday is reset for today instead of duplicated"""
+        yesterday = SimpleNamespace(
+            mission_id=1,
+            status="completed",
+            progress={"logins": 1},
+            assigned_at=datetime.now() - timedelta(days=1),
+            completed_at=datetime.now() - timedelta(days=1)
+        )
+        today = SimpleNamespace(mission_id=2, status="active", progress={}, assigned_at=datetime.now(), completed_at=None)
+        self._existing(yesterday, today)
+        
+        assigned = self.service._materialize_daily_missions(42, MISSIONS)
+        
+        assert assigned == 1
+        assert yesterday.status == "active"
+        assert yesterday.progress == {}
+        assert yesterday.completed_at is None
+        assert yesterday.assigned_at.date() == datetime.now().date()
+        self.service.db.add.assert_not_called()
+        self.service.db.commit.assert_called_once()
+        assert mock_bus.publish.call_count == 1
+    
+    @patch("modules.gamification.missions.UserMission")
+    @patch("modules.gamification.missions.event_bus")
+    def test_creates_missing_rows(self, mock_bus, mock_user_mission):
+        """Missions the user never had get a new row"""
+        self._existing()
+        
+        assigned = self.service._materialize_daily_missions(42, MISSIONS)
+        
+        assert assigned == 2
+        assert self.service.db.add.call_count == 2
+        assert [call.kwargs["mission_id"] for call in mock_user_mission.call_args_list] == [1, 2]
+    
+    @patch("modules.gamification.missions.event_bus")
+    def test_todays_rows_are_left_alone(self, mock_bus):
+        """Nothing is committed when today's rows already exist"""
+        self._existing(*[
+            SimpleNamespace(mission_id=mission_id, status="completed", progress={}, assigned_at=datetime.now(), completed_at=None)
+            for mission_id, _, _ in MISSIONS
+        ])
+        
+        assert self.service._materialize_daily_missions(42, MISSIONS) == 0
+        self.service.db.commit.assert_not_called()
+        mock_bus.publish.assert_not_called()
+    
+    def test_invalidate_daily_set_forces_reload(self):
+        """Bumping the generation makes other processes drop their cached set"""
+        query = self.service.db.query.return_value.filter.return_value.order_by.return_value
+        query.all.return_value = [SimpleNamespace(id=1, mission_key="daily_login", title="Login")]
+        
+        first = self.service._get_daily_set()
+        query.all.return_value = [
+            SimpleNamespace(id=1, mission_key="daily_login", title="Login"),
+            SimpleNamespace(id=3, mission_key="daily_trivia", title="Trivia")
+        ]
+        assert self.service._get_daily_set() == first
+        
+        # Simulate another process: only the Redis generation changes
+        self.service.redis.incr(MissionService.DAILY_SET_GENERATION_KEY)
+        second = self.service._get_daily_set()
+        
+        assert second["version"] != first["version"]
+        assert [m[0] for m in second["missions"]] == [1, 3]
@@ -0,0 +1,142 @@
+"""
+Tests for keyset pagination and the shared streaming helpers
+"""
+
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi import Response
+from sqlalchemy import Column, Integer, String, JSON, DateTime, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from api.pagination import keyset_page, NEXT_CURSOR_HEADER
+from database.models import AnalyticsEvent
+from modules.analytics.export import DataExporter, ParquetUnavailableError
+from utils.streaming import iter_table_chunks, ndjson_stream, csv_stream
+
+Base = declarative_base()
+
+
+class Entry(Base):
+    __tablename__ = "entries"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    created_at = Column(DateTime)
+    payload = Column(JSON, nullable=True)
+
+
+class TestKeysetPagination:
+    """Tests for keyset_page and iter_table_chunks"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = Session(engine)
+        self.created_at = datetime(2024, 1, 1, 12, 0)
+        self.db.add_all([
+            Entry(id=i, name=f"entry {i}", created_at=self.created_at, payload={"n": i} if i % 2 else None)
+            for i in range(1, 8)
+        ])
+        self.db.commit()
+    
+    def _page(self, **kwargs):
+        response = Response()
+        rows = keyset_page(self.db.query(Entry), Entry, response, **kwargs)
+        return [row.id for row in rows], response.headers.get(NEXT_CURSOR_HEADER)
+    
+    def test_cursor_walks_every_row_once(self):
+        """Following X-Next-Cursor visits each row exactly once, in id order"""
+        seen, cursor = [], None
+        while True:
+            ids, cursor = self._page(after_id=int(cursor) if cursor else None, limit=3)
+            seen.extend(ids)
+            if cursor is None:
+                break
+        
+        assert seen == list(range(1, 8))
+    
+    def test_last_full_page_points_past_the_end(self):
+        """A full final page still returns a cursor; the next page is empty"""
+        assert self._page(after_id=4, limit=3) == ([5, 6, 7], "7")
+        assert self._page(after_id=7, limit=3) == ([], None)
+    
+    def test_skip_without_cursor(self):
+        """Older clients can still page with skip"""
+        assert self._page(skip=5, limit=3) == ([6, 7], None)
+        assert self._page(after_id=1, skip=5, limit=3)[0] == [2, 3, 4]
+    
+    def test_chunks_and_encoders(self):
+        """Rows stream in chunks and encode to NDJSON and CSV"""
+        chunks = list(iter_table_chunks(self.db, Entry, [Entry.id > 2], chunk_size=2))
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        
+        lines = "".join(ndjson_stream(chunks)).splitlines()
+        assert json.loads(lines[0]) == {"id": 3, "name": "entry 3", "created_at": "2024-01-01T12:00:00", "payload": {"n": 3}}
+        
+        rows = list(csv.DictReader(io.StringIO("".join(csv_stream(chunks, ["id", "payload"])))))
+        assert [(row["id"], row["payload"]) for row in rows[:2]] == [("3", '{"n": 3}'), ("4", "")]
+
+
+class TestStreamingExport:
+    """Tests for DataExporter streaming through the shared helpers"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        engine = create_engine("sqlite://")
+        AnalyticsEvent.__table__.create(engine)
+        now = datetime.now()
+        with engine.begin() as connection:
+            connection.execute(AnalyticsEvent.__table__.insert(), [
+                {"user_id": i, "event_type": "content_viewed", "session_id": None,
+                 "timestamp": now - timedelta(days=i), "event_metadata": {"post": i}}
+                for i in (1, 2, 40)
+            ])
+        self.exporter = DataExporter(Session(engine))
+    
+    def test_ndjson_export_honours_the_time_range(self):
+        """Only events of the last 30 days are exported by default"""
+        lines = "".join(self.exporter.stream_ndjson("analytics", chunk_size=1)).splitlines()
+        
+        assert [json.loads(line)["event_metadata"] for line in lines] == [{"post": 1}, {"post": 2}]
+    
+    def test_write_csv_counts_rows(self, tmp_path):
+        """write_csv writes a header and reports the data rows"""
+        path = tmp_path / "analytics.csv"
+        
+        assert self.exporter.write_csv("analytics", str(path), chunk_size=1) == 2
+        
+        with open(path, newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        assert [row["user_id"] for row in rows] == ["1", "2"]
+        assert rows[0]["event_metadata"] == '{"post": 1}'
+    
+    def test_unknown_dataset(self):
+        """Only STREAM_DATASETS can be streamed"""
+        with pytest.raises(ValueError):
+            self.exporter.stream_ndjson("users")
+    
+    def test_write_parquet_without_pyarrow(self, tmp_path):
+        """A missing pyarrow raises ParquetUnavailableError instead of writing"""
+        with patch.dict(sys.modules, {"pyarrow": None, "pyarrow.parquet": None}):
+            with pytest.raises(ParquetUnavailableError):
+                self.exporter.write_parquet("analytics", str(tmp_path / "analytics.parquet"))
+    
+    def test_write_parquet_row_groups(self, tmp_path):
+        """write_parquet writes one row group per chunk"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        path = tmp_path / "analytics.parquet"
+        
+        assert self.exporter.write_parquet("analytics", str(path), chunk_size=1) == 2
+        
+        parquet_file = pq.ParquetFile(str(path))
+        assert parquet_file.metadata.num_row_groups == 2
+        table = parquet_file.read()
+        assert table.column("user_id").to_pylist() == [1, 2]
+        assert table.column("event_metadata").to_pylist() == ['{"post": 1}', '{"post": 2}']
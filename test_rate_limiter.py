@@ -0,0 +1,122 @@
+"""
+Tests for the sliding-window rate limiter
+"""
+
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from utils.rate_limiter import RateLimiter, AsyncRateLimiter, RATE_LIMITS
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestRateLimiter:
+    """Tests for SLIDING_WINDOW_SCRIPT"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with patch("utils.rate_limiter.get_redis", return_value=self.redis):
+            self.limiter = RateLimiter()
+    
+    def test_limit_within_window(self):
+        """Attempts beyond max_attempts inside the window are refused"""
+        allowed = [self.limiter.can_perform_action(42, "test", 3, 60) for _ in range(4)]
+        
+        assert allowed == [True, True, True, False]
+        assert self.limiter.get_remaining_attempts(42, "test", 3, 60) == 0
+        assert self.limiter.can_perform_action(7, "test", 3, 60) is True
+    
+    def test_window_slides(self):
+        """Attempts older than the window no longer count"""
+        with patch("utils.rate_limiter.time.time", return_value=1000.0):
+            assert self.limiter.can_perform_action(42, "test", 1, 60) is True
+            assert self.limiter.can_perform_action(42, "test", 1, 60) is False
+        
+        with patch("utils.rate_limiter.time.time", return_value=1061.0):
+            assert self.limiter.can_perform_action(42, "test", 1, 60) is True
+    
+    def test_multiple_limits_record_only_when_all_pass(self):
+        """A refused attempt is not recorded in the windows that allowed it"""
+        for _ in range(RATE_LIMITS["daily_command"]["max_attempts"]):
+            assert self.limiter.check_limits(42, ["channel_reaction", "daily_command"]) is True
+        
+        assert self.limiter.check_limits(42, ["channel_reaction", "daily_command"]) is False
+        assert self.limiter.get_remaining_attempts(42, "channel_reaction", 50) == 45
+
+
+class TestAsyncRateLimiter:
+    """Tests for the async limiter used by bot handlers"""
+    
+    @pytest.mark.asyncio
+    async def test_check_limits(self):
+        """The async variant enforces the same predefined limits"""
+        redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        with patch("utils.rate_limiter.get_async_redis", return_value=redis):
+            limiter = AsyncRateLimiter()
+        
+        results = [await limiter.check_limits(42, ["daily_command"]) for _ in range(6)]
+        
+        assert results == [True] * 5 + [False]
+
+
+class TestHandlerLimits:
+    """Tests for how the bot handlers apply the limiter"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.update = Mock()
+        self.update.effective_user.id = 42
+        self.update.callback_query.data = "trivia_answer:abc:b"
+        self.update.callback_query.answer = AsyncMock()
+        self.update.callback_query.edit_message_text = AsyncMock()
+        self.update.message.reply_text = AsyncMock()
+        self.limiter = Mock()
+        self.limiter.check_limits = AsyncMock(return_value=False)
+    
+    @pytest.mark.asyncio
+    async def test_trivia_limit_follows_subscription(self):
+        """Free users are checked against trivia_free, VIP users against trivia_vip"""
+        from bot.handlers import trivias
+        
+        for vip, limit_name in ((False, "trivia_free"), (True, "trivia_vip")):
+            self.limiter.check_limits.reset_mock()
+            with patch.object(trivias, "async_rate_limiter", self.limiter), \
+                 patch.object(trivias, "trivia_service") as service, \
+                 patch.object(trivias, "subscription_service") as subscriptions:
+                service.is_served.return_value = True
+                subscriptions.is_vip.return_value = vip
+                await trivias.trivia_answer(self.update, Mock(user_data={}))
+            
+            self.limiter.check_limits.assert_awaited_once_with(42, [limit_name])
+            service.submit_answer.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_unserved_trivia_answer_skips_limit(self):
+        """Late or replayed answers do not use up the daily allowance"""
+        from bot.handlers import trivias
+        
+        with patch.object(trivias, "async_rate_limiter", self.limiter), \
+             patch.object(trivias, "trivia_service") as service:
+            service.is_served.return_value = False
+            service.submit_answer.return_value = {"success": False, "error": "expired"}
+            await trivias.trivia_answer(self.update, Mock(user_data={}))
+        
+        self.limiter.check_limits.assert_not_called()
+        service.submit_answer.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_daily_fails_open(self):
+        """A limiter error lets the /daily command through"""
+        from bot.commands import daily
+        
+        self.limiter.check_limits = AsyncMock(side_effect=ConnectionError("redis down"))
+        db = Mock()
+        db.query.return_value.filter.return_value.first.return_value = None
+        with patch.object(daily, "async_rate_limiter", self.limiter), \
+             patch.object(daily, "get_db", return_value=iter([db])):
+            await daily.daily_handler(self.update, Mock())
+        
+        self.update.message.reply_text.assert_awaited_once()
+        assert "No estás registrado" in self.update.message.reply_text.call_args[0][0]
@@ -0,0 +1,165 @@
+"""
+Tests for queued reaction ingestion
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from modules.admin.reactions import ReactionsService, REACTION_QUEUE_KEY, REACTION_PROCESSING_KEY
+
+fakeredis = pytest.importorskip("fakeredis")
+
+CONFIG = {"❤️": {"besitos": 5, "limit_per_user": 2}}
+
+
+class TestReactionQueue:
+    """Tests for RECORD_REACTION_SCRIPT and flush_reactions"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with patch("modules.admin.reactions.get_redis", return_value=self.redis):
+            self.service = ReactionsService()
+        self.service._get_post_config = lambda post_id: CONFIG
+        self.service.besitos_service = Mock()
+        
+        self.db = Mock()
+        # No reactions stored yet: empty limit seed and nothing to deduplicate
+        self.db.query.return_value.filter.return_value.group_by.return_value.all.return_value = []
+        self.db.query.return_value.filter.return_value.all.return_value = []
+        self.get_db = patch("modules.admin.reactions.get_db", side_effect=lambda: iter([self.db]))
+        self.get_db.start()
+    
+    def teardown_method(self):
+        """Teardown for each test"""
+        self.get_db.stop()
+    
+    def test_limit_per_user_is_enforced(self):
+        """Reactions beyond the emoji's per-user limit are not queued"""
+        results = [self.service.handle_reaction(42, 1, "❤️") for _ in range(3)]
+        
+        assert [result["rewards_granted"] for result in results] == [True, True, False]
+        assert self.redis.llen(REACTION_QUEUE_KEY) == 2
+        assert self.redis.hget("reactions:limits:1", "42:❤️") == "2"
+    
+    def test_limits_are_seeded_from_database(self):
+        """Reactions already stored count towards the limit"""
+        self.db.query.return_value.filter.return_value.group_by.return_value.all.return_value = [(42, "❤️", 2)]
+        
+        assert self.service.handle_reaction(42, 1, "❤️")["rewards_granted"] is False
+        assert self.service.handle_reaction(7, 1, "❤️")["rewards_granted"] is True
+    
+    @patch("modules.admin.reactions.event_bus")
+    @patch("modules.admin.reactions.UserReaction")
+    def test_flush_acknowledges_after_commit(self, mock_reaction, mock_bus):
+        """Entries leave the processing list only after the commit"""
+        self.service.handle_reaction(42, 1, "❤️")
+        self.service.handle_reaction(42, 1, "❤️")
+        
+        def commit():
+            assert self.redis.llen(REACTION_PROCESSING_KEY) == 2
+        self.db.commit.side_effect = commit
+        
+        assert self.service.flush_reactions() == 2
+        
+        assert self.redis.llen(REACTION_PROCESSING_KEY) == 0
+        self.service.besitos_service.queue_grant.assert_called_once()
+        assert self.service.besitos_service.queue_grant.call_args.kwargs["amount"] == 10
+    
+    @patch("modules.admin.reactions.UserReaction")
+    def test_failed_flush_requeues(self, mock_reaction):
+        """A failed commit puts the batch back in order and grants nothing"""
+        self.service.handle_reaction(42, 1, "❤️")
+        self.service.handle_reaction(7, 1, "❤️")
+        self.db.commit.side_effect = RuntimeError("database unavailable")
+        
+        assert self.service.flush_reactions() == 0
+        
+        self.db.rollback.assert_called_once()
+        assert self.redis.llen(REACTION_PROCESSING_KEY) == 0
+        assert [json.loads(raw)["user_id"] for raw in self.redis.lrange(REACTION_QUEUE_KEY, 0, -1)] == [42, 7]
+        self.service.besitos_service.queue_grant.assert_not_called()
+    
+    @patch("modules.admin.reactions.event_bus")
+    @patch("modules.admin.reactions.UserReaction")
+    def test_recovered_reactions_are_not_stored_twice(self, mock_reaction, mock_bus):
+        """Reactions committed before a crash are skipped when their batch is replayed"""
+        ts = time.time()
+        self.redis.rpush(REACTION_PROCESSING_KEY, json.dumps(
+            {"user_id": 42, "post_id": 1, "emoji": "❤️", "besitos": 5, "ts": ts}
+        ))
+        self.redis.rpush(REACTION_QUEUE_KEY, json.dumps(
+            {"user_id": 7, "post_id": 1, "emoji": "❤️", "besitos": 5, "ts": ts}
+        ))
+        
+        self.db.query.return_value.filter.return_value.all.return_value = [
+            (42, 1, "❤️", datetime.fromtimestamp(ts, timezone.utc))
+        ]
+        assert self.service.flush_reactions() == 0
+        
+        mock_reaction.assert_not_called()
+        assert self.service.besitos_service.queue_grant.call_args.kwargs["user_id"] == 42
+        assert self.redis.llen(REACTION_QUEUE_KEY) == 1
+        assert self.redis.llen(REACTION_PROCESSING_KEY) == 0
+    
+    @patch("modules.admin.reactions.event_bus")
+    @patch("modules.admin.reactions.UserReaction")
+    def test_grants_are_replayed_with_the_same_id(self, mock_reaction, mock_bus):
+        """A crash between the commit and the grants re-queues them under the same grant ids"""
+        self.service.handle_reaction(42, 1, "❤️")
+        self.service.handle_reaction(7, 1, "❤️")
+        self.service.besitos_service.queue_grant.side_effect = [None, ConnectionError("redis down")]
+        
+        with pytest.raises(ConnectionError):
+            self.service.flush_reactions()
+        first_ids = [call.kwargs["grant_id"] for call in self.service.besitos_service.queue_grant.call_args_list]
+        
+        # The reactions were committed, so the replay stores nothing new
+        entries = [json.loads(raw) for raw in self.redis.lrange(REACTION_PROCESSING_KEY, 0, -1)]
+        self.db.query.return_value.filter.return_value.all.return_value = [
+            (entry["user_id"], entry["post_id"], entry["emoji"], datetime.fromtimestamp(entry["ts"], timezone.utc))
+            for entry in entries
+        ]
+        self.service.besitos_service.queue_grant.reset_mock(side_effect=True)
+        mock_reaction.reset_mock()
+        
+        assert self.service.flush_reactions() == 0
+        
+        mock_reaction.assert_not_called()
+        replay_ids = [call.kwargs["grant_id"] for call in self.service.besitos_service.queue_grant.call_args_list]
+        assert replay_ids == first_ids
+        assert len(set(replay_ids)) == 2
+        assert self.redis.llen(REACTION_PROCESSING_KEY) == 0
+
+
+class TestReactionHandler:
+    """Tests for the live channel reaction handler"""
+    
+    @pytest.mark.asyncio
+    async def test_reaction_is_queued_without_direct_notification(self):
+        """Channel reactions go through the batched service; rewards are only notified in batches"""
+        from bot.handlers import reactions
+        
+        update = Mock()
+        update.effective_user.id = 42
+        update.effective_chat.id = -100
+        update.message.message_id = 555
+        context = Mock()
+        limiter = Mock()
+        limiter.check_limits = AsyncMock(return_value=True)
+        
+        with patch.object(reactions, "async_rate_limiter", limiter), \
+             patch.object(reactions, "reactions_service") as service, \
+             patch.object(reactions, "_update_reaction_missions") as missions:
+            service.get_post_id.return_value = 3
+            service.handle_reaction.return_value = {"success": True, "rewards_granted": True, "queued": True}
+            await reactions.handle_reaction_added(update, context)
+        
+        service.get_post_id.assert_called_once_with(-100, 555)
+        service.handle_reaction.assert_called_once_with(42, 3, "❤️")
+        missions.assert_called_once_with(42, 555, "❤️")
+        context.bot.send_message.assert_not_called()
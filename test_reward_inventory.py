@@ -0,0 +1,132 @@
+"""
+Tests for keeping the cached inventory map coherent with reward items
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.gamification.achievements import AchievementService
+from modules.gamification.missions import MissionService
+from modules.gamification.inventory import InventoryService
+
+fakeredis = pytest.importorskip("fakeredis")
+
+USER_ID = 42
+MAP_KEY = f"inventory:map:{USER_ID}"
+
+
+class TestRewardInventory:
+    """Reward items written in the caller's transaction drop the cached map"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.redis.hset(MAP_KEY, mapping={"__loaded": 1, "rose": 1})
+        self.get_redis = patch("modules.gamification.inventory.get_redis", return_value=self.redis)
+        self.get_redis.start()
+        self.db = Mock()
+    
+    def teardown_method(self):
+        """Teardown for each test"""
+        self.get_redis.stop()
+    
+    @patch("modules.gamification.missions.UserInventory")
+    @patch("modules.gamification.missions.event_bus")
+    def test_mission_item_reward(self, mock_bus, mock_inventory):
+        """Completing a mission that rewards an item invalidates the map after commit"""
+        service = MissionService(lazy_daily=True)
+        service.db = self.db
+        self.db.query.return_value.filter.return_value.first.side_effect = [
+            SimpleNamespace(status="active", completed_at=None),
+            SimpleNamespace(mission_key="m", title="M", mission_type="daily", rewards={"items": ["rose"]}),
+            SimpleNamespace(id=3),
+            None
+        ]
+        self.db.commit.side_effect = lambda: self._assert_cached()
+        
+        assert service.complete_mission(USER_ID, 1) is True
+        
+        self.db.add.assert_called_once()
+        assert not self.redis.exists(MAP_KEY)
+    
+    @patch("modules.gamification.achievements.UserInventory")
+    @patch("modules.gamification.achievements.UserAchievement")
+    @patch("modules.gamification.achievements.event_bus")
+    def test_achievement_item_reward(self, mock_bus, mock_user_achievement, mock_inventory):
+        """Unlocking an achievement that rewards an item invalidates the map after commit"""
+        with patch("modules.gamification.achievements.get_redis", return_value=self.redis):
+            service = AchievementService()
+        service.db = self.db
+        self.db.query.return_value.filter.return_value.first.side_effect = [
+            SimpleNamespace(id=5, achievement_key="a", name="A", reward_besitos=0, reward_item_id=3),
+            None,
+            None
+        ]
+        self.db.commit.side_effect = lambda: self._assert_cached()
+        
+        assert service.unlock_achievement(USER_ID, "a") is True
+        
+        assert not self.redis.exists(MAP_KEY)
+    
+    def _assert_cached(self):
+        assert self.redis.exists(MAP_KEY)
+
+
+class TestInventoryMapLoad:
+    """A map loaded from the database is only cached if nothing changed meanwhile"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.db = Mock()
+        self.rows = self.db.query.return_value.join.return_value.filter.return_value.all
+        self.rows.return_value = [("rose", 1)]
+        self.patches = [
+            patch("modules.gamification.inventory.get_redis", return_value=self.redis),
+            patch("modules.gamification.inventory.get_db", side_effect=lambda: iter([self.db])),
+            patch.object(InventoryService, "_update_map_script", None),
+            patch.object(InventoryService, "_store_map_script", None)
+        ]
+        for patcher in self.patches:
+            patcher.start()
+    
+    def teardown_method(self):
+        """Teardown for each test"""
+        for patcher in self.patches:
+            patcher.stop()
+    
+    def test_loaded_map_is_cached(self):
+        """A cold read caches the map and the next read skips the database"""
+        assert InventoryService.get_inventory_map(USER_ID) == {"rose": 1}
+        assert InventoryService.get_inventory_map(USER_ID) == {"rose": 1}
+        
+        assert self.rows.call_count == 1
+        assert self.redis.hget(MAP_KEY, "rose") == "1"
+    
+    def test_write_during_load_is_not_overwritten(self):
+        """A write committed while the map was loading keeps the stale map out of the cache"""
+        def write_during_load():
+            InventoryService._update_inventory_map(USER_ID, "rose", 2)
+            return [("rose", 1)]
+        self.rows.side_effect = write_during_load
+        
+        assert InventoryService.get_inventory_map(USER_ID) == {"rose": 1}
+        assert not self.redis.exists(MAP_KEY)
+        
+        self.rows.side_effect = None
+        self.rows.return_value = [("rose", 2)]
+        assert InventoryService.get_inventory_map(USER_ID) == {"rose": 2}
+        assert self.redis.hget(MAP_KEY, "rose") == "2"
+    
+    def test_invalidation_during_load_is_not_overwritten(self):
+        """invalidate_inventory_map also bumps the generation"""
+        def invalidate_during_load():
+            InventoryService.invalidate_inventory_map(USER_ID)
+            return [("rose", 1)]
+        self.rows.side_effect = invalidate_during_load
+        
+        InventoryService.get_inventory_map(USER_ID)
+        
+        assert not self.redis.exists(MAP_KEY)
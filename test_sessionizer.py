@@ -0,0 +1,119 @@
+"""
+Tests for the streaming sessionizer and its Redis checkpoint
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from modules.analytics.sessionizer import (
+    Sessionizer, CHECKPOINT_EVENT_KEY, CHECKPOINT_OPEN_KEY, SESSIONIZER_LOCK_NAME
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestSessionizer:
+    """Tests for Sessionizer.run"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.db = MagicMock()
+        self.events = self.db.query.return_value.filter.return_value.order_by.return_value.limit.return_value
+        # Every event is settled unless a test says otherwise
+        self.db.query.return_value.filter.return_value.scalar.return_value = None
+        
+        with patch("modules.analytics.sessionizer.get_redis", return_value=self.redis), \
+                patch("utils.locks.get_redis", return_value=self.redis):
+            self.sessionizer = Sessionizer(self.db)
+    
+    def _stored(self):
+        return [row for call in self.db.bulk_insert_mappings.call_args_list for row in call.args[1]]
+    
+    def test_idle_sessions_are_closed_and_checkpointed(self):
+        """A gap splits sessions; idle sessions are stored and leave the checkpoint"""
+        start = datetime.now() - timedelta(hours=3)
+        self.events.all.return_value = [
+            (1, 42, 'message_sent', start, None),
+            (2, 42, 'besitos_earned', start + timedelta(minutes=5), {'amount': 20}),
+            (3, 42, 'message_sent', start + timedelta(minutes=50), None)
+        ]
+        
+        assert self.sessionizer.run() == {'events': 3, 'sessions': 2}
+        
+        first, second = self._stored()
+        assert (first['messages_sent'], first['besitos_earned'], first['session_duration']) == (1, 20, 300)
+        assert second['start_time'] == start + timedelta(minutes=50)
+        assert self.redis.get(CHECKPOINT_EVENT_KEY) == "3"
+        assert not self.redis.exists(CHECKPOINT_OPEN_KEY)
+    
+    def test_open_session_resumes_from_checkpoint(self):
+        """An active session survives between runs and keeps counting"""
+        now = datetime.now()
+        self.events.all.return_value = [(1, 42, 'message_sent', now - timedelta(minutes=2), None)]
+        assert self.sessionizer.run() == {'events': 1, 'sessions': 0}
+        assert self.redis.hexists(CHECKPOINT_OPEN_KEY, "42")
+        
+        self.events.all.return_value = [(2, 42, 'reaction_added', now, None)]
+        self.sessionizer.run()
+        
+        assert self.redis.get(CHECKPOINT_EVENT_KEY) == "2"
+        self.db.bulk_insert_mappings.assert_not_called()
+        
+        # An hour later the session has gone idle
+        class Later(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now + timedelta(hours=1)
+        
+        self.events.all.return_value = []
+        with patch("modules.analytics.sessionizer.datetime", Later):
+            assert self.sessionizer.run()['sessions'] == 1
+        
+        session, = self._stored()
+        assert (session['messages_sent'], session['reactions_added']) == (1, 1)
+    
+    def test_sessions_stored_before_a_crash_are_skipped(self):
+        """Replaying a batch does not insert the same session twice"""
+        start = datetime.now() - timedelta(hours=3)
+        self.events.all.return_value = [(1, 42, 'message_sent', start, None)]
+        self.db.query.return_value.filter.return_value.__iter__.return_value = iter([(f"42-{int(start.timestamp())}",)])
+        
+        assert self.sessionizer.run() == {'events': 1, 'sessions': 0}
+        assert self.redis.get(CHECKPOINT_EVENT_KEY) == "1"
+    
+    def test_failed_commit_keeps_checkpoint(self):
+        """The checkpoint only moves once the sessions are committed"""
+        self.events.all.return_value = [(1, 42, 'message_sent', datetime.now() - timedelta(hours=3), None)]
+        self.db.commit.side_effect = RuntimeError("database unavailable")
+        
+        with pytest.raises(RuntimeError):
+            self.sessionizer.run()
+        
+        self.db.rollback.assert_called_once()
+        assert self.redis.get(CHECKPOINT_EVENT_KEY) is None
+        assert not self.sessionizer.lock.is_locked(SESSIONIZER_LOCK_NAME)
+    
+    def test_concurrent_run_is_skipped(self):
+        """A run that finds the lock held consumes nothing"""
+        holder = self.sessionizer.lock.acquire_lock(SESSIONIZER_LOCK_NAME, timeout=60)
+        
+        assert self.sessionizer.run() == {'events': 0, 'sessions': 0}
+        self.db.query.assert_not_called()
+        
+        self.sessionizer.lock.release_lock(SESSIONIZER_LOCK_NAME, holder)
+    
+    def test_reading_stops_at_first_unsettled_event(self):
+        """Events from the first recently stored one on are left for a later run"""
+        self.db.query.return_value.filter.return_value.scalar.return_value = 7
+        self.events.all.return_value = [(5, 42, 'message_sent', datetime.now(), None)]
+        
+        self.sessionizer.run()
+        
+        settled_filter, events_filter = [call.args for call in self.db.query.return_value.filter.call_args_list[:2]]
+        assert str(settled_filter[1].compile()).startswith("analytics_events.created_at >=")
+        assert str(events_filter[1].compile()) == "analytics_events.id < :id_1"
+        assert events_filter[1].compile().params == {'id_1': 7}
+        assert self.redis.get(CHECKPOINT_EVENT_KEY) == "5"
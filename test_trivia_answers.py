@@ -0,0 +1,111 @@
+"""
+Tests for trivia answers checked against the served-question record
+"""
+
+import json
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.gamification.trivias import TriviaService
+
+fakeredis = pytest.importorskip("fakeredis")
+
+TRIVIA = {
+    "_id": "t1",
+    "question_key": "diana_origin",
+    "category": "historia",
+    "difficulty": "facil",
+    "question": {"text": "¿Dónde nació Diana?"},
+    "options": [
+        {"option_id": "a", "is_correct": False},
+        {"option_id": "b", "is_correct": True}
+    ],
+    "time_limit_seconds": 30,
+    "rewards": {"correct": {"besitos": 10}, "incorrect": {"besitos": 1}}
+}
+
+
+class TestTriviaAnswers:
+    """Tests for submit_answer, get_trivia_stats and the served record"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        
+        with patch("modules.gamification.trivias.get_redis", return_value=self.redis), \
+                patch("modules.gamification.trivias.mongo_db", Mock()), \
+                patch("modules.gamification.trivias.EventBus"), \
+                patch("modules.gamification.trivias.InventoryService"):
+            self.service = TriviaService()
+        
+        self.service.besitos_service = Mock()
+        self.service.get_trivia_by_id = Mock(return_value=TRIVIA)
+    
+    def test_served_answer_is_rewarded_with_server_time(self):
+        """The served record grades the answer; the client cannot claim a faster time"""
+        self.service._record_served(42, TRIVIA)
+        key = self.service._served_key(42, "t1")
+        assert self.redis.ttl(key) == 30 + TriviaService.SERVED_GRACE_SECONDS
+        
+        # Served four seconds ago
+        served = json.loads(self.redis.get(key))
+        served["served_at"] = time.time() - 4
+        self.redis.set(key, json.dumps(served))
+        
+        result = self.service.submit_answer(42, "t1", "b", response_time=1.0)
+        
+        assert result["correct"] is True
+        assert result["response_time"] == pytest.approx(4.0, abs=0.5)
+        assert result["rewards"]["besitos"] == int(10 * (10 - result["response_time"]) / 10 * 2)
+        assert "late" not in result
+        self.service.get_trivia_by_id.assert_not_called()
+        self.service.besitos_service.grant_besitos.assert_called_once_with(42, result["rewards"]["besitos"], "trivia_answer")
+        
+        update = self.service.trivia_stats_collection.update_one.call_args
+        assert update.args[0] == {"user_id": 42}
+        assert update.args[1]["$inc"]["correct_answers"] == 1
+        assert update.args[1]["$inc"]["category_stats.historia.answered"] == 1
+        assert update.kwargs["upsert"] is True
+    
+    def test_unserved_answer_is_graded_without_rewards(self):
+        """An expired or never recorded question is graded but earns nothing"""
+        result = self.service.submit_answer(42, "t1", "b", response_time=45.0)
+        
+        assert result["success"] is True
+        assert result["correct"] is True
+        assert result["late"] is True
+        assert result["rewards"] == {}
+        self.service.besitos_service.grant_besitos.assert_not_called()
+        self.service.trivia_stats_collection.update_one.assert_not_called()
+    
+    def test_replayed_answer_earns_once(self):
+        """The served record is consumed, so answering again only grades"""
+        self.service._record_served(42, TRIVIA)
+        
+        first = self.service.submit_answer(42, "t1", "a")
+        replay = self.service.submit_answer(42, "t1", "a")
+        
+        assert first["rewards"]["besitos"] == 1
+        assert "late" not in first
+        assert replay["late"] is True
+        assert replay["correct"] is False
+        assert self.service.besitos_service.grant_besitos.call_count == 1
+        assert self.service.trivia_stats_collection.update_one.call_count == 1
+        assert self.service.is_served(42, "t1") is False
+    
+    def test_stats_are_derived_from_counters(self):
+        """Accuracy and average response time are computed on read"""
+        self.service.trivia_stats_collection.find_one.return_value = {
+            "total_answered": 4,
+            "correct_answers": 3,
+            "total_response_time": 22.0,
+            "total_besitos_earned": 40
+        }
+        
+        stats = self.service.get_trivia_stats(42)
+        
+        assert stats["accuracy"] == 75.0
+        assert stats["average_response_time"] == 5.5
+        assert stats["incorrect_answers"] == 1
@@ -0,0 +1,55 @@
+"""
+Tests for trivia selection from the Redis id pools
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.gamification.trivias import TriviaService
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class TestTriviaPick:
+    """Tests for PICK_TRIVIA_SCRIPT through get_random_trivia"""
+    
+    def setup_method(self):
+        """Setup for each test"""
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        
+        with patch("modules.gamification.trivias.get_redis", return_value=self.redis), \
+                patch("modules.gamification.trivias.mongo_db", Mock()), \
+                patch("modules.gamification.trivias.EventBus"), \
+                patch("modules.gamification.trivias.InventoryService"):
+            self.service = TriviaService()
+        
+        self.redis.sadd(self.service._pool_key(None, None), "a", "b", "c")
+        self.redis.sadd(self.service._pool_key("historia", None), "c")
+        self.service.get_trivia_by_id = lambda trivia_id: {"_id": trivia_id}
+        self.service._record_served = Mock()
+    
+    def test_unseen_question_is_preferred(self):
+        """Questions seen in the last 24 hours are skipped while others remain"""
+        self.redis.sadd(self.service._seen_key(42), "a", "b")
+        
+        assert self.service.get_random_trivia(user_id=42)["_id"] == "c"
+    
+    def test_seen_questions_are_reused_when_exhausted(self):
+        """A user who has seen the whole pool still gets a question"""
+        self.redis.sadd(self.service._seen_key(42), "a", "b", "c")
+        
+        assert self.service.get_random_trivia(user_id=42)["_id"] in {"a", "b", "c"}
+    
+    def test_served_question_is_marked_seen(self):
+        """Serving a question adds it to the user's seen set with a TTL"""
+        trivia = self.service.get_random_trivia(category="historia", user_id=42)
+        
+        assert trivia["_id"] == "c"
+        assert self.redis.sismember(self.service._seen_key(42), "c")
+        assert 0 < self.redis.ttl(self.service._seen_key(42)) <= TriviaService.SEEN_TTL
+        self.service._record_served.assert_called_once_with(42, trivia)
+    
+    def test_empty_pool_returns_none(self):
+        """Filters with no matching questions yield no trivia"""
+        assert self.service.get_random_trivia(category="ciencia", difficulty="dificil", user_id=42) is None
@@ -1,49 +1,241 @@
 """
 Distributed locking system using Redis for preventing race conditions
+
+Waiters are queued in FIFO order in a sorted set and woken up through a
+pub/sub channel when the holder releases or a waiter leaves the queue,
+instead of polling. Queued waiters keep a heartbeat, so one that dies is
+dropped within seconds. Long operations can keep their lease alive with
+automatic renewal. AsyncDistributedLock is the same lock for code running
+on the event loop.
 """
+import asyncio
+import threading
 import time
 import uuid
-from typing import Optional
+from typing import Any, Dict, Optional
 from functools import wraps
-from database.connection import get_redis
+from database.connection import get_redis, get_async_redis
+
+# Queued waiters refresh their entry this often...
+WAITER_HEARTBEAT_INTERVAL = 0.5
+# ...and are dropped from the queue when they have not for this long
+WAITER_HEARTBEAT_TTL = 2.0
+
+# Acquire the lock only if the caller is at the head of the wait queue
+# KEYS: lock key, queue key (token -> arrival), expiry key (token -> expiry), release channel
+# ARGV: token, lease_ms, now, expires_at
+# expires_at is the caller's heartbeat expiry (never past its own wait
+# deadline); when given, a caller that does not get the lock is queued or
+# has its heartbeat refreshed. Waiters whose expiry has passed are dropped
+# first, and the next waiter is woken up if that changed the head.
+# Returns 1 if acquired, 0 otherwise
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[3])
+local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)
+for _, waiter in ipairs(stale) do
+    redis.call('ZREM', KEYS[2], waiter)
+    redis.call('ZREM', KEYS[3], waiter)
+end
+local head = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+if head and head ~= ARGV[1] then
+    if #stale > 0 then
+        redis.call('PUBLISH', KEYS[4], 'dequeued')
+    end
+elseif redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('ZREM', KEYS[3], ARGV[1])
+    return 1
+end
+if ARGV[4] ~= '' then
+    redis.call('ZADD', KEYS[2], 'NX', now, ARGV[1])
+    redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+end
+return 0
+"""
+
+# Leave the wait queue (timed out) and wake up the next waiter
+# KEYS: queue key, expiry key, release channel
+# ARGV: token
+LEAVE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('PUBLISH', KEYS[3], 'dequeued')
+return 1
+"""
+
+# Release the lock if we still own it and wake up waiters
+# KEYS: lock key, release channel
+# ARGV: token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('PUBLISH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Extend the lease if we still own the lock
+# KEYS: lock key
+# ARGV: token, lease_ms
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class LockMetrics:
+    """In-process wait time metrics for distributed locks"""
+    
+    def __init__(self):
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def record(self, wait_time: float, acquired: bool, contended: bool) -> None:
+        """Record the outcome of one acquire attempt"""
+        if acquired:
+            self.acquired += 1
+        else:
+            self.timeouts += 1
+        if contended:
+            self.contended += 1
+        self.total_wait += wait_time
+        self.max_wait = max(self.max_wait, wait_time)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lock wait statistics"""
+        attempts = self.acquired + self.timeouts
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / attempts * 1000, 3) if attempts > 0 else 0,
+            "max_wait_ms": round(self.max_wait * 1000, 3)
+        }
+    
+    def clear_stats(self) -> None:
+        """Clear lock statistics"""
+        self.__init__()
+
+
+# Global lock metrics shared by sync and async locks, reported with each auction closing run
+lock_metrics = LockMetrics()
+
+
+def _lock_keys(lock_name: str) -> Dict[str, str]:
+    return {
+        "lock": f"lock:{lock_name}",
+        "queue": f"lock_queue:{lock_name}",
+        "expiry": f"lock_waiters:{lock_name}",
+        "channel": f"lock_released:{lock_name}"
+    }
+
+
+def _acquire_args(lock_identifier: str, lease_ms: int, queue_for: Optional[float]) -> list:
+    """ACQUIRE_SCRIPT arguments; queue_for is the caller's remaining wait, None to not queue"""
+    now = time.time()
+    expires_at = '' if queue_for is None else now + min(max(queue_for, 0), WAITER_HEARTBEAT_TTL)
+    return [lock_identifier, lease_ms, now, expires_at]
+
+
+def _next_wakeup(remaining: float, lock_ttl_ms: int) -> float:
+    """Wait for a release notification, but wake up in time for the next heartbeat or lease expiry"""
+    wait = min(remaining, WAITER_HEARTBEAT_INTERVAL)
+    if lock_ttl_ms >= 0:
+        wait = min(wait, lock_ttl_ms / 1000)
+    return max(wait, 0.001)
+
 
 class DistributedLock:
     """Distributed lock implementation using Redis"""
     
     def __init__(self):
         self.redis_client = get_redis()
+        self._acquire_script = self.redis_client.register_script(ACQUIRE_SCRIPT)
+        self._leave_script = self.redis_client.register_script(LEAVE_SCRIPT)
+        self._release_script = self.redis_client.register_script(RELEASE_SCRIPT)
+        self._extend_script = self.redis_client.register_script(EXTEND_SCRIPT)
+        self._renewers: Dict[str, threading.Event] = {}
     
-    def acquire_lock(self, lock_name: str, timeout: int = 10, retry_delay: float = 0.1, max_retries: int = 10) -> Optional[str]:
+    def acquire_lock(
+        self,
+        lock_name: str,
+        timeout: int = 10,
+        retry_delay: float = 0.1,
+        max_retries: int = 10,
+        wait_timeout: Optional[float] = None,
+        renew: bool = False
+    ) -> Optional[str]:
         """
         Acquire a distributed lock
         
+        Waiters queue in FIFO order and are woken up by the release
+        notification rather than polling. This blocks the calling thread
+        while waiting; use AsyncDistributedLock on the event loop.
+        
         Args:
             lock_name: Name of the lock
-            timeout: Lock timeout in seconds
-            retry_delay: Delay between retries in seconds
-            max_retries: Maximum number of retry attempts
-            
+            timeout: Lock lease in seconds
+            retry_delay: Kept for compatibility; with max_retries it sets the
+                default wait budget (retry_delay * max_retries)
+            max_retries: See retry_delay
+            wait_timeout: Maximum time to wait for the lock in seconds
+            renew: Keep extending the lease in the background until released
+        
         Returns:
             Lock identifier if acquired, None if failed
         """
+        keys = _lock_keys(lock_name)
         lock_identifier = str(uuid.uuid4())
+        lease_ms = int(timeout * 1000)
+        max_wait = wait_timeout if wait_timeout is not None else retry_delay * max_retries
         
-        for attempt in range(max_retries):
-            # Try to acquire the lock
-            acquired = self.redis_client.set(
-                f"lock:{lock_name}",
-                lock_identifier,
-                nx=True,
-                ex=timeout
-            )
-            
-            if acquired:
-                return lock_identifier
-            
-            # Wait before retrying
-            time.sleep(retry_delay)
+        started = time.monotonic()
+        deadline = started + max_wait
+        
+        if self._try_acquire(keys, lock_identifier, lease_ms):
+            lock_metrics.record(0.0, acquired=True, contended=False)
+            if renew:
+                self._start_renewal(lock_name, lock_identifier, timeout)
+            return lock_identifier
         
-        return None
+        if max_wait <= 0:
+            lock_metrics.record(0.0, acquired=False, contended=True)
+            return None
+        
+        # Contended: queue up and wait for release notifications
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(keys["channel"])
+        
+        acquired = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if self._try_acquire(keys, lock_identifier, lease_ms, queue_for=remaining):
+                    acquired = True
+                    break
+                if remaining <= 0:
+                    break
+                
+                pubsub.get_message(timeout=_next_wakeup(remaining, self.redis_client.pttl(keys["lock"])))
+        finally:
+            if not acquired:
+                self._leave_script(keys=[keys["queue"], keys["expiry"], keys["channel"]], args=[lock_identifier])
+            pubsub.close()
+        
+        lock_metrics.record(time.monotonic() - started, acquired=acquired, contended=True)
+        
+        if not acquired:
+            return None
+        
+        if renew:
+            self._start_renewal(lock_name, lock_identifier, timeout)
+        return lock_identifier
     
     def release_lock(self, lock_name: str, lock_identifier: str) -> bool:
         """
@@ -52,25 +244,172 @@ class DistributedLock:
         Args:
             lock_name: Name of the lock
             lock_identifier: Lock identifier returned by acquire_lock
-            
+        
         Returns:
             True if lock was released, False otherwise
         """
-        # Use Lua script for atomic check-and-delete
-        lua_script = """
-        if redis.call("get", KEYS[1]) == ARGV[1] then
-            return redis.call("del", KEYS[1])
-        else
-            return 0
-        end
+        self._stop_renewal(lock_identifier)
+        
+        keys = _lock_keys(lock_name)
+        result = self._release_script(keys=[keys["lock"], keys["channel"]], args=[lock_identifier])
+        return bool(result)
+    
+    def extend_lock(self, lock_name: str, lock_identifier: str, timeout: int = 10) -> bool:
         """
+        Extend the lease of a lock we still hold
         
-        result = self.redis_client.eval(lua_script, 1, f"lock:{lock_name}", lock_identifier)
+        Args:
+            lock_name: Name of the lock
+            lock_identifier: Lock identifier returned by acquire_lock
+            timeout: New lease in seconds
+        
+        Returns:
+            True if the lease was extended, False if the lock was lost
+        """
+        keys = _lock_keys(lock_name)
+        result = self._extend_script(keys=[keys["lock"]], args=[lock_identifier, int(timeout * 1000)])
         return bool(result)
     
     def is_locked(self, lock_name: str) -> bool:
         """Check if a lock is currently held"""
         return bool(self.redis_client.exists(f"lock:{lock_name}"))
+    
+    def _try_acquire(self, keys: Dict[str, str], lock_identifier: str, lease_ms: int,
+                     queue_for: Optional[float] = None) -> bool:
+        return bool(self._acquire_script(
+            keys=[keys["lock"], keys["queue"], keys["expiry"], keys["channel"]],
+            args=_acquire_args(lock_identifier, lease_ms, queue_for)
+        ))
+    
+    def _start_renewal(self, lock_name: str, lock_identifier: str, timeout: int) -> None:
+        """Extend the lease every third of its length until released"""
+        stop = threading.Event()
+        self._renewers[lock_identifier] = stop
+        
+        def renew():
+            while not stop.wait(timeout / 3):
+                if not self.extend_lock(lock_name, lock_identifier, timeout):
+                    break
+        
+        threading.Thread(target=renew, daemon=True).start()
+    
+    def _stop_renewal(self, lock_identifier: str) -> None:
+        stop = self._renewers.pop(lock_identifier, None)
+        if stop is not None:
+            stop.set()
+
+
+class AsyncDistributedLock:
+    """The same distributed lock for coroutines; waiting never blocks the event loop"""
+    
+    def __init__(self):
+        self.redis_client = get_async_redis()
+        self._acquire_script = self.redis_client.register_script(ACQUIRE_SCRIPT)
+        self._leave_script = self.redis_client.register_script(LEAVE_SCRIPT)
+        self._release_script = self.redis_client.register_script(RELEASE_SCRIPT)
+        self._extend_script = self.redis_client.register_script(EXTEND_SCRIPT)
+        self._renewers: Dict[str, asyncio.Task] = {}
+    
+    async def acquire_lock(
+        self,
+        lock_name: str,
+        timeout: int = 10,
+        wait_timeout: float = 1.0,
+        renew: bool = False
+    ) -> Optional[str]:
+        """
+        Acquire a distributed lock without blocking the event loop
+        
+        Args:
+            lock_name: Name of the lock
+            timeout: Lock lease in seconds
+            wait_timeout: Maximum time to wait for the lock in seconds
+            renew: Keep extending the lease in a background task until released
+        
+        Returns:
+            Lock identifier if acquired, None if failed
+        """
+        keys = _lock_keys(lock_name)
+        lock_identifier = str(uuid.uuid4())
+        lease_ms = int(timeout * 1000)
+        
+        started = time.monotonic()
+        deadline = started + wait_timeout
+        
+        if await self._try_acquire(keys, lock_identifier, lease_ms):
+            lock_metrics.record(0.0, acquired=True, contended=False)
+            if renew:
+                self._start_renewal(lock_name, lock_identifier, timeout)
+            return lock_identifier
+        
+        if wait_timeout <= 0:
+            lock_metrics.record(0.0, acquired=False, contended=True)
+            return None
+        
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(keys["channel"])
+        
+        acquired = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if await self._try_acquire(keys, lock_identifier, lease_ms, queue_for=remaining):
+                    acquired = True
+                    break
+                if remaining <= 0:
+                    break
+                
+                lock_ttl = await self.redis_client.pttl(keys["lock"])
+                await pubsub.get_message(timeout=_next_wakeup(remaining, lock_ttl))
+        finally:
+            if not acquired:
+                await self._leave_script(keys=[keys["queue"], keys["expiry"], keys["channel"]], args=[lock_identifier])
+            await pubsub.aclose()
+        
+        lock_metrics.record(time.monotonic() - started, acquired=acquired, contended=True)
+        
+        if not acquired:
+            return None
+        
+        if renew:
+            self._start_renewal(lock_name, lock_identifier, timeout)
+        return lock_identifier
+    
+    async def release_lock(self, lock_name: str, lock_identifier: str) -> bool:
+        """Release a distributed lock; returns True if it was still held"""
+        self._stop_renewal(lock_identifier)
+        
+        keys = _lock_keys(lock_name)
+        result = await self._release_script(keys=[keys["lock"], keys["channel"]], args=[lock_identifier])
+        return bool(result)
+    
+    async def extend_lock(self, lock_name: str, lock_identifier: str, timeout: int = 10) -> bool:
+        """Extend the lease of a lock we still hold; returns False if the lock was lost"""
+        keys = _lock_keys(lock_name)
+        result = await self._extend_script(keys=[keys["lock"]], args=[lock_identifier, int(timeout * 1000)])
+        return bool(result)
+    
+    async def _try_acquire(self, keys: Dict[str, str], lock_identifier: str, lease_ms: int,
+                           queue_for: Optional[float] = None) -> bool:
+        return bool(await self._acquire_script(
+            keys=[keys["lock"], keys["queue"], keys["expiry"], keys["channel"]],
+            args=_acquire_args(lock_identifier, lease_ms, queue_for)
+        ))
+    
+    def _start_renewal(self, lock_name: str, lock_identifier: str, timeout: int) -> None:
+        """Extend the lease every third of its length in a background task until released"""
+        async def renew():
+            while True:
+                await asyncio.sleep(timeout / 3)
+                if not await self.extend_lock(lock_name, lock_identifier, timeout):
+                    break
+        
+        self._renewers[lock_identifier] = asyncio.create_task(renew())
+    
+    def _stop_renewal(self, lock_identifier: str) -> None:
+        task = self._renewers.pop(lock_identifier, None)
+        if task is not None:
+            task.cancel()
 
 
 class AuctionLockManager:
@@ -88,8 +427,8 @@ class AuctionLockManager:
         return self.lock.release_lock(f"auction_bid:{auction_id}", lock_identifier)
     
     def lock_auction_close(self, auction_id: int, timeout: int = 10) -> Optional[str]:
-        """Acquire lock for closing an auction"""
-        return self.lock.acquire_lock(f"auction_close:{auction_id}", timeout=timeout)
+        """Acquire lock for closing an auction (lease is renewed until released)"""
+        return self.lock.acquire_lock(f"auction_close:{auction_id}", timeout=timeout, renew=True)
     
     def unlock_auction_close(self, auction_id: int, lock_identifier: str) -> bool:
         """Release lock for auction close"""
@@ -148,4 +487,4 @@ def get_lock_manager() -> AuctionLockManager:
     if _lock_manager is None:
         _lock_manager = AuctionLockManager()
     
-    return _lock_manager
\ No newline at end of file
+    return _lock_manager
@@ -3,15 +3,45 @@ Rate limiting utility for DianaBot
 """
 
 import time
-from typing import Optional
-from database.connection import get_redis
+import uuid
+from typing import List, Optional, Sequence
+from database.connection import get_redis, get_async_redis
+
+# Sliding-window log check-and-increment across several limits at once
+# KEYS: one sorted set per limit
+# ARGV: now_ms, member, then (max_attempts, window_ms) per key
+# Returns 0 if allowed (and records the attempt in every window),
+# otherwise the 1-based index of the first limit that was exceeded
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    local max_attempts = tonumber(ARGV[1 + i * 2])
+    local window = tonumber(ARGV[2 + i * 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= max_attempts then
+        return i
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[2])
+    redis.call('PEXPIRE', key, tonumber(ARGV[2 + i * 2]))
+end
+return 0
+"""
 
 
 class RateLimiter:
-    """Rate limiter for preventing farming and abuse"""
+    """
+    Rate limiter for preventing farming and abuse
+    
+    Uses a sliding-window log per (action, user) in a Redis sorted set. The
+    check and the increment happen in one Lua script, so concurrent requests
+    cannot both slip through and each action costs one round trip.
+    """
     
     def __init__(self):
         self.redis = get_redis()
+        self._script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
     
     def can_perform_action(
         self, 
@@ -32,30 +62,30 @@ class RateLimiter:
         Returns:
             bool: True if action is allowed, False if rate limited
         """
-        key = f"rate_limit:{action_key}:{user_id}"
-        
-        # Get current count
-        current_count = self.redis.get(key)
-        
-        if current_count is None:
-            # First attempt in this window
-            self.redis.setex(key, time_window, 1)
-            return True
-        
-        current_count = int(current_count)
-        
-        if current_count >= max_attempts:
-            return False
+        keys, args = _script_params(user_id, [(action_key, max_attempts, time_window)])
+        return self._script(keys=keys, args=args) == 0
+    
+    def check_limits(self, user_id: int, limit_names: Sequence[str]) -> bool:
+        """
+        Check several predefined RATE_LIMITS at once, recording the attempt
+        only if all of them allow it
         
-        # Increment count
-        self.redis.incr(key)
-        return True
+        Args:
+            user_id: User ID
+            limit_names: Keys of RATE_LIMITS to enforce
+            
+        Returns:
+            bool: True if action is allowed, False if any limit is exceeded
+        """
+        keys, args = _script_params(user_id, _predefined_limits(limit_names))
+        return self._script(keys=keys, args=args) == 0
     
     def get_remaining_attempts(
         self, 
         user_id: int, 
         action_key: str, 
-        max_attempts: int
+        max_attempts: int,
+        time_window: Optional[int] = None
     ) -> int:
         """
         Get remaining attempts for an action
@@ -64,40 +94,43 @@ class RateLimiter:
             user_id: User ID
             action_key: Action identifier
             max_attempts: Maximum attempts allowed
+            time_window: Time window in seconds (defaults to RATE_LIMITS)
             
         Returns:
             int: Remaining attempts
         """
-        key = f"rate_limit:{action_key}:{user_id}"
-        current_count = self.redis.get(key)
-        
-        if current_count is None:
-            return max_attempts
-        
-        current_count = int(current_count)
+        key = _limit_key(action_key, user_id)
+        window = time_window or RATE_LIMITS.get(action_key, {}).get("time_window", 86400)
+        now_ms = int(time.time() * 1000)
+        current_count = self.redis.zcount(key, now_ms - window * 1000, "+inf")
         return max(0, max_attempts - current_count)
     
     def get_time_until_reset(
         self, 
         user_id: int, 
-        action_key: str
+        action_key: str,
+        time_window: Optional[int] = None
     ) -> Optional[int]:
         """
-        Get time until rate limit resets
+        Get time until the oldest attempt leaves the window
         
         Args:
             user_id: User ID
             action_key: Action identifier
+            time_window: Time window in seconds (defaults to RATE_LIMITS)
             
         Returns:
             Optional[int]: Seconds until reset, or None if not rate limited
         """
-        key = f"rate_limit:{action_key}:{user_id}"
-        ttl = self.redis.ttl(key)
+        key = _limit_key(action_key, user_id)
+        window = time_window or RATE_LIMITS.get(action_key, {}).get("time_window", 86400)
+        oldest = self.redis.zrange(key, 0, 0, withscores=True)
         
-        if ttl > 0:
-            return ttl
-        return None
+        if not oldest:
+            return None
+        
+        remaining = int((oldest[0][1] + window * 1000 - time.time() * 1000) / 1000)
+        return remaining if remaining > 0 else None
     
     def reset_rate_limit(
         self, 
@@ -114,12 +147,58 @@ class RateLimiter:
         Returns:
             bool: True if reset successful
         """
-        key = f"rate_limit:{action_key}:{user_id}"
-        return bool(self.redis.delete(key))
+        return bool(self.redis.delete(_limit_key(action_key, user_id)))
+
+
+class AsyncRateLimiter:
+    """Async variant of RateLimiter for use inside bot handlers"""
+    
+    def __init__(self):
+        self.redis = get_async_redis()
+        self._script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+    
+    async def can_perform_action(
+        self,
+        user_id: int,
+        action_key: str,
+        max_attempts: int,
+        time_window: int
+    ) -> bool:
+        """Check and record an action against a single limit"""
+        keys, args = _script_params(user_id, [(action_key, max_attempts, time_window)])
+        return await self._script(keys=keys, args=args) == 0
+    
+    async def check_limits(self, user_id: int, limit_names: Sequence[str]) -> bool:
+        """Check and record an action against several predefined RATE_LIMITS"""
+        keys, args = _script_params(user_id, _predefined_limits(limit_names))
+        return await self._script(keys=keys, args=args) == 0
+
+
+def _limit_key(action_key: str, user_id: int) -> str:
+    return f"rate_limit:sw:{action_key}:{user_id}"
+
 
+def _predefined_limits(limit_names: Sequence[str]) -> List[tuple]:
+    return [
+        (name, RATE_LIMITS[name]["max_attempts"], RATE_LIMITS[name]["time_window"])
+        for name in limit_names
+    ]
 
-# Global rate limiter instance
+
+def _script_params(user_id: int, limits: List[tuple]):
+    """Build KEYS/ARGV for the sliding window script"""
+    now_ms = int(time.time() * 1000)
+    keys = []
+    args = [now_ms, f"{now_ms}:{uuid.uuid4().hex[:8]}"]
+    for action_key, max_attempts, time_window in limits:
+        keys.append(_limit_key(action_key, user_id))
+        args.extend([max_attempts, time_window * 1000])
+    return keys, args
+
+
+# Global rate limiter instances
 rate_limiter = RateLimiter()
+async_rate_limiter = AsyncRateLimiter()
 
 
 # Predefined rate limits for different actions
@@ -139,6 +218,11 @@ RATE_LIMITS = {
         "time_window": 86400,  # 24 hours
         "description": "Daily reward: once per day"
     },
+    "daily_command": {
+        "max_attempts": 5,
+        "time_window": 60,  # 1 minute
+        "description": "Daily reward command: 5 attempts per minute"
+    },
     "mission_claim": {
         "max_attempts": 10,
         "time_window": 3600,  # 1 hour
@@ -0,0 +1,82 @@
+"""
+Chunked table reads and streaming encoders shared by exports and API listings
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+# Rows fetched per server-side cursor round trip when streaming
+STREAM_CHUNK_SIZE = 5000
+
+
+def iter_table_chunks(db: Session, model, filters: Iterable = (),
+                      chunk_size: int = STREAM_CHUNK_SIZE,
+                      columns: Optional[Sequence[str]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Read a table in id order through a server-side cursor, chunk_size rows at a time
+    
+    Every column is read unless columns names the ones to keep.
+    """
+    if columns is None:
+        columns = [column.name for column in model.__table__.columns]
+    names = list(columns)
+    columns = [model.__table__.columns[name] for name in names]
+    
+    stmt = select(*columns).where(*filters).order_by(model.id).execution_options(yield_per=chunk_size)
+    result = db.execute(stmt)
+    try:
+        for partition in result.partitions():
+            yield [dict(zip(names, row)) for row in partition]
+    finally:
+        result.close()
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps default for the values stored in our tables"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=json_default)
+    return json_default(value)
+
+
+def ndjson_stream(chunks: Iterable[List[Dict[str, Any]]]) -> Iterator[str]:
+    """Encode row chunks as newline-delimited JSON, one text chunk per row chunk"""
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(row, ensure_ascii=False, default=json_default) + "\n"
+            for row in chunk
+        )
+
+
+def csv_stream(chunks: Iterable[List[Dict[str, Any]]], fieldnames: List[str]) -> Iterator[str]:
+    """Encode row chunks as CSV with a header row; nested values are written as JSON"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction="ignore")
+    
+    writer.writeheader()
+    yield output.getvalue()
+    
+    for chunk in chunks:
+        output.seek(0)
+        output.truncate()
+        writer.writerows(
+            {key: _csv_value(value) for key, value in row.items()}
+            for row in chunk
+        )
+        yield output.getvalue()